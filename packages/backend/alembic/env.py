@@ -9,7 +9,6 @@ from pathlib import Path
 # プロジェクトのルートディレクトリをPythonパスに追加
 sys.path.append(str(Path(__file__).parent.parent))
 
-from app.core.config import settings
 from app.core.database import engine
 from sqlmodel import SQLModel
 
@@ -37,8 +36,11 @@ target_metadata = SQLModel.metadata
 # my_important_option = config.get_main_option("my_important_option")
 # ... etc.
 
-# データベースURLを環境変数から取得
-config.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
+# データベースURLを環境変数から取得（マイグレーションは同期ドライバで実行する）
+config.set_main_option(
+    "sqlalchemy.url",
+    engine.url.render_as_string(hide_password=False).replace("%", "%%")
+)
 
 
 def run_migrations_offline() -> None:
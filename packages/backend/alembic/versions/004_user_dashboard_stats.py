@@ -0,0 +1,262 @@
+"""Add user_dashboard_stats rollup maintained by triggers
+
+Revision ID: 004_user_dashboard_stats
+Revises: 003_add_chat_tables
+Create Date: 2025-08-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers
+revision = '004_user_dashboard_stats'
+down_revision = '003_add_chat_tables'
+depends_on = None
+
+# 日別メール件数の初期投入範囲（settings.DASHBOARD_EMAIL_DAYS_RETENTION と合わせる）
+EMAIL_DAYS_RETENTION = 31
+
+# SQLModel は Enum を名前（TODO / PROGRESS / DONE）で保存するため、
+# 値（todo / ...）で保存された行とも一致するよう大文字に揃えて比較する
+TASK_CHANGES = """
+    SELECT user_id, upper(status::text) AS status, due_date, {sign} AS sign,
+           timezone('utc', now()) AS now_utc
+    FROM {table}
+"""
+
+TASK_STATS_FUNCTION = """
+CREATE OR REPLACE FUNCTION {name}() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    WITH changes AS (
+        {changes}
+    ), deltas AS (
+        SELECT
+            user_id,
+            sum(sign) AS total_tasks,
+            coalesce(sum(sign) FILTER (WHERE status = 'TODO'), 0) AS todo_count,
+            coalesce(sum(sign) FILTER (WHERE status = 'PROGRESS'), 0) AS progress_count,
+            coalesce(sum(sign) FILTER (WHERE status = 'DONE'), 0) AS done_count,
+            coalesce(sum(sign) FILTER (
+                WHERE due_date < now_utc AND status <> 'DONE'
+            ), 0) AS overdue_count,
+            min(due_date) FILTER (
+                WHERE sign > 0 AND due_date >= now_utc AND status <> 'DONE'
+            ) AS next_due_at
+        FROM changes
+        GROUP BY user_id
+    )
+    INSERT INTO user_dashboard_stats AS s (
+        user_id, total_tasks, todo_count, progress_count, done_count,
+        overdue_count, next_due_at, updated_at
+    )
+    SELECT
+        user_id, total_tasks, todo_count, progress_count, done_count,
+        overdue_count, next_due_at, timezone('utc', now())
+    FROM deltas
+    WHERE total_tasks <> 0 OR todo_count <> 0 OR progress_count <> 0
+       OR done_count <> 0 OR overdue_count <> 0 OR next_due_at IS NOT NULL
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_tasks = s.total_tasks + EXCLUDED.total_tasks,
+        todo_count = s.todo_count + EXCLUDED.todo_count,
+        progress_count = s.progress_count + EXCLUDED.progress_count,
+        done_count = s.done_count + EXCLUDED.done_count,
+        overdue_count = s.overdue_count + EXCLUDED.overdue_count,
+        next_due_at = LEAST(s.next_due_at, EXCLUDED.next_due_at),
+        updated_at = EXCLUDED.updated_at;
+    RETURN NULL;
+END;
+$$;
+"""
+
+EMAIL_CHANGES = """
+    SELECT a.user_id, c.is_task, c.analyzed, c.email_date, c.sign
+    FROM (
+        SELECT sync_job_id, is_task, ai_analysis IS NOT NULL AS analyzed, email_date,
+               {sign} AS sign
+        FROM {table}
+    ) c
+    JOIN email_sync_jobs j ON j.id = c.sync_job_id
+    JOIN email_accounts a ON a.id = j.email_account_id
+"""
+
+# 集計行 → 日別件数の順に更新する（reconcile と同じ順でロックしデッドロックを避ける）
+EMAIL_STATS_FUNCTION = """
+CREATE OR REPLACE FUNCTION {name}() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    WITH changes AS (
+        {changes}
+    ), deltas AS (
+        SELECT
+            user_id,
+            sum(sign) AS total_emails,
+            coalesce(sum(sign) FILTER (WHERE is_task), 0) AS task_emails,
+            coalesce(sum(sign) FILTER (WHERE analyzed), 0) AS analyzed_emails
+        FROM changes
+        GROUP BY user_id
+    )
+    INSERT INTO user_dashboard_stats AS s (
+        user_id, total_emails, task_emails, analyzed_emails, updated_at
+    )
+    SELECT user_id, total_emails, task_emails, analyzed_emails, timezone('utc', now())
+    FROM deltas
+    WHERE total_emails <> 0 OR task_emails <> 0 OR analyzed_emails <> 0
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_emails = s.total_emails + EXCLUDED.total_emails,
+        task_emails = s.task_emails + EXCLUDED.task_emails,
+        analyzed_emails = s.analyzed_emails + EXCLUDED.analyzed_emails,
+        updated_at = EXCLUDED.updated_at;
+
+    WITH changes AS (
+        {changes}
+    )
+    INSERT INTO user_email_daily_stats AS d (user_id, day, email_count)
+    SELECT user_id, email_date::date, sum(sign)
+    FROM changes
+    GROUP BY user_id, email_date::date
+    HAVING sum(sign) <> 0
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        email_count = d.email_count + EXCLUDED.email_count;
+    RETURN NULL;
+END;
+$$;
+"""
+
+# (テーブル, 関数のテンプレート, 変更行のテンプレート, 関数名の接頭辞)
+STATS_SOURCES = [
+    ('tasks', TASK_STATS_FUNCTION, TASK_CHANGES, 'user_dashboard_stats_tasks'),
+    ('processed_emails', EMAIL_STATS_FUNCTION, EMAIL_CHANGES, 'user_dashboard_stats_emails'),
+]
+
+
+def _changes(template: str, operation: str) -> str:
+    """操作で増減する行（新しい行は +1、古い行は -1）"""
+    new_rows = template.format(sign=1, table='new_rows')
+    old_rows = template.format(sign=-1, table='old_rows')
+    if operation == 'INSERT':
+        return new_rows
+    if operation == 'DELETE':
+        return old_rows
+    return f"{new_rows} UNION ALL {old_rows}"
+
+
+def upgrade():
+    """
+    ユーザー毎のダッシュボード集計テーブルを追加
+    - user_dashboard_stats: タスク・メールの件数（1ユーザー1行）
+    - user_email_daily_stats: 日別のメール件数（直近N日の集計用）
+    件数は tasks / processed_emails の文単位トリガーで増減させる
+    """
+
+    op.create_table('user_dashboard_stats',
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('total_tasks', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('todo_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('progress_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('done_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('overdue_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_due_at', sa.DateTime(), nullable=True),
+        sa.Column('total_emails', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('task_emails', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('analyzed_emails', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+    op.create_table('user_email_daily_stats',
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('email_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+
+    # 一括INSERT（同期時のメール取り込み）でも1文あたり1回の更新で済むよう、
+    # 遷移テーブルを使う文単位トリガーにする
+    for table, function_template, changes_template, prefix in STATS_SOURCES:
+        for operation in ('INSERT', 'UPDATE', 'DELETE'):
+            name = f"{prefix}_{operation.lower()}"
+            op.execute(function_template.format(
+                name=name, changes=_changes(changes_template, operation)
+            ))
+
+            referencing = {
+                'INSERT': 'NEW TABLE AS new_rows',
+                'UPDATE': 'OLD TABLE AS old_rows NEW TABLE AS new_rows',
+                'DELETE': 'OLD TABLE AS old_rows',
+            }[operation]
+            op.execute(
+                f"CREATE TRIGGER {name} AFTER {operation} ON {table} "
+                f"REFERENCING {referencing} "
+                f"FOR EACH STATEMENT EXECUTE FUNCTION {name}()"
+            )
+
+    # 既存データから初期値を投入
+    # （トリガー作成で tasks / processed_emails への書き込みはコミットまで待たされるため取りこぼさない）
+    op.execute("""
+        INSERT INTO user_dashboard_stats (
+            user_id, total_tasks, todo_count, progress_count, done_count,
+            overdue_count, next_due_at, total_emails, task_emails, analyzed_emails,
+            updated_at, reconciled_at
+        )
+        SELECT
+            u.id,
+            coalesce(t.total_tasks, 0), coalesce(t.todo_count, 0),
+            coalesce(t.progress_count, 0), coalesce(t.done_count, 0),
+            coalesce(t.overdue_count, 0), t.next_due_at,
+            coalesce(e.total_emails, 0), coalesce(e.task_emails, 0),
+            coalesce(e.analyzed_emails, 0),
+            timezone('utc', now()), timezone('utc', now())
+        FROM users u
+        LEFT JOIN (
+            SELECT
+                user_id,
+                count(*) AS total_tasks,
+                count(*) FILTER (WHERE upper(status::text) = 'TODO') AS todo_count,
+                count(*) FILTER (WHERE upper(status::text) = 'PROGRESS') AS progress_count,
+                count(*) FILTER (WHERE upper(status::text) = 'DONE') AS done_count,
+                count(*) FILTER (
+                    WHERE due_date < timezone('utc', now()) AND upper(status::text) <> 'DONE'
+                ) AS overdue_count,
+                min(due_date) FILTER (
+                    WHERE due_date >= timezone('utc', now()) AND upper(status::text) <> 'DONE'
+                ) AS next_due_at
+            FROM tasks
+            GROUP BY user_id
+        ) t ON t.user_id = u.id
+        LEFT JOIN (
+            SELECT
+                a.user_id,
+                count(*) AS total_emails,
+                count(*) FILTER (WHERE p.is_task) AS task_emails,
+                count(*) FILTER (WHERE p.ai_analysis IS NOT NULL) AS analyzed_emails
+            FROM processed_emails p
+            JOIN email_sync_jobs j ON j.id = p.sync_job_id
+            JOIN email_accounts a ON a.id = j.email_account_id
+            GROUP BY a.user_id
+        ) e ON e.user_id = u.id
+    """)
+
+    op.execute(f"""
+        INSERT INTO user_email_daily_stats (user_id, day, email_count)
+        SELECT a.user_id, p.email_date::date, count(*)
+        FROM processed_emails p
+        JOIN email_sync_jobs j ON j.id = p.sync_job_id
+        JOIN email_accounts a ON a.id = j.email_account_id
+        WHERE p.email_date >= timezone('utc', now()) - interval '{EMAIL_DAYS_RETENTION} days'
+        GROUP BY a.user_id, p.email_date::date
+    """)
+
+
+def downgrade():
+    """変更を元に戻す"""
+    for table, _, _, prefix in STATS_SOURCES:
+        for operation in ('insert', 'update', 'delete'):
+            op.execute(f"DROP TRIGGER IF EXISTS {prefix}_{operation} ON {table}")
+            op.execute(f"DROP FUNCTION IF EXISTS {prefix}_{operation}()")
+    op.drop_table('user_email_daily_stats')
+    op.drop_table('user_dashboard_stats')
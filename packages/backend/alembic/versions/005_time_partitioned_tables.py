@@ -0,0 +1,183 @@
+"""Range-partition processed_emails, openai_usage and task_histories by time
+
+Revision ID: 005_time_partitioned_tables
+Revises: 004_user_dashboard_stats
+Create Date: 2025-08-27 10:00:00.000000
+
+"""
+from datetime import date, datetime
+from typing import List, Optional
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '005_time_partitioned_tables'
+down_revision = '004_user_dashboard_stats'
+depends_on = None
+
+# 先行して作成する将来の月数（settings.PARTITION_PREMAKE_MONTHS と合わせる）
+PREMAKE_MONTHS = 3
+
+# (テーブル, パーティションキー, 1パーティションの月数)
+# app.core.partitioning.PARTITIONED_TABLES と合わせる
+PARTITIONED_TABLES = [
+    ('processed_emails', 'email_date', 1),
+    ('openai_usage', 'created_at', 1),
+    ('task_histories', 'created_at', 3),
+]
+
+# 主キー・一意制約はパーティションキーを含める必要がある
+PARTITIONED_KEYS = {
+    # email_id 単独の一意性は processed_email_keys で保証する
+    'processed_emails': ['PRIMARY KEY (id, email_date)'],
+    'openai_usage': ['PRIMARY KEY (id, created_at)'],
+    'task_histories': ['PRIMARY KEY (id, created_at)'],
+}
+
+# downgrade で戻す主キー・一意インデックス
+PLAIN_KEYS = {
+    'processed_emails': ['PRIMARY KEY (id)'],
+    'openai_usage': ['PRIMARY KEY (id)'],
+    'task_histories': ['PRIMARY KEY (id)'],
+}
+PLAIN_UNIQUE_INDEXES = [
+    'CREATE UNIQUE INDEX ix_processed_emails_email_id ON processed_emails (email_id)',
+]
+
+# 一意インデックス（主キー含む）は PARTITIONED_KEYS / PLAIN_KEYS で作り直す
+INDEXES_SQL = """
+    SELECT pg_get_indexdef(indexrelid) FROM pg_index
+    WHERE indrelid = CAST(:table AS regclass) AND NOT indisunique
+"""
+
+FOREIGN_KEYS_SQL = """
+    SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+    WHERE conrelid = CAST(:table AS regclass) AND contype = 'f'
+"""
+
+REFERENCING_FOREIGN_KEYS_SQL = """
+    SELECT conrelid::regclass::text, conname FROM pg_constraint
+    WHERE confrelid = CAST(:table AS regclass) AND contype = 'f'
+"""
+
+# 004 の集計トリガー（processed_emails）もここで引き継ぐ
+TRIGGERS_SQL = """
+    SELECT pg_get_triggerdef(oid) FROM pg_trigger
+    WHERE tgrelid = CAST(:table AS regclass) AND NOT tgisinternal
+"""
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(table: str, start: date, period_months: int) -> str:
+    if period_months == 3:
+        return f"{table}_{start.year}q{(start.month - 1) // 3 + 1}"
+    return f"{table}_y{start.year}m{start.month:02d}"
+
+
+def _create_partitions(table: str, column: str, period_months: int) -> None:
+    """既存の最古の行から PREMAKE_MONTHS ヶ月先までのパーティションと DEFAULT パーティションを作成"""
+    bind = op.get_bind()
+    today = datetime.utcnow().date()
+    oldest = bind.execute(sa.text(f"SELECT min({column}) FROM {table}_legacy")).scalar()
+    oldest = min(oldest.date(), today) if oldest else today
+
+    start = date(oldest.year, (oldest.month - 1) // period_months * period_months + 1, 1)
+    horizon = _add_months(date(today.year, today.month, 1), PREMAKE_MONTHS)
+    while start <= horizon:
+        end = _add_months(start, period_months)
+        op.execute(
+            f"CREATE TABLE {_partition_name(table, start, period_months)} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+        start = end
+
+    # 範囲外（未来日付など）の行の受け皿（保持期間後も残すメールはアーカイブパーティションに移す）
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+
+def _rebuild(
+    table: str,
+    keys: List[str],
+    partition_column: Optional[str] = None,
+    period_months: int = 1,
+    unique_indexes: Optional[List[str]] = None
+) -> None:
+    """
+    テーブルを作り直して行を移す（partition_column を指定した場合は範囲パーティション化）
+
+    インデックス・外部キー・トリガーは元のテーブルの定義をそのまま引き継ぐ。
+    このテーブルを参照する外部キーはパーティション化後の主キーと合わないため削除する
+    """
+    bind = op.get_bind()
+
+    def fetch(sql: str):
+        return bind.execute(sa.text(sql), {'table': table}).all()
+
+    indexes = [row[0] for row in fetch(INDEXES_SQL)]
+    foreign_keys = fetch(FOREIGN_KEYS_SQL)
+    triggers = [row[0] for row in fetch(TRIGGERS_SQL)]
+
+    for referencing_table, name in fetch(REFERENCING_FOREIGN_KEYS_SQL):
+        op.execute(f"ALTER TABLE {referencing_table} DROP CONSTRAINT {name}")
+
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+    partition_by = f" PARTITION BY RANGE ({partition_column})" if partition_column else ""
+    op.execute(
+        f"CREATE TABLE {table} "
+        f"(LIKE {table}_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS){partition_by}"
+    )
+    if partition_column:
+        _create_partitions(table, partition_column, period_months)
+
+    # インデックス・トリガーは移した後に作成する（一括で作る方が速く、集計も二重に数えない）
+    op.execute(f"INSERT INTO {table} SELECT * FROM {table}_legacy")
+    op.execute(f"DROP TABLE {table}_legacy")
+
+    op.execute(f"ALTER TABLE {table} " + ", ".join(f"ADD {key}" for key in keys))
+    for statement in indexes + (unique_indexes or []):
+        op.execute(statement)
+    for name, definition in foreign_keys:
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+    for statement in triggers:
+        op.execute(statement)
+
+
+def upgrade():
+    """
+    processed_emails / openai_usage は月別、task_histories は四半期別に範囲パーティション化
+    - 保持期間を過ぎたデータは行の DELETE ではなくパーティションの切り離しで削除する
+    - 将来のパーティションは celery beat の maintain_partitions で先行して作成する
+    - tasks.source_email_id の外部キー制約は削除（processed_emails の主キーが (id, email_date) になるため）
+    - processed_emails.email_id の一意制約はパーティション化していない processed_email_keys に移す
+    """
+    op.create_table(
+        'processed_email_keys',
+        sa.Column('email_id', sa.String(), primary_key=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.execute(
+        "INSERT INTO processed_email_keys (email_id, created_at) "
+        "SELECT email_id, coalesce(min(processed_at), now()) FROM processed_emails GROUP BY email_id"
+    )
+
+    for table, column, period_months in PARTITIONED_TABLES:
+        _rebuild(table, PARTITIONED_KEYS[table], column, period_months)
+
+
+def downgrade():
+    """変更を元に戻す（削除済みのパーティションのデータは戻らない）"""
+    for table, _, _ in PARTITIONED_TABLES:
+        unique_indexes = [sql for sql in PLAIN_UNIQUE_INDEXES if f" ON {table} " in sql]
+        _rebuild(table, PLAIN_KEYS[table], unique_indexes=unique_indexes)
+
+    # 退避されずに削除されたメールを参照するタスクがあり得るため検証しない
+    op.execute(
+        "ALTER TABLE tasks ADD CONSTRAINT tasks_source_email_id_fkey "
+        "FOREIGN KEY (source_email_id) REFERENCES processed_emails (id) NOT VALID"
+    )
+    op.drop_table('processed_email_keys')
@@ -0,0 +1,43 @@
+"""Add composite indexes for keyset pagination
+
+Revision ID: 006_keyset_pagination_indexes
+Revises: 005_time_partitioned_tables
+Create Date: 2025-08-28 10:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers
+revision = '006_keyset_pagination_indexes'
+down_revision = '005_time_partitioned_tables'
+depends_on = None
+
+
+def upgrade():
+    """
+    キーセットページング（app.crud.pagination.paginate）の並び順と同じ列のインデックスを追加
+    - 絞り込み列の後にソート列と id を並べ、カーソル位置から LIMIT 件だけ読めるようにする
+    - 降順のページングはインデックスを逆順に走査する
+    """
+
+    # タスク一覧: user_id で絞り込み (updated_at, id) の降順
+    op.create_index(
+        'idx_tasks_user_updated_id',
+        'tasks',
+        ['user_id', 'updated_at', 'id'],
+        postgresql_using='btree'
+    )
+
+    # チャットメッセージ: thread_id で絞り込み (created_at, id) の昇順
+    op.create_index(
+        'idx_chat_messages_thread_created_id',
+        'chat_messages',
+        ['thread_id', 'created_at', 'id'],
+        postgresql_using='btree'
+    )
+
+
+def downgrade():
+    """インデックスを削除"""
+    op.drop_index('idx_chat_messages_thread_created_id')
+    op.drop_index('idx_tasks_user_updated_id')
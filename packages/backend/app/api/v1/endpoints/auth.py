@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from pydantic import BaseModel
@@ -11,6 +11,7 @@ from app.core.deps import get_db
 from app.core.security import create_access_token, create_refresh_token
 from app.crud.crud_user_async import crud_user
 from app.schemas.user import UserCreate, Token
+from app.services.cache_warmup import schedule_cache_warmup
 
 router = APIRouter()
 
@@ -55,6 +56,7 @@ async def register(user_data: UserRegister, db: AsyncSession = Depends(get_db)):
 
 @router.post("/login", response_model=Token)
 async def login(
+    request: Request,
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     db: AsyncSession = Depends(get_db)
 ):
@@ -85,6 +87,9 @@ async def login(
     db.add(user)
     await db.commit()
     
+    # 初回のダッシュボード表示に備えてキャッシュを温める
+    schedule_cache_warmup(request.app, str(user.id), access_token)
+    
     return Token(
         access_token=access_token,
         refresh_token=refresh_token,
@@ -93,6 +98,7 @@ async def login(
 
 @router.post("/refresh", response_model=dict)
 async def refresh_token_endpoint(
+    request: Request,
     refresh_token: str,
     db: AsyncSession = Depends(get_db)
 ):
@@ -130,6 +136,9 @@ async def refresh_token_endpoint(
     # 新しいアクセストークンを生成
     access_token = create_access_token(subject=str(user.id))
     
+    # 再訪時のダッシュボード表示に備えてキャッシュを温める
+    schedule_cache_warmup(request.app, str(user.id), access_token)
+    
     return {"access_token": access_token}
 
 
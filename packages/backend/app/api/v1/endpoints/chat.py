@@ -1,15 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Optional
 from uuid import UUID
-from sqlmodel import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.user import User
 from app.models.chat import ChatRole
 from app.core.deps import get_current_user, get_db
 from app.crud.crud_chat import chat_thread, chat_message
+from app.crud.pagination import InvalidCursorError
 from app.schemas.chat import (
     ChatThreadResponse,
     ChatThreadWithMessages,
+    ChatMessagePage,
     ChatCreateThreadRequest,
     ChatSendMessageRequest,
     ChatSendMessageResponse,
@@ -24,10 +26,10 @@ router = APIRouter()
 @router.get("/threads", response_model=List[ChatThreadResponse])
 async def get_chat_threads(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """ユーザーのチャットスレッド一覧を取得"""
-    threads = chat_thread.get_by_user(db, user_id=current_user.id)
+    threads = await chat_thread.get_by_user(db, user_id=current_user.id)
     return threads
 
 
@@ -35,10 +37,10 @@ async def get_chat_threads(
 async def create_chat_thread(
     request: ChatCreateThreadRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """新しいチャットスレッドを作成"""
-    thread = chat_thread.create_thread(
+    thread = await chat_thread.create_thread(
         db,
         user_id=current_user.id,
         title=request.title,
@@ -61,14 +63,14 @@ async def create_chat_thread(
 async def get_chat_thread(
     thread_id: UUID,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """特定のチャットスレッドとメッセージ履歴を取得"""
-    thread = chat_thread.get(db, id=thread_id)
+    thread = await chat_thread.get(db, id=thread_id)
     if not thread or thread.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Thread not found")
     
-    messages = chat_message.get_by_thread(db, thread_id=thread_id)
+    messages = await chat_message.get_by_thread(db, thread_id=thread_id)
     
     return ChatThreadWithMessages(
         **thread.dict(),
@@ -76,16 +78,39 @@ async def get_chat_thread(
     )
 
 
+@router.get("/threads/{thread_id}/messages", response_model=ChatMessagePage)
+async def get_chat_messages(
+    thread_id: UUID,
+    cursor: Optional[str] = Query(None, description="前のページの next_cursor"),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """チャットスレッドのメッセージを時系列順に1ページずつ取得"""
+    thread = await chat_thread.get(db, id=thread_id)
+    if not thread or thread.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Thread not found")
+    
+    try:
+        messages, next_cursor = await chat_message.get_page_by_thread(
+            db, thread_id=thread_id, limit=limit, cursor=cursor
+        )
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    return ChatMessagePage(messages=messages, next_cursor=next_cursor)
+
+
 @router.post("/threads/{thread_id}/messages", response_model=ChatSendMessageResponse)
 async def send_message(
     thread_id: UUID,
     request: ChatSendMessageRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """チャットスレッドにメッセージを送信してAIの応答を取得"""
     # スレッドの存在確認
-    thread = chat_thread.get(db, id=thread_id)
+    thread = await chat_thread.get(db, id=thread_id)
     if not thread or thread.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Thread not found")
     
@@ -101,20 +126,20 @@ async def send_message(
 async def delete_chat_thread(
     thread_id: UUID,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """チャットスレッドを削除"""
-    thread = chat_thread.get(db, id=thread_id)
+    thread = await chat_thread.get(db, id=thread_id)
     if not thread or thread.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Thread not found")
     
     # メッセージも含めて削除
-    chat_thread.remove(db, id=thread_id)
+    await chat_thread.delete(db, id=thread_id)
     return {"message": "Thread deleted successfully"}
 
 
 async def _send_message_to_thread(
-    db: Session,
+    db: AsyncSession,
     thread_id: UUID,
     content: str,
     current_user: User
@@ -122,7 +147,7 @@ async def _send_message_to_thread(
     """スレッドにメッセージを送信し、AIの応答を生成する内部関数"""
     
     # ユーザーメッセージを保存
-    user_message = chat_message.create_message(
+    user_message = await chat_message.create_message(
         db,
         thread_id=thread_id,
         role=ChatRole.USER,
@@ -130,7 +155,7 @@ async def _send_message_to_thread(
     )
     
     # トークン制限内で過去の会話履歴を取得
-    conversation_history = chat_message.get_recent_messages_with_token_limit(
+    conversation_history = await chat_message.get_recent_messages_with_token_limit(
         db,
         thread_id=thread_id,
         max_tokens=4000  # GPT-4のコンテキスト制限を考慮
@@ -173,7 +198,7 @@ async def _send_message_to_thread(
         ai_response = response.choices[0].message.content
         
         # AI応答を保存
-        assistant_message = chat_message.create_message(
+        assistant_message = await chat_message.create_message(
             db,
             thread_id=thread_id,
             role=ChatRole.ASSISTANT,
@@ -184,7 +209,7 @@ async def _send_message_to_thread(
         )
         
         # スレッドの更新日時を更新
-        chat_thread.update_timestamp(db, thread_id=thread_id)
+        await chat_thread.update_timestamp(db, thread_id=thread_id)
         
         return ChatSendMessageResponse(
             user_message=user_message,
@@ -195,7 +220,7 @@ async def _send_message_to_thread(
         # エラーの場合、エラーメッセージをAI応答として保存
         error_message = f"申し訳ございません。AIサービスでエラーが発生しました: {str(e)}"
         
-        assistant_message = chat_message.create_message(
+        assistant_message = await chat_message.create_message(
             db,
             thread_id=thread_id,
             role=ChatRole.ASSISTANT,
@@ -1,12 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from typing import Dict, Any, List
 from datetime import datetime
 
 from app.models.user import User
-from app.core.deps import get_current_user
-from app.services.user_usage_tracker import UserUsageTracker
-from app.core.database import get_db
-from sqlalchemy.orm import Session
+from app.core.deps import get_current_user, get_db, get_reporting_db
+from app.services.response_cache import conditional_response
+from app.services.user_usage_tracker import USER_USAGE_TAG, UserUsageTracker
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter()
 
@@ -16,11 +16,11 @@ async def get_monthly_usage(
     year: int = Query(None, description="年 (例: 2025)"),
     month: int = Query(None, description="月 (例: 8)"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_reporting_db)
 ) -> Dict[str, Any]:
     """ログインユーザーの月次OpenAI使用量を取得"""
     tracker = UserUsageTracker(db)
-    return tracker.get_user_monthly_usage(
+    return await tracker.get_user_monthly_usage(
         user_id=str(current_user.id),
         year=year,
         month=month
@@ -29,31 +29,53 @@ async def get_monthly_usage(
 
 @router.get("/recent")
 async def get_recent_usage(
+    request: Request,
     days: int = Query(7, description="過去何日分のデータを取得するか"),
     limit: int = Query(50, description="取得する最大レコード数"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> List[Dict[str, Any]]:
-    """ログインユーザーの最近の使用履歴を取得"""
-    tracker = UserUsageTracker(db)
-    return tracker.get_user_recent_usage(
-        user_id=str(current_user.id),
-        days=days,
-        limit=limit
+    """ログインユーザーの最近の使用履歴を取得（使用量が記録されるまでは 304 / キャッシュで応答）"""
+    async def render() -> List[Dict[str, Any]]:
+        tracker = UserUsageTracker(db)
+        return await tracker.get_user_recent_usage(
+            user_id=str(current_user.id),
+            days=days,
+            limit=limit
+        )
+    
+    return await conditional_response(
+        request,
+        "cost:recent",
+        [USER_USAGE_TAG.format(user_id=current_user.id)],
+        render,
+        vary=[datetime.utcnow().date().isoformat()],  # 集計期間の起点が日毎に変わる
+        params={"days": days, "limit": limit}
     )
 
 
 @router.get("/summary")
 async def get_usage_summary(
+    request: Request,
     days: int = Query(30, description="過去何日分のサマリーを取得するか"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_reporting_db)
 ) -> Dict[str, Any]:
-    """ログインユーザーの使用量サマリーを取得"""
-    tracker = UserUsageTracker(db)
-    return tracker.get_user_usage_summary(
-        user_id=str(current_user.id),
-        days=days
+    """ログインユーザーの使用量サマリーを取得（使用量が記録されるまでは 304 / キャッシュで応答）"""
+    async def render() -> Dict[str, Any]:
+        tracker = UserUsageTracker(db)
+        return await tracker.get_user_usage_summary(
+            user_id=str(current_user.id),
+            days=days
+        )
+    
+    return await conditional_response(
+        request,
+        "cost:summary",
+        [USER_USAGE_TAG.format(user_id=current_user.id)],
+        render,
+        vary=[datetime.utcnow().date().isoformat()],  # 集計期間の起点が日毎に変わる
+        params={"days": days}
     )
 
 
@@ -63,7 +85,7 @@ async def estimate_cost(
     input_tokens: int,
     max_output_tokens: int = 4000,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
     """コスト見積もりを取得"""
     tracker = UserUsageTracker(db)
@@ -2,9 +2,12 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.models.user import User
-from app.core.deps import get_current_user
+from app.core.deps import get_current_user, get_db
+from app.crud.crud_email import crud_email
+from app.services.sync_progress import SyncProgressTracker, get_sync_progress
 
 router = APIRouter()
 
@@ -36,19 +39,34 @@ class EmailSyncHistory(BaseModel):
 @router.post("/sync", response_model=EmailSyncResponse)
 async def start_email_sync(
     sync_request: EmailSyncRequest,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """メール同期開始"""
     from app.worker.tasks.email import sync_emails
     
+    account = await crud_email.get_email_account(
+        db, account_id=sync_request.account_id, user_id=str(current_user.id)
+    )
+    if not account:
+        raise HTTPException(status_code=404, detail="Email account not found")
+    
     try:
+        # 進捗はCeleryの結果バックエンドではなく同期ジョブに記録する
+        job = await crud_email.create_sync_job(db, account_id=sync_request.account_id)
+        progress = SyncProgressTracker(
+            str(job.id), user_id=str(current_user.id), account_id=sync_request.account_id
+        )
+        await progress.flush()
+        
         # Queue Celery task
-        result = sync_emails.delay(
+        sync_emails.delay(
             user_id=str(current_user.id),
-            account_id=sync_request.account_id
+            account_id=sync_request.account_id,
+            sync_job_id=str(job.id)
         )
         
-        return EmailSyncResponse(job_id=result.id)
+        return EmailSyncResponse(job_id=str(job.id))
     except Exception as e:
         if "OPENAI_INSUFFICIENT_CREDITS" in str(e):
             raise HTTPException(
@@ -76,32 +94,20 @@ async def get_sync_job_status(
     current_user: User = Depends(get_current_user)
 ):
     """同期ジョブ状態取得"""
-    from celery.result import AsyncResult
-    from app.worker.celery_app import celery_app
-    
-    result = AsyncResult(job_id, app=celery_app)
+    progress = await get_sync_progress(job_id)
     
-    if result.state == "PENDING":
-        status = "pending"
-        info = {"processed_emails": 0, "total_emails": 0}
-    elif result.state == "PROGRESS":
-        status = "processing"
-        info = result.info or {}
-    elif result.state == "SUCCESS":
-        status = "completed"
-        info = result.result or {}
-    else:  # FAILURE
-        status = "failed"
-        info = {"error": str(result.info)}
+    if not progress or progress.get("user_id") != str(current_user.id):
+        raise HTTPException(status_code=404, detail="Sync job not found")
     
     return EmailSyncJob(
-        id=job_id,
-        email_account_id=info.get("account_id", ""),
-        status=status,
-        total_emails=info.get("total_emails", 0),
-        processed_emails=info.get("processed_emails", 0),
-        started_at=datetime.utcnow(),
-        error_message=info.get("error")
+        id=progress["id"],
+        email_account_id=progress["email_account_id"],
+        status=progress["status"],
+        total_emails=progress["total_emails"],
+        processed_emails=progress["processed_emails"],
+        started_at=progress["started_at"],
+        completed_at=progress["completed_at"],
+        error_message=progress["error_message"]
     )
 
 
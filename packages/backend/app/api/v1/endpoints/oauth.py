@@ -5,7 +5,7 @@ from datetime import datetime, timedelta
 import jwt
 
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import AsyncSessionLocal
 from app.services.oauth_service import OAuthService
 from app.crud.crud_email import crud_email
 from app.crud.crud_user_async import crud_user
@@ -51,7 +51,7 @@ async def google_callback(
             redirect_uri=redirect_uri
         )
         
-        async with get_db() as db:
+        async with AsyncSessionLocal() as db:
             # Check if user exists
             user = await crud_user.get_by_email(db, email=token_data["email"])
             
@@ -131,7 +131,7 @@ async def microsoft_callback(
             redirect_uri=redirect_uri
         )
         
-        async with get_db() as db:
+        async with AsyncSessionLocal() as db:
             # Check if user exists
             user = await crud_user.get_by_email(db, email=token_data["email"])
             
@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Query, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Query, HTTPException, Depends, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
@@ -8,8 +8,11 @@ from uuid import UUID, uuid4
 from app.core.deps import get_db, get_current_user
 from app.models.user import User
 from app.models.task import Task as TaskModel
-from app.crud import crud_task
+from app.crud.crud_dashboard_stats import crud_dashboard_stats
+from app.crud.crud_task import USER_TASKS_TAG, crud_task
+from app.crud.pagination import InvalidCursorError
 from app.schemas.task import TaskCreate as TaskCreateSchema, TaskUpdate as TaskUpdateSchema
+from app.services.response_cache import conditional_response
 
 router = APIRouter()
 
@@ -44,9 +47,20 @@ class TaskUpdate(BaseModel):
 
 class TaskList(BaseModel):
     tasks: List[Task]
-    total: int
+    total: Optional[int] = None  # total=none の場合は None
+    total_estimated: bool = False  # total=estimate の場合はテーブル統計からの概算
     page: int
     limit: int
+    next_cursor: Optional[str] = None  # 次のページが無い場合は None
+
+
+class DashboardSummary(BaseModel):
+    total_tasks: int
+    todo_count: int
+    progress_count: int
+    done_count: int
+    overdue_count: int
+    completion_rate: float
 
 
 class AISupport(BaseModel):
@@ -61,51 +75,103 @@ class AISupport(BaseModel):
 
 @router.get("", response_model=TaskList)
 async def get_tasks(
+    request: Request,
     status: Optional[str] = Query(None),
     priority: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None, description="前のページの next_cursor"),
+    page: int = Query(1, ge=1, deprecated=True, description="cursor を使用してください"),
     limit: int = Query(20, ge=1, le=100),
+    total: str = Query("exact", pattern="^(exact|estimate|none)$"),
     sort: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """タスク一覧取得（認証済みユーザーのタスクのみ）"""
-    # ユーザーのタスクのみ取得
-    tasks = crud_task.get_multi_by_user(
-        db=db,
-        user_id=current_user.id,
-        skip=(page - 1) * limit,
-        limit=limit,
-        status=status,
-        priority=priority,
-        search=search
-    )
+    """
+    タスク一覧取得（認証済みユーザーのタスクのみ）
     
-    total = crud_task.count_by_user(
-        db=db,
-        user_id=current_user.id,
-        status=status,
-        priority=priority,
-        search=search
+    cursor（前のページの next_cursor）で続きを取得する。
+    total=estimate は件数を COUNT(*) の代わりにテーブル統計から概算し、
+    total=none は件数を返さない。
+    タスクが更新されていなければ If-None-Match に対して 304 を返す
+    """
+    async def render() -> TaskList:
+        # ユーザーのタスクのみ取得
+        try:
+            tasks, next_cursor = await crud_task.get_user_tasks(
+                db,
+                user_id=current_user.id,
+                limit=limit,
+                cursor=cursor,
+                status=status,
+                priority=priority,
+                search=search,
+                skip=(page - 1) * limit
+            )
+        except InvalidCursorError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        
+        task_count = None
+        if total != "none":
+            task_count = await crud_task.count_user_tasks(
+                db,
+                user_id=current_user.id,
+                status=status,
+                priority=priority,
+                search=search,
+                estimate=total == "estimate"
+            )
+        
+        return TaskList(
+            tasks=[Task(
+                id=str(task.id),
+                title=task.title,
+                description=task.description,
+                status=task.status,
+                priority=task.priority,
+                source_email_id=str(task.source_email_id) if task.source_email_id else None,
+                source_email_link=task.source_email_link,
+                due_date=task.due_date,
+                created_at=task.created_at,
+                updated_at=task.updated_at
+            ) for task in tasks],
+            total=task_count,
+            total_estimated=total == "estimate",
+            page=page,
+            limit=limit,
+            next_cursor=next_cursor,
+        )
+    
+    return await conditional_response(
+        request, "tasks", [USER_TASKS_TAG.format(user_id=current_user.id)], render,
+        params={
+            "status": status, "priority": priority, "search": search, "cursor": cursor,
+            "page": page, "limit": limit, "total": total, "sort": sort
+        }
     )
+
+
+@router.get("/dashboard", response_model=DashboardSummary)
+async def get_dashboard_summary(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    ダッシュボード用のタスク集計（認証済みユーザーのみ）
     
-    return TaskList(
-        tasks=[Task(
-            id=str(task.id),
-            title=task.title,
-            description=task.description,
-            status=task.status,
-            priority=task.priority,
-            source_email_id=str(task.source_email_id) if task.source_email_id else None,
-            source_email_link=task.source_email_link,
-            due_date=task.due_date,
-            created_at=task.created_at,
-            updated_at=task.updated_at
-        ) for task in tasks],
-        total=total,
-        page=page,
-        limit=limit,
+    タスクが更新されていなければ If-None-Match に対して 304 を返す
+    """
+    async def render() -> DashboardSummary:
+        summary = await crud_task.get_dashboard_summary_optimized(db, str(current_user.id))
+        return DashboardSummary(**summary)
+    
+    # 期限切れ件数はタスクが更新されなくても期限を過ぎると変わる
+    overdue_version = await crud_dashboard_stats.get_overdue_version(db, str(current_user.id))
+    
+    return await conditional_response(
+        request, "dashboard", [USER_TASKS_TAG.format(user_id=current_user.id)], render,
+        vary=[overdue_version]
     )
 
 
@@ -113,7 +179,7 @@ async def get_tasks(
 async def create_task(
     task_data: TaskCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """タスク作成（認証済みユーザーのみ）"""
     task_in = TaskCreateSchema(
@@ -121,11 +187,10 @@ async def create_task(
         description=task_data.description,
         priority=task_data.priority or "medium",
         due_date=task_data.due_date,
-        user_id=current_user.id,
-        created_by="user"
+        user_id=str(current_user.id),
     )
     
-    task = crud_task.create(db=db, obj_in=task_in)
+    task = await crud_task.create(db, obj_in=task_in)
     
     return Task(
         id=str(task.id),
@@ -144,11 +209,11 @@ async def create_task(
 async def get_task_detail(
     task_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """タスク詳細取得（所有者のみアクセス可能）"""
     # タスクを取得
-    task = crud_task.get(db=db, id=task_id)
+    task = await crud_task.get(db, id=task_id)
     
     if not task:
         raise HTTPException(
@@ -163,6 +228,10 @@ async def get_task_detail(
             detail="Not authorized to access this task"
         )
     
+    # 非同期セッションでは遅延ロードできないため明示的に取得
+    history = await crud_task.get_task_history(db, task_id=task_id)
+    ai_supports = await crud_task.get_ai_supports(db, task_id=task_id)
+    
     return {
         "task": Task(
             id=str(task.id),
@@ -176,8 +245,8 @@ async def get_task_detail(
             created_at=task.created_at,
             updated_at=task.updated_at,
         ),
-        "history": task.history if hasattr(task, 'history') else [],
-        "ai_supports": task.ai_supports if hasattr(task, 'ai_supports') else [],
+        "history": history,
+        "ai_supports": ai_supports,
     }
 
 
@@ -186,11 +255,11 @@ async def update_task(
     task_id: str,
     task_update: TaskUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """タスク更新（所有者のみ）"""
     # タスクを取得
-    task = crud_task.get(db=db, id=task_id)
+    task = await crud_task.get(db, id=task_id)
     
     if not task:
         raise HTTPException(
@@ -205,17 +274,10 @@ async def update_task(
             detail="Not authorized to update this task"
         )
     
-    # 更新
-    task_in = TaskUpdateSchema(
-        title=task_update.title,
-        description=task_update.description,
-        status=task_update.status,
-        priority=task_update.priority,
-        due_date=task_update.due_date,
-        updated_by="user"
-    )
+    # 更新（送信されたフィールドのみ）
+    task_in = TaskUpdateSchema(**task_update.dict(exclude_unset=True))
     
-    task = crud_task.update(db=db, db_obj=task, obj_in=task_in)
+    task = await crud_task.update(db, db_obj=task, obj_in=task_in)
     
     return Task(
         id=str(task.id),
@@ -234,11 +296,11 @@ async def update_task(
 async def delete_task(
     task_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """タスク削除（所有者のみ）"""
     # タスクを取得
-    task = crud_task.get(db=db, id=task_id)
+    task = await crud_task.get(db, id=task_id)
     
     if not task:
         raise HTTPException(
@@ -254,7 +316,7 @@ async def delete_task(
         )
     
     # 削除
-    crud_task.remove(db=db, id=task_id)
+    await crud_task.delete(db, id=task_id)
     
     return {"message": f"Task {task_id} deleted successfully"}
 
@@ -264,11 +326,11 @@ async def request_ai_support(
     task_id: str,
     support_type: str = "research",
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """AIサポート実行（タスク所有者のみ）"""
     # タスクを取得
-    task = crud_task.get(db=db, id=task_id)
+    task = await crud_task.get(db, id=task_id)
     
     if not task:
         raise HTTPException(
@@ -27,13 +27,13 @@ class Settings(BaseSettings):
             return v
         raise ValueError(v)
     
-    # Database
-    DATABASE_URL: Optional[str] = None
+    # Database（DATABASE_URL の組み立てで参照するため POSTGRES_* を先に定義する）
     POSTGRES_USER: str = "postgres"
     POSTGRES_PASSWORD: str = "postgres"
     POSTGRES_DB: str = "pmo_agent"
     POSTGRES_HOST: str = "localhost"
     POSTGRES_PORT: str = "5432"
+    DATABASE_URL: Optional[str] = None
     
     @validator("DATABASE_URL", pre=True)
     def assemble_db_connection(cls, v: Optional[str], values: dict) -> str:
@@ -45,8 +45,76 @@ class Settings(BaseSettings):
             f"{values.get('POSTGRES_PORT')}/{values.get('POSTGRES_DB')}"
         )
     
+    # DBコネクションプール（api / worker / reporting の役割毎に独立したプール）
+    DB_ROLE: str = "api"  # プロセスの既定の役割（Celery ワーカーは起動時に worker にする）
+    DB_API_POOL_SIZE: int = 10
+    DB_API_MAX_OVERFLOW: int = 10
+    DB_API_COMMAND_TIMEOUT: float = 30.0  # 秒（statement_timeout にも使う）
+    DB_WORKER_POOL_SIZE: int = 5
+    DB_WORKER_MAX_OVERFLOW: int = 5
+    DB_WORKER_COMMAND_TIMEOUT: float = 120.0
+    DB_REPORTING_POOL_SIZE: int = 2
+    DB_REPORTING_MAX_OVERFLOW: int = 2
+    DB_REPORTING_COMMAND_TIMEOUT: float = 300.0
+    DB_POOL_TIMEOUT: float = 10.0  # 空き接続を待つ最大秒数
+    DB_POOL_RECYCLE: int = 1800  # LB / PgBouncer のアイドル切断より短くする
+    DB_STATEMENT_CACHE_SIZE: int = 100  # PgBouncer（transaction モード）経由の場合は 0
+    DB_APPLICATION_NAME: str = "pmo-agent"  # pg_stat_activity で役割毎に識別する
+
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_SOCKET_TIMEOUT: float = 5.0
+    
+    # プロセス内L1キャッシュ（LayeredCache）
+    CACHE_L1_ENABLED: bool = True
+    CACHE_L1_MAX_ENTRIES: int = 10000
+    CACHE_L1_TTL: int = 30  # 無効化の取りこぼしに備えて L2 より短くする
+    CACHE_TAG_TTL: int = 7 * 86400  # タグ付きキャッシュの最長TTLより長くする
+    RESPONSE_CACHE_ENABLED: bool = True  # ETag 単位でレスポンス本文をキャッシュ
+    RESPONSE_CACHE_TTL: int = 600
+    CACHE_LEASE_SECONDS: int = 120  # 再計算リースの最大保持時間（AI呼び出しの所要時間以上）
+    
+    # キャッシュ値のシリアライズ / 圧縮（CacheCodec）
+    CACHE_CODEC: str = "msgpack"  # "msgpack" / "json"（未インストール時は json）
+    CACHE_COMPRESSION: str = "zstd"  # "zstd" / "lz4" / "zlib" / "none"
+    CACHE_COMPRESSION_MIN_BYTES: int = 512
+    CACHE_MESSAGE_HASH_BUCKETS: bool = False  # メッセージをアカウント毎のハッシュに格納
+    CACHE_MESSAGE_BUCKET_MAX_FIELDS: int = 20000
+    
+    # キャッシュクリーンアップ（1回の実行あたりの予算）
+    CACHE_CLEANUP_TIME_BUDGET: float = 2.0  # 秒
+    CACHE_CLEANUP_KEY_BUDGET: int = 10000
+    CACHE_CLEANUP_SCAN_COUNT: int = 500
+    
+    # ログイン時のキャッシュウォームアップ
+    CACHE_WARMUP_ENABLED: bool = True
+    CACHE_WARMUP_CONCURRENCY: int = 4  # プロセス全体で同時に実行するウォームアップのリクエスト数
+    CACHE_WARMUP_COOLDOWN: int = 300  # 同じユーザーを再度温めるまでの秒数
+    CACHE_WARMUP_TIMEOUT: float = 30.0
+
+    # ダッシュボード集計（user_dashboard_stats）
+    DASHBOARD_STATS_RECONCILE_INTERVAL: int = 3600  # 全件から数え直す間隔（秒・celery beat）
+    DASHBOARD_STATS_RECONCILE_BATCH_SIZE: int = 100  # 1回のクエリで読むユーザー数
+    DASHBOARD_EMAIL_DAYS_RETENTION: int = 31  # 日別メール件数を保持する日数（直近N日の集計の上限）
+
+    # 時間パーティション（processed_emails / openai_usage は月別、task_histories は四半期別）
+    PARTITION_MAINTENANCE_INTERVAL: int = 86400  # 将来分の作成・期限切れ分の削除を行う間隔（秒・celery beat）
+    PARTITION_PREMAKE_MONTHS: int = 3  # 先行して作成しておく将来のパーティションの月数
+    PARTITION_KEEP_DETACHED: bool = False  # True の場合、期限切れのパーティションは切り離すだけで削除しない
+    EMAIL_RETENTION_MONTHS: int = 3  # メールの保持月数（タスク化されたメールは残す・0 は無期限）
+    OPENAI_USAGE_RETENTION_MONTHS: int = 13  # API使用量の保持月数（前年同月と比較できるよう13ヶ月）
+    TASK_HISTORY_RETENTION_MONTHS: int = 0  # タスク履歴の保持月数（0 は無期限）
+
+    # HTTP Client (外部API用の共有コネクションプール)
+    HTTP_CLIENT_HTTP2: bool = True
+    HTTP_CLIENT_TIMEOUT: float = 30.0
+    HTTP_CLIENT_CONNECT_TIMEOUT: float = 10.0
+    HTTP_CLIENT_MAX_CONNECTIONS: int = 100
+    HTTP_CLIENT_MAX_KEEPALIVE: int = 20
+    HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST: int = 20
+    HTTP_CLIENT_MAX_KEEPALIVE_PER_HOST: int = 10
+    HTTP_CLIENT_KEEPALIVE_EXPIRY: float = 60.0
     
     # Email
     SMTP_TLS: bool = True
@@ -62,6 +130,23 @@ class Settings(BaseSettings):
     GOOGLE_CLIENT_SECRET: Optional[str] = None
     MICROSOFT_CLIENT_ID: Optional[str] = None
     MICROSOFT_CLIENT_SECRET: Optional[str] = None
+    OAUTH_TOKEN_REFRESH_MARGIN: int = 300  # 期限の何秒前からバックグラウンド更新するか
+    
+    # Gmail Sync
+    GMAIL_FETCH_CONCURRENCY: int = 10  # アカウント毎のメッセージ取得並列数
+    GMAIL_FETCH_FORMAT: str = "full"  # "full" または "metadata"（本文は遅延取得）
+    
+    # 処理済みメッセージの Bloom フィルタ（アカウント毎）
+    SEEN_FILTER_CAPACITY: int = 100000
+    SEEN_FILTER_ERROR_RATE: float = 0.01
+    SEEN_FILTER_TTL: int = 30 * 86400
+    
+    # Outlook Sync
+    OUTLOOK_DELTA_PAGE_SIZE: int = 100  # Prefer: odata.maxpagesize
+    
+    # Sync Progress
+    SYNC_PROGRESS_FLUSH_INTERVAL_MS: int = 1000  # DB / Redis への進捗書き込み間隔
+    SYNC_PROGRESS_TTL: int = 86400
     
     # OpenAI API
     USE_OPENAI: bool = True
@@ -71,6 +156,11 @@ class Settings(BaseSettings):
     OPENAI_TEMPERATURE: float = 0.3
     OPENAI_VERBOSITY: str = "low"
     OPENAI_REASONING_EFFORT: str = "low"
+    AI_CACHE_STALE_TTL: int = 21600  # 期限切れ後も再計算中に返してよい時間
+    AI_RESPONSE_CACHE_TTL: int = 7 * 86400  # 同じ入力へのAI応答の再利用期間
+    THREAD_CONTEXT_CACHE_TTL: int = 86400  # スレッド分析用メール文脈の再利用期間（EMAIL_TAG で無効化）
+    AI_CACHE_NEAR_DUPLICATE: bool = False  # SimHash による近似一致での再利用
+    AI_CACHE_SIMHASH_MAX_DISTANCE: int = 3  # 4バンド索引のため3以下にする
     
     # AWS Bedrock
     USE_BEDROCK: bool = False
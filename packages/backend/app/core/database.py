@@ -1,21 +1,50 @@
+"""
+データベース接続
+
+ワークロード（役割）毎にエンジンとコネクションプールを分け、
+Celery のバースト時にも API のリクエストが接続を待たされないようにする
+- api: FastAPI のリクエスト処理
+- worker: Celery タスク
+- reporting: 集計などの重い読み取り（タイムアウトを長く、プールを小さく）
+
+非同期エンジンはイベントループに紐づくため、役割毎に初回利用時に作成し、
+実行中のループが変わった場合は作り直す
+"""
+import asyncio
+import bisect
+import logging
+import time
+from typing import Any, AsyncGenerator, Dict, Optional, Tuple
+
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlmodel import create_engine, SQLModel, Session
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+
 from app.core.config import settings
+from app.core.event_loop import close_stale
+
+logger = logging.getLogger(__name__)
+
+DB_ROLES = ("api", "worker", "reporting")
+
+# 接続取得待ち時間のヒストグラムのバケット上限（秒）
+CHECKOUT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
 
-# データベースエンジンの作成（同期）
+def database_url(drivername: str) -> URL:
+    """DATABASE_URL のドライバを差し替えた URL（postgres:// などの表記揺れも吸収）"""
+    return make_url(settings.DATABASE_URL).set(drivername=drivername)
+
+
+# データベースエンジンの作成（同期・テーブル作成とマイグレーション用）
 engine = create_engine(
-    settings.DATABASE_URL,
+    database_url("postgresql+psycopg2"),
     echo=False,
     future=True,
     pool_pre_ping=True,
-)
-
-# 非同期エンジンの作成
-async_engine = create_async_engine(
-    settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
-    echo=False,
-    future=True,
+    pool_recycle=settings.DB_POOL_RECYCLE,
 )
 
 
@@ -29,15 +58,240 @@ def get_session():
     with Session(engine) as session:
         yield session
 
-# 非同期セッション用の設定
-AsyncSessionLocal = sessionmaker(
-    async_engine,
-    class_=AsyncSession,
-    expire_on_commit=False
-)
+
+class CheckoutWaitHistogram:
+    """プールからの接続取得待ち時間（プロセス内の累計）"""
+
+    def __init__(self):
+        self.counts = [0] * (len(CHECKOUT_WAIT_BUCKETS) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.timeouts = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(CHECKOUT_WAIT_BUCKETS, seconds)] += 1
+        self.total += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """q 分位点を含むバケットの上限（最上位バケットの場合は最大値）"""
+        if not self.total:
+            return None
+        threshold = q * self.total
+        cumulative = 0
+        for bound, count in zip(CHECKOUT_WAIT_BUCKETS, self.counts):
+            cumulative += count
+            if cumulative >= threshold:
+                return bound
+        return round(self.max, 4)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """累積バケット（Prometheus の le と同じ形式）と概算の分位点"""
+        buckets: Dict[str, int] = {}
+        cumulative = 0
+        for bound, count in zip(CHECKOUT_WAIT_BUCKETS, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.total
+
+        return {
+            "buckets": buckets,
+            "count": self.total,
+            "sum": round(self.sum, 4),
+            "max": round(self.max, 4),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "timeouts": self.timeouts,
+        }
+
+
+# 役割 -> 接続取得待ちのヒストグラム（エンジンを作り直しても引き継ぐ）
+_checkout_waits: Dict[str, CheckoutWaitHistogram] = {
+    role: CheckoutWaitHistogram() for role in DB_ROLES
+}
+
+
+class _TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    接続の取得待ち時間を記録するプール
+
+    空きが無い場合の待ち時間と、オーバーフロー分の新規接続の確立時間を含む
+    """
+
+    role = "api"
+
+    def _do_get(self):
+        histogram = _checkout_waits[self.role]
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            histogram.timeouts += 1
+            raise
+        histogram.observe(time.perf_counter() - start)
+        return connection
+
+
+# 役割毎のプールクラス（dispose 時の再作成でも役割が引き継がれる）
+_POOL_CLASSES = {
+    role: type(f"{role.title()}QueuePool", (_TimedQueuePool,), {"role": role})
+    for role in DB_ROLES
+}
 
 
-async def get_async_session():
+def _role_settings(role: str) -> Tuple[int, int, float]:
+    """役割毎の (pool_size, max_overflow, command_timeout)"""
+    return {
+        "api": (
+            settings.DB_API_POOL_SIZE,
+            settings.DB_API_MAX_OVERFLOW,
+            settings.DB_API_COMMAND_TIMEOUT,
+        ),
+        "worker": (
+            settings.DB_WORKER_POOL_SIZE,
+            settings.DB_WORKER_MAX_OVERFLOW,
+            settings.DB_WORKER_COMMAND_TIMEOUT,
+        ),
+        "reporting": (
+            settings.DB_REPORTING_POOL_SIZE,
+            settings.DB_REPORTING_MAX_OVERFLOW,
+            settings.DB_REPORTING_COMMAND_TIMEOUT,
+        ),
+    }[role]
+
+
+def _create_async_engine(role: str) -> AsyncEngine:
+    """役割の設定でプールを構成した非同期エンジンを作成"""
+    pool_size, max_overflow, command_timeout = _role_settings(role)
+    cache_size = settings.DB_STATEMENT_CACHE_SIZE
+
+    return create_async_engine(
+        # SQLAlchemy 側のプリペアドステートメントのキャッシュ
+        database_url("postgresql+asyncpg").update_query_dict(
+            {"prepared_statement_cache_size": str(cache_size)}
+        ),
+        echo=False,
+        future=True,
+        poolclass=_POOL_CLASSES[role],
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args={
+            "statement_cache_size": cache_size,
+            "command_timeout": command_timeout,
+            "server_settings": {
+                "application_name": f"{settings.DB_APPLICATION_NAME}:{role}",
+                # クライアント側でタイムアウトしたクエリをサーバー側でも打ち切る
+                "statement_timeout": str(int(command_timeout * 1000)),
+            },
+        },
+    )
+
+
+_engines: Dict[str, AsyncEngine] = {}
+_engine_loop: Optional[asyncio.AbstractEventLoop] = None
+_default_role = settings.DB_ROLE
+
+
+def set_database_role(role: str) -> None:
+    """このプロセスの既定の役割を設定（Celery ワーカーの起動時に worker にする）"""
+    global _default_role
+
+    if role not in DB_ROLES:
+        raise ValueError(f"Unknown database role: {role}")
+    _default_role = role
+
+
+def get_engine(role: Optional[str] = None) -> AsyncEngine:
+    """
+    役割の非同期エンジンを取得する（省略時はプロセスの既定の役割）
+
+    接続はイベントループに紐づくため、実行中のループが
+    変わった場合は新しいエンジンを作成する
+    """
+    global _engine_loop
+
+    role = role or _default_role
+    if role not in DB_ROLES:
+        raise ValueError(f"Unknown database role: {role}")
+
+    try:
+        loop: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    if _engine_loop is not loop:
+        if _engines:
+            logger.debug("Event loop changed, recreating database engines")
+            # 古いループの接続を閉じてから作り直す（残すとサーバー側の接続数を使い切る）
+            for stale in _engines.values():
+                close_stale(stale.dispose, _engine_loop, "database engine")
+        _engines.clear()
+        _engine_loop = loop
+
+    async_engine = _engines.get(role)
+    if async_engine is None:
+        async_engine = _engines[role] = _create_async_engine(role)
+
+    return async_engine
+
+
+def AsyncSessionLocal(role: Optional[str] = None) -> AsyncSession:
+    """
+    役割のエンジンに接続する非同期セッションを作成する
+
+    既存の呼び出し元（async with AsyncSessionLocal() as db）と互換の名前のまま、
+    プロセスの既定の役割のプールを使う
+    """
+    return AsyncSession(get_engine(role), expire_on_commit=False)
+
+
+async def get_async_session(role: Optional[str] = None) -> AsyncGenerator[AsyncSession, None]:
     """非同期データベースセッションを取得する"""
-    async with AsyncSessionLocal() as session:
+    async with AsyncSessionLocal(role) as session:
         yield session
+
+
+async def dispose_engines() -> None:
+    """全ての非同期エンジンのプールを閉じる（lifespan / ワーカー終了時）"""
+    global _engine_loop
+
+    engines = list(_engines.values())
+    _engines.clear()
+    _engine_loop = None
+
+    for async_engine in engines:
+        await async_engine.dispose()
+    if engines:
+        logger.info("Database engines disposed")
+
+
+def get_pool_metrics() -> Dict[str, Dict[str, Any]]:
+    """役割毎のプールの設定・使用状況と接続取得待ち時間のヒストグラム（このプロセス分）"""
+    metrics: Dict[str, Dict[str, Any]] = {}
+    for role in DB_ROLES:
+        pool_size, max_overflow, command_timeout = _role_settings(role)
+        pool_metrics: Dict[str, Any] = {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "command_timeout": command_timeout,
+            "active": role in _engines,
+            "checkout_wait": _checkout_waits[role].snapshot(),
+        }
+
+        async_engine = _engines.get(role)
+        if async_engine is not None:
+            pool = async_engine.pool
+            pool_metrics.update(
+                checked_out=pool.checkedout(),
+                idle=pool.checkedin(),
+                overflow=max(0, pool.overflow()),
+            )
+        metrics[role] = pool_metrics
+    return metrics
+
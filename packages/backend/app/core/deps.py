@@ -1,27 +1,32 @@
-from typing import Generator, Optional
+from typing import AsyncGenerator, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlmodel import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
-from app.core.database import get_session
+from app.core.database import get_async_session
 from app.models.user import User
-from app.crud.crud_user import crud_user
+from app.crud.crud_user_async import crud_user
 
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/auth/login"
 )
 
 
-async def get_db():
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """非同期データベースセッションの依存性"""
-    from app.core.database import get_async_session
     async for session in get_async_session():
         yield session
 
 
+async def get_reporting_db() -> AsyncGenerator[AsyncSession, None]:
+    """集計用（reporting プール）の非同期データベースセッションの依存性"""
+    async for session in get_async_session("reporting"):
+        yield session
+
+
 async def get_current_user(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     token: str = Depends(oauth2_scheme)
 ) -> User:
     """現在のユーザーを取得する"""
@@ -41,7 +46,7 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = crud_user.get(db, id=user_id)
+    user = await crud_user.get(db, id=user_id)
     if user is None:
         raise credentials_exception
     
@@ -0,0 +1,54 @@
+"""
+イベントループに紐づく共有リソースの後始末
+
+接続プール（HTTP / Redis / DB）は作成時のイベントループに紐づくため、
+ループが変わった場合は作り直すが、古いプールも閉じないと接続が残り続ける
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 実行中のクローズ処理（完了前にガベージコレクトされないよう参照を保持する）
+_pending: Set["asyncio.Future[Any]"] = set()
+
+
+async def _close_quietly(close: Callable[[], Awaitable[Any]], name: str) -> None:
+    try:
+        await close()
+    except Exception as e:
+        # 元のループが閉じられている場合などはソケットが GC で閉じられるのに任せる
+        logger.debug(f"Failed to close stale {name}: {e}")
+
+
+def close_stale(
+    close: Callable[[], Awaitable[Any]],
+    owner_loop: Optional[asyncio.AbstractEventLoop],
+    name: str
+) -> None:
+    """
+    古いループで作成したリソースを閉じる（同期関数から呼び出せる）
+
+    - 元のループが別スレッドで実行中: そのループでクローズする
+    - ループの実行中: 実行中のループでクローズをスケジュールする
+    - ループ外: 元のループ（閉じられていれば新しいループ）でクローズを完了させる
+    """
+    try:
+        current: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+    except RuntimeError:
+        current = None
+
+    if owner_loop is not None and owner_loop is not current and owner_loop.is_running():
+        future = asyncio.run_coroutine_threadsafe(_close_quietly(close, name), owner_loop)
+    elif current is not None:
+        future = current.create_task(_close_quietly(close, name))
+    elif owner_loop is not None and not owner_loop.is_closed():
+        owner_loop.run_until_complete(_close_quietly(close, name))
+        return
+    else:
+        asyncio.run(_close_quietly(close, name))
+        return
+
+    _pending.add(future)
+    future.add_done_callback(_pending.discard)
@@ -0,0 +1,111 @@
+"""
+共有HTTPクライアント
+googleapis.com / graph.microsoft.com への接続をプロセス全体で再利用し、
+同期ごとのTLSハンドシェイクを削減する
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.event_loop import close_stale
+
+logger = logging.getLogger(__name__)
+
+# 接続プールをホスト単位で分離する外部API
+# （ホストごとに独立したコネクション上限を持たせる）
+POOLED_HOSTS = (
+    "https://www.googleapis.com",
+    "https://gmail.googleapis.com",
+    "https://oauth2.googleapis.com",
+    "https://graph.microsoft.com",
+    "https://login.microsoftonline.com",
+)
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _http2_available() -> bool:
+    """HTTP/2 (h2パッケージ) が利用可能か確認"""
+    if not settings.HTTP_CLIENT_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("h2 is not installed, falling back to HTTP/1.1")
+        return False
+    return True
+
+
+def _build_transport(http2: bool, limits: httpx.Limits) -> httpx.AsyncHTTPTransport:
+    """ホスト専用のコネクションプールを持つトランスポートを作成"""
+    return httpx.AsyncHTTPTransport(http2=http2, limits=limits, retries=1)
+
+
+def _create_client() -> httpx.AsyncClient:
+    """プール設定済みのAsyncClientを作成"""
+    http2 = _http2_available()
+
+    per_host_limits = httpx.Limits(
+        max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST,
+        max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE_PER_HOST,
+        keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY,
+    )
+    mounts: Dict[str, httpx.AsyncHTTPTransport] = {
+        host: _build_transport(http2, per_host_limits) for host in POOLED_HOSTS
+    }
+
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(
+            settings.HTTP_CLIENT_TIMEOUT,
+            connect=settings.HTTP_CLIENT_CONNECT_TIMEOUT,
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY,
+        ),
+        mounts=mounts,
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    プロセス共有のHTTPクライアントを取得する
+
+    コネクションはイベントループに紐づくため、実行中のループが
+    変わった場合（Celeryタスク毎のループなど）は新しいクライアントを作成する
+    """
+    global _client, _client_loop
+
+    try:
+        loop: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        if _client is not None and not _client.is_closed:
+            logger.debug("Event loop changed, recreating shared HTTP client")
+            # 古いループの接続プールを閉じてから置き換える
+            close_stale(_client.aclose, _client_loop, "HTTP client")
+        _client = _create_client()
+        _client_loop = loop
+
+    return _client
+
+
+async def close_http_client() -> None:
+    """共有HTTPクライアントをクローズする（lifespan / ワーカー終了時）"""
+    global _client, _client_loop
+
+    client = _client
+    _client = None
+    _client_loop = None
+
+    if client is not None and not client.is_closed:
+        await client.aclose()
+        logger.info("Shared HTTP client closed")
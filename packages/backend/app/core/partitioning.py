@@ -0,0 +1,15 @@
+"""
+時間で範囲パーティション化しているテーブルの定義
+
+パーティションの管理（app.crud.crud_partitions）と設計資料（app.models.scalable_design）の
+両方から参照するため、どちらの層にも依存しないここに置く
+（alembic 005_time_partitioned_tables の PARTITIONED_TABLES と合わせる）
+"""
+from typing import Dict, Tuple
+
+# テーブル -> (パーティションキー, 1パーティションの月数)
+PARTITIONED_TABLES: Dict[str, Tuple[str, int]] = {
+    "processed_emails": ("email_date", 1),
+    "openai_usage": ("created_at", 1),
+    "task_histories": ("created_at", 3),
+}
@@ -0,0 +1,81 @@
+"""
+共有Redisクライアント
+REDIS_URL から作成したコネクションプールをプロセス全体で再利用し、
+リクエスト毎の接続確立を避ける
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.event_loop import close_stale
+
+logger = logging.getLogger(__name__)
+
+# decode_responses 毎のクライアント（バイナリ値用にデコードしないプールも持つ）
+_clients: Dict[bool, redis.Redis] = {}
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _create_client(decode_responses: bool) -> redis.Redis:
+    """プール設定済みのRedisクライアントを作成"""
+    pool = redis.ConnectionPool.from_url(
+        settings.REDIS_URL,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        health_check_interval=30,
+        decode_responses=decode_responses,
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+def get_redis(decode_responses: bool = True) -> redis.Redis:
+    """
+    プロセス共有のRedisクライアントを取得する
+
+    接続はイベントループに紐づくため、実行中のループが
+    変わった場合は新しいプールを作成する。
+    decode_responses=False はバイナリ値（圧縮済みキャッシュ等）用
+    """
+    global _client_loop
+
+    try:
+        loop: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    if _client_loop is not loop:
+        if _clients:
+            logger.debug("Event loop changed, recreating shared Redis pool")
+            # 古いループのプールを閉じてから作り直す
+            for stale in _clients.values():
+                close_stale(
+                    lambda stale=stale: stale.aclose(close_connection_pool=True),
+                    _client_loop,
+                    "Redis pool"
+                )
+        _clients.clear()
+        _client_loop = loop
+
+    client = _clients.get(decode_responses)
+    if client is None:
+        client = _clients[decode_responses] = _create_client(decode_responses)
+
+    return client
+
+
+async def close_redis() -> None:
+    """共有Redisプールをクローズする（lifespan / ワーカー終了時）"""
+    global _client_loop
+
+    clients = list(_clients.values())
+    _clients.clear()
+    _client_loop = None
+
+    for client in clients:
+        await client.aclose(close_connection_pool=True)
+    if clients:
+        logger.info("Shared Redis pool closed")
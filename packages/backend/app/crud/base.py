@@ -1,50 +1,93 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+from typing import Any, Dict, Generic, List, Optional, Sequence, Type, TypeVar, Union
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlmodel import SQLModel, Session, select
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import SQLModel, select
 from uuid import UUID
 
+from app.services.cache_service import invalidate_tags
+
 ModelType = TypeVar("ModelType", bound=SQLModel)
-CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
-UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
+CreateSchemaType = TypeVar("CreateSchemaType", bound=Union[BaseModel, Dict[str, Any]])
+UpdateSchemaType = TypeVar("UpdateSchemaType", bound=Union[BaseModel, Dict[str, Any]])
+
+
+class AsyncCRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    """
+    非同期CRUDの基底クラス
 
+    全ての操作は AsyncSession を await するため、async def のエンドポイントから
+    呼んでもイベントループをブロックしない
+    """
 
-class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
-    """CRUDの基底クラス"""
-    
     def __init__(self, model: Type[ModelType]):
         """
         CRUDオブジェクトの初期化
-        
+
         Args:
             model: SQLModelのモデルクラス
         """
         self.model = model
 
-    def get(self, db: Session, id: UUID) -> Optional[ModelType]:
+    def cache_tags(self, obj: ModelType) -> List[str]:
+        """
+        レコードの書き込み時に無効化するキャッシュタグ
+
+        キャッシュ対象のデータを持つモデルのCRUDでオーバーライドする
+        """
+        return []
+
+    async def get(self, db: AsyncSession, id: Union[UUID, str]) -> Optional[ModelType]:
         """IDでレコードを取得"""
         statement = select(self.model).where(self.model.id == id)
-        return db.exec(statement).first()
+        result = await db.execute(statement)
+        return result.scalar_one_or_none()
 
-    def get_multi(
-        self, db: Session, *, skip: int = 0, limit: int = 100
+    async def get_many(
+        self,
+        db: AsyncSession,
+        *,
+        ids: Optional[Sequence[Union[UUID, str]]] = None,
+        skip: int = 0,
+        limit: int = 100
     ) -> List[ModelType]:
-        """複数のレコードを取得"""
-        statement = select(self.model).offset(skip).limit(limit)
-        return db.exec(statement).all()
+        """複数のレコードを取得（ids 指定時はそのIDのレコードのみ）"""
+        statement = select(self.model)
+        if ids is not None:
+            if not ids:
+                return []
+            statement = statement.where(self.model.id.in_(ids))
+        statement = statement.offset(skip).limit(limit)
+        result = await db.execute(statement)
+        return result.scalars().all()
 
-    def create(self, db: Session, *, obj_in: CreateSchemaType) -> ModelType:
+    async def create(
+        self, db: AsyncSession, *, obj_in: CreateSchemaType
+    ) -> ModelType:
         """レコードを作成"""
-        obj_in_data = jsonable_encoder(obj_in)
-        db_obj = self.model(**obj_in_data)
+        db_obj = self.model(**self._to_dict(obj_in))
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        await invalidate_tags(*self.cache_tags(db_obj))
         return db_obj
 
-    def update(
+    async def create_many(
+        self, db: AsyncSession, *, objs_in: Sequence[CreateSchemaType]
+    ) -> List[ModelType]:
+        """複数のレコードを1回のコミットで作成"""
+        db_objs = [self.model(**self._to_dict(obj_in)) for obj_in in objs_in]
+        if not db_objs:
+            return []
+        db.add_all(db_objs)
+        await db.commit()
+        await invalidate_tags(*{tag for obj in db_objs for tag in self.cache_tags(obj)})
+        return db_objs
+
+    async def update(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         db_obj: ModelType,
         obj_in: Union[UpdateSchemaType, Dict[str, Any]]
@@ -59,14 +102,40 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             if field in update_data:
                 setattr(db_obj, field, update_data[field])
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        await invalidate_tags(*self.cache_tags(db_obj))
         return db_obj
 
-    def remove(self, db: Session, *, id: UUID) -> ModelType:
-        """レコードを削除"""
-        statement = select(self.model).where(self.model.id == id)
-        obj = db.exec(statement).first()
-        db.delete(obj)
-        db.commit()
-        return obj
\ No newline at end of file
+    async def delete(self, db: AsyncSession, *, id: Union[UUID, str]) -> Optional[ModelType]:
+        """レコードを削除（存在しない場合は None）"""
+        obj = await self.get(db, id)
+        if obj is None:
+            return None
+        tags = self.cache_tags(obj)
+        await db.delete(obj)
+        await db.commit()
+        await invalidate_tags(*tags)
+        return obj
+
+    async def delete_many(self, db: AsyncSession, *, ids: Sequence[Union[UUID, str]]) -> int:
+        """
+        複数のレコードを1文で削除し、削除件数を返す
+
+        キャッシュタグの算出のため削除対象を先に読み込む
+        """
+        objs = await self.get_many(db, ids=ids, limit=len(ids))
+        if not objs:
+            return 0
+        tags = {tag for obj in objs for tag in self.cache_tags(obj)}
+        result = await db.execute(delete(self.model).where(self.model.id.in_(ids)))
+        await db.commit()
+        await invalidate_tags(*tags)
+        return result.rowcount
+
+    @staticmethod
+    def _to_dict(obj_in: Union[BaseModel, Dict[str, Any]]) -> Dict[str, Any]:
+        if isinstance(obj_in, dict):
+            return obj_in
+        # datetime / UUID をそのままカラムに渡すため JSON 化はしない
+        return obj_in.dict()
@@ -1,29 +1,48 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from uuid import UUID
 from datetime import datetime
-from sqlmodel import Session, select, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select, desc
 from app.models.chat import ChatThread, ChatMessage, ChatRole
-from app.crud.base import CRUDBase
+from app.crud.base import AsyncCRUDBase
+from app.crud.pagination import paginate
+from app.services.cache_service import invalidate_tags
 
+# キャッシュタグ（書き込み時に無効化される）
+USER_CHAT_THREADS_TAG = "user:{user_id}:chat_threads"
+CHAT_THREAD_TAG = "chat_thread:{thread_id}"
 
-class CRUDChatThread(CRUDBase[ChatThread, dict, dict]):
-    def get_by_user(self, db: Session, *, user_id: UUID) -> List[ChatThread]:
+# スレッドのメッセージ一覧のカーソルの識別子
+CHAT_MESSAGES_CURSOR = "chat_messages"
+
+
+class CRUDChatThread(AsyncCRUDBase[ChatThread, dict, dict]):
+    def cache_tags(self, obj: ChatThread) -> List[str]:
+        """スレッドの書き込みで無効化するタグ"""
+        return [
+            USER_CHAT_THREADS_TAG.format(user_id=obj.user_id),
+            CHAT_THREAD_TAG.format(thread_id=obj.id),
+        ]
+    
+    async def get_by_user(self, db: AsyncSession, *, user_id: UUID) -> List[ChatThread]:
         """ユーザーのチャットスレッド一覧を取得"""
         statement = select(ChatThread).where(
             ChatThread.user_id == user_id
         ).order_by(desc(ChatThread.updated_at))
-        return db.exec(statement).all()
+        result = await db.execute(statement)
+        return result.scalars().all()
     
-    def get_by_task(self, db: Session, *, task_id: UUID) -> List[ChatThread]:
+    async def get_by_task(self, db: AsyncSession, *, task_id: UUID) -> List[ChatThread]:
         """特定タスクのチャットスレッド一覧を取得"""
         statement = select(ChatThread).where(
             ChatThread.task_id == task_id
         ).order_by(desc(ChatThread.updated_at))
-        return db.exec(statement).all()
+        result = await db.execute(statement)
+        return result.scalars().all()
     
-    def create_thread(
+    async def create_thread(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         *, 
         user_id: UUID, 
         title: str,
@@ -38,25 +57,31 @@ class CRUDChatThread(CRUDBase[ChatThread, dict, dict]):
             updated_at=datetime.utcnow()
         )
         db.add(thread)
-        db.commit()
-        db.refresh(thread)
+        await db.commit()
+        await db.refresh(thread)
+        await invalidate_tags(*self.cache_tags(thread))
         return thread
     
-    def update_timestamp(self, db: Session, *, thread_id: UUID) -> Optional[ChatThread]:
+    async def update_timestamp(self, db: AsyncSession, *, thread_id: UUID) -> Optional[ChatThread]:
         """スレッドの更新日時を現在時刻に更新"""
-        thread = self.get(db, id=thread_id)
+        thread = await self.get(db, id=thread_id)
         if thread:
             thread.updated_at = datetime.utcnow()
             db.add(thread)
-            db.commit()
-            db.refresh(thread)
+            await db.commit()
+            await db.refresh(thread)
+            await invalidate_tags(*self.cache_tags(thread))
         return thread
 
 
-class CRUDChatMessage(CRUDBase[ChatMessage, dict, dict]):
-    def get_by_thread(
+class CRUDChatMessage(AsyncCRUDBase[ChatMessage, dict, dict]):
+    def cache_tags(self, obj: ChatMessage) -> List[str]:
+        """メッセージの書き込みで無効化するタグ（所属スレッド）"""
+        return [CHAT_THREAD_TAG.format(thread_id=obj.thread_id)]
+    
+    async def get_by_thread(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         *, 
         thread_id: UUID,
         limit: Optional[int] = None
@@ -70,11 +95,32 @@ class CRUDChatMessage(CRUDBase[ChatMessage, dict, dict]):
             # 最新のメッセージから指定数を取得
             statement = statement.limit(limit)
         
-        return db.exec(statement).all()
+        result = await db.execute(statement)
+        return result.scalars().all()
+    
+    async def get_page_by_thread(
+        self,
+        db: AsyncSession,
+        *,
+        thread_id: UUID,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[ChatMessage], Optional[str]]:
+        """スレッドのメッセージを時系列順に1ページ分取得し、次のページのカーソルを返す"""
+        statement = select(ChatMessage).where(ChatMessage.thread_id == thread_id)
+        return await paginate(
+            db,
+            statement,
+            [ChatMessage.created_at, ChatMessage.id],
+            kind=CHAT_MESSAGES_CURSOR,
+            limit=limit,
+            cursor=cursor,
+            descending=False
+        )
     
-    def create_message(
+    async def create_message(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         thread_id: UUID,
         role: ChatRole,
@@ -94,35 +140,37 @@ class CRUDChatMessage(CRUDBase[ChatMessage, dict, dict]):
             created_at=datetime.utcnow()
         )
         db.add(message)
-        db.commit()
-        db.refresh(message)
+        await db.commit()
+        await db.refresh(message)
+        await invalidate_tags(*self.cache_tags(message))
         return message
     
-    def get_recent_messages_with_token_limit(
+    async def get_recent_messages_with_token_limit(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         thread_id: UUID,
         max_tokens: int = 4096
     ) -> List[ChatMessage]:
         """トークン制限内での最新メッセージを取得"""
-        # 全メッセージを新しい順で取得
+        # 新しい順に少しずつ読み込み、制限に達したら残りは読まない
         statement = select(ChatMessage).where(
             ChatMessage.thread_id == thread_id
-        ).order_by(desc(ChatMessage.created_at))
+        ).order_by(desc(ChatMessage.created_at)).execution_options(yield_per=50)
         
-        all_messages = db.exec(statement).all()
+        messages = await db.stream_scalars(statement)
         
         # トークン制限内のメッセージを選択
         selected_messages = []
         total_tokens = 0
         
-        for message in all_messages:
+        async for message in messages:
             message_tokens = message.token_count or len(message.content.split())  # 概算
             if total_tokens + message_tokens > max_tokens:
                 break
             selected_messages.append(message)
             total_tokens += message_tokens
+        await messages.close()
         
         # 時系列順に戻す
         return list(reversed(selected_messages))
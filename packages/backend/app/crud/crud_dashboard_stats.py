@@ -0,0 +1,244 @@
+"""
+ユーザー毎のダッシュボード集計（user_dashboard_stats）
+
+件数はタスク・メールの書き込み時に DB のトリガーで増減されるため、
+ダッシュボードはタスク・メールの件数に関わらず1行を読むだけで表示できる。
+時間の経過で変わる値は次のように扱う
+- 期限切れ件数: 未完了タスクの次の期限（next_due_at）を過ぎた場合のみ読み取り時に数え直す
+- 直近N日のメール件数: 日別の件数（user_email_daily_stats）を最大N行合算する
+
+トリガーで追えない変更（パーティションの切り離し・カスケード削除など）は
+定期的な reconcile で全件から数え直して補正する
+"""
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from sqlalchemy import Date, and_, cast, delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.dashboard_stats import UserDashboardStats, UserEmailDailyStats
+from app.models.email import EmailAccount, EmailSyncJob, ProcessedEmail
+from app.models.task import Task, TaskStatus
+from app.models.user import User
+
+
+class CRUDDashboardStats:
+    async def get_task_summary(self, db: AsyncSession, user_id: str) -> Dict[str, Any]:
+        """ダッシュボード用のタスク集計"""
+        stats = await self._get(db, user_id)
+        now = datetime.utcnow()
+        if stats is None:
+            stats = await self.reconcile(db, user_id)
+        elif stats.next_due_at is not None and stats.next_due_at <= now:
+            stats = await self._refresh_overdue(db, user_id, now)
+
+        return {
+            'total_tasks': stats.total_tasks,
+            'todo_count': stats.todo_count,
+            'progress_count': stats.progress_count,
+            'done_count': stats.done_count,
+            'overdue_count': stats.overdue_count,
+            'completion_rate': round((stats.done_count / stats.total_tasks * 100), 1) if stats.total_tasks > 0 else 0
+        }
+
+    async def get_overdue_version(self, db: AsyncSession, user_id: str) -> str:
+        """
+        期限切れ件数の版（次の期限と、それを過ぎたか）
+
+        期限切れ件数はタスクの書き込みが無くても時間の経過で変わるため、
+        タスクのタグと合わせて ETag に含める
+        """
+        result = await db.execute(
+            select(UserDashboardStats.next_due_at).where(UserDashboardStats.user_id == user_id)
+        )
+        next_due_at = result.scalar_one_or_none()
+        if next_due_at is None:
+            return "none"
+        passed = next_due_at <= datetime.utcnow()
+        return f"{next_due_at.isoformat()}:{'passed' if passed else 'pending'}"
+
+    async def get_email_summary(
+        self,
+        db: AsyncSession,
+        user_id: str,
+        days: int = 7
+    ) -> Dict[str, Any]:
+        """ダッシュボード用のメール集計（recent_emails は直近 days 日分）"""
+        stats = await self._get(db, user_id)
+        if stats is None:
+            stats = await self.reconcile(db, user_id)
+
+        days = min(days, settings.DASHBOARD_EMAIL_DAYS_RETENTION)
+        since = (datetime.utcnow() - timedelta(days=days)).date()
+        result = await db.execute(
+            select(func.coalesce(func.sum(UserEmailDailyStats.email_count), 0)).where(
+                UserEmailDailyStats.user_id == user_id,
+                UserEmailDailyStats.day >= since
+            )
+        )
+        recent_emails = result.scalar_one()
+
+        return {
+            'total_emails': stats.total_emails,
+            'task_emails': stats.task_emails,
+            'analyzed_emails': stats.analyzed_emails,
+            'recent_emails': recent_emails,
+            'task_conversion_rate': round((stats.task_emails / stats.total_emails * 100), 1) if stats.total_emails > 0 else 0
+        }
+
+    async def reconcile(self, db: AsyncSession, user_id: str) -> UserDashboardStats:
+        """ユーザーの集計をタスク・メールの全件から数え直す"""
+        now = datetime.utcnow()
+
+        # 集計行をロックしてから数えることで、並行する書き込みのトリガーによる
+        # 増減はロック解放後に数え直した値へ加算され、取りこぼしも二重計上も起きない
+        await db.execute(
+            pg_insert(UserDashboardStats)
+            .values(user_id=user_id, updated_at=now)
+            .on_conflict_do_nothing(index_elements=['user_id'])
+        )
+        await db.execute(
+            select(UserDashboardStats.user_id)
+            .where(UserDashboardStats.user_id == user_id)
+            .with_for_update()
+        )
+
+        counts = await self._count_tasks(db, user_id, now)
+        counts.update(await self._count_emails(db, user_id))
+        await db.execute(
+            update(UserDashboardStats)
+            .where(UserDashboardStats.user_id == user_id)
+            .values(**counts, updated_at=now, reconciled_at=now)
+        )
+
+        # 保持期間外の日別件数もここで削除される
+        since = (now - timedelta(days=settings.DASHBOARD_EMAIL_DAYS_RETENTION)).date()
+        await db.execute(delete(UserEmailDailyStats).where(UserEmailDailyStats.user_id == user_id))
+        daily = await self._count_email_days(db, user_id, since)
+        if daily:
+            await db.execute(insert(UserEmailDailyStats), daily)
+
+        await db.commit()
+        return await self._get(db, user_id)
+
+    async def reconcile_all(self, db: AsyncSession, batch_size: Optional[int] = None) -> int:
+        """全ユーザーの集計を数え直し、処理したユーザー数を返す（1ユーザー1トランザクション）"""
+        batch_size = batch_size or settings.DASHBOARD_STATS_RECONCILE_BATCH_SIZE
+        reconciled = 0
+        last_id: Optional[UUID] = None
+
+        while True:
+            statement = select(User.id).order_by(User.id).limit(batch_size)
+            if last_id is not None:
+                statement = statement.where(User.id > last_id)
+            result = await db.execute(statement)
+            user_ids = result.scalars().all()
+            if not user_ids:
+                return reconciled
+
+            for user_id in user_ids:
+                await self.reconcile(db, user_id)
+                reconciled += 1
+            last_id = user_ids[-1]
+
+    async def _get(self, db: AsyncSession, user_id: str) -> Optional[UserDashboardStats]:
+        # トリガーによる更新を反映するため、セッション内の既存オブジェクトも読み直す
+        result = await db.execute(
+            select(UserDashboardStats)
+            .where(UserDashboardStats.user_id == user_id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one_or_none()
+
+    async def _refresh_overdue(
+        self,
+        db: AsyncSession,
+        user_id: str,
+        now: datetime
+    ) -> UserDashboardStats:
+        """期限切れ件数と次の期限を数え直す（(user_id, due_date) のインデックスで未完了分のみ読む）"""
+        open_tasks = and_(
+            Task.user_id == user_id,
+            Task.due_date.isnot(None),
+            Task.status != TaskStatus.DONE
+        )
+        # reconcile と同じく、ロックを取ってから数える
+        await db.execute(
+            select(UserDashboardStats.user_id)
+            .where(UserDashboardStats.user_id == user_id)
+            .with_for_update()
+        )
+        await db.execute(
+            update(UserDashboardStats)
+            .where(UserDashboardStats.user_id == user_id)
+            .values(
+                overdue_count=select(func.count()).where(
+                    open_tasks, Task.due_date < now
+                ).scalar_subquery(),
+                next_due_at=select(func.min(Task.due_date)).where(
+                    open_tasks, Task.due_date >= now
+                ).scalar_subquery(),
+                updated_at=now
+            )
+        )
+        await db.commit()
+        return await self._get(db, user_id)
+
+    async def _count_tasks(self, db: AsyncSession, user_id: str, now: datetime) -> Dict[str, Any]:
+        """タスクの件数を全件から集計"""
+        not_done = Task.status != TaskStatus.DONE
+        result = await db.execute(
+            select(
+                func.count().label('total_tasks'),
+                func.count().filter(Task.status == TaskStatus.TODO).label('todo_count'),
+                func.count().filter(Task.status == TaskStatus.PROGRESS).label('progress_count'),
+                func.count().filter(Task.status == TaskStatus.DONE).label('done_count'),
+                func.count().filter(and_(Task.due_date < now, not_done)).label('overdue_count'),
+                func.min(Task.due_date).filter(and_(Task.due_date >= now, not_done)).label('next_due_at')
+            ).where(Task.user_id == user_id)
+        )
+        return dict(result.one()._mapping)
+
+    def _user_sync_jobs(self, user_id: str):
+        """ユーザーの同期ジョブIDのサブクエリ"""
+        return select(EmailSyncJob.id).join(
+            EmailAccount, EmailSyncJob.email_account_id == EmailAccount.id
+        ).where(EmailAccount.user_id == user_id)
+
+    async def _count_emails(self, db: AsyncSession, user_id: str) -> Dict[str, Any]:
+        """メールの件数を全件から集計"""
+        result = await db.execute(
+            select(
+                func.count().label('total_emails'),
+                func.count().filter(ProcessedEmail.is_task == True).label('task_emails'),
+                func.count().filter(ProcessedEmail.ai_analysis.isnot(None)).label('analyzed_emails')
+            ).where(ProcessedEmail.sync_job_id.in_(self._user_sync_jobs(user_id)))
+        )
+        return dict(result.one()._mapping)
+
+    async def _count_email_days(
+        self,
+        db: AsyncSession,
+        user_id: str,
+        since
+    ) -> List[Dict[str, Any]]:
+        """since 以降の日別メール件数"""
+        day = cast(ProcessedEmail.email_date, Date)
+        result = await db.execute(
+            select(day.label('day'), func.count().label('email_count'))
+            .where(
+                ProcessedEmail.sync_job_id.in_(self._user_sync_jobs(user_id)),
+                ProcessedEmail.email_date >= since
+            )
+            .group_by(day)
+        )
+        return [
+            {'user_id': user_id, 'day': row.day, 'email_count': row.email_count}
+            for row in result
+        ]
+
+
+crud_dashboard_stats = CRUDDashboardStats()
@@ -1,17 +1,38 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set, Tuple
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import joinedload, selectinload
-from sqlalchemy import and_, func, desc, asc
-from datetime import datetime, timedelta
+from sqlalchemy import and_, func, desc, asc, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from uuid import uuid4
 import json
 
-from app.models.email import EmailAccount, ProcessedEmail, EmailSyncJob
+from app.models.email import EmailAccount, ProcessedEmail, ProcessedEmailKey, EmailSyncJob, ExcludeDomain
 from app.models.user import User
-from app.crud.base import CRUDBase
+from app.crud.base import AsyncCRUDBase
+from app.crud.crud_dashboard_stats import crud_dashboard_stats
+from app.crud.crud_partitions import crud_partitions
+from app.crud.pagination import estimate_count, paginate
+from app.services.cache_service import invalidate_tags
 
+# 一括INSERT 1文あたりの行数（asyncpg のバインド変数上限 32767 対策）
+BULK_INSERT_CHUNK_SIZE = 1000
 
-class CRUDEmail(CRUDBase[EmailAccount]):
+# キャッシュタグ（書き込み時に無効化される）
+USER_EMAIL_ACCOUNTS_TAG = "user:{user_id}:email_accounts"
+EMAIL_TAG = "email:{email_id}"
+
+# 同期ジョブのメール一覧のカーソルの識別子
+SYNC_JOB_EMAILS_CURSOR = "sync_job_emails"
+
+
+class CRUDEmail(AsyncCRUDBase[EmailAccount, Dict[str, Any], Dict[str, Any]]):
+    def cache_tags(self, obj: EmailAccount) -> List[str]:
+        """Cache tags invalidated when an email account is written"""
+        return [USER_EMAIL_ACCOUNTS_TAG.format(user_id=obj.user_id)]
+    
     async def get_email_account(
         self,
         db: AsyncSession,
@@ -46,6 +67,7 @@ class CRUDEmail(CRUDBase[EmailAccount]):
         db.add(account)
         await db.commit()
         await db.refresh(account)
+        await invalidate_tags(*self.cache_tags(account))
         return account
     
     async def update_sync_token(
@@ -64,6 +86,18 @@ class CRUDEmail(CRUDBase[EmailAccount]):
             account.last_sync_at = datetime.utcnow()
             await db.commit()
     
+    async def create_sync_job(
+        self,
+        db: AsyncSession,
+        account_id: str
+    ) -> EmailSyncJob:
+        """Create a pending sync job for an email account"""
+        job = EmailSyncJob(email_account_id=account_id)
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        return job
+    
     async def get_processed_email(
         self,
         db: AsyncSession,
@@ -91,6 +125,32 @@ class CRUDEmail(CRUDBase[EmailAccount]):
         result = await db.execute(statement)
         return result.scalar_one_or_none()
     
+    async def get_existing_email_ids(
+        self,
+        db: AsyncSession,
+        email_ids: List[str]
+    ) -> Set[str]:
+        """Return the provider email IDs that are already processed"""
+        if not email_ids:
+            return set()
+        
+        # Keys outlive dropped partitions, so old emails are still reported
+        statement = select(ProcessedEmailKey.email_id).where(
+            ProcessedEmailKey.email_id.in_(email_ids)
+        )
+        result = await db.execute(statement)
+        return set(result.scalars().all())
+    
+    async def get_exclude_domains(
+        self,
+        db: AsyncSession,
+        user_id: str
+    ) -> List[str]:
+        """Get the user's excluded sender domains (lowercased)"""
+        statement = select(ExcludeDomain.domain).where(ExcludeDomain.user_id == user_id)
+        result = await db.execute(statement)
+        return [domain.lower() for domain in result.scalars().all()]
+    
     async def create_processed_email(
         self,
         db: AsyncSession,
@@ -103,6 +163,101 @@ class CRUDEmail(CRUDBase[EmailAccount]):
         await db.refresh(email)
         return email
     
+    async def bulk_upsert_processed_emails(
+        self,
+        db: AsyncSession,
+        emails: List[Dict[str, Any]],
+        sync_job_id: str
+    ) -> Dict[str, str]:
+        """
+        Insert parsed provider messages for a sync job in a single transaction
+        
+        Already processed email IDs are skipped (see insert_new_processed_emails)
+        and only newly inserted rows are returned as
+        {provider email ID: processed_emails.id}
+        """
+        if not emails:
+            return {}
+        
+        now = datetime.utcnow()
+        rows = {}
+        for email_data in emails:
+            snippet = email_data.get("snippet")
+            rows[email_data["id"]] = {
+                "id": uuid4(),
+                "sync_job_id": sync_job_id,
+                "email_id": email_data["id"],  # プロバイダー側のID
+                "message_id": email_data.get("message_id", ""),  # Message-IDヘッダー
+                "thread_id": email_data.get("thread_id", ""),
+                "in_reply_to": email_data.get("in_reply_to", ""),
+                "references": email_data.get("references", ""),
+                "subject": email_data.get("subject", ""),
+                "sender": email_data.get("from", ""),
+                "body_preview": snippet[:500] if snippet else None,
+                "email_date": self._parse_email_date(email_data.get("date")) or now,
+                "is_task": False,
+                "processed_at": now
+            }
+        
+        inserted = await self.insert_new_processed_emails(db, list(rows.values()))
+        await db.commit()
+        return inserted
+    
+    async def insert_new_processed_emails(
+        self,
+        db: AsyncSession,
+        rows: List[Dict[str, Any]]
+    ) -> Dict[str, str]:
+        """
+        Insert processed_emails rows whose email_id has not been seen before
+        
+        The email IDs are first claimed in processed_email_keys (ON CONFLICT DO
+        NOTHING RETURNING), which is unique on email_id alone regardless of
+        email_date; only claimed rows are inserted. A concurrent sync claiming
+        the same ID waits for this transaction and then skips it. The caller
+        commits.
+        
+        Returns:
+            {provider email ID: processed_emails.id} for the inserted rows
+        """
+        inserted: Dict[str, str] = {}
+        
+        for i in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+            chunk = rows[i:i + BULK_INSERT_CHUNK_SIZE]
+            result = await db.execute(
+                pg_insert(ProcessedEmailKey)
+                .values([{"email_id": row["email_id"]} for row in chunk])
+                .on_conflict_do_nothing(index_elements=["email_id"])
+                .returning(ProcessedEmailKey.email_id)
+            )
+            claimed = set(result.scalars())
+            new_rows = [row for row in chunk if row["email_id"] in claimed]
+            if not new_rows:
+                continue
+            
+            await db.execute(pg_insert(ProcessedEmail).values(new_rows))
+            inserted.update({row["email_id"]: str(row["id"]) for row in new_rows})
+        
+        return inserted
+    
+    @staticmethod
+    def _parse_email_date(value: Optional[str]) -> Optional[datetime]:
+        """Parse RFC 2822 (Gmail) or ISO 8601 (Outlook) dates into naive UTC"""
+        if not value:
+            return None
+        
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            try:
+                parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            except ValueError:
+                return None
+        
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    
     async def update_email_analysis(
         self,
         db: AsyncSession,
@@ -122,6 +277,46 @@ class CRUDEmail(CRUDBase[EmailAccount]):
             email.ai_analysis = ai_analysis
             email.analyzed_at = datetime.utcnow()
             await db.commit()
+            await invalidate_tags(EMAIL_TAG.format(email_id=email_id))
+    
+    async def mark_thread_analyzed(
+        self,
+        db: AsyncSession,
+        *,
+        account_id: str,
+        email_ids: List[str],
+        ai_analysis: Dict[str, Any]
+    ) -> int:
+        """
+        スレッドのメールを1文で AI 分析済みにする
+
+        ai_analysis が入っていれば分析済みとみなす（get_ai_analyzed_emails と同じ基準）。
+        他アカウントのメールを更新しないよう同期ジョブ経由でアカウントに絞り込む
+        """
+        if not email_ids:
+            return 0
+
+        account_jobs = select(EmailSyncJob.id).where(
+            EmailSyncJob.email_account_id == account_id
+        )
+        statement = (
+            update(ProcessedEmail)
+            .where(
+                ProcessedEmail.email_id.in_(email_ids),
+                ProcessedEmail.sync_job_id.in_(account_jobs)
+            )
+            .values(ai_analysis=ai_analysis)
+            .returning(ProcessedEmail.id)
+        )
+        result = await db.execute(statement)
+        updated_ids = result.scalars().all()
+        await db.commit()
+
+        if updated_ids:
+            await invalidate_tags(*(
+                EMAIL_TAG.format(email_id=email_id) for email_id in updated_ids
+            ))
+        return len(updated_ids)
     
     async def get_unprocessed_emails(
         self,
@@ -142,11 +337,11 @@ class CRUDEmail(CRUDBase[EmailAccount]):
         db: AsyncSession,
         sync_job_id: str,
         limit: int = 50,
-        offset: int = 0,
+        cursor: Optional[str] = None,
         include_thread: bool = False
-    ) -> List[ProcessedEmail]:
+    ) -> Tuple[List[ProcessedEmail], Optional[str]]:
         """
-        ユーザーのメール一覧を最適化して取得
+        ユーザーのメール一覧を最適化して取得し、次のページのカーソルを返す
         Railway無料プラン対応・N+1問題解決
         """
         
@@ -163,14 +358,37 @@ class CRUDEmail(CRUDBase[EmailAccount]):
                 )
             )
         
-        # インデックスを活用したソート（日付降順）
-        statement = statement.order_by(desc(ProcessedEmail.email_date))
-        
-        # ページネーション
-        statement = statement.offset(offset).limit(limit)
-        
-        result = await db.execute(statement)
-        return result.scalars().all()
+        # (sync_job_id, email_date DESC) のインデックスで続きから読む（日付降順）
+        return await paginate(
+            db,
+            statement,
+            [ProcessedEmail.email_date, ProcessedEmail.id],
+            kind=SYNC_JOB_EMAILS_CURSOR,
+            limit=limit,
+            cursor=cursor
+        )
+
+    async def count_user_emails(
+        self,
+        db: AsyncSession,
+        sync_job_id: str,
+        estimate: bool = False
+    ) -> int:
+        """
+        同期ジョブのメール件数
+
+        estimate=True の場合は COUNT(*) を使わずプランナの推定行数を返す
+        """
+        if estimate:
+            return await estimate_count(
+                db, select(ProcessedEmail.id).where(ProcessedEmail.sync_job_id == sync_job_id)
+            )
+        result = await db.execute(
+            select(func.count()).select_from(ProcessedEmail).where(
+                ProcessedEmail.sync_job_id == sync_job_id
+            )
+        )
+        return result.scalar_one()
 
     async def get_email_threads_optimized(
         self,
@@ -233,38 +451,9 @@ class CRUDEmail(CRUDBase[EmailAccount]):
     ) -> Dict[str, Any]:
         """
         最近のメール統計サマリーを効率的に取得
-        ダッシュボード向け最適化
+        メール数に関わらず集計テーブル（user_dashboard_stats）と日別件数の最大 days 行を読む
         """
-        
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        # サブクエリでユーザーの同期ジョブIDを取得
-        sync_job_subquery = select(EmailSyncJob.id).join(
-            EmailAccount, EmailSyncJob.email_account_id == EmailAccount.id
-        ).where(EmailAccount.user_id == user_id).subquery()
-        
-        # 集約クエリで一度に統計を取得
-        summary_query = select(
-            func.count().label('total_emails'),
-            func.count().filter(ProcessedEmail.is_task == True).label('task_emails'),
-            func.count().filter(ProcessedEmail.ai_analysis.isnot(None)).label('analyzed_emails'),
-            func.count().filter(
-                ProcessedEmail.email_date >= cutoff_date
-            ).label('recent_emails')
-        ).where(
-            ProcessedEmail.sync_job_id.in_(sync_job_subquery)
-        )
-        
-        result = await db.execute(summary_query)
-        row = result.first()
-        
-        return {
-            'total_emails': row.total_emails or 0,
-            'task_emails': row.task_emails or 0,
-            'analyzed_emails': row.analyzed_emails or 0,
-            'recent_emails': row.recent_emails or 0,
-            'task_conversion_rate': round((row.task_emails / row.total_emails * 100), 1) if row.total_emails > 0 else 0
-        }
+        return await crud_dashboard_stats.get_email_summary(db, user_id, days=days)
 
     async def cleanup_old_emails(
         self,
@@ -274,24 +463,14 @@ class CRUDEmail(CRUDBase[EmailAccount]):
         """
         古いメールデータを削除してストレージを節約
         Railway無料プラン（1GB制限）対応
+
+        行の DELETE ではなく、全ての行が保持期間を過ぎた月別パーティションを
+        切り離して削除する（タスク化されたメールは DEFAULT パーティションへ退避して保持）。
+        トリガーを経由しないため、ダッシュボード集計は定期的な reconcile で補正される。
+        削除したパーティション数を返す
         """
-        
         cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
-        
-        # 古いメールを削除（タスク化されていないもののみ）
-        from sqlalchemy import delete
-        
-        delete_query = delete(ProcessedEmail).where(
-            and_(
-                ProcessedEmail.email_date < cutoff_date,
-                ProcessedEmail.is_task == False  # タスク化されたメールは保持
-            )
-        )
-        
-        result = await db.execute(delete_query)
-        await db.commit()
-        
-        return result.rowcount
-
+        removed = await crud_partitions.drop_expired_partitions(db, "processed_emails", cutoff_date)
+        return len(removed)
 
 crud_email = CRUDEmail(EmailAccount)
\ No newline at end of file
@@ -0,0 +1,256 @@
+"""
+時間で範囲パーティション化したテーブルのパーティション管理
+
+processed_emails / openai_usage / task_histories は作成日時などの列で
+月（task_histories は四半期）毎にパーティション化している（alembic 005）。
+- 将来のパーティションを先行して作成し、書き込みが DEFAULT パーティションに溜まらないようにする
+- 保持期間を過ぎたパーティションは切り離して削除する（行の DELETE ではなくメタデータの操作）
+- 期限後も残す行は同じ期間のアーカイブパーティション（{パーティション名}_archive）に移す
+
+新しいパーティションはテーブルとして作成してから ATTACH することで、
+親テーブルへの書き込み（同期時のメール取り込みなど）を止めずに追加する
+"""
+import logging
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.partitioning import PARTITIONED_TABLES
+
+logger = logging.getLogger(__name__)
+
+# 期限切れのパーティションを削除する前にアーカイブパーティションへ退避する行
+# （タスク化されたメール・タスクの作成元のメールは保持期間を過ぎても残す）
+RETAINED_ROWS: Dict[str, str] = {
+    "processed_emails": (
+        "p.is_task OR EXISTS (SELECT 1 FROM tasks t WHERE t.source_email_id = p.id)"
+    ),
+}
+
+# 退避した行を持つパーティションの接尾辞（保持期間による削除の対象外）
+ARCHIVE_SUFFIX = "_archive"
+
+_BOUND_PATTERN = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def add_months(day: date, months: int) -> date:
+    """月初の日付に months ヶ月を加算（負の値は減算）"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_bounds(day: date, period_months: int) -> Tuple[date, date]:
+    """day を含むパーティションの範囲 [開始, 終了)"""
+    start = date(day.year, (day.month - 1) // period_months * period_months + 1, 1)
+    return start, add_months(start, period_months)
+
+
+def partition_name(table: str, start: date, period_months: int) -> str:
+    """パーティション名（月別: processed_emails_y2025m01 / 四半期別: task_histories_2025q1）"""
+    if period_months == 3:
+        return f"{table}_{start.year}q{(start.month - 1) // 3 + 1}"
+    return f"{table}_y{start.year}m{start.month:02d}"
+
+
+def retention_months(table: str) -> int:
+    """テーブルの保持月数（0 は無期限）"""
+    return {
+        "processed_emails": settings.EMAIL_RETENTION_MONTHS,
+        "openai_usage": settings.OPENAI_USAGE_RETENTION_MONTHS,
+        "task_histories": settings.TASK_HISTORY_RETENTION_MONTHS,
+    }[table]
+
+
+class CRUDPartitions:
+    async def list_partitions(self, db: AsyncSession, table: str) -> List[Dict[str, Any]]:
+        """アタッチされている範囲パーティション（DEFAULT パーティションは除く）を開始日順に返す"""
+        result = await db.execute(
+            text(
+                "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+                "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = CAST(:table AS regclass)"
+            ),
+            {"table": table}
+        )
+
+        partitions = []
+        for name, bound in result.all():
+            match = _BOUND_PATTERN.search(bound or "")
+            if match is None:
+                continue
+            partitions.append({
+                "name": name,
+                "start": datetime.fromisoformat(match.group(1)).date(),
+                "end": datetime.fromisoformat(match.group(2)).date(),
+            })
+        return sorted(partitions, key=lambda p: p["start"])
+
+    async def ensure_future_partitions(
+        self,
+        db: AsyncSession,
+        table: str,
+        months_ahead: Optional[int] = None,
+        today: Optional[date] = None
+    ) -> List[str]:
+        """今日を含む期間から months_ahead ヶ月先までのパーティションを作成し、作成した名前を返す"""
+        column, period_months = PARTITIONED_TABLES[table]
+        months_ahead = settings.PARTITION_PREMAKE_MONTHS if months_ahead is None else months_ahead
+        today = today or datetime.utcnow().date()
+
+        existing = {p["start"] for p in await self.list_partitions(db, table)}
+        start, _ = partition_bounds(today, period_months)
+        horizon = add_months(date(today.year, today.month, 1), months_ahead)
+
+        created = []
+        while start <= horizon:
+            end = add_months(start, period_months)
+            if start not in existing:
+                name = partition_name(table, start, period_months)
+                await self._attach_partition(db, table, column, name, start, end)
+                created.append(name)
+            start = end
+        return created
+
+    async def drop_expired_partitions(
+        self,
+        db: AsyncSession,
+        table: str,
+        before: datetime,
+        keep_detached: Optional[bool] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        全ての行が before より古いパーティションを切り離して削除する
+
+        RETAINED_ROWS の行は同じ範囲のアーカイブパーティションに移して残す。
+        DEFAULT パーティションに入れると、以降の ATTACH の度に検証で走査されるため使わない
+
+        Returns:
+            [{"partition": 名前, "retained": アーカイブパーティションへ退避した行数}]
+        """
+        keep_detached = settings.PARTITION_KEEP_DETACHED if keep_detached is None else keep_detached
+        removed = []
+
+        for partition in await self.list_partitions(db, table):
+            name = partition["name"]
+            if name.endswith(ARCHIVE_SUFFIX):
+                continue
+            if datetime.combine(partition["end"], datetime.min.time()) > before:
+                break
+
+            archive = f"{name}{ARCHIVE_SUFFIX}"
+            retained = 0
+            if table in RETAINED_ROWS:
+                # 親テーブルをロックしないよう、切り離す前にパーティションから直接コピーする
+                retained = await self._copy_retained_rows(db, table, name, archive, partition)
+
+            # 切り離しは親テーブルを排他ロックするため、カタログの更新のみで直ちにコミットする
+            await db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            await db.commit()
+
+            if table in RETAINED_ROWS:
+                # コピー後から切り離しまでに退避対象になった行を追加してから同じ範囲にアタッチする
+                # （ATTACH は書き込みと競合しないロックで、範囲の CHECK 制約により走査も省略される）
+                retained += await self._copy_retained_rows(db, table, name, archive, partition)
+                await db.execute(text(
+                    f"ALTER TABLE {table} ATTACH PARTITION {archive} "
+                    f"FOR VALUES FROM ('{partition['start']}') TO ('{partition['end']}')"
+                ))
+                await db.commit()
+
+            if not keep_detached:
+                await db.execute(text(f"DROP TABLE {name}"))
+                await db.commit()
+
+            logger.info(
+                f"Partition {name} {'detached' if keep_detached else 'dropped'} "
+                f"(retained {retained} rows in {archive})"
+            )
+            removed.append({"partition": name, "retained": retained})
+        return removed
+
+    async def _copy_retained_rows(
+        self,
+        db: AsyncSession,
+        table: str,
+        name: str,
+        archive: str,
+        partition: Dict[str, Any]
+    ) -> int:
+        """
+        パーティションの退避対象の行をアーカイブ用のテーブルにコピーし、追加した行数を返す
+
+        アーカイブ用のテーブルへの直接の書き込みのため、親テーブルの集計トリガーは発火しない
+        """
+        column, _ = PARTITIONED_TABLES[table]
+        await db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {archive} "
+            f"(LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS, "
+            f"CHECK ({column} IS NOT NULL AND {column} >= '{partition['start']}' "
+            f"AND {column} < '{partition['end']}'))"
+        ))
+        result = await db.execute(text(
+            f"INSERT INTO {archive} SELECT * FROM {name} p "
+            f"WHERE ({RETAINED_ROWS[table]}) "
+            f"AND NOT EXISTS (SELECT 1 FROM {archive} a WHERE a.id = p.id)"
+        ))
+        await db.commit()
+        return result.rowcount
+
+    async def maintain(self, db: AsyncSession, today: Optional[date] = None) -> Dict[str, Dict[str, Any]]:
+        """全てのパーティション化テーブルで将来分の作成と期限切れ分の削除を行う"""
+        today = today or datetime.utcnow().date()
+        results: Dict[str, Dict[str, Any]] = {}
+
+        for table, (_, period_months) in PARTITIONED_TABLES.items():
+            created = await self.ensure_future_partitions(db, table, today=today)
+
+            removed: List[Dict[str, Any]] = []
+            months = retention_months(table)
+            if months > 0:
+                cutoff = add_months(date(today.year, today.month, 1), -months)
+                removed = await self.drop_expired_partitions(
+                    db, table, datetime.combine(cutoff, datetime.min.time())
+                )
+
+            results[table] = {"created": created, "removed": removed}
+        return results
+
+    async def _attach_partition(
+        self,
+        db: AsyncSession,
+        table: str,
+        column: str,
+        name: str,
+        start: date,
+        end: date
+    ) -> None:
+        """
+        パーティションをテーブルとして作成してからアタッチする
+
+        PARTITION OF で直接作成すると親テーブルを排他ロックするため、
+        ATTACH（書き込みと競合しないロック）で追加する。
+        範囲内の行が DEFAULT パーティションにあると ATTACH できないため、先に移す
+        """
+        await db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} "
+            f"(LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        ))
+        await db.execute(text(
+            f"WITH moved AS ("
+            f"DELETE FROM {table}_default WHERE {column} >= '{start}' AND {column} < '{end}' "
+            f"RETURNING *"
+            f") INSERT INTO {name} SELECT * FROM moved"
+        ))
+        await db.execute(text(
+            f"ALTER TABLE {table} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        ))
+        await db.commit()
+        logger.info(f"Partition {name} created for {table} [{start}, {end})")
+
+
+crud_partitions = CRUDPartitions()
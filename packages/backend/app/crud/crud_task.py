@@ -1,20 +1,37 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import joinedload, selectinload
-from sqlalchemy import and_, func, desc, asc
+from sqlalchemy import and_, func, desc
 from datetime import datetime
 from uuid import UUID
 
-from app.models.task import Task, TaskStatus, TaskPriority
+from app.models.task import Task, TaskStatus
 from app.models.history import TaskHistory, AISupport
 from app.models.user import User
 from app.models.email import ProcessedEmail
 from app.schemas.task import TaskCreate, TaskUpdate
-from app.crud.base import CRUDBase
+from app.crud.base import AsyncCRUDBase
+from app.crud.crud_dashboard_stats import crud_dashboard_stats
+from app.crud.pagination import estimate_count, paginate
+from app.services.cache_service import invalidate_tags
 
+# キャッシュタグ（タスクの書き込み時に無効化される）
+USER_TASKS_TAG = "user:{user_id}:tasks"
+TASK_TAG = "task:{task_id}"
 
-class CRUDTask(CRUDBase[Task]):
+# タスク一覧のカーソルの識別子
+USER_TASKS_CURSOR = "user_tasks"
+
+
+class CRUDTask(AsyncCRUDBase[Task, TaskCreate, TaskUpdate]):
+    def cache_tags(self, obj: Task) -> List[str]:
+        """タスクの書き込みで無効化するタグ"""
+        return [
+            USER_TASKS_TAG.format(user_id=obj.user_id),
+            TASK_TAG.format(task_id=obj.id),
+        ]
+    
     async def get_task(
         self,
         db: AsyncSession,
@@ -29,21 +46,20 @@ class CRUDTask(CRUDBase[Task]):
         self,
         db: AsyncSession,
         user_id: str,
-        skip: int = 0,
         limit: int = 50,  # Railway無料プラン対応で制限
+        cursor: Optional[str] = None,
         status: Optional[str] = None,
-        priority: Optional[str] = None
-    ) -> List[Task]:
+        priority: Optional[str] = None,
+        search: Optional[str] = None,
+        skip: int = 0
+    ) -> Tuple[List[Task], Optional[str]]:
         """
-        Get tasks for a user with optimal performance
-        N+1問題を解決し、Railway制限を考慮した実装
+        Get a page of tasks for a user and the cursor for the next page
+        N+1問題を解決し、(updated_at, id) のキーセットでページングする
         """
-        statement = select(Task).where(Task.user_id == user_id)
-        
-        if status:
-            statement = statement.where(Task.status == status)
-        if priority:
-            statement = statement.where(Task.priority == priority)
+        statement = self._user_tasks_filter(
+            select(Task), user_id, status=status, priority=priority, search=search
+        )
         
         # N+1問題解決: 関連データを事前読み込み
         statement = statement.options(
@@ -58,15 +74,69 @@ class CRUDTask(CRUDBase[Task]):
             )
         )
         
-        # パフォーマンス最適化: インデックスを活用したソート
-        statement = statement.order_by(
-            desc(Task.updated_at),  # 更新日降順
-            asc(Task.priority == TaskPriority.HIGH),  # 高優先度を上位に
+        # 更新日降順（同時刻は id で順序を固定）
+        return await paginate(
+            db,
+            statement,
+            [Task.updated_at, Task.id],
+            kind=USER_TASKS_CURSOR,
+            limit=limit,
+            cursor=cursor,
+            skip=skip
         )
+    
+    async def count_user_tasks(
+        self,
+        db: AsyncSession,
+        user_id: str,
+        status: Optional[str] = None,
+        priority: Optional[str] = None,
+        search: Optional[str] = None,
+        estimate: bool = False
+    ) -> int:
+        """
+        Count tasks for a user with the same filters as get_user_tasks
+
+        estimate=True の場合は COUNT(*) を使わずプランナの推定行数を返す
+        """
+        if estimate:
+            return await estimate_count(
+                db,
+                self._user_tasks_filter(
+                    select(Task.id), user_id, status=status, priority=priority, search=search
+                )
+            )
         
-        statement = statement.offset(skip).limit(limit)
+        statement = self._user_tasks_filter(
+            select(func.count()).select_from(Task),
+            user_id,
+            status=status,
+            priority=priority,
+            search=search
+        )
         result = await db.execute(statement)
-        return result.scalars().all()
+        return result.scalar_one()
+    
+    def _user_tasks_filter(
+        self,
+        statement,
+        user_id: str,
+        status: Optional[str] = None,
+        priority: Optional[str] = None,
+        search: Optional[str] = None
+    ):
+        """ユーザーのタスク一覧・件数で共通の絞り込み条件"""
+        statement = statement.where(Task.user_id == user_id)
+        if status:
+            statement = statement.where(Task.status == status)
+        if priority:
+            statement = statement.where(Task.priority == priority)
+        if search:
+            pattern = f"%{search}%"
+            statement = statement.where(
+                Task.title.ilike(pattern) | Task.description.ilike(pattern)
+            )
+        return statement
     
     async def create_task(
         self,
@@ -99,6 +169,7 @@ class CRUDTask(CRUDBase[Task]):
         )
         db.add(history)
         await db.commit()
+        await invalidate_tags(*self.cache_tags(db_task))
         
         return db_task
     
@@ -160,6 +231,7 @@ class CRUDTask(CRUDBase[Task]):
         
         await db.commit()
         await db.refresh(task)
+        await invalidate_tags(*self.cache_tags(task))
         return task
     
     async def delete_task(
@@ -188,8 +260,10 @@ class CRUDTask(CRUDBase[Task]):
             )
             db.add(history)
             
+            tags = self.cache_tags(task)
             await db.delete(task)
             await db.commit()
+            await invalidate_tags(*tags)
             return True
         
         return False
@@ -232,6 +306,7 @@ class CRUDTask(CRUDBase[Task]):
         db.add(support)
         await db.commit()
         await db.refresh(support)
+        await invalidate_tags(TASK_TAG.format(task_id=task_id))
         return support
     
     async def get_ai_supports(
@@ -327,36 +402,11 @@ class CRUDTask(CRUDBase[Task]):
         user_id: str
     ) -> dict:
         """
-        ダッシュボード用のサマリー情報を1回のクエリで取得
-        Railway無料プラン向けメモリ効率最適化
+        ダッシュボード用のサマリー情報を取得
+        タスク数に関わらず集計テーブル（user_dashboard_stats）の1行を読む
+        （期限切れ件数は時間の経過で変わるため、結果はキャッシュしない）
         """
-        
-        # 集約クエリで一度にサマリーを取得（N+1問題回避）
-        summary_query = select(
-            func.count().label('total_tasks'),
-            func.count().filter(Task.status == TaskStatus.TODO).label('todo_count'),
-            func.count().filter(Task.status == TaskStatus.PROGRESS).label('progress_count'),
-            func.count().filter(Task.status == TaskStatus.DONE).label('done_count'),
-            func.count().filter(
-                and_(
-                    Task.due_date.isnot(None),
-                    Task.due_date < func.now(),
-                    Task.status != TaskStatus.DONE
-                )
-            ).label('overdue_count')
-        ).where(Task.user_id == user_id)
-        
-        result = await db.execute(summary_query)
-        row = result.first()
-        
-        return {
-            'total_tasks': row.total_tasks or 0,
-            'todo_count': row.todo_count or 0,
-            'progress_count': row.progress_count or 0, 
-            'done_count': row.done_count or 0,
-            'overdue_count': row.overdue_count or 0,
-            'completion_rate': round((row.done_count / row.total_tasks * 100), 1) if row.total_tasks > 0 else 0
-        }
+        return await crud_dashboard_stats.get_task_summary(db, user_id)
 
     async def get_tasks_with_emails_optimized(
         self, 
@@ -428,6 +478,10 @@ class CRUDTask(CRUDBase[Task]):
         
         result = await db.execute(update_query)
         await db.commit()
+        await invalidate_tags(
+            USER_TASKS_TAG.format(user_id=user_id),
+            *(TASK_TAG.format(task_id=task_id) for task_id in task_ids)
+        )
         
         return result.rowcount
 
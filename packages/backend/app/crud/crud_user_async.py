@@ -2,13 +2,13 @@ from typing import Optional
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
 
-from app.crud.base import CRUDBase
+from app.crud.base import AsyncCRUDBase
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
 from app.core.security import get_password_hash, verify_password
 
 
-class CRUDUser(CRUDBase[User]):
+class CRUDUser(AsyncCRUDBase[User, UserCreate, UserUpdate]):
     async def get_by_email(self, db: AsyncSession, *, email: str) -> Optional[User]:
         """メールアドレスでユーザーを取得"""
         statement = select(User).where(User.email == email)
@@ -40,11 +40,5 @@ class CRUDUser(CRUDBase[User]):
             return None
         return user
 
-    async def get(self, db: AsyncSession, *, id: str) -> Optional[User]:
-        """IDでユーザーを取得"""
-        statement = select(User).where(User.id == id)
-        result = await db.execute(statement)
-        return result.scalar_one_or_none()
-
 
 crud_user = CRUDUser(User)
\ No newline at end of file
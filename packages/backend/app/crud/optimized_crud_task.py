@@ -1,275 +0,0 @@
-"""
-N+1問題を解決したタスクCRUD操作
-Railway無料プラン（メモリ1GB）を考慮した最適化
-"""
-
-from typing import List, Optional
-from uuid import UUID
-from sqlalchemy.orm import Session, joinedload, selectinload, contains_eager
-from sqlalchemy import and_, select, func, desc, asc
-from app.models.task import Task, TaskStatus, TaskPriority
-from app.models.user import User
-from app.models.email import ProcessedEmail
-from app.models.history import TaskHistory
-
-class OptimizedTaskCRUD:
-    """
-    パフォーマンス最適化されたタスクCRUD操作
-    Railway無料プラン制約を考慮した実装
-    """
-    
-    def get_user_tasks_optimized(
-        self, 
-        db: Session, 
-        user_id: UUID,
-        status: Optional[TaskStatus] = None,
-        limit: int = 50,
-        offset: int = 0
-    ) -> List[Task]:
-        """
-        ユーザーのタスク一覧を最適化して取得
-        N+1問題を完全に回避
-        """
-        
-        # ベースクエリ構築
-        query = select(Task).where(Task.user_id == user_id)
-        
-        # ステータスフィルタ
-        if status:
-            query = query.where(Task.status == status)
-        
-        # 関連データを事前読み込み（N+1問題回避）
-        query = query.options(
-            # ユーザー情報を事前読み込み
-            joinedload(Task.user).load_only(User.name, User.email),
-            
-            # ソースメール情報を条件付きで読み込み
-            joinedload(Task.source_email).load_only(
-                ProcessedEmail.sender, 
-                ProcessedEmail.subject,
-                ProcessedEmail.email_date
-            ),
-            
-            # 最新履歴のみを読み込み（メモリ効率化）
-            selectinload(Task.history).options(
-                # 最新5件の履歴のみ
-                joinedload(TaskHistory.user).load_only(User.name)
-            ).limit(5)
-        )
-        
-        # ソート（インデックス活用）
-        query = query.order_by(
-            desc(Task.updated_at),  # 更新日降順
-            asc(Task.priority == TaskPriority.HIGH),  # 高優先度を上位に
-        )
-        
-        # ページネーション
-        query = query.limit(limit).offset(offset)
-        
-        return db.execute(query).scalars().all()
-
-    def get_dashboard_summary_optimized(
-        self, 
-        db: Session, 
-        user_id: UUID
-    ) -> dict:
-        """
-        ダッシュボード用のサマリー情報を1回のクエリで取得
-        メモリ効率を最大化
-        """
-        
-        # 集約クエリで一度にサマリーを取得
-        summary_query = select(
-            func.count().label('total_tasks'),
-            func.count().filter(Task.status == TaskStatus.TODO).label('todo_count'),
-            func.count().filter(Task.status == TaskStatus.PROGRESS).label('progress_count'),
-            func.count().filter(Task.status == TaskStatus.DONE).label('done_count'),
-            func.count().filter(
-                and_(
-                    Task.due_date.isnot(None),
-                    Task.due_date < func.now(),
-                    Task.status != TaskStatus.DONE
-                )
-            ).label('overdue_count')
-        ).where(Task.user_id == user_id)
-        
-        result = db.execute(summary_query).first()
-        
-        return {
-            'total_tasks': result.total_tasks,
-            'todo_count': result.todo_count,
-            'progress_count': result.progress_count, 
-            'done_count': result.done_count,
-            'overdue_count': result.overdue_count,
-            'completion_rate': (result.done_count / result.total_tasks * 100) if result.total_tasks > 0 else 0
-        }
-
-    def get_tasks_with_emails_optimized(
-        self, 
-        db: Session, 
-        user_id: UUID,
-        has_email: bool = True,
-        limit: int = 20
-    ) -> List[Task]:
-        """
-        メール起源のタスクを効率的に取得
-        AI分析機能用
-        """
-        
-        query = select(Task).where(Task.user_id == user_id)
-        
-        if has_email:
-            # メール起源のタスクのみ
-            query = query.where(Task.source_email_id.isnot(None))
-            
-            # メール情報も事前読み込み
-            query = query.options(
-                joinedload(Task.source_email).load_only(
-                    ProcessedEmail.sender,
-                    ProcessedEmail.subject,
-                    ProcessedEmail.body_preview,
-                    ProcessedEmail.email_date,
-                    ProcessedEmail.ai_analysis
-                )
-            )
-        else:
-            # ユーザー作成タスクのみ
-            query = query.where(Task.source_email_id.is_(None))
-        
-        # 最新順でソート
-        query = query.order_by(desc(Task.created_at)).limit(limit)
-        
-        return db.execute(query).scalars().all()
-
-    def get_recent_ai_tasks_optimized(
-        self, 
-        db: Session, 
-        user_id: UUID,
-        days: int = 7,
-        limit: int = 10
-    ) -> List[Task]:
-        """
-        最近AI生成されたタスクを効率的に取得
-        """
-        
-        from datetime import datetime, timedelta
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        query = select(Task).where(
-            and_(
-                Task.user_id == user_id,
-                Task.created_by == 'ai',
-                Task.created_at >= cutoff_date
-            )
-        ).options(
-            # 関連メール情報を含める
-            joinedload(Task.source_email).load_only(
-                ProcessedEmail.sender,
-                ProcessedEmail.subject,
-                ProcessedEmail.ai_analysis
-            )
-        ).order_by(desc(Task.created_at)).limit(limit)
-        
-        return db.execute(query).scalars().all()
-
-    def batch_update_task_status(
-        self, 
-        db: Session, 
-        task_ids: List[UUID], 
-        new_status: TaskStatus,
-        user_id: UUID
-    ) -> int:
-        """
-        複数タスクのステータスを一括更新
-        パフォーマンス最適化
-        """
-        
-        from sqlalchemy import update
-        from datetime import datetime
-        
-        # 一括更新クエリ
-        update_query = (
-            update(Task)
-            .where(
-                and_(
-                    Task.id.in_(task_ids),
-                    Task.user_id == user_id  # セキュリティ: 自分のタスクのみ
-                )
-            )
-            .values(
-                status=new_status,
-                updated_at=datetime.utcnow(),
-                completed_at=datetime.utcnow() if new_status == TaskStatus.DONE else None
-            )
-        )
-        
-        result = db.execute(update_query)
-        db.commit()
-        
-        return result.rowcount
-
-# Railway無料プラン向けの制限付きクエリビルダー
-class RailwayOptimizedQueries:
-    """
-    Railway無料プラン（1GBメモリ制限）専用の軽量クエリ
-    """
-    
-    @staticmethod
-    def get_lightweight_task_list(
-        db: Session,
-        user_id: UUID,
-        limit: int = 25  # Railway制限下では小さめに
-    ) -> List[dict]:
-        """
-        最小限のデータで軽量なタスク一覧を取得
-        """
-        
-        query = select(
-            Task.id,
-            Task.title,
-            Task.status,
-            Task.priority,
-            Task.due_date,
-            Task.created_at
-        ).where(Task.user_id == user_id).order_by(
-            desc(Task.updated_at)
-        ).limit(limit)
-        
-        results = db.execute(query).all()
-        
-        return [
-            {
-                'id': str(row.id),
-                'title': row.title,
-                'status': row.status,
-                'priority': row.priority,
-                'due_date': row.due_date.isoformat() if row.due_date else None,
-                'created_at': row.created_at.isoformat()
-            }
-            for row in results
-        ]
-
-# 使用例とパフォーマンステスト
-def performance_comparison_example():
-    """
-    最適化前後のパフォーマンス比較例
-    """
-    
-    print("=== パフォーマンス比較 ===")
-    print("【最適化前】:")
-    print("- 100タスク取得: 101回のクエリ (N+1問題)")
-    print("- メモリ使用量: ~50MB")
-    print("- 実行時間: ~2秒")
-    
-    print("\n【最適化後】:")
-    print("- 100タスク取得: 3回のクエリ (joinedload使用)")
-    print("- メモリ使用量: ~15MB")
-    print("- 実行時間: ~0.3秒")
-    
-    print("\n【Railway無料プラン対応】:")
-    print("- 制限: 25タスク/ページ")
-    print("- メモリ使用量: ~5MB")
-    print("- 実行時間: ~0.1秒")
-
-if __name__ == "__main__":
-    performance_comparison_example()
\ No newline at end of file
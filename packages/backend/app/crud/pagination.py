@@ -0,0 +1,153 @@
+"""
+キーセット（カーソル）ページネーション
+
+OFFSET は読み飛ばす行数に比例して遅くなるため、ページの最後の行の
+(ソートキー, id) を不透明なカーソルとして返し、次のページはその続きから
+インデックスを使って読み始める。
+
+件数は COUNT(*) の代わりに、プランナがテーブル統計から見積もった行数
+（EXPLAIN の Plan Rows）を使うこともできる
+"""
+import base64
+import binascii
+import json
+import operator
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+
+class InvalidCursorError(ValueError):
+    """カーソルが不正（改ざん・別の一覧のカーソル）"""
+
+
+def _dump(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return "d:" + value.isoformat()
+    if isinstance(value, UUID):
+        return "u:" + str(value)
+    if isinstance(value, str):
+        return "s:" + value
+    return value
+
+
+def _load(value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    kind, _, raw = value.partition(":")
+    if kind == "d":
+        return datetime.fromisoformat(raw)
+    if kind == "u":
+        return UUID(raw)
+    if kind == "s":
+        return raw
+    raise ValueError(f"Unknown cursor value: {value}")
+
+
+def encode_cursor(kind: str, values: Sequence[Any]) -> str:
+    """一覧の種類とソートキーの値から不透明なカーソルを作成"""
+    payload = json.dumps({"k": kind, "v": [_dump(v) for v in values]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(kind: str, cursor: str, size: int) -> List[Any]:
+    """カーソルをソートキーの値に戻す（別の一覧のカーソルは InvalidCursorError）"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload.get("k") != kind or len(payload["v"]) != size:
+            raise ValueError("cursor does not belong to this listing")
+        return [_load(v) for v in payload["v"]]
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError) as e:
+        raise InvalidCursorError("Invalid pagination cursor") from e
+
+
+def keyset_condition(columns: Sequence[Any], values: Sequence[Any], descending: bool = True):
+    """
+    ソート順で values の行より後ろにある行の条件
+
+    (a, b) < (x, y) を a <= x AND (a < x OR (a = x AND b < y)) に展開し、
+    先頭列の範囲条件で (親ID, 先頭列) のインデックスから読み始められるようにする
+    """
+    after = operator.lt if descending else operator.gt
+    bound = operator.le if descending else operator.ge
+
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        equal_prefix = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal_prefix, after(column, value)))
+    return and_(bound(columns[0], values[0]), or_(*clauses))
+
+
+async def paginate(
+    db: AsyncSession,
+    statement,
+    columns: Sequence[Any],
+    kind: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    descending: bool = True,
+    skip: int = 0
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    キーセットで1ページ分を取得し、(行, 次のページのカーソル) を返す
+
+    Args:
+        statement: 絞り込み済みの select（ORDER BY / OFFSET / LIMIT は付けない）
+        columns: ソートキーの列（最後は一意になる id 列）
+        kind: カーソルを発行した一覧の識別子
+        limit: 1ページの件数
+        cursor: 前のページで返したカーソル（先頭ページは None）
+        descending: 降順で並べる場合は True
+        skip: カーソルが無い場合に読み飛ばす件数（ページ番号指定との互換用）
+    """
+    if cursor:
+        values = decode_cursor(kind, cursor, len(columns))
+        statement = statement.where(keyset_condition(columns, values, descending))
+    elif skip:
+        statement = statement.offset(skip)
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    # 次のページの有無を判定するため1件多く読む
+    result = await db.execute(statement.order_by(*order).limit(limit + 1))
+    rows = result.scalars().unique().all()
+
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(kind, [getattr(last, column.key) for column in columns])
+
+
+class _Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) <statement>（バインド変数は通常のクエリと同じく処理される）"""
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain)
+def _compile_explain(element: _Explain, compiler, **kw) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+async def estimate_count(db: AsyncSession, statement) -> int:
+    """
+    プランナの推定行数（テーブル統計に基づく概算の件数）
+
+    COUNT(*) と違い該当行を数えないため、件数が多くても一定時間で返る。
+    ANALYZE の頻度によっては実際の件数とずれる
+    """
+    result = await db.execute(_Explain(statement.order_by(None)))
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -6,7 +6,14 @@ import logging
 from starlette.middleware.base import BaseHTTPMiddleware
 
 from app.core.config import settings
+from app.core.database import dispose_engines, get_pool_metrics
+from app.core.http_client import close_http_client
+from app.core.redis_client import close_redis
 from app.api.v1.api import api_router
+from app.services.ai_response_cache import get_ai_cache_metrics
+from app.services.cache_cleanup import get_cleanup_metrics
+from app.services.cache_service import get_cache_stats
+from app.services.cache_warmup import cancel_all_cache_warmups
 
 # ロギング設定
 logging.basicConfig(level=logging.INFO)
@@ -37,6 +44,10 @@ async def lifespan(app: FastAPI):
     yield
     # 終了時の処理
     logger.info("Shutting down PMO Agent API...")
+    await cancel_all_cache_warmups()
+    await close_http_client()
+    await close_redis()
+    await dispose_engines()
 
 
 # FastAPIアプリケーションの作成
@@ -58,7 +69,7 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
         allow_headers=["Authorization", "Content-Type", "X-Requested-With"],
-        expose_headers=["X-Total-Count"],
+        expose_headers=["X-Total-Count", "ETag"],
         max_age=3600,
     )
 
@@ -76,6 +87,22 @@ async def health_check():
     }
 
 
+@app.get("/health/cache")
+async def cache_stats():
+    """キャッシュのネームスペース毎ヒット／ミス数（このプロセス分）、AI応答キャッシュのヒット率、クリーンアップ累計"""
+    return {
+        "namespaces": get_cache_stats(),
+        "ai": await get_ai_cache_metrics(),
+        "cleanup": await get_cleanup_metrics(),
+    }
+
+
+@app.get("/health/db")
+async def db_pool_stats():
+    """DBコネクションプールの役割毎の使用状況と接続取得待ち時間のヒストグラム（このプロセス分）"""
+    return {"pools": get_pool_metrics()}
+
+
 @app.get("/")
 async def root():
     """ルートエンドポイント"""
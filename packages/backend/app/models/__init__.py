@@ -2,4 +2,5 @@ from .user import User
 from .task import Task
 from .email import Email
 from .history import TaskHistory, AISupport
-from .chat import ChatThread, ChatMessage
\ No newline at end of file
+from .chat import ChatThread, ChatMessage
+from .dashboard_stats import UserDashboardStats, UserEmailDailyStats
\ No newline at end of file
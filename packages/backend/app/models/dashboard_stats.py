@@ -0,0 +1,42 @@
+from sqlmodel import Field, SQLModel
+from typing import Optional
+from datetime import date, datetime
+from uuid import UUID
+
+
+class UserDashboardStats(SQLModel, table=True):
+    """
+    ユーザー毎のダッシュボード集計テーブルモデル
+
+    件数はタスク・メールの書き込み時にトリガーで増減される
+    （alembic 004_user_dashboard_stats）
+    """
+    __tablename__ = "user_dashboard_stats"
+
+    user_id: UUID = Field(foreign_key="users.id", primary_key=True)
+
+    # タスク
+    total_tasks: int = 0
+    todo_count: int = 0
+    progress_count: int = 0
+    done_count: int = 0
+    overdue_count: int = 0
+    # 未完了タスクで次に期限を迎える日時（これを過ぎたら overdue_count を数え直す）
+    next_due_at: Optional[datetime] = None
+
+    # メール
+    total_emails: int = 0
+    task_emails: int = 0
+    analyzed_emails: int = 0
+
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    reconciled_at: Optional[datetime] = None  # 全件から数え直した日時
+
+
+class UserEmailDailyStats(SQLModel, table=True):
+    """ユーザー毎・日毎（email_date の UTC 日付）のメール件数テーブルモデル"""
+    __tablename__ = "user_email_daily_stats"
+
+    user_id: UUID = Field(foreign_key="users.id", primary_key=True)
+    day: date = Field(primary_key=True)
+    email_count: int = 0
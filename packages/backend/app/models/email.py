@@ -35,12 +35,18 @@ class EmailAccount(EmailAccountBase, table=True):
 
 
 class ProcessedEmail(SQLModel, table=True):
-    """処理済みメールテーブルモデル"""
+    """
+    処理済みメールテーブルモデル
+
+    email_date で月別に範囲パーティション化されている（alembic 005_time_partitioned_tables）。
+    DB 上の主キーは (id, email_date)。パーティションをまたぐ email_id の一意性は
+    ProcessedEmailKey で保証する
+    """
     __tablename__ = "processed_emails"
     
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     sync_job_id: UUID = Field(foreign_key="email_sync_jobs.id", index=True)
-    email_id: str = Field(unique=True, index=True)  # プロバイダー側のメールID
+    email_id: str = Field(index=True)  # プロバイダー側のメールID
     sender: str
     subject: str
     body_preview: Optional[str] = None
@@ -60,6 +66,20 @@ class ProcessedEmail(SQLModel, table=True):
     tasks: List["Task"] = Relationship(back_populates="source_email")
 
 
+class ProcessedEmailKey(SQLModel, table=True):
+    """
+    取り込み済みのプロバイダー側メールID（パーティション化していない重複排除用のテーブル）
+
+    processed_emails の一意制約はパーティションキー（email_date）を含める必要があり、
+    日時の取り方が異なる同期経路の間では重複を防げないため、email_id 単独で一意にする。
+    保持期間後にパーティションを削除しても残し、古いメールの再取り込みを防ぐ
+    """
+    __tablename__ = "processed_email_keys"
+    
+    email_id: str = Field(primary_key=True)  # プロバイダー側のメールID
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class EmailSyncJobStatus(str, Enum):
     """同期ジョブのステータス"""
     PENDING = "pending"
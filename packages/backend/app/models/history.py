@@ -15,7 +15,12 @@ class TaskAction(str, Enum):
 
 
 class TaskHistory(SQLModel, table=True):
-    """タスク履歴テーブルモデル"""
+    """
+    タスク履歴テーブルモデル
+
+    created_at で四半期別に範囲パーティション化されている（alembic 005_time_partitioned_tables）。
+    DB 上の主キーは (id, created_at)
+    """
     __tablename__ = "task_histories"
     
     id: UUID = Field(default_factory=uuid4, primary_key=True)
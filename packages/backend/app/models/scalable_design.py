@@ -7,6 +7,8 @@ from sqlalchemy import Index, text
 from typing import Dict, List
 import os
 
+from app.core.partitioning import PARTITIONED_TABLES
+
 class ScalableDBDesign:
     """
     段階的にスケールアップ可能なDB設計戦略
@@ -73,28 +75,12 @@ class ScalableDBDesign:
     def get_partitioning_strategy() -> Dict[str, str]:
         """
         データ量に応じたパーティショニング戦略
+        実装は alembic 005_time_partitioned_tables と app.crud.crud_partitions
+        （将来分の作成・期限切れ分の切り離しは celery beat の maintain_partitions）
         """
         return {
-            'processed_emails': '''
-            -- 月別パーティショニング（Pro tier以上）
-            CREATE TABLE processed_emails_y2025m01 PARTITION OF processed_emails
-            FOR VALUES FROM ('2025-01-01') TO ('2025-02-01');
-            
-            CREATE TABLE processed_emails_y2025m02 PARTITION OF processed_emails  
-            FOR VALUES FROM ('2025-02-01') TO ('2025-03-01');
-            ''',
-            
-            'task_histories': '''
-            -- 四半期別パーティショニング（Enterprise tier）
-            CREATE TABLE task_histories_2025q1 PARTITION OF task_histories
-            FOR VALUES FROM ('2025-01-01') TO ('2025-04-01');
-            ''',
-            
-            'openai_usage': '''
-            -- 月別パーティショニング（コスト分析効率化）
-            CREATE TABLE openai_usage_y2025m01 PARTITION OF openai_usage
-            FOR VALUES FROM ('2025-01-01') TO ('2025-02-01');
-            '''
+            table: f"-- {column} で{'四半期' if months == 3 else '月'}別の範囲パーティショニング"
+            for table, (column, months) in PARTITIONED_TABLES.items()
         }
 
 class PerformanceEvolutionPlan:
@@ -199,7 +185,7 @@ class MigrationReadinessChecker:
             'n_plus_1_resolved': True,  # ✅ joinedload 実装済み
             'caching_implemented': False,  # ❌ Redis導入が必要
             'monitoring_setup': False,   # ❌ APM導入が必要
-            'data_archiving': False,     # ❌ 古いデータ削除機能が必要
+            'data_archiving': True,      # ✅ パーティションの切り離しで古いデータを削除
             'backup_strategy': False,    # ❌ バックアップ戦略が必要
         }
 
@@ -34,6 +34,7 @@ class Task(TaskBase, table=True):
     
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     user_id: UUID = Field(foreign_key="users.id", index=True)
+    # processed_emails はパーティション化されているため DB 上の外部キー制約は無い（結合用の定義）
     source_email_id: Optional[UUID] = Field(default=None, foreign_key="processed_emails.id")
     source_email_link: Optional[str] = None
     email_summary: Optional[str] = None  # メール要約
@@ -12,6 +12,9 @@ Base = declarative_base()
 class OpenAIUsage(Base):
     """
     ユーザー別のOpenAI API使用量記録
+
+    created_at で月別に範囲パーティション化されている（alembic 005_time_partitioned_tables）。
+    DB 上の主キーは (id, created_at)
     """
     __tablename__ = "openai_usage"
     
@@ -65,36 +68,31 @@ class OpenAIUsage(Base):
         }
         
     @classmethod
-    def calculate_monthly_total(cls, user_id: str, year: int, month: int):
-        """指定月のユーザー使用量合計を計算"""
-        from sqlalchemy import func, extract
-        from app.core.database import get_db
+    async def calculate_monthly_total(cls, db, user_id: str, year: int, month: int):
+        """指定月のユーザー使用量合計を計算（db は AsyncSession）"""
+        from sqlalchemy import func, extract, select
+        
+        result = (await db.execute(select(
+            func.sum(cls.input_tokens).label('total_input_tokens'),
+            func.sum(cls.output_tokens).label('total_output_tokens'),
+            func.sum(cls.total_tokens).label('total_tokens'),
+            func.sum(cls.cost_usd).label('total_cost_usd'),
+            func.sum(cls.cost_jpy).label('total_cost_jpy'),
+            func.count(cls.id).label('request_count')
+        ).where(
+            cls.user_id == user_id,
+            extract('year', cls.created_at) == year,
+            extract('month', cls.created_at) == month
+        ))).first()
         
-        session = next(get_db())
-        try:
-            result = session.query(
-                func.sum(cls.input_tokens).label('total_input_tokens'),
-                func.sum(cls.output_tokens).label('total_output_tokens'),
-                func.sum(cls.total_tokens).label('total_tokens'),
-                func.sum(cls.cost_usd).label('total_cost_usd'),
-                func.sum(cls.cost_jpy).label('total_cost_jpy'),
-                func.count(cls.id).label('request_count')
-            ).filter(
-                cls.user_id == user_id,
-                extract('year', cls.created_at) == year,
-                extract('month', cls.created_at) == month
-            ).first()
-            
-            return {
-                "total_input_tokens": result.total_input_tokens or 0,
-                "total_output_tokens": result.total_output_tokens or 0,
-                "total_tokens": result.total_tokens or 0,
-                "total_cost_usd": round(result.total_cost_usd or 0.0, 6),
-                "total_cost_jpy": round(result.total_cost_jpy or 0.0, 2),
-                "request_count": result.request_count or 0
-            }
-        finally:
-            session.close()
+        return {
+            "total_input_tokens": result.total_input_tokens or 0,
+            "total_output_tokens": result.total_output_tokens or 0,
+            "total_tokens": result.total_tokens or 0,
+            "total_cost_usd": round(result.total_cost_usd or 0.0, 6),
+            "total_cost_jpy": round(result.total_cost_jpy or 0.0, 2),
+            "request_count": result.request_count or 0
+        }
 
 
 # User モデルにリレーションを追加する必要があります
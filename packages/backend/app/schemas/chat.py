@@ -49,6 +49,11 @@ class ChatThreadWithMessages(ChatThreadResponse):
     messages: List[ChatMessageResponse] = []
 
 
+class ChatMessagePage(BaseModel):
+    messages: List[ChatMessageResponse] = []
+    next_cursor: Optional[str] = None  # 次のページが無い場合は None
+
+
 class ChatSendMessageRequest(BaseModel):
     content: str
 
@@ -12,8 +12,13 @@ import re
 
 from app.core.config import settings
 from app.models.task import Task
+from app.services.ai_response_cache import AIResponseCache
 from app.services.cache_service import CacheService
 
+# プロンプトを変更したら上げる（古いキャッシュは使われなくなる）
+TASK_ANALYSIS_PROMPT_VERSION = "v1"
+MEETING_ACTIONS_PROMPT_VERSION = "v1"
+
 
 class EmailAnalyzer:
     """メール分析とタスク化サービス"""
@@ -298,9 +303,19 @@ class AIOptimizer:
     """コスト最適化されたAI処理サービス"""
     
     def __init__(self):
-        self.cache = CacheService()
         self.batch_size = 10  # バッチ処理のサイズ
         self.cache_ttl = 86400  # キャッシュ有効期限（1日）
+        # 入力内容のハッシュでキャッシュし、同時ミスでもAIは1回だけ呼ぶ
+        self.analysis_cache = AIResponseCache(
+            "ai:task_analysis",
+            ttl=self.cache_ttl,
+            stale_ttl=settings.AI_CACHE_STALE_TTL
+        )
+        self.meeting_cache = AIResponseCache(
+            "ai:meeting_actions",
+            ttl=self.cache_ttl * 7,  # 議事録は7日間キャッシュ
+            stale_ttl=settings.AI_CACHE_STALE_TTL
+        )
         
     async def batch_analyze_tasks(
         self, 
@@ -311,36 +326,30 @@ class AIOptimizer:
         複数タスクをバッチで分析（コスト削減）
         10タスクを1回のAPIコールで処理
         """
-        # キャッシュキーの生成
-        cache_key = self._generate_cache_key(tasks, analysis_type)
-        
-        # キャッシュチェック
-        if cached := await self.cache.get(cache_key):
-            return json.loads(cached)
-        
-        # バッチ処理用のプロンプト作成
-        batches = [
-            tasks[i:i + self.batch_size] 
-            for i in range(0, len(tasks), self.batch_size)
-        ]
-        
-        results = []
-        for batch in batches:
-            # 1回のAPIコールで複数タスクを処理
-            batch_result = await self._analyze_batch(batch, analysis_type)
-            results.extend(batch_result)
+        async def analyze() -> str:
+            # バッチ処理用のプロンプト作成
+            batches = [
+                tasks[i:i + self.batch_size] 
+                for i in range(0, len(tasks), self.batch_size)
+            ]
             
-            # レート制限対策
-            await asyncio.sleep(0.5)
-        
-        # 結果をキャッシュ
-        await self.cache.set(
-            cache_key, 
-            json.dumps(results), 
-            expire=self.cache_ttl
-        )
-        
-        return results
+            results = []
+            for batch in batches:
+                # 1回のAPIコールで複数タスクを処理
+                batch_result = await self._analyze_batch(batch, analysis_type)
+                results.extend(batch_result)
+                
+                # レート制限対策
+                await asyncio.sleep(0.5)
+            
+            return json.dumps(results)
+        
+        # 同じ内容のタスクを分析済みならそのまま返し、ミス時は1回だけ分析して保存
+        return json.loads(await self.analysis_cache.get_or_compute(
+            self._task_analysis_input(tasks, analysis_type),
+            analyze,
+            template_version=TASK_ANALYSIS_PROMPT_VERSION
+        ))
     
     async def smart_task_prioritization(
         self, 
@@ -401,28 +410,22 @@ class AIOptimizer:
         議事録からアクションアイテムを抽出
         同じテキストは再処理しない（キャッシュ活用）
         """
-        if use_cache:
-            text_hash = hashlib.md5(meeting_text.encode()).hexdigest()
-            cache_key = f"meeting_actions:{text_hash}"
+        async def extract() -> str:
+            # プロンプトの最適化（トークン数削減）
+            condensed_text = self._condense_text(meeting_text, max_chars=2000)
             
-            if cached := await self.cache.get(cache_key):
-                return json.loads(cached)
-        
-        # プロンプトの最適化（トークン数削減）
-        condensed_text = self._condense_text(meeting_text, max_chars=2000)
-        
-        # AI処理（実際の実装では適切なAIサービスを呼び出し）
-        actions = await self._extract_actions_from_text(condensed_text)
-        
-        # キャッシュ保存
-        if use_cache:
-            await self.cache.set(
-                cache_key,
-                json.dumps(actions),
-                expire=self.cache_ttl * 7  # 議事録は7日間キャッシュ
-            )
-        
-        return actions
+            # AI処理（実際の実装では適切なAIサービスを呼び出し）
+            actions = await self._extract_actions_from_text(condensed_text)
+            return json.dumps(actions)
+        
+        if not use_cache:
+            return json.loads(await extract())
+        
+        return json.loads(await self.meeting_cache.get_or_compute(
+            meeting_text,
+            extract,
+            template_version=MEETING_ACTIONS_PROMPT_VERSION
+        ))
     
     async def generate_weekly_summary(
         self,
@@ -451,15 +454,29 @@ class AIOptimizer:
         
         return basic_summary
     
-    def _generate_cache_key(
+    def _task_analysis_input(
         self, 
         tasks: List[Task], 
         analysis_type: str
-    ) -> str:
-        """キャッシュキーの生成"""
-        task_ids = sorted([str(t.id) for t in tasks])
-        key_string = f"{analysis_type}:{':'.join(task_ids)}"
-        return hashlib.md5(key_string.encode()).hexdigest()
+    ) -> Dict[str, Any]:
+        """キャッシュキー用の分析入力（タスクの編集で変わる内容を含める）"""
+        return {
+            "analysis_type": analysis_type,
+            "tasks": sorted(
+                (
+                    {
+                        "id": str(t.id),
+                        "title": t.title,
+                        "description": t.description,
+                        "status": t.status,
+                        "priority": t.priority,
+                        "due_date": t.due_date.isoformat() if t.due_date else None,
+                    }
+                    for t in tasks
+                ),
+                key=lambda t: t["id"]
+            ),
+        }
     
     def _condense_text(self, text: str, max_chars: int) -> str:
         """テキストの圧縮（トークン削減）"""
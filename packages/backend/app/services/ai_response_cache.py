@@ -0,0 +1,227 @@
+"""
+AI応答のコンテンツアドレス型キャッシュ
+
+モデル名・プロンプトテンプレートのバージョン・正規化した入力のハッシュをキーに
+AIの応答を保存し、同じ内容の再分析（リトライ・再同期）ではAIを呼ばない。
+テンプレートを変更した場合はバージョンを上げれば古い応答は使われなくなる。
+
+near_duplicate を有効にすると、文字 n-gram の SimHash が近い（ハミング距離が
+max_distance 以下の）入力の応答も再利用する。SimHash は 16 ビット×4 のバンドに
+分けて索引するため、距離3以下の候補はいずれかのバンドが必ず一致する
+"""
+import hashlib
+import json
+import logging
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.services.cache_service import SingleFlightCache
+
+logger = logging.getLogger(__name__)
+
+# ネームスペース毎の exact_hits / near_hits / misses（全プロセス合算）
+METRICS_KEY = "ai_cache:metrics"
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+SHINGLE_SIZE = 3
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_input(content: Any) -> str:
+    """
+    入力を正規化（NFKC・空白の畳み込み）
+
+    dict / list はキー順を固定した JSON にしてから正規化する
+    """
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False, sort_keys=True, default=str)
+    text = unicodedata.normalize("NFKC", content)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def content_digest(
+    normalized: str,
+    model: str,
+    template_version: str,
+    scope: str = ""
+) -> str:
+    """モデル・テンプレートのバージョン・scope・正規化済み入力からキャッシュキーを作成"""
+    source = "\x1f".join([model, template_version, scope, normalized])
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def simhash(text: str, shingle_size: int = SHINGLE_SIZE) -> int:
+    """
+    文字 n-gram の SimHash（64ビット）
+
+    日本語は単語区切りが無いため、単語ではなく文字単位のシングルを使う
+    """
+    shingles = Counter(
+        text[i:i + shingle_size] for i in range(max(1, len(text) - shingle_size + 1))
+    )
+    weights = [0] * SIMHASH_BITS
+    for shingle, count in shingles.items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if h >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def _bands(signature: int) -> List[int]:
+    width = SIMHASH_BITS // SIMHASH_BANDS
+    mask = (1 << width) - 1
+    return [(signature >> (i * width)) & mask for i in range(SIMHASH_BANDS)]
+
+
+class AIResponseCache:
+    """
+    AI応答キャッシュ（同時ミスの重複呼び出し防止・stale-while-revalidate 付き）
+
+    使用例:
+        cache = AIResponseCache("ai:thread_analysis", ttl=86400)
+        text = await cache.get_or_compute(prompt, call_model, model="gpt-5-mini", template_version="v1")
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: int,
+        stale_ttl: int = 0,
+        near_duplicate: Optional[bool] = None,
+        max_distance: Optional[int] = None
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.near_duplicate = (
+            settings.AI_CACHE_NEAR_DUPLICATE if near_duplicate is None else near_duplicate
+        )
+        self.max_distance = (
+            settings.AI_CACHE_SIMHASH_MAX_DISTANCE if max_distance is None else max_distance
+        )
+        self._cache = SingleFlightCache(namespace, ttl=ttl, stale_ttl=stale_ttl)
+
+    async def get_or_compute(
+        self,
+        content: Any,
+        compute: Callable[[], Awaitable[str]],
+        model: str = "",
+        template_version: str = "",
+        scope: Optional[str] = None
+    ) -> str:
+        """
+        同じ入力の応答があれば返し、無ければ compute を1回だけ呼んで保存する
+
+        Args:
+            content: AIに渡す入力（プロンプト文字列、または dict / list）
+            compute: AIを呼び出して応答文字列を返すコルーチン関数
+            model: モデル名
+            template_version: プロンプトテンプレートのバージョン
+            scope: キャッシュの共有範囲（ユーザーIDなど）。近似一致は scope の指定時のみ行う
+                （近似一致で得た応答も scope 内にだけ保存され、他のユーザーには返らない）
+        """
+        normalized = normalize_input(content)
+        digest = content_digest(normalized, model, template_version, scope or "")
+        use_near = self.near_duplicate and scope is not None
+        outcome = "exact_hits"
+
+        async def tracked_compute() -> str:
+            nonlocal outcome
+            signature = simhash(normalized) if use_near else None
+            if signature is not None:
+                value = await self._find_near_duplicate(
+                    signature, self._index_scope(model, template_version, scope)
+                )
+                if value is not None:
+                    outcome = "near_hits"
+                    return value
+
+            outcome = "misses"
+            value = await compute()
+            if signature is not None:
+                await self._index(
+                    signature, digest, self._index_scope(model, template_version, scope)
+                )
+            return value
+
+        value = await self._cache.get_or_compute(digest, tracked_compute)
+        await self._record(outcome)
+        return value
+
+    def _index_scope(self, model: str, template_version: str, scope: str) -> str:
+        """近似一致はモデル・テンプレート・scope が同じ入力の間でのみ行う"""
+        source = "\x1f".join([model, template_version, scope])
+        return hashlib.sha256(source.encode()).hexdigest()[:16]
+
+    def _band_key(self, index_scope: str, band: int, value: int) -> str:
+        return f"{self.namespace}:simhash:{index_scope}:{band}:{value:04x}"
+
+    async def _find_near_duplicate(self, signature: int, index_scope: str) -> Optional[str]:
+        """SimHash の近い入力の応答を探す"""
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                for band, value in enumerate(_bands(signature)):
+                    pipe.smembers(self._band_key(index_scope, band, value))
+                members = set().union(*await pipe.execute())
+        except redis.RedisError as e:
+            logger.warning(f"AI cache near-duplicate lookup error: {e}")
+            return None
+
+        candidates = []
+        for member in members:
+            digest, _, other = member.partition(":")
+            distance = bin(signature ^ int(other, 16)).count("1")
+            if distance <= self.max_distance:
+                candidates.append((distance, digest))
+
+        for _, digest in sorted(candidates):
+            value = await self._cache.get(digest)
+            if value is not None:
+                return value
+        return None
+
+    async def _index(self, signature: int, digest: str, index_scope: str) -> None:
+        """AIを呼んで得た応答の SimHash を索引に登録"""
+        member = f"{digest}:{signature:016x}"
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                for band, value in enumerate(_bands(signature)):
+                    key = self._band_key(index_scope, band, value)
+                    pipe.sadd(key, member)
+                    pipe.expire(key, self.ttl + self.stale_ttl)
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"AI cache index error: {e}")
+
+    async def _record(self, outcome: str) -> None:
+        try:
+            await get_redis().hincrby(METRICS_KEY, f"{self.namespace}:{outcome}", 1)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to record AI cache metrics: {e}")
+
+
+async def get_ai_cache_metrics() -> Dict[str, Dict[str, Any]]:
+    """ネームスペース毎のヒット数・ミス数・ヒット率を取得"""
+    raw = await get_redis().hgetall(METRICS_KEY)
+
+    metrics: Dict[str, Dict[str, Any]] = {}
+    for field, value in raw.items():
+        namespace, _, name = field.rpartition(":")
+        metrics.setdefault(
+            namespace, {"exact_hits": 0, "near_hits": 0, "misses": 0}
+        )[name] = int(value)
+
+    for counts in metrics.values():
+        total = counts["exact_hits"] + counts["near_hits"] + counts["misses"]
+        counts["hit_rate"] = (
+            round((counts["exact_hits"] + counts["near_hits"]) / total, 4) if total else 0.0
+        )
+    return metrics
@@ -0,0 +1,163 @@
+"""
+キャッシュクリーンアップ
+
+SCAN カーソルでキャッシュのネームスペースを少しずつ走査し、
+有効期限の無いキーを削除する。1回の実行は時間とキー数の予算内で打ち切り、
+カーソルを Redis に保存して次回の実行で続きから再開する。
+
+Celery のブローカーと同じ Redis を使うため、KEYS のような
+全件走査で Redis を止めないことを優先する
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# クリーンアップ対象のネームスペース（キーは "{namespace}:*"）
+CLEANUP_NAMESPACES = (
+    "email:msg",
+    "email:msgs",
+    "email:sync_token",
+)
+
+# ネームスペース毎の SCAN カーソル
+CURSOR_KEY = "cache_cleanup:cursor"
+# ネームスペース毎の累計削除数・解放バイト数
+METRICS_KEY = "cache_cleanup:metrics"
+
+
+class CacheCleanupEngine:
+    """予算付きのインクリメンタルなキャッシュクリーンアップ"""
+
+    def __init__(
+        self,
+        namespaces: Sequence[str] = CLEANUP_NAMESPACES,
+        time_budget: Optional[float] = None,
+        key_budget: Optional[int] = None,
+        scan_count: Optional[int] = None
+    ):
+        self.namespaces = namespaces
+        self.time_budget = time_budget or settings.CACHE_CLEANUP_TIME_BUDGET
+        self.key_budget = key_budget or settings.CACHE_CLEANUP_KEY_BUDGET
+        self.scan_count = scan_count or settings.CACHE_CLEANUP_SCAN_COUNT
+
+    @property
+    def redis(self) -> redis.Redis:
+        return get_redis()
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        予算の範囲でクリーンアップを1回実行する
+
+        Returns:
+            ネームスペース毎の走査数・削除数・解放バイト数と、
+            走査が一巡したか（pass_completed）
+        """
+        deadline = time.monotonic() + self.time_budget
+        remaining_keys = self.key_budget
+        cursors = await self.redis.hgetall(CURSOR_KEY)
+
+        report: Dict[str, Dict[str, Any]] = {}
+        for namespace in self.namespaces:
+            if remaining_keys <= 0 or time.monotonic() >= deadline:
+                break
+
+            stats = await self._scan_namespace(
+                namespace,
+                int(cursors.get(namespace, 0)),
+                deadline,
+                remaining_keys
+            )
+            remaining_keys -= stats["scanned"]
+            report[namespace] = stats
+
+        await self._record_metrics(report)
+        return report
+
+    async def _scan_namespace(
+        self,
+        namespace: str,
+        cursor: int,
+        deadline: float,
+        key_budget: int
+    ) -> Dict[str, Any]:
+        """保存済みカーソルから予算内で走査し、カーソルを保存する"""
+        stats = {"scanned": 0, "deleted": 0, "reclaimed_bytes": 0, "pass_completed": False}
+
+        while True:
+            cursor, keys = await self.redis.scan(
+                cursor, match=f"{namespace}:*", count=self.scan_count
+            )
+            stats["scanned"] += len(keys)
+
+            if keys:
+                deleted, reclaimed = await self._delete_keys_without_ttl(keys)
+                stats["deleted"] += deleted
+                stats["reclaimed_bytes"] += reclaimed
+
+            if cursor == 0:
+                stats["pass_completed"] = True
+                break
+            if stats["scanned"] >= key_budget or time.monotonic() >= deadline:
+                break
+
+            # 他のタスクにイベントループを譲る
+            await asyncio.sleep(0)
+
+        if stats["pass_completed"]:
+            await self.redis.hdel(CURSOR_KEY, namespace)
+        else:
+            await self.redis.hset(CURSOR_KEY, namespace, cursor)
+
+        return stats
+
+    async def _delete_keys_without_ttl(self, keys: Sequence[str]) -> Tuple[int, int]:
+        """有効期限の無いキーを UNLINK し、(削除数, 解放バイト数) を返す"""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.ttl(key)
+            ttls = await pipe.execute()
+
+        targets = [key for key, ttl in zip(keys, ttls) if ttl == -1]
+        if not targets:
+            return 0, 0
+
+        # 削除前にサイズを計測し、UNLINK でメモリ解放をバックグラウンドに回す
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in targets:
+                pipe.memory_usage(key)
+            pipe.unlink(*targets)
+            *sizes, deleted = await pipe.execute()
+
+        return deleted, sum(size or 0 for size in sizes)
+
+    async def _record_metrics(self, report: Dict[str, Dict[str, Any]]) -> None:
+        """ネームスペース毎の累計を加算"""
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for namespace, stats in report.items():
+                    pipe.hincrby(METRICS_KEY, f"{namespace}:deleted_keys", stats["deleted"])
+                    pipe.hincrby(
+                        METRICS_KEY, f"{namespace}:reclaimed_bytes", stats["reclaimed_bytes"]
+                    )
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Failed to record cache cleanup metrics: {e}")
+
+
+async def get_cleanup_metrics() -> Dict[str, Dict[str, int]]:
+    """ネームスペース毎の累計削除数・解放バイト数を取得"""
+    raw = await get_redis().hgetall(METRICS_KEY)
+
+    metrics: Dict[str, Dict[str, int]] = {}
+    for field, value in raw.items():
+        namespace, _, name = field.rpartition(":")
+        metrics.setdefault(namespace, {})[name] = int(value)
+    return metrics
@@ -0,0 +1,156 @@
+"""
+キャッシュ用コーデック
+キャッシュ値をバイナリ形式（msgpack / orjson / json）にシリアライズし、
+一定サイズ以上の場合のみ圧縮（zstd / lz4 / zlib）する
+
+先頭2バイトにシリアライザと圧縮方式を記録するため、
+設定を変更しても既存のキャッシュ値はそのまま読み出せる
+"""
+import json
+import logging
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:  # 任意依存
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # 任意依存
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # 任意依存
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # 任意依存
+    lz4_frame = None
+
+# ヘッダー1バイト目: シリアライザ
+SERIALIZER_MSGPACK = b"m"
+SERIALIZER_JSON = b"j"  # orjson の出力も JSON なので共通
+
+# ヘッダー2バイト目: 圧縮方式
+COMPRESSION_NONE = b"n"
+COMPRESSION_ZSTD = b"z"
+COMPRESSION_LZ4 = b"l"
+COMPRESSION_ZLIB = b"d"
+
+
+def _json_dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=str)
+    return json.dumps(value, default=str, separators=(",", ":")).encode()
+
+
+def _json_loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _compressors() -> Dict[bytes, Tuple[Optional[Callable], Optional[Callable]]]:
+    """圧縮方式毎の (圧縮, 展開) 関数。未インストールのものは None"""
+    return {
+        COMPRESSION_ZSTD: (
+            zstandard.ZstdCompressor(level=3).compress if zstandard else None,
+            zstandard.ZstdDecompressor().decompress if zstandard else None,
+        ),
+        COMPRESSION_LZ4: (
+            lz4_frame.compress if lz4_frame else None,
+            lz4_frame.decompress if lz4_frame else None,
+        ),
+        COMPRESSION_ZLIB: (zlib.compress, zlib.decompress),
+    }
+
+
+class CacheCodec:
+    """
+    キャッシュ値のエンコード／デコード
+
+    serializer: "msgpack" / "json"（json は orjson があれば使用）
+    compression: "zstd" / "lz4" / "zlib" / "none"
+    指定したライブラリが無い場合は json / zlib にフォールバックする
+    """
+
+    def __init__(
+        self,
+        serializer: Optional[str] = None,
+        compression: Optional[str] = None,
+        compress_min_bytes: Optional[int] = None
+    ):
+        serializer = serializer or settings.CACHE_CODEC
+        compression = compression or settings.CACHE_COMPRESSION
+        self.compress_min_bytes = (
+            compress_min_bytes
+            if compress_min_bytes is not None
+            else settings.CACHE_COMPRESSION_MIN_BYTES
+        )
+
+        if serializer == "msgpack" and msgpack is None:
+            logger.warning("msgpack is not installed, falling back to JSON cache codec")
+            serializer = "json"
+        self.serializer = SERIALIZER_MSGPACK if serializer == "msgpack" else SERIALIZER_JSON
+
+        self._codecs = _compressors()
+        self.compression = {
+            "zstd": COMPRESSION_ZSTD,
+            "lz4": COMPRESSION_LZ4,
+            "zlib": COMPRESSION_ZLIB,
+        }.get(compression, COMPRESSION_NONE)
+        if self.compression != COMPRESSION_NONE and self._codecs[self.compression][0] is None:
+            logger.warning(f"{compression} is not installed, falling back to zlib compression")
+            self.compression = COMPRESSION_ZLIB
+
+    def encode(self, value: Any) -> bytes:
+        """値をヘッダー付きバイト列に変換"""
+        if self.serializer == SERIALIZER_MSGPACK:
+            payload = msgpack.packb(value, use_bin_type=True, default=str)
+        else:
+            payload = _json_dumps(value)
+
+        compression = COMPRESSION_NONE
+        if self.compression != COMPRESSION_NONE and len(payload) >= self.compress_min_bytes:
+            compressed = self._codecs[self.compression][0](payload)
+            # 圧縮で小さくならない場合はそのまま保存
+            if len(compressed) < len(payload):
+                payload = compressed
+                compression = self.compression
+
+        return self.serializer + compression + payload
+
+    def decode(self, data: Optional[bytes]) -> Any:
+        """encode したバイト列を値に戻す（形式が不明な場合は None）"""
+        if not data or len(data) < 2:
+            return None
+
+        serializer, compression, payload = data[:1], data[1:2], data[2:]
+        try:
+            if compression != COMPRESSION_NONE:
+                decompress = self._codecs.get(compression, (None, None))[1]
+                if decompress is None:
+                    return None
+                payload = decompress(payload)
+
+            if serializer == SERIALIZER_MSGPACK:
+                if msgpack is None:
+                    return None
+                return msgpack.unpackb(payload, raw=False)
+            if serializer == SERIALIZER_JSON:
+                return _json_loads(payload)
+        except Exception as e:
+            logger.warning(f"Failed to decode cache value: {e}")
+        return None
+
+
+# 設定値に基づく既定のコーデック（フォールバック警告をプロセス毎に1回に抑える）
+cache_codec = CacheCodec()
@@ -1,57 +1,636 @@
 """
 キャッシュサービス
 Redis を使用した効率的なキャッシュ管理
+
+LayeredCache はプロセス内LRU（L1）と Redis（L2）の2層構成で、
+削除は Redis Pub/Sub で全プロセス（APIワーカー / Celeryワーカー）の L1 に伝播する
 """
-import redis
+import asyncio
 import json
-from typing import Optional, Any
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import redis.asyncio as redis
+
 from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# タグ毎のバージョン（書き込み時にランダムな値へ更新する）
+TAG_VERSION_KEY = "cache:tag:{tag}"
+
+# 他プロセスが計算中の結果を待つ際のポーリング間隔（秒）
+LEASE_POLL_INTERVAL = 0.2
+
+# 自分が取得したリースのみ解放する（期限切れ後に他プロセスが取り直した場合に備える）
+_RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# 自プロセスが発行した無効化メッセージを識別するためのID（fork した子プロセスでは再生成する）
+_PROCESS_ID = uuid.uuid4().hex
 
 
 class CacheService:
-    """Redisキャッシュサービス"""
-    
-    def __init__(self):
-        self.redis_client = redis.Redis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            db=0,
-            decode_responses=True
-        )
-        
+    """Redisキャッシュサービス（プロセス共有のコネクションプールを使用）"""
+
+    @property
+    def redis_client(self) -> redis.Redis:
+        """共有プールのクライアント（イベントループ毎に再作成される）"""
+        return get_redis()
+
     async def get(self, key: str) -> Optional[str]:
         """キャッシュから値を取得"""
         try:
-            return self.redis_client.get(key)
-        except Exception as e:
-            print(f"Cache get error: {e}")
+            return await self.redis_client.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Cache get error: {e}")
             return None
-    
+
     async def set(
-        self, 
-        key: str, 
-        value: str, 
+        self,
+        key: str,
+        value: str,
         expire: int = 3600
     ) -> bool:
         """キャッシュに値を設定"""
         try:
-            return self.redis_client.setex(key, expire, value)
-        except Exception as e:
-            print(f"Cache set error: {e}")
+            return bool(await self.redis_client.setex(key, expire, value))
+        except redis.RedisError as e:
+            logger.warning(f"Cache set error: {e}")
             return False
-    
+
     async def delete(self, key: str) -> bool:
         """キャッシュから削除"""
         try:
-            return bool(self.redis_client.delete(key))
-        except Exception as e:
-            print(f"Cache delete error: {e}")
+            return bool(await self.redis_client.delete(key))
+        except redis.RedisError as e:
+            logger.warning(f"Cache delete error: {e}")
             return False
-    
+
     async def exists(self, key: str) -> bool:
         """キーの存在確認"""
         try:
-            return bool(self.redis_client.exists(key))
-        except Exception as e:
-            print(f"Cache exists error: {e}")
-            return False
\ No newline at end of file
+            return bool(await self.redis_client.exists(key))
+        except redis.RedisError as e:
+            logger.warning(f"Cache exists error: {e}")
+            return False
+
+    async def mget(self, keys: List[str]) -> Dict[str, Optional[str]]:
+        """複数キーを1往復で取得"""
+        if not keys:
+            return {}
+        try:
+            values = await self.redis_client.mget(keys)
+            return dict(zip(keys, values))
+        except redis.RedisError as e:
+            logger.warning(f"Cache mget error: {e}")
+            return {key: None for key in keys}
+
+    async def mset(self, mapping: Dict[str, str], expire: int = 3600) -> bool:
+        """複数キーを有効期限付きで1往復で設定"""
+        if not mapping:
+            return True
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, value in mapping.items():
+                    pipe.setex(key, expire, value)
+                await pipe.execute()
+            return True
+        except redis.RedisError as e:
+            logger.warning(f"Cache mset error: {e}")
+            return False
+
+    async def delete_many(self, keys: List[str]) -> int:
+        """複数キーを1往復で削除"""
+        if not keys:
+            return 0
+        try:
+            return await self.redis_client.delete(*keys)
+        except redis.RedisError as e:
+            logger.warning(f"Cache delete error: {e}")
+            return 0
+
+    def pipeline(self, transaction: bool = False) -> redis.client.Pipeline:
+        """
+        任意のコマンドをまとめて送るパイプラインを取得
+
+        使用例:
+            async with cache.pipeline() as pipe:
+                pipe.get("a").incr("b")
+                results = await pipe.execute()
+        """
+        return self.redis_client.pipeline(transaction=transaction)
+
+
+class LocalLRUCache:
+    """
+    TTL付きのプロセス内LRUキャッシュ
+
+    件数が上限を超えた場合は最も長く参照されていないエントリから追い出す
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        """有効期限内の値を取得（参照したエントリを末尾へ移動）"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        """値を保存し、上限を超えた分を古い順に追い出す"""
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# プロセス内で全ネームスペースが共有するL1
+_local_cache = LocalLRUCache(settings.CACHE_L1_MAX_ENTRIES)
+
+# ネームスペース毎のヒット／ミス数
+_cache_stats: Dict[str, Dict[str, int]] = defaultdict(
+    lambda: {"l1_hits": 0, "l2_hits": 0, "misses": 0}
+)
+
+_listener_task: Optional[asyncio.Task] = None
+_listener_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_cache_stats() -> Dict[str, Dict[str, int]]:
+    """ネームスペース毎のL1/L2ヒット数とミス数を取得"""
+    return {namespace: dict(counts) for namespace, counts in _cache_stats.items()}
+
+
+def _reset_after_fork() -> None:
+    """
+    fork した子プロセス（Celery prefork の worker など）の状態を初期化する
+
+    発行元IDが親・兄弟プロセスと同じままだと互いの無効化メッセージを自分のものとして
+    無視してしまうため作り直す。引き継いだL1は購読開始までの無効化を受け取れないため破棄する
+    """
+    global _PROCESS_ID
+    _PROCESS_ID = uuid.uuid4().hex
+    _local_cache.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _apply_invalidation(message: Dict[str, str]) -> None:
+    """受信した無効化メッセージをL1に反映"""
+    if message.get("origin") != _PROCESS_ID and "key" in message:
+        _local_cache.delete(message["key"])
+
+
+async def _listen_for_invalidations() -> None:
+    """
+    無効化チャネルを購読してL1から該当キーを削除する
+
+    購読が切れていた間のメッセージは受け取れないため、
+    再接続時にはL1全体を破棄する
+    """
+    while True:
+        pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    _apply_invalidation(json.loads(message["data"]))
+                except (TypeError, ValueError):
+                    logger.warning(f"Invalid cache invalidation message: {message['data']!r}")
+        except asyncio.CancelledError:
+            raise
+        except redis.RedisError as e:
+            logger.warning(f"Cache invalidation subscriber disconnected: {e}")
+        finally:
+            try:
+                await pubsub.aclose()
+            except redis.RedisError:
+                pass
+
+        _local_cache.clear()
+        await asyncio.sleep(1)
+
+
+def _ensure_invalidation_listener() -> None:
+    """実行中のイベントループに購読タスクが無ければ起動"""
+    global _listener_task, _listener_loop
+
+    loop = asyncio.get_running_loop()
+    if _listener_task is not None and not _listener_task.done() and _listener_loop is loop:
+        return
+
+    # ループが変わった場合、旧ループの間に届いた無効化は受け取れていない
+    if _listener_loop is not None and _listener_loop is not loop:
+        _local_cache.clear()
+
+    _listener_task = loop.create_task(_listen_for_invalidations())
+    _listener_loop = loop
+
+
+class LayeredCache:
+    """
+    L1（プロセス内LRU）+ L2（Redis）の2層キャッシュ
+
+    Redis のキーは "{namespace}:{key}"。L1 の有効期限は L2 より短く保ち、
+    無効化メッセージを取りこぼした場合でも古い値が残り続けないようにする
+
+    使用例:
+        tokens = LayeredCache("email:sync_token")
+        await tokens.set(account_id, history_id, expire=86400)
+        await tokens.get(account_id)
+        await tokens.delete(account_id)  # 全プロセスのL1から削除される
+    """
+
+    def __init__(self, namespace: str, l1_ttl: Optional[int] = None):
+        self.namespace = namespace
+        self.l1_ttl = l1_ttl if l1_ttl is not None else settings.CACHE_L1_TTL
+        self.enabled = settings.CACHE_L1_ENABLED
+        self._stats = _cache_stats[namespace]
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Optional[str]:
+        """L1 → L2 の順に取得し、L2 でヒットした値は L1 に載せる"""
+        full_key = self._key(key)
+
+        if self.enabled:
+            _ensure_invalidation_listener()
+            value = _local_cache.get(full_key)
+            if value is not None:
+                self._stats["l1_hits"] += 1
+                return value
+
+        try:
+            value = await get_redis().get(full_key)
+        except redis.RedisError as e:
+            logger.warning(f"Cache get error: {e}")
+            value = None
+
+        if value is None:
+            self._stats["misses"] += 1
+            return None
+
+        self._stats["l2_hits"] += 1
+        if self.enabled:
+            _local_cache.set(full_key, value, self.l1_ttl)
+        return value
+
+    async def set(self, key: str, value: str, expire: int = 3600) -> bool:
+        """L2 に書き込んだ後、他プロセスの L1 を無効化して自プロセスの L1 を更新"""
+        full_key = self._key(key)
+        try:
+            await get_redis().setex(full_key, expire, value)
+        except redis.RedisError as e:
+            logger.warning(f"Cache set error: {e}")
+            _local_cache.delete(full_key)
+            return False
+
+        await self._publish({"key": full_key})
+        if self.enabled:
+            _local_cache.set(full_key, value, min(self.l1_ttl, expire))
+        return True
+
+    async def delete(self, key: str) -> bool:
+        """L2 と全プロセスの L1 から削除"""
+        full_key = self._key(key)
+        _local_cache.delete(full_key)
+        try:
+            deleted = bool(await get_redis().delete(full_key))
+        except redis.RedisError as e:
+            logger.warning(f"Cache delete error: {e}")
+            deleted = False
+
+        await self._publish({"key": full_key})
+        return deleted
+
+    async def _publish(self, message: Dict[str, str]) -> None:
+        """無効化メッセージを全プロセスへ配信"""
+        message["origin"] = _PROCESS_ID
+        try:
+            await get_redis().publish(INVALIDATION_CHANNEL, json.dumps(message))
+        except redis.RedisError as e:
+            logger.warning(f"Cache invalidation publish error: {e}")
+
+
+# プロセス内で実行中の再計算（キー毎に1つ）
+_inflight: Dict[str, asyncio.Task] = {}
+
+
+class SingleFlightCache:
+    """
+    キャッシュスタンピード対策付きキャッシュ
+
+    同じキーのミスが同時に発生しても計算は1回だけ行う。
+    プロセス内は実行中タスクの共有、プロセス間は Redis のリース（SET NX EX）で排他し、
+    リースを取れなかった側は結果がキャッシュに載るのを待つ。
+
+    有効期限切れから stale_ttl 秒の間は古い値をそのまま返し、
+    裏で1ワーカーだけが再計算する（stale-while-revalidate）
+
+    使用例:
+        cache = SingleFlightCache("ai:meeting_actions", ttl=86400, stale_ttl=3600)
+        value = await cache.get_or_compute(text_hash, compute)  # compute は str を返すコルーチン関数
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: int,
+        stale_ttl: int = 0,
+        lease_seconds: Optional[int] = None
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.lease_seconds = lease_seconds or settings.CACHE_LEASE_SECONDS
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[str]]
+    ) -> str:
+        """キャッシュ済みの値を返し、無ければ1回だけ計算して保存する"""
+        full_key = self._key(key)
+
+        entry = await self._load(full_key)
+        if entry is not None:
+            value, fresh_until = entry
+            if fresh_until > time.time():
+                return value
+
+            # 期限切れ直後は古い値を返し、再計算は裏で行う
+            self._start_compute(full_key, compute, wait_for_lease=False)
+            return value
+
+        # 呼び出し元がキャンセルされても、同じ結果を待つ他の呼び出しのために計算は続ける
+        value = await asyncio.shield(
+            self._start_compute(full_key, compute, wait_for_lease=True)
+        )
+        if value is None:
+            # 古い値の裏での再計算（他プロセスに委譲済み）と合流した場合
+            value = await self._compute_with_lease(full_key, compute, wait_for_lease=True)
+        return value
+
+    async def get(self, key: str) -> Optional[str]:
+        """保存済みの値を鮮度に関わらず取得（無ければ None）"""
+        entry = await self._load(self._key(key))
+        return entry[0] if entry is not None else None
+
+    def _start_compute(
+        self,
+        full_key: str,
+        compute: Callable[[], Awaitable[str]],
+        wait_for_lease: bool
+    ) -> asyncio.Task:
+        """同じキーの計算が実行中ならそれを共有し、無ければ開始する"""
+        loop = asyncio.get_running_loop()
+        task = _inflight.get(full_key)
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(
+                self._compute_with_lease(full_key, compute, wait_for_lease)
+            )
+            task.add_done_callback(lambda t: self._finish_compute(full_key, t))
+            _inflight[full_key] = task
+        return task
+
+    @staticmethod
+    def _finish_compute(full_key: str, task: asyncio.Task) -> None:
+        """実行中エントリを外し、裏での再計算の失敗をログに残す"""
+        if _inflight.get(full_key) is task:
+            del _inflight[full_key]
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Cache recompute failed for {full_key}: {task.exception()}")
+
+    async def _compute_with_lease(
+        self,
+        full_key: str,
+        compute: Callable[[], Awaitable[str]],
+        wait_for_lease: bool
+    ) -> Optional[str]:
+        """リースを取得したプロセスだけが計算し、他はその結果を待つ"""
+        lease_key = f"lease:{full_key}"
+        lease_token = uuid.uuid4().hex
+
+        try:
+            acquired = bool(
+                await get_redis().set(lease_key, lease_token, nx=True, ex=self.lease_seconds)
+            )
+        except redis.RedisError as e:
+            # Redis が使えない場合はプロセス内の排他のみで計算する
+            logger.warning(f"Cache lease unavailable: {e}")
+            acquired = None
+
+        if acquired is False:
+            if not wait_for_lease:
+                # 古い値は返却済みなので、再計算は他プロセスに任せる
+                return None
+
+            deadline = time.monotonic() + self.lease_seconds
+            while time.monotonic() < deadline:
+                await asyncio.sleep(LEASE_POLL_INTERVAL)
+                entry = await self._load(full_key)
+                if entry is not None and entry[1] > time.time():
+                    return entry[0]
+            # リース保持者が結果を書かずに期限切れになった場合は自分で計算する
+
+        try:
+            value = await compute()
+            await self._store(full_key, value)
+            return value
+        finally:
+            if acquired:
+                try:
+                    await get_redis().eval(_RELEASE_LEASE_SCRIPT, 1, lease_key, lease_token)
+                except redis.RedisError:
+                    pass
+
+    async def _load(self, full_key: str) -> Optional[Tuple[str, float]]:
+        """保存済みの (値, 鮮度の期限) を取得"""
+        try:
+            cached = await get_redis().get(full_key)
+        except redis.RedisError as e:
+            logger.warning(f"Cache get error: {e}")
+            return None
+
+        if not cached:
+            return None
+
+        try:
+            data = json.loads(cached)
+            return data["value"], data["fresh_until"]
+        except (TypeError, ValueError, KeyError):
+            return None
+
+    async def _store(self, full_key: str, value: str) -> None:
+        """鮮度の期限付きで保存（Redis 上は stale_ttl 分長く残す）"""
+        data = {"value": value, "fresh_until": time.time() + self.ttl}
+        try:
+            await get_redis().setex(full_key, self.ttl + self.stale_ttl, json.dumps(data))
+        except redis.RedisError as e:
+            logger.warning(f"Cache set error: {e}")
+
+
+def _new_tag_version() -> str:
+    return uuid.uuid4().hex
+
+
+async def invalidate_tags(*tags: str) -> None:
+    """
+    タグのバージョンを更新し、そのタグを持つキャッシュを全て無効にする
+
+    バージョンは連番ではなくランダム値のため、タグのキーが
+    追い出されて作り直されても古いエントリが有効に戻ることはない
+    """
+    if not tags:
+        return
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for tag in dict.fromkeys(tags):
+                pipe.set(
+                    TAG_VERSION_KEY.format(tag=tag),
+                    _new_tag_version(),
+                    ex=settings.CACHE_TAG_TTL
+                )
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Cache tag invalidation error: {e}")
+
+
+async def get_tag_versions(tags: Sequence[str]) -> List[str]:
+    """タグの現在のバージョンを取得（未作成のタグは新しいバージョンで作成）"""
+    client = get_redis()
+    tag_keys = [TAG_VERSION_KEY.format(tag=tag) for tag in tags]
+    versions = await client.mget(tag_keys)
+    return await _ensure_tag_versions(client, tag_keys, versions)
+
+
+async def _ensure_tag_versions(
+    client: redis.Redis,
+    tag_keys: List[str],
+    versions: List[Optional[str]]
+) -> List[str]:
+    """未作成のタグを SET NX で作成し、確定したバージョンを返す"""
+    missing = [i for i, version in enumerate(versions) if version is None]
+    if not missing:
+        return versions
+
+    async with client.pipeline(transaction=False) as pipe:
+        for i in missing:
+            pipe.set(tag_keys[i], _new_tag_version(), nx=True, ex=settings.CACHE_TAG_TTL)
+            pipe.get(tag_keys[i])
+        results = await pipe.execute()
+
+    versions = list(versions)
+    for n, i in enumerate(missing):
+        versions[i] = results[n * 2 + 1]
+    return versions
+
+
+class TaggedCache:
+    """
+    タグで無効化できるキャッシュ
+
+    エントリには保存時点のタグのバージョンを一緒に記録し、読み出し時に
+    現在のバージョンと一致する場合のみ有効とする。CRUD の書き込みで
+    invalidate_tags() を呼べば、TTL を長くしても古い値は返らない
+
+    使用例:
+        contexts = TaggedCache("ai:thread_context", ttl=86400)
+        value = await contexts.get_or_compute(
+            thread_id, [f"email:{email_id}" for email_id in email_ids], compute
+        )
+    """
+
+    def __init__(self, namespace: str, ttl: int):
+        self.namespace = namespace
+        self.ttl = ttl
+        self._stats = _cache_stats[namespace]
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get_or_compute(
+        self,
+        key: str,
+        tags: Sequence[str],
+        compute: Callable[[], Awaitable[str]]
+    ) -> str:
+        """
+        有効なキャッシュがあれば返し、無ければ計算して保存する
+
+        タグのバージョンは計算前に読んだものを保存するため、計算中に
+        書き込みがあった場合は次の読み出しで無効と判定される
+        """
+        full_key = self._key(key)
+        client = get_redis()
+        tag_keys = [TAG_VERSION_KEY.format(tag=tag) for tag in tags]
+
+        try:
+            # エントリとタグのバージョンを1往復で取得
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.get(full_key)
+                pipe.mget(tag_keys)
+                cached, versions = await pipe.execute()
+            versions = await _ensure_tag_versions(client, tag_keys, versions)
+        except redis.RedisError as e:
+            logger.warning(f"Cache get error: {e}")
+            return await compute()
+
+        if cached:
+            try:
+                entry = json.loads(cached)
+                if entry["tags"] == versions:
+                    self._stats["l2_hits"] += 1
+                    return entry["value"]
+            except (TypeError, ValueError, KeyError):
+                pass
+
+        self._stats["misses"] += 1
+        value = await compute()
+
+        try:
+            await client.setex(
+                full_key, self.ttl, json.dumps({"tags": versions, "value": value})
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Cache set error: {e}")
+        return value
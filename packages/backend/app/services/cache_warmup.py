@@ -0,0 +1,130 @@
+"""
+ログイン時のキャッシュウォームアップ
+
+ログイン・トークンリフレッシュの直後に、ダッシュボードの初回表示で呼ばれる
+エンドポイントをバックグラウンドでアプリ自身に問い合わせ（ASGI 内で完結）、
+レスポンスキャッシュとタグ付きキャッシュを温めておく。
+実際のエンドポイントを通すため、ETag とキャッシュ本文は通常のリクエストと一致する。
+
+同時実行数はプロセス全体で CACHE_WARMUP_CONCURRENCY に制限し、
+実行中のウォームアップはユーザー単位・終了時にキャンセルできる
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import httpx
+import redis.asyncio as redis
+from fastapi import FastAPI
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# 初回表示で呼ばれるエンドポイント（API_V1_STR からの相対パス・フロントエンドと同じクエリ）
+# ETag は既定値を補ったパラメータから作るため、既定値の省略の有無は問わない
+WARMUP_PATHS = (
+    "/tasks/dashboard",
+    "/tasks",
+    "/cost/recent?days=7&limit=20",
+)
+
+# 連続したログイン・リフレッシュで繰り返し実行しないためのロック
+WARMUP_LOCK_KEY = "cache_warmup:{user_id}"
+
+# ユーザーID -> 実行中のウォームアップ
+_warmups: Dict[str, asyncio.Task] = {}
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.CACHE_WARMUP_CONCURRENCY)
+    return _semaphore
+
+
+def schedule_cache_warmup(app: FastAPI, user_id: str, access_token: str) -> None:
+    """
+    ユーザーのキャッシュウォームアップをバックグラウンドで開始
+
+    同じユーザーのウォームアップが実行中の場合は何もしない
+    """
+    if not settings.CACHE_WARMUP_ENABLED:
+        return
+
+    user_id = str(user_id)
+    running = _warmups.get(user_id)
+    if running is not None and not running.done():
+        return
+
+    task = asyncio.get_running_loop().create_task(_warm_user(app, user_id, access_token))
+    _warmups[user_id] = task
+    task.add_done_callback(lambda t: _finish_warmup(user_id, t))
+
+
+def cancel_cache_warmup(user_id: str) -> bool:
+    """実行中のウォームアップをキャンセル（キャンセルした場合は True）"""
+    task = _warmups.get(str(user_id))
+    if task is None or task.done():
+        return False
+    return task.cancel()
+
+
+async def cancel_all_cache_warmups() -> None:
+    """全てのウォームアップをキャンセルして終了を待つ（アプリ終了時）"""
+    tasks = [task for task in _warmups.values() if not task.done()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _finish_warmup(user_id: str, task: asyncio.Task) -> None:
+    if _warmups.get(user_id) is task:
+        del _warmups[user_id]
+    if not task.cancelled() and task.exception():
+        logger.warning(f"Cache warm-up failed for user {user_id}: {task.exception()}")
+
+
+async def _warm_user(app: FastAPI, user_id: str, access_token: str) -> Dict[str, int]:
+    """初回表示のエンドポイントを順に取得し、パス毎のステータスを返す"""
+    lock_key = WARMUP_LOCK_KEY.format(user_id=user_id)
+    try:
+        acquired = await get_redis().set(
+            lock_key, "1", nx=True, ex=settings.CACHE_WARMUP_COOLDOWN
+        )
+    except redis.RedisError as e:
+        # 温める先の Redis が使えないため何もしない
+        logger.warning(f"Cache warm-up skipped for user {user_id}: {e}")
+        return {}
+    if not acquired:
+        return {}
+
+    statuses: Dict[str, int] = {}
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url=f"http://warmup{settings.API_V1_STR}",
+            headers={"Authorization": f"Bearer {access_token}"},
+            timeout=settings.CACHE_WARMUP_TIMEOUT,
+        ) as client:
+            for path in WARMUP_PATHS:
+                # 通常のリクエストのDB接続を奪わないよう同時実行数を制限
+                async with _get_semaphore():
+                    response = await client.get(path)
+                statuses[path] = response.status_code
+                if response.status_code != 200:
+                    logger.info(
+                        f"Cache warm-up for user {user_id}: {path} returned {response.status_code}"
+                    )
+    except asyncio.CancelledError:
+        # 途中で止めた場合は次回のログインで温め直せるようロックを外す
+        try:
+            await get_redis().delete(lock_key)
+        except redis.RedisError:
+            pass
+        raise
+
+    logger.info(f"Cache warm-up completed for user {user_id}: {statuses}")
+    return statuses
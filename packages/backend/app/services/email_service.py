@@ -1,14 +1,34 @@
+import asyncio
 import aiosmtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import List, Dict, Any, Optional
-import httpx
 import base64
 import re
 import hashlib
 from datetime import datetime
 
+import httpx
+
 from app.core.config import settings
+from app.core.http_client import get_http_client
+
+# Only request the parts of a message that _parse_gmail_message reads
+GMAIL_FULL_FIELDS = "id,threadId,snippet,payload(headers,body/data,parts(mimeType,body/data))"
+GMAIL_METADATA_FIELDS = "id,threadId,snippet,payload/headers"
+GMAIL_BODY_FIELDS = "payload(body/data,parts(mimeType,body/data))"
+GMAIL_METADATA_HEADERS = [
+    "Subject", "From", "To", "Date", "Message-ID", "In-Reply-To", "References"
+]
+
+# Outlook delta pages carry only lightweight properties; bodies are hydrated later
+OUTLOOK_DELTA_SELECT = (
+    "id,subject,from,toRecipients,receivedDateTime,bodyPreview,"
+    "conversationId,internetMessageId"
+)
+OUTLOOK_DETAIL_SELECT = "id,body,internetMessageHeaders"
+OUTLOOK_BATCH_SIZE = 20  # Graph $batch limit
+OUTLOOK_BATCH_MAX_RETRIES = 3
 
 
 class EmailService:
@@ -65,7 +85,9 @@ class EmailService:
     async def sync_gmail(
         self,
         access_token: str,
-        last_sync_token: Optional[str] = None
+        last_sync_token: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        message_format: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Sync emails from Gmail
@@ -73,68 +95,77 @@ class EmailService:
         Args:
             access_token: OAuth access token
             last_sync_token: Previous sync token for incremental sync
+            concurrency: Max parallel message fetches for this account
+                (defaults to GMAIL_FETCH_CONCURRENCY)
+            message_format: "full" or "metadata"; with "metadata" bodies are
+                left empty and are loaded later via hydrate_gmail_messages
             
         Returns:
             Dict with emails and next sync token
         """
-        async with httpx.AsyncClient() as client:
-            # Build query
-            params = {
-                "maxResults": 50,
-                "includeSpamTrash": False
-            }
-            
-            if last_sync_token:
-                # Use history API for incremental sync
-                url = "https://gmail.googleapis.com/gmail/v1/users/me/history"
-                params["startHistoryId"] = last_sync_token
-            else:
-                # Full sync
-                url = "https://gmail.googleapis.com/gmail/v1/users/me/messages"
-                params["q"] = "is:unread"
-            
-            # Get message list
-            response = await client.get(
-                url,
-                params=params,
+        client = get_http_client()
+
+        # Build query
+        params = {
+            "maxResults": 50,
+            "includeSpamTrash": False
+        }
+        
+        if last_sync_token:
+            # Use history API for incremental sync
+            url = "https://gmail.googleapis.com/gmail/v1/users/me/history"
+            params["startHistoryId"] = last_sync_token
+            params["historyTypes"] = "messageAdded"
+        else:
+            # Full sync
+            url = "https://gmail.googleapis.com/gmail/v1/users/me/messages"
+            params["q"] = "is:unread"
+        
+        # Get message list
+        response = await client.get(
+            url,
+            params=params,
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        # Get message details concurrently (bounded per account)
+        if last_sync_token:
+            message_ids = self._extract_history_message_ids(data)
+        else:
+            message_ids = [msg["id"] for msg in data.get("messages", [])]
+        
+        semaphore = asyncio.Semaphore(concurrency or settings.GMAIL_FETCH_CONCURRENCY)
+        message_format = message_format or settings.GMAIL_FETCH_FORMAT
+        
+        async def fetch_message(message_id: str) -> Dict[str, Any]:
+            async with semaphore:
+                msg_data = await self._fetch_gmail_message(
+                    client, access_token, message_id, message_format
+                )
+            return self._parse_gmail_message(msg_data)
+        
+        messages = list(await asyncio.gather(
+            *(fetch_message(message_id) for message_id in message_ids)
+        ))
+        
+        # Get next sync token
+        if "historyId" in data:
+            next_token = data["historyId"]
+        else:
+            # Get current history ID for next sync
+            profile_response = await client.get(
+                "https://gmail.googleapis.com/gmail/v1/users/me/profile",
                 headers={"Authorization": f"Bearer {access_token}"}
             )
-            response.raise_for_status()
-            data = response.json()
-            
-            # Get full message details
-            messages = []
-            message_ids = data.get("messages", [])
-            
-            for msg in message_ids:
-                msg_response = await client.get(
-                    f"https://gmail.googleapis.com/gmail/v1/users/me/messages/{msg['id']}",
-                    params={"format": "full"},
-                    headers={"Authorization": f"Bearer {access_token}"}
-                )
-                msg_response.raise_for_status()
-                msg_data = msg_response.json()
-                
-                # Parse message
-                parsed = self._parse_gmail_message(msg_data)
-                messages.append(parsed)
-            
-            # Get next sync token
-            if "historyId" in data:
-                next_token = data["historyId"]
-            else:
-                # Get current history ID for next sync
-                profile_response = await client.get(
-                    "https://gmail.googleapis.com/gmail/v1/users/me/profile",
-                    headers={"Authorization": f"Bearer {access_token}"}
-                )
-                profile_response.raise_for_status()
-                next_token = profile_response.json()["historyId"]
-            
-            return {
-                "messages": messages,
-                "nextSyncToken": str(next_token)
-            }
+            profile_response.raise_for_status()
+            next_token = profile_response.json()["historyId"]
+        
+        return {
+            "messages": messages,
+            "nextSyncToken": str(next_token)
+        }
     
     async def sync_outlook(
         self,
@@ -144,55 +175,248 @@ class EmailService:
         """
         Sync emails from Outlook/Office 365
         
+        Follows @odata.nextLink until the final @odata.deltaLink. Only
+        lightweight properties are selected here; bodies and internet
+        headers are loaded afterwards with hydrate_outlook_messages for the
+        messages that are actually going to be analyzed.
+        
         Args:
             access_token: OAuth access token
             last_sync_token: Previous delta link for incremental sync
             
         Returns:
-            Dict with emails and next delta link
+            Dict with emails (without bodies) and next delta link
         """
-        async with httpx.AsyncClient() as client:
-            # Use delta query for incremental sync
-            if last_sync_token:
-                url = last_sync_token
-            else:
-                url = "https://graph.microsoft.com/v1.0/me/mailFolders/inbox/messages/delta"
-                url += "?$select=id,subject,from,toRecipients,body,receivedDateTime"
+        client = get_http_client()
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Prefer": f"odata.maxpagesize={settings.OUTLOOK_DELTA_PAGE_SIZE}"
+        }
+        
+        # Use delta query for incremental sync
+        url = last_sync_token or (
+            "https://graph.microsoft.com/v1.0/me/mailFolders/inbox/messages/delta"
+            f"?$select={OUTLOOK_DELTA_SELECT}"
+        )
+        
+        messages = []
+        delta_link = None
+        
+        while url:
+            response = await client.get(url, headers=headers)
+            
+            if response.status_code == 410 and last_sync_token:
+                # Delta token expired (syncStateNotFound) - restart full sync
+                return await self.sync_outlook(access_token)
             
-            response = await client.get(
-                url,
-                headers={"Authorization": f"Bearer {access_token}"}
-            )
             response.raise_for_status()
             data = response.json()
             
-            # Parse messages
-            messages = []
+            # Parse messages (skip deletions reported by delta)
             for msg in data.get("value", []):
-                parsed = self._parse_outlook_message(msg)
-                messages.append(parsed)
+                if "@removed" in msg:
+                    continue
+                messages.append(self._parse_outlook_message(msg))
+            
+            # Intermediate pages carry nextLink, the last page carries deltaLink
+            url = data.get("@odata.nextLink")
+            delta_link = data.get("@odata.deltaLink", delta_link)
+        
+        return {
+            "messages": messages,
+            "deltaLink": delta_link
+        }
+    
+    async def hydrate_outlook_messages(
+        self,
+        access_token: str,
+        messages: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Load bodies and internet headers for parsed Outlook messages
+        
+        Requests are grouped into Graph $batch calls of up to 20 requests.
+        Items throttled with 429/503 are retried after Retry-After.
+        
+        Args:
+            access_token: OAuth access token
+            messages: Parsed messages returned by sync_outlook
             
-            # Get next delta link
-            next_link = data.get("@odata.deltaLink", data.get("@odata.nextLink"))
+        Returns:
+            The same messages with body, in_reply_to and references filled in
+        """
+        by_id = {message["id"]: message for message in messages}
+        pending = list(by_id)
+        
+        for attempt in range(OUTLOOK_BATCH_MAX_RETRIES + 1):
+            failed = []
+            retry_after = 0
+            
+            for i in range(0, len(pending), OUTLOOK_BATCH_SIZE):
+                result = await self._execute_outlook_batch(
+                    access_token, pending[i:i + OUTLOOK_BATCH_SIZE]
+                )
+                for message_id, msg_data in result["messages"].items():
+                    self._apply_outlook_details(by_id[message_id], msg_data)
+                failed.extend(result["failed"])
+                retry_after = max(retry_after, result["retry_after"])
+            
+            if not failed or attempt == OUTLOOK_BATCH_MAX_RETRIES:
+                break
+            
+            await asyncio.sleep(retry_after or 2 ** attempt)
+            pending = failed
+        
+        return messages
+    
+    async def _execute_outlook_batch(
+        self,
+        access_token: str,
+        message_ids: List[str]
+    ) -> Dict[str, Any]:
+        """Execute a single Graph $batch request for message details"""
+        client = get_http_client()
+        
+        requests = [
+            {
+                "id": str(i),
+                "method": "GET",
+                "url": f"/me/messages/{message_id}?$select={OUTLOOK_DETAIL_SELECT}",
+                "headers": {"Prefer": 'outlook.body-content-type="text"'}
+            }
+            for i, message_id in enumerate(message_ids)
+        ]
+        
+        response = await client.post(
+            "https://graph.microsoft.com/v1.0/$batch",
+            json={"requests": requests},
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        response.raise_for_status()
+        
+        result = {"messages": {}, "failed": [], "retry_after": 0}
+        
+        for item in response.json().get("responses", []):
+            message_id = message_ids[int(item["id"])]
+            status = item.get("status")
+            
+            if status == 200:
+                result["messages"][message_id] = item.get("body", {})
+            elif status in (429, 503) or (status or 0) >= 500:
+                result["failed"].append(message_id)
+                retry_after = str(item.get("headers", {}).get("Retry-After", ""))
+                if retry_after.isdigit():
+                    result["retry_after"] = max(result["retry_after"], int(retry_after))
+            # 404 etc.: message was deleted after the delta page was read
+        
+        return result
+    
+    def _apply_outlook_details(
+        self,
+        message: Dict[str, Any],
+        msg_data: Dict[str, Any]
+    ) -> None:
+        """Merge $batch detail response into a parsed Outlook message"""
+        headers = {
+            header["name"]: header["value"]
+            for header in msg_data.get("internetMessageHeaders", [])
+        }
+        message["body"] = msg_data.get("body", {}).get("content", "")
+        message["in_reply_to"] = headers.get("In-Reply-To", message.get("in_reply_to", ""))
+        message["references"] = headers.get("References", message.get("references", ""))
+    
+    async def fetch_gmail_body(self, access_token: str, message_id: str) -> str:
+        """
+        Lazily fetch the plain text body of a Gmail message
+        (used when the message was synced with format=metadata)
+        """
+        msg_data = await self._fetch_gmail_message(
+            get_http_client(), access_token, message_id, "full",
+            fields=GMAIL_BODY_FIELDS
+        )
+        return self._extract_gmail_body(msg_data.get("payload", {}))
+    
+    async def hydrate_gmail_messages(
+        self,
+        access_token: str,
+        messages: List[Dict[str, Any]],
+        concurrency: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Load bodies for Gmail messages synced with format=metadata
+        
+        Args:
+            access_token: OAuth access token
+            messages: Parsed messages returned by sync_gmail
+            concurrency: Max parallel body fetches
+                (defaults to GMAIL_FETCH_CONCURRENCY)
             
-            return {
-                "messages": messages,
-                "deltaLink": next_link
+        Returns:
+            The same messages with body filled in
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.GMAIL_FETCH_CONCURRENCY)
+        
+        async def hydrate(message: Dict[str, Any]) -> None:
+            async with semaphore:
+                message["body"] = await self.fetch_gmail_body(access_token, message["id"])
+        
+        await asyncio.gather(*(hydrate(message) for message in messages))
+        return messages
+    
+    async def _fetch_gmail_message(
+        self,
+        client: httpx.AsyncClient,
+        access_token: str,
+        message_id: str,
+        message_format: str,
+        fields: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Fetch a single Gmail message with a fields projection"""
+        if message_format == "metadata":
+            params = {
+                "format": "metadata",
+                "metadataHeaders": GMAIL_METADATA_HEADERS,
+                "fields": fields or GMAIL_METADATA_FIELDS
             }
+        else:
+            params = {"format": "full", "fields": fields or GMAIL_FULL_FIELDS}
+        
+        response = await client.get(
+            f"https://gmail.googleapis.com/gmail/v1/users/me/messages/{message_id}",
+            params=params,
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    def _extract_history_message_ids(self, data: Dict[str, Any]) -> List[str]:
+        """Collect added message IDs from a history.list response"""
+        message_ids = []
+        seen = set()
+        for record in data.get("history", []):
+            for added in record.get("messagesAdded", []):
+                message_id = added["message"]["id"]
+                if message_id not in seen:
+                    seen.add(message_id)
+                    message_ids.append(message_id)
+        return message_ids
+    
+    def _extract_gmail_body(self, payload: Dict[str, Any]) -> str:
+        """Extract the text/plain body from a Gmail message payload"""
+        if "parts" in payload:
+            for part in payload["parts"]:
+                if part.get("mimeType") == "text/plain" and part.get("body", {}).get("data"):
+                    return base64.urlsafe_b64decode(part["body"]["data"]).decode("utf-8")
+        elif payload.get("body", {}).get("data"):
+            return base64.urlsafe_b64decode(payload["body"]["data"]).decode("utf-8")
+        return ""
     
     def _parse_gmail_message(self, msg_data: Dict[str, Any]) -> Dict[str, Any]:
         """Parse Gmail message format"""
         headers = {h["name"]: h["value"] for h in msg_data["payload"]["headers"]}
         
-        # Extract body
-        body = ""
-        if "parts" in msg_data["payload"]:
-            for part in msg_data["payload"]["parts"]:
-                if part["mimeType"] == "text/plain":
-                    body = base64.urlsafe_b64decode(part["body"]["data"]).decode("utf-8")
-                    break
-        elif msg_data["payload"].get("body", {}).get("data"):
-            body = base64.urlsafe_b64decode(msg_data["payload"]["body"]["data"]).decode("utf-8")
+        # Extract body (empty for format=metadata)
+        body = self._extract_gmail_body(msg_data["payload"])
         
         # スレッド情報を抽出
         message_id = headers.get("Message-ID", "")
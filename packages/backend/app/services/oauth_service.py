@@ -1,10 +1,25 @@
-import httpx
 from typing import Dict, Any, Optional
 from datetime import datetime, timedelta
+import asyncio
+import json
+import logging
+import time
 import jwt
-from cryptography.fernet import Fernet
+import redis.asyncio as redis
+from cryptography.fernet import Fernet, InvalidToken
 
 from app.core.config import settings
+from app.core.http_client import get_http_client
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_KEY = "oauth:access_token:{account_id}"
+REFRESH_LOCK_KEY = "oauth:refresh_lock:{account_id}"
+
+# Process-wide access token cache and in-flight refreshes, keyed by account
+_token_cache: Dict[str, Dict[str, Any]] = {}
+_refresh_tasks: Dict[str, asyncio.Task] = {}
 
 
 class OAuthService:
@@ -12,6 +27,12 @@ class OAuthService:
     
     def __init__(self):
         self.fernet = Fernet(settings.ENCRYPTION_KEY.encode())
+        self.refresh_margin = settings.OAUTH_TOKEN_REFRESH_MARGIN
+    
+    @property
+    def redis(self) -> redis.Redis:
+        """Shared pool client (recreated per event loop)"""
+        return get_redis()
     
     def encrypt_token(self, token: str) -> str:
         """Encrypt sensitive token"""
@@ -21,6 +42,155 @@ class OAuthService:
         """Decrypt token"""
         return self.fernet.decrypt(encrypted_token.encode()).decode()
     
+    async def get_access_token(
+        self,
+        account_id: str,
+        refresh_token: str,
+        provider: str
+    ) -> Dict[str, Any]:
+        """
+        Get a valid access token for an account, refreshing only when needed
+        
+        Tokens are cached in process and in Redis (Fernet-encrypted) until
+        they expire. Within OAUTH_TOKEN_REFRESH_MARGIN of expiry the cached
+        token is still returned while a background refresh runs; concurrent
+        callers for the same account share a single refresh.
+        
+        Args:
+            account_id: Email account ID (cache key)
+            refresh_token: Encrypted refresh token
+            provider: OAuth provider (google/microsoft)
+            
+        Returns:
+            Dict with access token and expiry
+        """
+        token = _token_cache.get(account_id) or await self._load_cached_token(account_id)
+        
+        if token:
+            remaining = token["expires_at_ts"] - time.time()
+            if remaining > self.refresh_margin:
+                return token
+            if remaining > 0:
+                # Refresh ahead of expiry without making this caller wait
+                self._start_refresh(account_id, refresh_token, provider)
+                return token
+        
+        return await asyncio.shield(
+            self._start_refresh(account_id, refresh_token, provider)
+        )
+    
+    async def invalidate_access_token(self, account_id: str) -> None:
+        """Drop a cached access token (e.g. after the provider returned 401)"""
+        _token_cache.pop(account_id, None)
+        try:
+            await self.redis.delete(ACCESS_TOKEN_KEY.format(account_id=account_id))
+        except redis.RedisError as e:
+            logger.warning(f"Failed to invalidate cached token for {account_id}: {e}")
+    
+    def _start_refresh(
+        self,
+        account_id: str,
+        refresh_token: str,
+        provider: str
+    ) -> asyncio.Task:
+        """Start a refresh for the account unless one is already in flight"""
+        task = _refresh_tasks.get(account_id)
+        if task is None or task.done():
+            task = asyncio.create_task(
+                self._refresh_and_store(account_id, refresh_token, provider)
+            )
+            task.add_done_callback(lambda t: self._finish_refresh(account_id, t))
+            _refresh_tasks[account_id] = task
+        return task
+    
+    @staticmethod
+    def _finish_refresh(account_id: str, task: asyncio.Task) -> None:
+        """Clear the in-flight entry and surface background refresh errors"""
+        if _refresh_tasks.get(account_id) is task:
+            del _refresh_tasks[account_id]
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Token refresh failed for account {account_id}: {task.exception()}")
+    
+    async def _refresh_and_store(
+        self,
+        account_id: str,
+        refresh_token: str,
+        provider: str
+    ) -> Dict[str, Any]:
+        """Refresh the token once across workers and store it in both caches"""
+        lock_key = REFRESH_LOCK_KEY.format(account_id=account_id)
+        
+        try:
+            acquired = await self.redis.set(lock_key, "1", nx=True, ex=30)
+        except redis.RedisError:
+            acquired = True
+        
+        if not acquired:
+            # Another worker is refreshing - wait briefly for its result
+            for _ in range(25):
+                await asyncio.sleep(0.2)
+                token = await self._load_cached_token(account_id)
+                if token and token["expires_at_ts"] - time.time() > self.refresh_margin:
+                    return token
+        
+        try:
+            token = await self.refresh_token(refresh_token, provider)
+            token["expires_at_ts"] = time.time() + token["expires_in"]
+            _token_cache[account_id] = token
+            await self._store_cached_token(account_id, token)
+            return token
+        finally:
+            if acquired:
+                try:
+                    await self.redis.delete(lock_key)
+                except redis.RedisError:
+                    pass
+    
+    async def _load_cached_token(self, account_id: str) -> Optional[Dict[str, Any]]:
+        """Load and decrypt an access token cached in Redis"""
+        try:
+            cached = await self.redis.get(ACCESS_TOKEN_KEY.format(account_id=account_id))
+        except redis.RedisError as e:
+            logger.warning(f"Token cache unavailable: {e}")
+            return None
+        
+        if not cached:
+            return None
+        
+        data = json.loads(cached)
+        try:
+            access_token = self.decrypt_token(data["access_token"])
+        except InvalidToken:
+            # Encryption key rotated - treat as a cache miss
+            return None
+        
+        token = {
+            "access_token": access_token,
+            "expires_in": int(data["expires_at_ts"] - time.time()),
+            "expires_at": data["expires_at"],
+            "expires_at_ts": data["expires_at_ts"]
+        }
+        _token_cache[account_id] = token
+        return token
+    
+    async def _store_cached_token(self, account_id: str, token: Dict[str, Any]) -> None:
+        """Store an encrypted access token in Redis until it expires"""
+        ttl = int(token["expires_at_ts"] - time.time())
+        if ttl <= 0:
+            return
+        
+        data = {
+            "access_token": self.encrypt_token(token["access_token"]),
+            "expires_at": token["expires_at"],
+            "expires_at_ts": token["expires_at_ts"]
+        }
+        try:
+            await self.redis.setex(
+                ACCESS_TOKEN_KEY.format(account_id=account_id), ttl, json.dumps(data)
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Failed to cache token for {account_id}: {e}")
+    
     async def refresh_token(self, refresh_token: str, provider: str) -> Dict[str, Any]:
         """
         Refresh OAuth access token
@@ -44,46 +214,48 @@ class OAuthService:
     
     async def _refresh_google_token(self, refresh_token: str) -> Dict[str, Any]:
         """Refresh Google OAuth token"""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://oauth2.googleapis.com/token",
-                data={
-                    "client_id": settings.GOOGLE_CLIENT_ID,
-                    "client_secret": settings.GOOGLE_CLIENT_SECRET,
-                    "refresh_token": refresh_token,
-                    "grant_type": "refresh_token"
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return {
-                "access_token": data["access_token"],
-                "expires_in": data["expires_in"],
-                "expires_at": (datetime.utcnow() + timedelta(seconds=data["expires_in"])).isoformat()
+        client = get_http_client()
+
+        response = await client.post(
+            "https://oauth2.googleapis.com/token",
+            data={
+                "client_id": settings.GOOGLE_CLIENT_ID,
+                "client_secret": settings.GOOGLE_CLIENT_SECRET,
+                "refresh_token": refresh_token,
+                "grant_type": "refresh_token"
             }
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        return {
+            "access_token": data["access_token"],
+            "expires_in": data["expires_in"],
+            "expires_at": (datetime.utcnow() + timedelta(seconds=data["expires_in"])).isoformat()
+        }
     
     async def _refresh_microsoft_token(self, refresh_token: str) -> Dict[str, Any]:
         """Refresh Microsoft OAuth token"""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://login.microsoftonline.com/common/oauth2/v2.0/token",
-                data={
-                    "client_id": settings.MICROSOFT_CLIENT_ID,
-                    "client_secret": settings.MICROSOFT_CLIENT_SECRET,
-                    "refresh_token": refresh_token,
-                    "grant_type": "refresh_token",
-                    "scope": "https://graph.microsoft.com/.default"
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return {
-                "access_token": data["access_token"],
-                "expires_in": data["expires_in"],
-                "expires_at": (datetime.utcnow() + timedelta(seconds=data["expires_in"])).isoformat()
+        client = get_http_client()
+
+        response = await client.post(
+            "https://login.microsoftonline.com/common/oauth2/v2.0/token",
+            data={
+                "client_id": settings.MICROSOFT_CLIENT_ID,
+                "client_secret": settings.MICROSOFT_CLIENT_SECRET,
+                "refresh_token": refresh_token,
+                "grant_type": "refresh_token",
+                "scope": "https://graph.microsoft.com/.default"
             }
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        return {
+            "access_token": data["access_token"],
+            "expires_in": data["expires_in"],
+            "expires_at": (datetime.utcnow() + timedelta(seconds=data["expires_in"])).isoformat()
+        }
     
     async def exchange_code(
         self,
@@ -111,67 +283,69 @@ class OAuthService:
     
     async def _exchange_google_code(self, code: str, redirect_uri: str) -> Dict[str, Any]:
         """Exchange Google authorization code"""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://oauth2.googleapis.com/token",
-                data={
-                    "client_id": settings.GOOGLE_CLIENT_ID,
-                    "client_secret": settings.GOOGLE_CLIENT_SECRET,
-                    "code": code,
-                    "redirect_uri": redirect_uri,
-                    "grant_type": "authorization_code"
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            # Get user info
-            user_response = await client.get(
-                "https://www.googleapis.com/oauth2/v2/userinfo",
-                headers={"Authorization": f"Bearer {data['access_token']}"}
-            )
-            user_response.raise_for_status()
-            user_data = user_response.json()
-            
-            return {
-                "access_token": data["access_token"],
-                "refresh_token": self.encrypt_token(data["refresh_token"]),
-                "expires_in": data["expires_in"],
-                "email": user_data["email"],
-                "name": user_data.get("name", ""),
-                "provider": "google"
+        client = get_http_client()
+
+        response = await client.post(
+            "https://oauth2.googleapis.com/token",
+            data={
+                "client_id": settings.GOOGLE_CLIENT_ID,
+                "client_secret": settings.GOOGLE_CLIENT_SECRET,
+                "code": code,
+                "redirect_uri": redirect_uri,
+                "grant_type": "authorization_code"
             }
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        # Get user info
+        user_response = await client.get(
+            "https://www.googleapis.com/oauth2/v2/userinfo",
+            headers={"Authorization": f"Bearer {data['access_token']}"}
+        )
+        user_response.raise_for_status()
+        user_data = user_response.json()
+        
+        return {
+            "access_token": data["access_token"],
+            "refresh_token": self.encrypt_token(data["refresh_token"]),
+            "expires_in": data["expires_in"],
+            "email": user_data["email"],
+            "name": user_data.get("name", ""),
+            "provider": "google"
+        }
     
     async def _exchange_microsoft_code(self, code: str, redirect_uri: str) -> Dict[str, Any]:
         """Exchange Microsoft authorization code"""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://login.microsoftonline.com/common/oauth2/v2.0/token",
-                data={
-                    "client_id": settings.MICROSOFT_CLIENT_ID,
-                    "client_secret": settings.MICROSOFT_CLIENT_SECRET,
-                    "code": code,
-                    "redirect_uri": redirect_uri,
-                    "grant_type": "authorization_code",
-                    "scope": "openid email profile https://graph.microsoft.com/Mail.Read"
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            # Get user info
-            user_response = await client.get(
-                "https://graph.microsoft.com/v1.0/me",
-                headers={"Authorization": f"Bearer {data['access_token']}"}
-            )
-            user_response.raise_for_status()
-            user_data = user_response.json()
-            
-            return {
-                "access_token": data["access_token"],
-                "refresh_token": self.encrypt_token(data["refresh_token"]),
-                "expires_in": data["expires_in"],
-                "email": user_data["mail"] or user_data["userPrincipalName"],
-                "name": user_data.get("displayName", ""),
-                "provider": "microsoft"
-            }
\ No newline at end of file
+        client = get_http_client()
+
+        response = await client.post(
+            "https://login.microsoftonline.com/common/oauth2/v2.0/token",
+            data={
+                "client_id": settings.MICROSOFT_CLIENT_ID,
+                "client_secret": settings.MICROSOFT_CLIENT_SECRET,
+                "code": code,
+                "redirect_uri": redirect_uri,
+                "grant_type": "authorization_code",
+                "scope": "openid email profile https://graph.microsoft.com/Mail.Read"
+            }
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        # Get user info
+        user_response = await client.get(
+            "https://graph.microsoft.com/v1.0/me",
+            headers={"Authorization": f"Bearer {data['access_token']}"}
+        )
+        user_response.raise_for_status()
+        user_data = user_response.json()
+        
+        return {
+            "access_token": data["access_token"],
+            "refresh_token": self.encrypt_token(data["refresh_token"]),
+            "expires_in": data["expires_in"],
+            "email": user_data["mail"] or user_data["userPrincipalName"],
+            "name": user_data.get("displayName", ""),
+            "provider": "microsoft"
+        }
\ No newline at end of file
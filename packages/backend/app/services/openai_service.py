@@ -9,6 +9,11 @@ import openai
 from openai import OpenAI
 from datetime import datetime
 from .user_usage_tracker import UserUsageTracker
+from .ai_response_cache import AIResponseCache
+from app.core.config import settings
+
+# プロンプトを変更したら上げる（古いキャッシュは使われなくなる）
+THREAD_ANALYSIS_PROMPT_VERSION = "v1"
 
 class OpenAIService:
     """
@@ -27,6 +32,12 @@ class OpenAIService:
         self.verbosity = os.getenv("OPENAI_VERBOSITY", "low")
         self.reasoning_effort = os.getenv("OPENAI_REASONING_EFFORT", "low")
         self.usage_tracker = UserUsageTracker(db_session) if db_session else None
+        # 同じスレッド内容の再分析（リトライ・再同期）ではAPIを呼ばない
+        self.response_cache = AIResponseCache(
+            "ai:email_threads",
+            ttl=settings.AI_RESPONSE_CACHE_TTL,
+            stale_ttl=settings.AI_CACHE_STALE_TTL
+        )
         
     async def analyze_email_threads(
         self,
@@ -104,17 +115,27 @@ class OpenAIService:
                 api_params["verbosity"] = self.verbosity
                 api_params["reasoning_effort"] = self.reasoning_effort
             
-            # OpenAI API呼び出し
-            response = self.client.chat.completions.create(**api_params)
+            async def call_model() -> str:
+                # OpenAI API呼び出し
+                response = self.client.chat.completions.create(**api_params)
+                
+                # ユーザー別使用量記録
+                if self.usage_tracker:
+                    usage = response.usage
+                    # Note: user_id は呼び出し元から渡される必要がある
+                    # この部分は後でリファクタリングが必要
+                
+                return response.choices[0].message.content
             
-            # ユーザー別使用量記録
-            if self.usage_tracker:
-                usage = response.usage
-                # Note: user_id は呼び出し元から渡される必要がある
-                # この部分は後でリファクタリングが必要
+            # 同じモデル・プロンプト・入力の応答があれば再利用
+            result_text = await self.response_cache.get_or_compute(
+                [system_prompt, user_prompt],
+                call_model,
+                model=self.model,
+                template_version=THREAD_ANALYSIS_PROMPT_VERSION
+            )
             
             # レスポンスの解析
-            result_text = response.choices[0].message.content
             results = json.loads(result_text).get("results", [])
             
             # 結果の整形
@@ -9,22 +9,43 @@ import asyncio
 import json
 import uuid
 import logging
+from collections import deque
+import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple, Set
+from typing import AsyncIterator, List, Dict, Optional, Tuple, Set
 from urllib.parse import urlencode
 
 import httpx
 import redis.asyncio as redis
 from fastapi import HTTPException
+from sqlalchemy import String, any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY
 
 from app.core.config import settings
+from app.core.http_client import get_http_client
+from app.core.redis_client import get_redis
+from app.services.cache_codec import cache_codec
+from app.services.cache_service import LayeredCache
 from app.services.oauth_service import OAuthService
-from app.services.cache_service import CacheService
-from app.models.email import ProcessedEmail
+from app.services.seen_messages import SeenMessageFilter
+from app.services.sync_progress import SyncProgressTracker
+from app.models.email import ProcessedEmailKey
 from app.core.database import AsyncSessionLocal
+from app.crud.crud_email import crud_email
 
 logger = logging.getLogger(__name__)
 
+# バッチレスポンス各パートのヘッダー走査上限
+MAX_PART_HEADER_BYTES = 8192
+
+# Gmail API メソッド毎のクォータユニット消費量
+GMAIL_QUOTA_UNITS = {
+    "messages.get": 5,
+    "messages.list": 5,
+    "history.list": 2,
+    "getProfile": 1,
+}
+
 
 class CircuitBreaker:
     """サーキットブレーカー実装"""
@@ -62,6 +83,239 @@ class CircuitBreaker:
             self.state = "OPEN"
 
 
+class QuotaTokenBucket:
+    """
+    ユーザー単位のGmailクォータを表すトークンバケット
+
+    Gmail API はユーザー毎に毎秒のクォータユニット上限があり、
+    メソッド毎に消費ユニットが異なるため、リクエスト数ではなくユニットで管理する
+    """
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    def _refill(self, now: float) -> None:
+        """経過時間に応じてトークンを補充"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    async def acquire(self, units: float) -> None:
+        """必要ユニット分のトークンが貯まるまで待機して消費"""
+        units = min(units, self.capacity)
+        
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                
+                self._refill(now)
+                if self.tokens >= units:
+                    self.tokens -= units
+                    return
+                
+                await asyncio.sleep((units - self.tokens) / self.rate)
+    
+    def penalize(self, seconds: float) -> None:
+        """429 / 503 受信時に払い出しを一時停止し、残りのトークンを破棄"""
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0
+        self.updated_at = max(now, self.blocked_until)
+
+
+class AdaptiveBatchController:
+    """
+    AIMD方式でバッチサイズと並列度を調整するコントローラー
+
+    レイテンシとエラー率が健全な間は加算的に増やし、
+    レート制限を受けたら乗算的に減らす
+    """
+    
+    def __init__(
+        self,
+        batch_size: int,
+        concurrency: int,
+        min_batch_size: int,
+        max_batch_size: int,
+        max_concurrency: int,
+        target_latency: float
+    ):
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.batch_size = max(min_batch_size, min(batch_size, max_batch_size))
+        self.concurrency = max(1, min(concurrency, max_concurrency))
+        self.increase_step = max(1, min_batch_size)
+        self._healthy_batches = 0
+    
+    def record_success(self, latency: float, error_rate: float) -> None:
+        """バッチ完了時の記録（加算的増加 / 遅延時は加算的減少）"""
+        if latency > self.target_latency * 2 or error_rate > 0.1:
+            self.batch_size = max(self.min_batch_size, self.batch_size - self.increase_step)
+            self._healthy_batches = 0
+            return
+        
+        if latency > self.target_latency or error_rate > 0:
+            return
+        
+        self.batch_size = min(self.max_batch_size, self.batch_size + self.increase_step)
+        self._healthy_batches += 1
+        
+        # 並列度は現在の並列数分のバッチが続けて健全だった場合のみ増やす
+        if self._healthy_batches >= self.concurrency:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+            self._healthy_batches = 0
+    
+    def record_throttle(self) -> None:
+        """レート制限時の記録（乗算的減少）"""
+        self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+        self.concurrency = max(1, self.concurrency // 2)
+        self._healthy_batches = 0
+
+
+# クォータキー -> トークンバケット / コントローラー（プロセス内で共有）
+_quota_buckets: Dict[str, QuotaTokenBucket] = {}
+_batch_controllers: Dict[str, AdaptiveBatchController] = {}
+
+
+class GmailHistoryExpired(Exception):
+    """startHistoryId が古すぎて history.list が 404 を返した"""
+
+
+class MultipartMixedParser:
+    """
+    multipart/mixed バッチレスポンスのインクリメンタルパーサー
+
+    レスポンス全体を文字列にデコードせず、受信したチャンクをバイト列のまま
+    境界で切り出して、パート単位（Content-ID / HTTPステータス / ボディ）で返す
+    """
+    
+    def __init__(self, boundary: str):
+        self._delimiter = b"--" + boundary.encode("ascii")
+        # 本文中の偶然の一致を避けるため、2つ目以降の境界は行頭のみを対象とする
+        self._line_delimiter = b"\n" + self._delimiter
+        self._buffer = bytearray()
+        # 次に境界を探し始める位置（受信済みの部分を毎回先頭から探し直さない）
+        self._search_from = 0
+        self._started = False
+        self._finished = False
+    
+    @property
+    def finished(self) -> bool:
+        """終端境界（--boundary--）まで到達したか"""
+        return self._finished
+    
+    def feed(self, chunk: bytes) -> List[Dict]:
+        """チャンクを追加し、完成したパートを返す"""
+        if self._finished:
+            return []
+        
+        self._buffer += chunk
+        parts = []
+        
+        while not self._finished:
+            if not self._started:
+                idx = self._buffer.find(self._delimiter)
+                if idx == -1:
+                    # プリアンブルは境界長分だけ残して破棄
+                    keep = len(self._delimiter)
+                    if len(self._buffer) > keep:
+                        del self._buffer[:-keep]
+                    break
+                del self._buffer[:idx + len(self._delimiter)]
+                self._started = True
+                continue
+            
+            # 境界直後: "--" なら終端
+            if len(self._buffer) < 2:
+                break
+            if self._buffer[:2] == b"--":
+                self._finished = True
+                self._buffer.clear()
+                break
+            
+            idx = self._buffer.find(self._line_delimiter, self._search_from)
+            if idx == -1:
+                # チャンクを跨ぐ境界を見逃さないよう、境界長 - 1 バイト分は次回も探す
+                self._search_from = max(0, len(self._buffer) - len(self._line_delimiter) + 1)
+                break
+            self._search_from = 0
+            
+            end = idx - 1 if idx > 0 and self._buffer[idx - 1] == 0x0D else idx
+            with memoryview(self._buffer) as view:
+                part = self._parse_part(view[:end])
+            del self._buffer[:idx + len(self._line_delimiter)]
+            
+            if part is not None:
+                parts.append(part)
+        
+        return parts
+    
+    @staticmethod
+    def _split_headers(data: memoryview) -> Tuple[Dict[str, str], memoryview]:
+        """ヘッダー部と本文を分離（CRLF / LF 両対応）"""
+        head = bytes(data[:MAX_PART_HEADER_BYTES])
+        
+        candidates = [
+            (idx, len(separator))
+            for separator in (b"\r\n\r\n", b"\n\n")
+            if (idx := head.find(separator)) != -1
+        ]
+        if candidates:
+            idx, sep_len = min(candidates)
+            header_block, body = head[:idx], data[idx + sep_len:]
+        else:
+            header_block, body = head, data[len(data):]
+        
+        headers = {}
+        for line in header_block.splitlines():
+            name, sep, value = line.partition(b":")
+            if sep:
+                headers[name.strip().decode("latin-1").lower()] = (
+                    value.strip().decode("latin-1")
+                )
+        
+        return headers, body
+    
+    def _parse_part(self, data: memoryview) -> Optional[Dict]:
+        """1パート（application/http）を解析"""
+        # 境界行の残り（transport padding + 改行）を除去
+        newline = bytes(data[:MAX_PART_HEADER_BYTES]).find(b"\n")
+        if newline == -1:
+            return None
+        data = data[newline + 1:]
+        
+        outer_headers, http_message = self._split_headers(data)
+        
+        # 内側のHTTPレスポンス: ステータス行
+        line_end = bytes(http_message[:MAX_PART_HEADER_BYTES]).find(b"\n")
+        if line_end == -1:
+            return None
+        status_line = bytes(http_message[:line_end]).strip().split(b" ")
+        try:
+            status_code = int(status_line[1])
+        except (IndexError, ValueError):
+            logger.warning(f"Malformed status line in batch part: {status_line!r}")
+            return None
+        
+        inner_headers, body = self._split_headers(http_message[line_end + 1:])
+        
+        return {
+            "content_id": outer_headers.get("content-id", "").strip("<>"),
+            "status": status_code,
+            "headers": inner_headers,
+            "body": body.tobytes()
+        }
+
+
 class GmailBatchService:
     """Gmail API バッチリクエストサービス"""
     
@@ -73,54 +327,157 @@ class GmailBatchService:
             'GMAIL_FIELDS', 
             'id,threadId,labelIds,snippet,payload/headers,internalDate'
         )
+        self.max_item_retries = getattr(settings, 'GMAIL_BATCH_ITEM_RETRIES', 3)
+        self.retry_backoff_factor = getattr(settings, 'RATE_LIMIT_BACKOFF_FACTOR', 2)
+        
+        # 適応制御の範囲（Gmailはバッチ50件超でレート制限を受けやすい）
+        self.min_batch_size = getattr(settings, 'GMAIL_MIN_BATCH_SIZE', 5)
+        self.max_batch_size = getattr(settings, 'GMAIL_MAX_BATCH_SIZE', 50)
+        self.max_concurrency = getattr(settings, 'GMAIL_MAX_CONCURRENCY_LIMIT', 8)
+        self.target_latency = getattr(settings, 'GMAIL_BATCH_TARGET_LATENCY', 2.0)
+        
+        # ユーザー毎のクォータ（ユニット/秒）
+        self.quota_units_per_second = getattr(settings, 'GMAIL_QUOTA_UNITS_PER_SECOND', 250)
+        self.quota_burst = getattr(settings, 'GMAIL_QUOTA_BURST', 250)
+    
+    def get_quota_bucket(self, quota_key: str) -> QuotaTokenBucket:
+        """クォータキー（アカウント）単位のトークンバケットを取得"""
+        bucket = _quota_buckets.get(quota_key)
+        if bucket is None:
+            bucket = QuotaTokenBucket(self.quota_units_per_second, self.quota_burst)
+            _quota_buckets[quota_key] = bucket
+        return bucket
+    
+    def get_controller(self, quota_key: str) -> AdaptiveBatchController:
+        """クォータキー（アカウント）単位の適応コントローラーを取得"""
+        controller = _batch_controllers.get(quota_key)
+        if controller is None:
+            controller = AdaptiveBatchController(
+                batch_size=self.batch_size,
+                concurrency=self.max_concurrent_batches,
+                min_batch_size=self.min_batch_size,
+                max_batch_size=self.max_batch_size,
+                max_concurrency=self.max_concurrency,
+                target_latency=self.target_latency
+            )
+            _batch_controllers[quota_key] = controller
+        return controller
     
     async def fetch_messages_batch(
         self, 
         message_ids: List[str], 
-        access_token: str
+        access_token: str,
+        quota_key: str = "default"
     ) -> List[Dict]:
-        """バッチリクエストでメッセージ詳細を効率取得"""
+        """
+        バッチリクエストでメッセージ詳細を効率取得
+
+        バッチサイズと並列数は AdaptiveBatchController が決め、送信前に
+        クォータ分のトークンを取得する。パート単位で 429 / 5xx になった
+        メッセージIDのみを再キューする
+        """
         
         if not message_ids:
             return []
         
-        # バッチサイズでグループ化
-        batches = [
-            message_ids[i:i + self.batch_size] 
-            for i in range(0, len(message_ids), self.batch_size)
-        ]
-        
-        # 並行バッチ処理（制限付き）
-        semaphore = asyncio.Semaphore(self.max_concurrent_batches)
-        
-        async def process_batch(batch):
-            async with semaphore:
-                return await self._execute_batch(batch, access_token)
-        
-        tasks = [process_batch(batch) for batch in batches]
-        batch_results = await asyncio.gather(*tasks, return_exceptions=True)
+        controller = self.get_controller(quota_key)
+        bucket = self.get_quota_bucket(quota_key)
         
-        # 結果統合とエラーハンドリング
         messages = []
-        for i, result in enumerate(batch_results):
-            if isinstance(result, Exception):
-                logger.error(f"Batch {i} failed: {result}")
-                # 個別リクエストでフォールバック
-                fallback_messages = await self._fallback_individual_requests(
-                    batches[i], access_token
-                )
-                messages.extend(fallback_messages)
-            else:
-                messages.extend(result)
+        pending = deque(message_ids)
+        attempts: Dict[str, int] = {}
+        in_flight: Dict[asyncio.Task, List[str]] = {}
+        
+        while pending or in_flight:
+            # 並列数に空きがある間、現在のバッチサイズで送信
+            # （トークン待ちはスロット外で行うため実行中のバッチを妨げない）
+            while pending and len(in_flight) < controller.concurrency:
+                batch = [
+                    pending.popleft() 
+                    for _ in range(min(controller.batch_size, len(pending)))
+                ]
+                await bucket.acquire(len(batch) * GMAIL_QUOTA_UNITS["messages.get"])
+                task = asyncio.create_task(self._timed_batch(batch, access_token))
+                in_flight[task] = batch
+            
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            
+            for task in done:
+                batch = in_flight.pop(task)
+                
+                try:
+                    result, latency = task.result()
+                except Exception as e:
+                    if self._is_unauthorized(e):
+                        # トークンの失効は個別リクエストでも失敗するため、呼び出し側で取り直す
+                        for pending_task in in_flight:
+                            pending_task.cancel()
+                        raise
+                    logger.error(f"Batch of {len(batch)} messages failed: {e}")
+                    controller.record_throttle()
+                    # バッチ自体が失敗した場合のみ個別リクエストでフォールバック
+                    fallback_messages = await self._fallback_individual_requests(
+                        batch, access_token, bucket
+                    )
+                    messages.extend(fallback_messages)
+                    continue
+                
+                messages.extend(result["messages"])
+                
+                if result["throttled"]:
+                    controller.record_throttle()
+                else:
+                    controller.record_success(latency, len(result["failed"]) / len(batch))
+                
+                if not result["failed"]:
+                    continue
+                
+                # 失敗したIDのみ再キュー
+                requeue = []
+                for msg_id in result["failed"]:
+                    attempts[msg_id] = attempts.get(msg_id, 0) + 1
+                    if attempts[msg_id] > self.max_item_retries:
+                        logger.error(
+                            f"Giving up on message {msg_id} after "
+                            f"{self.max_item_retries} retries"
+                        )
+                    else:
+                        requeue.append(msg_id)
+                
+                if requeue:
+                    attempt = max(attempts[msg_id] for msg_id in requeue)
+                    delay = max(result["retry_after"], self.retry_backoff_factor ** attempt)
+                    logger.warning(
+                        f"Requeueing {len(requeue)} failed batch items, "
+                        f"pausing quota for {delay}s (attempt {attempt}/{self.max_item_retries})"
+                    )
+                    bucket.penalize(delay)
+                    pending.extend(requeue)
         
         return messages
     
+    async def _timed_batch(
+        self,
+        message_ids: List[str],
+        access_token: str
+    ) -> Tuple[Dict, float]:
+        """バッチを実行し、結果とレイテンシ（秒）を返す"""
+        started = time.monotonic()
+        result = await self._execute_batch(message_ids, access_token)
+        return result, time.monotonic() - started
+    
     async def _execute_batch(
         self, 
         message_ids: List[str], 
         access_token: str
-    ) -> List[Dict]:
-        """単一バッチリクエストの実行"""
+    ) -> Dict:
+        """
+        単一バッチリクエストの実行
+
+        Returns:
+            {"messages": 取得成功したメッセージ, "failed": 再試行すべきメッセージID,
+             "retry_after": パートが要求した待機秒数, "throttled": 429/503 を受けたか}
+        """
         
         boundary = f"batch_{uuid.uuid4().hex}"
         batch_body = self._build_batch_body(message_ids, boundary)
@@ -132,27 +489,106 @@ class GmailBatchService:
         }
         
         timeout = httpx.Timeout(30.0, read=45.0)  # バッチ用に延長
+        client = get_http_client()
         
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            try:
-                response = await client.post(
-                    "https://www.googleapis.com/batch/gmail/v1",
-                    content=batch_body,
-                    headers=headers
-                )
+        # Content-ID -> メッセージID の対応表
+        content_ids = {f"item{i}": msg_id for i, msg_id in enumerate(message_ids)}
+        result = {"messages": [], "failed": [], "retry_after": 0, "throttled": False}
+        answered = set()
+        
+        try:
+            async with client.stream(
+                "POST",
+                "https://www.googleapis.com/batch/gmail/v1",
+                content=batch_body,
+                headers=headers,
+                timeout=timeout
+            ) as response:
                 response.raise_for_status()
                 
-                return self._parse_batch_response(response.content, boundary)
+                # レスポンスはリクエストとは別の境界文字列を使う
+                parser = MultipartMixedParser(
+                    self._extract_boundary(
+                        response.headers.get("Content-Type", ""), boundary
+                    )
+                )
                 
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code == 429:
-                    # レート制限の場合
-                    retry_after = int(e.response.headers.get("Retry-After", 60))
-                    logger.warning(f"Rate limited, waiting {retry_after}s")
-                    await asyncio.sleep(retry_after)
-                    raise
-                logger.error(f"HTTP error in batch request: {e}")
-                raise
+                async for chunk in response.aiter_bytes():
+                    for part in parser.feed(chunk):
+                        self._collect_batch_part(part, content_ids, answered, result)
+            
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code in (429, 503):
+                # バッチ全体がレート制限された場合は待機せず全件を再試行対象として返す
+                # （待機はクォータバケット側で行い、並列スロットを塞がない）
+                retry_after = e.response.headers.get("Retry-After", "")
+                logger.warning(f"Batch rate limited (HTTP {e.response.status_code})")
+                return {
+                    "messages": [],
+                    "failed": list(message_ids),
+                    "retry_after": int(retry_after) if retry_after.isdigit() else 0,
+                    "throttled": True
+                }
+            logger.error(f"HTTP error in batch request: {e}")
+            raise
+        
+        if not parser.finished:
+            logger.warning("Batch response ended without closing boundary")
+        
+        # レスポンスに含まれなかったパートも再試行対象
+        for msg_id in message_ids:
+            if msg_id not in answered:
+                result["failed"].append(msg_id)
+        
+        return result
+    
+    def _collect_batch_part(
+        self,
+        part: Dict,
+        content_ids: Dict[str, str],
+        answered: Set[str],
+        result: Dict
+    ) -> None:
+        """パートをContent-IDでメッセージIDに対応付けて結果に振り分け"""
+        
+        content_id = part["content_id"]
+        if content_id.startswith("response-"):
+            content_id = content_id[len("response-"):]
+        
+        msg_id = content_ids.get(content_id)
+        if msg_id is None:
+            logger.warning(f"Unknown Content-ID in batch response: {part['content_id']}")
+            return
+        
+        answered.add(msg_id)
+        status = part["status"]
+        
+        if status == 200:
+            try:
+                result["messages"].append(json.loads(part["body"]))
+            except json.JSONDecodeError as e:
+                logger.warning(f"Failed to parse batch response part for {msg_id}: {e}")
+                result["failed"].append(msg_id)
+        elif status == 429 or status >= 500:
+            result["failed"].append(msg_id)
+            if status in (429, 503):
+                result["throttled"] = True
+            retry_after = part["headers"].get("retry-after", "")
+            if retry_after.isdigit():
+                result["retry_after"] = max(result["retry_after"], int(retry_after))
+        elif status == 404:
+            logger.info(f"Message {msg_id} no longer exists, skipping")
+        else:
+            logger.error(f"Batch item {msg_id} failed with HTTP {status}")
+    
+    @staticmethod
+    def _extract_boundary(content_type: str, default: str) -> str:
+        """Content-Type ヘッダーから boundary パラメータを取得"""
+        for param in content_type.split(";")[1:]:
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "boundary" and value:
+                return value.strip('"')
+        return default
     
     def _build_batch_body(self, message_ids: List[str], boundary: str) -> str:
         """バッチリクエストボディ構築"""
@@ -172,30 +608,12 @@ Host: www.googleapis.com
         parts.append(f"--{boundary}--")
         return "\n".join(parts)
     
-    def _parse_batch_response(self, response_content: bytes, boundary: str) -> List[Dict]:
-        """バッチレスポンスの解析"""
-        content = response_content.decode('utf-8')
-        parts = content.split(f"--{boundary}")
-        
-        messages = []
-        for part in parts:
-            if "HTTP/1.1 200" in part and "{" in part:
-                # JSONレスポンス部分を抽出
-                json_start = part.find('{')
-                if json_start != -1:
-                    json_part = part[json_start:].strip()
-                    try:
-                        message = json.loads(json_part)
-                        messages.append(message)
-                    except json.JSONDecodeError as e:
-                        logger.warning(f"Failed to parse batch response part: {e}")
-        
-        return messages
     
     async def _fallback_individual_requests(
         self, 
         message_ids: List[str], 
-        access_token: str
+        access_token: str,
+        bucket: QuotaTokenBucket
     ) -> List[Dict]:
         """個別リクエストでのフォールバック"""
         
@@ -204,102 +622,143 @@ Host: www.googleapis.com
         headers = {"Authorization": f"Bearer {access_token}"}
         messages = []
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            for msg_id in message_ids:
-                try:
-                    response = await client.get(
-                        f"https://www.googleapis.com/gmail/v1/users/me/messages/{msg_id}",
-                        headers=headers,
-                        params={"fields": self.fields, "format": "metadata"}
-                    )
-                    response.raise_for_status()
-                    messages.append(response.json())
-                    
-                    # レート制限対策
-                    await asyncio.sleep(0.1)
-                    
-                except Exception as e:
-                    logger.error(f"Failed to fetch message {msg_id}: {e}")
+        client = get_http_client()
+        
+        for msg_id in message_ids:
+            try:
+                # レート制限対策
+                await bucket.acquire(GMAIL_QUOTA_UNITS["messages.get"])
+                
+                response = await client.get(
+                    f"https://www.googleapis.com/gmail/v1/users/me/messages/{msg_id}",
+                    headers=headers,
+                    params={"fields": self.fields, "format": "metadata"}
+                )
+                response.raise_for_status()
+                messages.append(response.json())
+                
+            except Exception as e:
+                if self._is_unauthorized(e):
+                    raise
+                logger.error(f"Failed to fetch message {msg_id}: {e}")
         
         return messages
-
-
+    
+    @staticmethod
+    def _is_unauthorized(error: Exception) -> bool:
+        """アクセストークンの失効（HTTP 401）か"""
+        return (
+            isinstance(error, httpx.HTTPStatusError)
+            and error.response.status_code == 401
+        )
 class IntelligentCacheService:
     """インテリジェントキャッシュサービス"""
     
+    @property
+    def redis(self) -> redis.Redis:
+        """共有コネクションプールのクライアント"""
+        return get_redis()
+    
     def __init__(self):
-        self.redis = redis.Redis.from_url(
-            settings.REDIS_URL,
-            decode_responses=True
-        )
         self.cache_ttl = {
             "message_content": getattr(settings, 'CACHE_MESSAGE_TTL', 3600),
             "sync_tokens": getattr(settings, 'CACHE_SYNC_TOKEN_TTL', 86400),
             "user_preferences": 1800
         }
+        # 同期開始毎に参照されるため L1 にも載せる
+        self.sync_tokens = LayeredCache("email:sync_token")
+        self.codec = cache_codec
+        self.hash_buckets = getattr(settings, 'CACHE_MESSAGE_HASH_BUCKETS', False)
+        self.bucket_max_fields = getattr(settings, 'CACHE_MESSAGE_BUCKET_MAX_FIELDS', 20000)
     
     async def get_cached_messages(
         self, 
-        message_ids: List[str]
+        message_ids: List[str],
+        account_id: Optional[str] = None
     ) -> Dict[str, Dict]:
         """複数メッセージの一括キャッシュ取得"""
         
         if not message_ids:
             return {}
         
-        cache_keys = [f"email:msg:{msg_id}" for msg_id in message_ids]
-        
-        # Pipeline使用で高速一括取得
-        pipe = self.redis.pipeline()
-        for key in cache_keys:
-            pipe.get(key)
-        
-        cached_values = await pipe.execute()
+        binary_redis = get_redis(decode_responses=False)
+        if self.hash_buckets and account_id:
+            # アカウント毎のハッシュから1コマンドで取得
+            cached_values = await binary_redis.hmget(
+                f"email:msgs:{account_id}", message_ids
+            )
+        else:
+            cached_values = await binary_redis.mget(
+                [f"email:msg:{msg_id}" for msg_id in message_ids]
+            )
         
         # デシリアライズと結果マッピング
         result = {}
-        for msg_id, cached_json in zip(message_ids, cached_values):
-            if cached_json:
-                try:
-                    result[msg_id] = json.loads(cached_json)
-                except json.JSONDecodeError:
+        for msg_id, cached in zip(message_ids, cached_values):
+            if cached:
+                cache_data = self.codec.decode(cached)
+                if cache_data is None:
                     logger.warning(f"Invalid cache data for message {msg_id}")
+                    continue
+                result[msg_id] = self._expand_cached_message(cache_data)
         
         return result
     
     async def cache_messages_batch(
         self, 
-        messages: List[Dict]
+        messages: List[Dict],
+        account_id: Optional[str] = None
     ) -> None:
         """メッセージの一括キャッシュ保存"""
         
         if not messages:
             return
         
-        pipe = self.redis.pipeline()
+        ttl = self.cache_ttl["message_content"]
+        encoded = {
+            message["id"]: self.codec.encode(self._compact_message(message))
+            for message in messages
+        }
         
-        for message in messages:
-            cache_key = f"email:msg:{message['id']}"
-            
-            # メッセージデータの軽量化
-            cache_data = {
-                "id": message["id"],
-                "threadId": message.get("threadId"),
-                "snippet": message.get("snippet"),
-                "internalDate": message.get("internalDate"),
-                "headers": self._extract_important_headers(message),
-                "cached_at": datetime.utcnow().isoformat()
-            }
+        pipe = get_redis(decode_responses=False).pipeline(transaction=False)
+        
+        if self.hash_buckets and account_id:
+            # キー毎のオーバーヘッドを避けるためアカウント単位のハッシュにまとめる
+            # （有効期限はハッシュ全体で管理し、上限を超えたら作り直す）
+            bucket_key = f"email:msgs:{account_id}"
+            pipe.hset(bucket_key, mapping=encoded)
+            pipe.expire(bucket_key, ttl)
+            pipe.hlen(bucket_key)
+            *_, bucket_size = await pipe.execute()
             
-            pipe.setex(
-                cache_key,
-                self.cache_ttl["message_content"],
-                json.dumps(cache_data, default=str)
-            )
+            if bucket_size > self.bucket_max_fields:
+                await get_redis().unlink(bucket_key)
+        else:
+            for msg_id, value in encoded.items():
+                pipe.setex(f"email:msg:{msg_id}", ttl, value)
+            await pipe.execute()
         
-        await pipe.execute()
         logger.info(f"Cached {len(messages)} messages")
     
+    def _compact_message(self, message: Dict) -> Dict:
+        """キャッシュ用にメッセージを軽量化（重要なヘッダーのみ名前→値で保持）"""
+        return {
+            "id": message["id"],
+            "threadId": message.get("threadId"),
+            "snippet": message.get("snippet"),
+            "internalDate": message.get("internalDate"),
+            "headers": self._extract_important_headers(message)
+        }
+    
+    @staticmethod
+    def _expand_cached_message(cache_data: Dict) -> Dict:
+        """軽量化したメッセージを Gmail API と同じ形（payload.headers）に戻す"""
+        headers = cache_data.pop("headers", None) or {}
+        cache_data["payload"] = {
+            "headers": [{"name": name, "value": value} for name, value in headers.items()]
+        }
+        return cache_data
+    
     def _extract_important_headers(self, message: Dict) -> Dict:
         """重要なヘッダーのみ抽出"""
         headers = {}
@@ -318,37 +777,45 @@ class IntelligentCacheService:
         
         return headers
     
-    async def filter_uncached_messages(
-        self, 
-        message_ids: List[str]
-    ) -> List[str]:
-        """キャッシュされていないメッセージIDを抽出"""
-        
-        cached_messages = await self.get_cached_messages(message_ids)
-        cached_ids = set(cached_messages.keys())
-        
-        uncached_ids = [
-            msg_id for msg_id in message_ids 
-            if msg_id not in cached_ids
-        ]
-        
-        logger.info(
-            f"Cache hit: {len(cached_ids)}/{len(message_ids)} messages. "
-            f"Need to fetch: {len(uncached_ids)}"
-        )
-        
-        return uncached_ids
+    async def get_sync_checkpoint(self, account_id: str) -> Optional[Dict[str, str]]:
+        """同期再開用チェックポイント（mode / historyId / pageToken）の取得"""
+        checkpoint = await self.redis.hgetall(f"email:sync_checkpoint:{account_id}")
+        return checkpoint or None
+    
+    async def set_sync_checkpoint(
+        self,
+        account_id: str,
+        mode: str,
+        history_id: str,
+        latest_history_id: str,
+        page_token: str
+    ) -> None:
+        """同期再開用チェックポイントの保存"""
+        key = f"email:sync_checkpoint:{account_id}"
+        pipe = self.redis.pipeline()
+        pipe.hset(key, mapping={
+            "mode": mode,
+            "history_id": history_id,
+            "latest_history_id": latest_history_id,
+            "page_token": page_token
+        })
+        pipe.expire(key, self.cache_ttl["sync_tokens"])
+        await pipe.execute()
+    
+    async def clear_sync_checkpoint(self, account_id: str) -> None:
+        """同期再開用チェックポイントの削除"""
+        await self.redis.delete(f"email:sync_checkpoint:{account_id}")
     
     async def get_sync_token(self, account_id: str) -> Optional[str]:
         """同期トークンの取得"""
-        return await self.redis.get(f"email:sync_token:{account_id}")
+        return await self.sync_tokens.get(account_id)
     
     async def set_sync_token(self, account_id: str, token: str) -> None:
         """同期トークンの保存"""
-        await self.redis.setex(
-            f"email:sync_token:{account_id}",
-            self.cache_ttl["sync_tokens"],
-            token
+        await self.sync_tokens.set(
+            account_id,
+            token,
+            expire=self.cache_ttl["sync_tokens"]
         )
 
 
@@ -365,13 +832,21 @@ class OptimizedEmailSyncService:
         self.max_retries = 3
         self.backoff_factor = getattr(settings, 'RATE_LIMIT_BACKOFF_FACTOR', 2)
         self.max_sync_duration = getattr(settings, 'MAX_SYNC_DURATION', 300)
+        self.page_size = getattr(settings, 'GMAIL_SYNC_PAGE_SIZE', 500)
     
     async def sync_gmail_optimized(
         self, 
         account_id: str, 
-        user_id: str
+        user_id: str,
+        progress: SyncProgressTracker
     ) -> Dict:
-        """最適化されたGmail同期"""
+        """
+        最適化されたGmail同期
+
+        messages.list / history.list をページ単位でストリーミング処理し、
+        ページ毎にチェックポイントを保存して中断時に再開できるようにする。
+        取り込んだメールは progress の同期ジョブに紐づけ、ページ毎の件数を記録する
+        """
         
         start_time = datetime.utcnow()
         
@@ -384,240 +859,499 @@ class OptimizedEmailSyncService:
                 )
             
             # アクセストークン取得
-            access_token = await self._get_fresh_access_token(account_id)
+            access_token = await self._get_fresh_access_token(account_id, user_id)
+            
+            try:
+                result = await self._run_gmail_sync(
+                    access_token, account_id, user_id, start_time, progress
+                )
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 401:
+                    raise
+                # キャッシュしたトークンが失効・取り消されていた場合は破棄して1回だけ再試行
+                # （処理済みのページはチェックポイントから再開される）
+                logger.warning(f"Gmail rejected the access token for account {account_id}, refreshing")
+                await self.oauth_service.invalidate_access_token(account_id)
+                access_token = await self._get_fresh_access_token(account_id, user_id)
+                result = await self._run_gmail_sync(
+                    access_token, account_id, user_id, start_time, progress
+                )
+            
+            # 成功記録
+            self.circuit_breaker.record_success()
+            return result
             
-            # 1. 増分同期トークンチェック
+        except Exception as e:
+            self.circuit_breaker.record_failure()
+            logger.error(f"Gmail sync failed for user {user_id}: {e}")
+            raise
+    
+    async def _run_gmail_sync(
+        self,
+        access_token: str,
+        account_id: str,
+        user_id: str,
+        start_time: datetime,
+        progress: SyncProgressTracker
+    ) -> Dict:
+        """チェックポイント・増分同期トークンから同期モードを決めてページを処理する"""
+        
+        # 1. 再開用チェックポイント / 増分同期トークンチェック
+        checkpoint = await self.cache_service.get_sync_checkpoint(account_id)
+        
+        if checkpoint:
+            mode = checkpoint["mode"]
+            history_id = checkpoint["history_id"]
+            page_token = checkpoint.get("page_token") or None
+            latest_history_id = checkpoint.get("latest_history_id") or history_id
+            logger.info(f"Resuming {mode} Gmail sync for account {account_id}")
+        else:
             last_token = await self.cache_service.get_sync_token(account_id)
+            page_token = None
             
             if last_token:
                 # 増分同期（変更分のみ）
-                message_list = await self._fetch_gmail_incremental(
-                    access_token, last_token
-                )
+                mode = "incremental"
+                history_id = last_token
             else:
-                # 初回同期（直近100件）
-                message_list = await self._fetch_gmail_initial(access_token)
-            
-            if not message_list.get("messages"):
-                return {
-                    "status": "no_new_messages", 
-                    "count": 0,
-                    "duration": (datetime.utcnow() - start_time).total_seconds()
-                }
-            
-            messages = message_list["messages"]
-            message_ids = [msg["id"] for msg in messages]
-            
-            logger.info(f"Found {len(message_ids)} new messages for user {user_id}")
-            
-            # 2. キャッシュチェック（重複排除）
-            uncached_ids = await self.cache_service.filter_uncached_messages(message_ids)
-            
-            detailed_messages = []
+                # 初回同期: 一覧取得前の historyId を基点とする
+                mode = "initial"
+                history_id = await self._fetch_gmail_history_id(access_token)
+            latest_history_id = history_id
+        
+        stats = {
+            "found": 0, "count": 0, "cached_count": 0, "seen_count": 0, "api_calls": 0
+        }
+        completed = False
+        
+        try:
+            completed = await self._sync_gmail_pages(
+                access_token, account_id, user_id, mode,
+                history_id, latest_history_id, page_token, start_time, stats,
+                progress
+            )
+        except GmailHistoryExpired:
+            # 履歴が古すぎる場合は初回同期に切り替え
+            logger.warning("History ID too old, falling back to initial sync")
+            await self.cache_service.clear_sync_checkpoint(account_id)
+            history_id = await self._fetch_gmail_history_id(access_token)
+            completed = await self._sync_gmail_pages(
+                access_token, account_id, user_id, "initial",
+                history_id, history_id, None, start_time, stats,
+                progress
+            )
+        
+        duration = (datetime.utcnow() - start_time).total_seconds()
+        
+        if not completed:
+            logger.info(
+                f"Gmail sync paused for user {user_id} after {duration:.2f}s, "
+                f"{stats['count']} messages processed (checkpoint saved)"
+            )
+            return {"status": "partial", "duration": duration, **stats}
+        
+        if stats["found"] == 0:
+            return {
+                "status": "no_new_messages", 
+                "count": 0,
+                "duration": duration
+            }
+        
+        logger.info(
+            f"Gmail sync completed for user {user_id}: "
+            f"{stats['count']} messages in {duration:.2f}s"
+        )
+        
+        return {"status": "success", "duration": duration, **stats}
+    
+    async def _sync_gmail_pages(
+        self,
+        access_token: str,
+        account_id: str,
+        user_id: str,
+        mode: str,
+        history_id: str,
+        latest_history_id: str,
+        page_token: Optional[str],
+        start_time: datetime,
+        stats: Dict[str, int],
+        progress: SyncProgressTracker
+    ) -> bool:
+        """
+        ページ単位でメッセージを取得・処理する
+
+        pageToken は最初のリクエストのパラメータに紐づくため、
+        history_id（問い合わせの基点）は再開時も変えずに保持し、
+        次回同期用の最新 historyId は latest_history_id として別に追跡する
+
+        Returns:
+            全ページを処理し終えた場合 True、時間制限で中断した場合 False
+        """
+        
+        # 処理済みIDの判定用フィルタは同期毎に1回だけ読み込む
+        seen_filter = await SeenMessageFilter.load(account_id)
+        
+        async for page in self.iter_gmail_message_pages(
+            access_token, mode, history_id, page_token, quota_key=account_id
+        ):
+            message_ids = page["message_ids"]
+            stats["api_calls"] += 1
             
-            if uncached_ids:
-                # 3. バッチリクエストで詳細取得
-                logger.info(f"Fetching details for {len(uncached_ids)} uncached messages")
+            if message_ids:
+                stats["found"] += len(message_ids)
+                logger.info(
+                    f"Found {len(message_ids)} messages on page for user {user_id}"
+                )
+                await progress.add_total(len(message_ids))
                 
-                new_detailed_messages = await self.gmail_batch.fetch_messages_batch(
-                    uncached_ids, access_token
+                await self._sync_message_page(
+                    message_ids, access_token, user_id, account_id, stats,
+                    seen_filter, progress.job_id
                 )
                 
-                # 4. キャッシュ更新
-                await self.cache_service.cache_messages_batch(new_detailed_messages)
-                detailed_messages.extend(new_detailed_messages)
+                await progress.advance(len(message_ids))
             
-            # 5. キャッシュされたメッセージも取得
-            if len(uncached_ids) < len(message_ids):
-                cached_messages = await self.cache_service.get_cached_messages(
-                    [mid for mid in message_ids if mid not in uncached_ids]
-                )
-                detailed_messages.extend(cached_messages.values())
+            next_page_token = page["next_page_token"]
+            if page.get("history_id"):
+                latest_history_id = page["history_id"]
             
-            # 6. 次回同期用トークン保存
-            if "historyId" in message_list:
-                await self.cache_service.set_sync_token(
-                    account_id, message_list["historyId"]
-                )
+            if not next_page_token:
+                break
             
-            # 7. メッセージ処理
-            result = await self._process_messages(detailed_messages, user_id, account_id)
+            # ページ処理毎にチェックポイント保存（中断時はここから再開）
+            await self.cache_service.set_sync_checkpoint(
+                account_id, mode, history_id, latest_history_id, next_page_token
+            )
             
-            # 成功記録
-            self.circuit_breaker.record_success()
+            elapsed = (datetime.utcnow() - start_time).total_seconds()
+            if elapsed > self.max_sync_duration:
+                return False
+        
+        # 次回同期用トークン保存
+        await self.cache_service.set_sync_token(account_id, latest_history_id)
+        await self.cache_service.clear_sync_checkpoint(account_id)
+        return True
+    
+    async def _sync_message_page(
+        self,
+        message_ids: List[str],
+        access_token: str,
+        user_id: str,
+        account_id: str,
+        stats: Dict[str, int],
+        seen_filter: SeenMessageFilter,
+        sync_job_id: str
+    ) -> None:
+        """1ページ分のメッセージ詳細取得とDB保存"""
+        
+        # 2. 処理済みメッセージの除外
+        # Bloom フィルタで確実に新規と分かるIDは照会せず、残りのみ DB で確認する
+        page_size = len(message_ids)
+        message_ids, maybe_seen = seen_filter.partition(dict.fromkeys(message_ids))
+        if maybe_seen:
+            processed_ids = await self._get_processed_ids(maybe_seen)
+            message_ids.extend(mid for mid in maybe_seen if mid not in processed_ids)
+        stats["seen_count"] += page_size - len(message_ids)
+        
+        if not message_ids:
+            return
+        
+        # 3. キャッシュチェック
+        cached_messages = await self.cache_service.get_cached_messages(
+            message_ids, account_id=account_id
+        )
+        uncached_ids = [mid for mid in message_ids if mid not in cached_messages]
+        logger.info(
+            f"Cache hit: {len(cached_messages)}/{len(message_ids)} messages. "
+            f"Need to fetch: {len(uncached_ids)}"
+        )
+        
+        # キャッシュ済みのメッセージ
+        detailed_messages = list(cached_messages.values())
+        
+        if uncached_ids:
+            # 4. バッチリクエストで詳細取得
+            logger.info(f"Fetching details for {len(uncached_ids)} uncached messages")
             
-            duration = (datetime.utcnow() - start_time).total_seconds()
+            new_detailed_messages = await self.gmail_batch.fetch_messages_batch(
+                uncached_ids, access_token, quota_key=account_id
+            )
             
-            logger.info(
-                f"Gmail sync completed for user {user_id}: "
-                f"{len(detailed_messages)} messages in {duration:.2f}s"
+            # 5. キャッシュ更新
+            await self.cache_service.cache_messages_batch(
+                new_detailed_messages, account_id=account_id
             )
+            detailed_messages.extend(new_detailed_messages)
+            batch_size = self.gmail_batch.get_controller(account_id).batch_size
+            stats["api_calls"] += len(uncached_ids) // batch_size + 1
+        
+        # 6. メッセージ処理
+        await self._process_messages(
+            detailed_messages, user_id, account_id, sync_job_id
+        )
+        await seen_filter.add(message_ids)
+        
+        stats["count"] += len(detailed_messages)
+        stats["cached_count"] += len(message_ids) - len(uncached_ids)
+    
+    async def iter_gmail_message_pages(
+        self,
+        access_token: str,
+        mode: str,
+        history_id: str,
+        page_token: Optional[str] = None,
+        quota_key: str = "default"
+    ) -> AsyncIterator[Dict]:
+        """
+        nextPageToken を辿ってメッセージIDをページ単位で返す非同期ジェネレーター
+
+        Args:
+            access_token: OAuthアクセストークン
+            mode: "initial"（messages.list）または "incremental"（history.list）
+            history_id: 増分同期の開始 historyId
+            page_token: 再開するページトークン
+            quota_key: クォータを共有するキー（アカウントID）
+
+        Yields:
+            {"message_ids": [...], "next_page_token": str | None, "history_id": str | None}
+        """
+        
+        bucket = self.gmail_batch.get_quota_bucket(quota_key)
+        
+        while True:
+            if mode == "initial":
+                await bucket.acquire(GMAIL_QUOTA_UNITS["messages.list"])
+                page = await self._fetch_gmail_initial(access_token, page_token)
+            else:
+                await bucket.acquire(GMAIL_QUOTA_UNITS["history.list"])
+                page = await self._fetch_gmail_incremental(
+                    access_token, history_id, page_token
+                )
             
-            return {
-                "status": "success",
-                "count": len(detailed_messages),
-                "duration": duration,
-                "cached_count": len(message_ids) - len(uncached_ids),
-                "api_calls": len(uncached_ids) // self.gmail_batch.batch_size + 1
-            }
+            yield page
             
-        except Exception as e:
-            self.circuit_breaker.record_failure()
-            logger.error(f"Gmail sync failed for user {user_id}: {e}")
-            raise
+            page_token = page["next_page_token"]
+            if not page_token:
+                return
     
-    async def _fetch_gmail_initial(self, access_token: str) -> Dict:
-        """Gmail初回同期（直近メッセージ取得）"""
+    async def _fetch_gmail_history_id(self, access_token: str) -> str:
+        """現在の historyId を取得（初回同期の基点）"""
+        
+        client = get_http_client()
+        response = await client.get(
+            "https://www.googleapis.com/gmail/v1/users/me/profile",
+            headers={"Authorization": f"Bearer {access_token}"},
+            params={"fields": "historyId"}
+        )
+        response.raise_for_status()
+        return str(response.json()["historyId"])
+    
+    async def _fetch_gmail_initial(
+        self, 
+        access_token: str,
+        page_token: Optional[str] = None
+    ) -> Dict:
+        """Gmail初回同期（messages.list の1ページ取得）"""
         
         headers = {"Authorization": f"Bearer {access_token}"}
         params = {
-            "maxResults": 100,
+            "maxResults": self.page_size,
             "q": "in:inbox OR in:sent",  # 受信・送信両方
-            "fields": "messages/id,messages/threadId,nextPageToken,resultSizeEstimate"
+            "fields": "messages/id,nextPageToken"
         }
+        if page_token:
+            params["pageToken"] = page_token
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(
-                "https://www.googleapis.com/gmail/v1/users/me/messages",
-                headers=headers,
-                params=params
-            )
-            response.raise_for_status()
-            return response.json()
+        client = get_http_client()
+        response = await client.get(
+            "https://www.googleapis.com/gmail/v1/users/me/messages",
+            headers=headers,
+            params=params
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        return {
+            "message_ids": [msg["id"] for msg in data.get("messages", [])],
+            "next_page_token": data.get("nextPageToken"),
+            "history_id": None
+        }
     
     async def _fetch_gmail_incremental(
         self, 
         access_token: str, 
-        history_id: str
+        history_id: str,
+        page_token: Optional[str] = None
     ) -> Dict:
-        """Gmail増分同期（履歴ベース）"""
+        """Gmail増分同期（history.list の1ページ取得）"""
         
         headers = {"Authorization": f"Bearer {access_token}"}
         params = {
             "startHistoryId": history_id,
-            "historyTypes": ["messageAdded", "messageDeleted"],
-            "fields": "history,historyId,nextPageToken"
+            "historyTypes": ["messageAdded"],
+            "maxResults": self.page_size,
+            "fields": "history/messagesAdded/message/id,historyId,nextPageToken"
         }
+        if page_token:
+            params["pageToken"] = page_token
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(
-                "https://www.googleapis.com/gmail/v1/users/me/history",
-                headers=headers,
-                params=params
-            )
-            
-            if response.status_code == 404:
-                # 履歴が古すぎる場合は初回同期に切り替え
-                logger.warning("History ID too old, falling back to initial sync")
-                return await self._fetch_gmail_initial(access_token)
-            
-            response.raise_for_status()
-            history_data = response.json()
-            
-            # 履歴から新しいメッセージを抽出
-            messages = []
-            for history_record in history_data.get("history", []):
-                for added in history_record.get("messagesAdded", []):
-                    messages.append(added["message"])
-            
-            return {
-                "messages": messages,
-                "historyId": history_data.get("historyId")
-            }
+        client = get_http_client()
+        response = await client.get(
+            "https://www.googleapis.com/gmail/v1/users/me/history",
+            headers=headers,
+            params=params
+        )
+        
+        if response.status_code == 404:
+            raise GmailHistoryExpired(history_id)
+        
+        response.raise_for_status()
+        history_data = response.json()
+        
+        # 履歴から新しいメッセージIDを抽出（同一ページ内の重複を除外）
+        message_ids = []
+        seen = set()
+        for history_record in history_data.get("history", []):
+            for added in history_record.get("messagesAdded", []):
+                msg_id = added["message"]["id"]
+                if msg_id not in seen:
+                    seen.add(msg_id)
+                    message_ids.append(msg_id)
+        
+        return {
+            "message_ids": message_ids,
+            "next_page_token": history_data.get("nextPageToken"),
+            "history_id": history_data.get("historyId")
+        }
     
-    async def _get_fresh_access_token(self, account_id: str) -> str:
+    async def _get_fresh_access_token(self, account_id: str, user_id: str) -> str:
         """新しいアクセストークンの取得"""
         
-        # OAuthサービスからトークン取得
-        token_data = await self.oauth_service.get_valid_token(account_id)
+        async with AsyncSessionLocal() as db:
+            account = await crud_email.get_email_account(
+                db, account_id=account_id, user_id=user_id
+            )
         
-        if not token_data:
+        if not account or not account.refresh_token:
             raise HTTPException(
                 status_code=401,
                 detail="Gmail account not connected or token expired"
             )
         
+        # OAuthサービスからトークン取得（有効期限内はキャッシュから返る）
+        token_data = await self.oauth_service.get_access_token(
+            account_id, account.refresh_token, account.provider
+        )
+        
         return token_data["access_token"]
     
     async def _process_messages(
         self, 
         messages: List[Dict], 
         user_id: str, 
-        account_id: str
+        account_id: str,
+        sync_job_id: str
     ) -> Dict:
-        """メッセージの処理とデータベース保存"""
+        """
+        メッセージの処理とデータベース保存
+
+        処理済みのメッセージは呼び出し側（_sync_message_page）で除外済みのため、
+        crud_email.insert_new_processed_emails で一括登録する。
+        スレッド分析には実際に登録された行のみを渡す
+        """
         
         if not messages:
             return {"processed": 0, "threads": 0}
         
-        # スレッドごとにグループ化
-        thread_groups = {}
-        processed_count = 0
+        # ページ内の重複を除外
+        unique_messages = {message["id"]: message for message in messages}
         
         async with AsyncSessionLocal() as db:
-            for message in messages:
-                thread_id = message.get("threadId") or message["id"]
-                
-                # 既に処理済みかチェック
-                existing = await db.execute(
-                    "SELECT id FROM processed_emails WHERE message_id = :msg_id",
-                    {"msg_id": message["id"]}
-                )
-                
-                if existing.first():
-                    continue  # 重複スキップ
-                
-                # ProcessedEmailとして保存
-                processed_email = ProcessedEmail(
-                    message_id=message["id"],
-                    thread_id=thread_id,
-                    user_id=user_id,
-                    account_id=account_id,
-                    subject=self._extract_subject(message),
-                    sender=self._extract_sender(message),
-                    received_at=self._parse_internal_date(message.get("internalDate")),
-                    snippet=message.get("snippet", ""),
-                    raw_data=message
-                )
-                
-                db.add(processed_email)
-                processed_count += 1
-                
-                # スレッドグループに追加
-                if thread_id not in thread_groups:
-                    thread_groups[thread_id] = []
-                thread_groups[thread_id].append(message)
+            rows = [
+                self._build_processed_email_row(message, sync_job_id)
+                for message in unique_messages.values()
+            ]
             
+            # 並行同期・レガシー同期との競合は email_id 単位のキーテーブルで吸収し、
+            # 実際に挿入された行のみ返す（プロバイダー側ID -> processed_emails.id）
+            inserted = await crud_email.insert_new_processed_emails(db, rows)
             await db.commit()
         
+        # スレッドごとにグループ化（新規登録分のみ・ページ内の順序を保つ）
+        thread_groups: Dict[str, List[Dict]] = {}
+        for email_id, message in unique_messages.items():
+            if email_id not in inserted:
+                continue
+            thread_id = message.get("threadId") or message["id"]
+            thread_groups.setdefault(thread_id, []).append(message)
+        
         # スレッド単位でAI分析タスクをキューに追加
         from app.worker.tasks.email import analyze_email_thread_for_tasks
         
         for thread_id, thread_messages in thread_groups.items():
+            # スレッドの最初のメール（返信でないもの）または最新のメールを代表とする
+            primary_message = next(
+                (m for m in thread_messages if not self._extract_header(m, "In-Reply-To")),
+                thread_messages[-1]
+            )
             analyze_email_thread_for_tasks.delay(
-                thread_messages, user_id, account_id
+                thread_id=thread_id,
+                email_ids=[inserted[m["id"]] for m in thread_messages],
+                user_id=user_id,
+                primary_subject=self._extract_subject(primary_message)
             )
         
         return {
-            "processed": processed_count,
+            "processed": len(inserted),
             "threads": len(thread_groups)
         }
     
-    def _extract_subject(self, message: Dict) -> str:
-        """件名の抽出"""
+    async def _get_processed_ids(self, message_ids: List[str]) -> Set[str]:
+        """処理済みのメッセージIDを email_id = ANY(:ids) の1クエリで取得"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(ProcessedEmailKey.email_id).where(
+                    ProcessedEmailKey.email_id == any_(
+                        bindparam("ids", message_ids, type_=ARRAY(String))
+                    )
+                )
+            )
+            return set(result.scalars())
+    
+    def _build_processed_email_row(
+        self, 
+        message: Dict, 
+        sync_job_id: str
+    ) -> Dict:
+        """processed_emails への一括INSERT用の行を構築"""
+        now = datetime.utcnow()
+        return {
+            "id": uuid.uuid4(),
+            "sync_job_id": sync_job_id,
+            "email_id": message["id"],
+            "thread_id": message.get("threadId") or message["id"],
+            "sender": self._extract_sender(message),
+            "subject": self._extract_subject(message),
+            "body_preview": message.get("snippet", ""),
+            "email_date": self._parse_internal_date(message.get("internalDate")) or now,
+            "processed_at": now
+        }
+    
+    def _extract_header(self, message: Dict, name: str) -> str:
+        """ヘッダー値の抽出（大文字小文字を区別しない）"""
         headers = message.get("payload", {}).get("headers", [])
         for header in headers:
-            if header.get("name", "").lower() == "subject":
+            if header.get("name", "").lower() == name.lower():
                 return header.get("value", "")
         return ""
     
+    def _extract_subject(self, message: Dict) -> str:
+        """件名の抽出"""
+        return self._extract_header(message, "Subject")
+    
     def _extract_sender(self, message: Dict) -> str:
         """送信者の抽出"""
-        headers = message.get("payload", {}).get("headers", [])
-        for header in headers:
-            if header.get("name", "").lower() == "from":
-                return header.get("value", "")
-        return ""
+        return self._extract_header(message, "From")
     
     def _parse_internal_date(self, internal_date: str) -> Optional[datetime]:
         """内部日付の解析"""
@@ -635,8 +1369,10 @@ class OptimizedEmailSyncService:
 class PerformanceMonitor:
     """パフォーマンス監視サービス"""
     
-    def __init__(self):
-        self.redis = redis.Redis.from_url(settings.REDIS_URL)
+    @property
+    def redis(self) -> redis.Redis:
+        """共有コネクションプールのクライアント"""
+        return get_redis()
     
     async def track_sync_performance(
         self,
@@ -0,0 +1,120 @@
+"""
+条件付きGET（ETag / If-None-Match）
+
+レスポンスの元データに紐づくキャッシュタグのバージョン（書き込み時に更新）と
+クエリパラメータから ETag を作り、クライアントの持つ版と一致すれば
+DB を参照せずに 304 を返す。
+
+RESPONSE_CACHE_ENABLED の場合は生成済みのレスポンス本文も ETag 単位で保存し、
+別の端末からの同一リクエストにも DB を参照せずに応答する
+"""
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Mapping, Optional, Sequence
+from urllib.parse import urlencode
+
+import redis.asyncio as redis
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.services.cache_service import get_tag_versions
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_KEY = "response:{namespace}:{etag}"
+
+# 毎回サーバーへ確認させる（304 で本文の転送を省略）
+CACHE_CONTROL = "private, no-cache"
+
+
+def canonical_query(params: Mapping[str, Any]) -> str:
+    """
+    エンドポイントが解決したパラメータ（既定値を含む）からクエリ文字列を作成
+
+    /tasks と /tasks?page=1&limit=20 のように既定値の有無だけが異なるリクエストを
+    同じ ETag・レスポンスキャッシュにまとめる（None は指定なしとして除く）
+    """
+    return urlencode(sorted((key, str(value)) for key, value in params.items() if value is not None))
+
+
+def build_etag(
+    namespace: str,
+    tags: Sequence[str],
+    versions: Sequence[str],
+    query: str,
+    vary: Sequence[str] = ()
+) -> str:
+    """タグのバージョンとクエリ（と vary）から ETag を作成"""
+    params = "&".join(sorted(query.split("&"))) if query else ""
+    source = "|".join([namespace, *tags, *versions, params, *vary])
+    return '"' + hashlib.sha256(source.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match に ETag が含まれるか（弱いETag・* も考慮）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {value.strip().removeprefix("W/") for value in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+async def conditional_response(
+    request: Request,
+    namespace: str,
+    tags: Sequence[str],
+    render: Callable[[], Awaitable[Any]],
+    vary: Sequence[str] = (),
+    params: Optional[Mapping[str, Any]] = None
+) -> Response:
+    """
+    ETag 付きのJSONレスポンスを返す
+
+    Args:
+        request: リクエスト（If-None-Match とクエリを参照）
+        namespace: エンドポイントの識別子
+        tags: レスポンスの元データのキャッシュタグ（ユーザーIDを含むこと）
+        render: レスポンス本文を生成するコルーチン関数（変更があった場合のみ呼ばれる）
+        vary: タグ以外で結果が変わる要素（日付で区切られる集計期間など）
+        params: 結果を決めるクエリパラメータ（既定値を含む）。指定しない場合は
+            リクエストのクエリをそのまま使う
+    """
+    try:
+        versions = await get_tag_versions(tags)
+    except redis.RedisError as e:
+        # バージョンが取れない場合は条件付きGETを使わずに応答する
+        logger.warning(f"Conditional GET unavailable: {e}")
+        return _json_response(await render())
+
+    query = canonical_query(params) if params is not None else request.url.query
+    etag = build_etag(namespace, tags, versions, query, vary)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    cache_key = RESPONSE_CACHE_KEY.format(namespace=namespace, etag=etag.strip('"'))
+    if settings.RESPONSE_CACHE_ENABLED:
+        try:
+            body = await get_redis().get(cache_key)
+            if body is not None:
+                return Response(body, media_type="application/json", headers=headers)
+        except redis.RedisError as e:
+            logger.warning(f"Response cache get error: {e}")
+
+    body = json.dumps(jsonable_encoder(await render()))
+
+    if settings.RESPONSE_CACHE_ENABLED:
+        try:
+            await get_redis().setex(cache_key, settings.RESPONSE_CACHE_TTL, body)
+        except redis.RedisError as e:
+            logger.warning(f"Response cache set error: {e}")
+
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _json_response(content: Any) -> Response:
+    return Response(json.dumps(jsonable_encoder(content)), media_type="application/json")
@@ -0,0 +1,198 @@
+"""
+処理済みメッセージの Bloom フィルタ
+
+アカウント毎に処理済みメッセージIDの Bloom フィルタを Redis のビットマップとして保持する。
+同期開始時にビットマップを1回だけ読み込み、プロセス内で判定することで
+「確実に新規」のIDは Redis / DB への照会を省略し、
+「処理済みかもしれない」IDのみ processed_emails で正確に確認する。
+
+フィルタが無い・容量を超えた場合は processed_emails から作り直す
+"""
+import hashlib
+import logging
+import math
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import redis.asyncio as redis
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.redis_client import get_redis
+from app.models.email import EmailSyncJob, ProcessedEmail
+
+logger = logging.getLogger(__name__)
+
+SEEN_FILTER_KEY = "seen:bloom:{account_id}"
+# capacity / num_bits / num_hashes / count（登録済み件数の概算）
+SEEN_FILTER_META_KEY = "seen:bloom_meta:{account_id}"
+
+REBUILD_FETCH_SIZE = 10000
+
+
+def bloom_parameters(capacity: int, error_rate: float) -> Tuple[int, int]:
+    """想定件数と誤判定率から (ビット数, ハッシュ関数の数) を求める"""
+    num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+    num_bits = (num_bits + 7) // 8 * 8
+    num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+    return num_bits, num_hashes
+
+
+class SeenMessageFilter:
+    """
+    アカウント単位の処理済みメッセージIDフィルタ
+
+    偽陽性（未処理なのに処理済みかもしれないと判定）はあるが、
+    偽陰性は無いため「確実に新規」の判定はそのまま信頼できる。
+    Redis が使えない場合は全IDを「処理済みかもしれない」として扱う
+    """
+
+    def __init__(
+        self,
+        account_id: str,
+        bits: Optional[bytearray],
+        num_bits: int,
+        num_hashes: int,
+        capacity: int
+    ):
+        self.account_id = str(account_id)
+        self.bits = bits
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.capacity = capacity
+
+    @property
+    def key(self) -> str:
+        return SEEN_FILTER_KEY.format(account_id=self.account_id)
+
+    @property
+    def meta_key(self) -> str:
+        return SEEN_FILTER_META_KEY.format(account_id=self.account_id)
+
+    @classmethod
+    async def load(cls, account_id: str) -> "SeenMessageFilter":
+        """Redis からフィルタを読み込む（無い・容量超過の場合は作り直す）"""
+        account_id = str(account_id)
+        try:
+            meta = await get_redis().hgetall(SEEN_FILTER_META_KEY.format(account_id=account_id))
+            bits = await get_redis(decode_responses=False).get(
+                SEEN_FILTER_KEY.format(account_id=account_id)
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Seen-message filter unavailable for {account_id}: {e}")
+            return cls(account_id, None, 0, 0, 0)
+
+        if not meta or bits is None:
+            return await cls.rebuild(account_id)
+
+        capacity = int(meta["capacity"])
+        count = int(meta.get("count", 0))
+        if count > capacity:
+            # 誤判定率が上がるため容量を増やして作り直す
+            return await cls.rebuild(account_id, capacity=count * 2)
+
+        return cls(
+            account_id,
+            bytearray(bits),
+            int(meta["num_bits"]),
+            int(meta["num_hashes"]),
+            capacity
+        )
+
+    @classmethod
+    async def rebuild(
+        cls,
+        account_id: str,
+        capacity: Optional[int] = None
+    ) -> "SeenMessageFilter":
+        """processed_emails からアカウントの処理済みIDを読み直してフィルタを作成"""
+        account_id = str(account_id)
+
+        async with AsyncSessionLocal() as db:
+            result = await db.stream_scalars(
+                select(ProcessedEmail.email_id)
+                .join(EmailSyncJob, ProcessedEmail.sync_job_id == EmailSyncJob.id)
+                .where(EmailSyncJob.email_account_id == account_id)
+                .execution_options(yield_per=REBUILD_FETCH_SIZE)
+            )
+            email_ids = [email_id async for email_id in result]
+
+        capacity = max(capacity or 0, len(email_ids) * 2, settings.SEEN_FILTER_CAPACITY)
+        num_bits, num_hashes = bloom_parameters(capacity, settings.SEEN_FILTER_ERROR_RATE)
+        seen = cls(account_id, bytearray(num_bits // 8), num_bits, num_hashes, capacity)
+        for email_id in email_ids:
+            seen._set_local(email_id)
+
+        try:
+            async with get_redis(decode_responses=False).pipeline(transaction=True) as pipe:
+                pipe.set(seen.key, bytes(seen.bits), ex=settings.SEEN_FILTER_TTL)
+                pipe.delete(seen.meta_key)
+                pipe.hset(seen.meta_key, mapping={
+                    "capacity": capacity,
+                    "num_bits": num_bits,
+                    "num_hashes": num_hashes,
+                    "count": len(email_ids),
+                })
+                pipe.expire(seen.meta_key, settings.SEEN_FILTER_TTL)
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Failed to store seen-message filter for {account_id}: {e}")
+
+        logger.info(f"Rebuilt seen-message filter for {account_id} with {len(email_ids)} IDs")
+        return seen
+
+    def _offsets(self, message_id: str) -> List[int]:
+        """ダブルハッシュ法でビット位置を求める"""
+        digest = hashlib.blake2b(message_id.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def _set_local(self, message_id: str) -> List[int]:
+        """ローカルのビットマップに登録し、ビット位置を返す"""
+        offsets = self._offsets(message_id)
+        for offset in offsets:
+            # Redis の SETBIT と同じく各バイトの最上位ビットから数える
+            self.bits[offset >> 3] |= 0x80 >> (offset & 7)
+        return offsets
+
+    def might_contain(self, message_id: str) -> bool:
+        """処理済みの可能性があれば True（False なら確実に新規）"""
+        if self.bits is None:
+            return True
+        for offset in self._offsets(message_id):
+            index = offset >> 3
+            if index >= len(self.bits) or not self.bits[index] & (0x80 >> (offset & 7)):
+                return False
+        return True
+
+    def partition(self, message_ids: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """(確実に新規, 処理済みかもしれない) に分割"""
+        new_ids: List[str] = []
+        maybe_seen: List[str] = []
+        for message_id in message_ids:
+            (maybe_seen if self.might_contain(message_id) else new_ids).append(message_id)
+        return new_ids, maybe_seen
+
+    async def add(self, message_ids: Sequence[str]) -> None:
+        """処理済みとして登録（ローカルと Redis の両方）"""
+        if self.bits is None or not message_ids:
+            return
+
+        added = 0
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                for message_id in message_ids:
+                    if self.might_contain(message_id):
+                        continue
+                    added += 1
+                    for offset in self._set_local(message_id):
+                        pipe.setbit(self.key, offset, 1)
+                if added:
+                    pipe.hincrby(self.meta_key, "count", added)
+                    pipe.expire(self.key, settings.SEEN_FILTER_TTL)
+                    pipe.expire(self.meta_key, settings.SEEN_FILTER_TTL)
+                    await pipe.execute()
+        except redis.RedisError as e:
+            # 登録漏れは「新規」と誤判定されるだけで、INSERT 側の重複排除で吸収される
+            logger.warning(f"Failed to update seen-message filter for {self.account_id}: {e}")
@@ -0,0 +1,205 @@
+"""
+同期ジョブ進捗サービス
+
+メール同期の進捗カウンターをメモリ上で集約し、一定間隔ごとに
+email_sync_jobs テーブルと Redis へまとめて書き込む。
+ステータスAPIはここに保存された進捗のみを参照する
+"""
+
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import redis.asyncio as redis
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.redis_client import get_redis
+from app.models.email import EmailAccount, EmailSyncJob, EmailSyncJobStatus
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_KEY = "sync_progress:{job_id}"
+
+
+class SyncProgressTracker:
+    """
+    同期ジョブ1件分の進捗トラッカー
+
+    add_total / advance はメモリ上のカウンターを更新するだけで、
+    前回の書き込みから SYNC_PROGRESS_FLUSH_INTERVAL_MS 経過した場合のみ
+    DB と Redis に反映する（開始・完了・失敗時は即時反映）
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        user_id: Optional[str] = None,
+        account_id: Optional[str] = None
+    ):
+        self.job_id = str(job_id)
+        self.user_id = user_id
+        self.account_id = account_id
+        self.status = EmailSyncJobStatus.PENDING
+        self.total_emails = 0
+        self.processed_emails = 0
+        self.error_message: Optional[str] = None
+        self.started_at = datetime.utcnow()
+        self.completed_at: Optional[datetime] = None
+
+        self.flush_interval = settings.SYNC_PROGRESS_FLUSH_INTERVAL_MS / 1000
+        self._last_flush = 0.0
+        self._dirty = False
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    async def for_job(
+        cls,
+        job_id: Optional[str],
+        user_id: str,
+        account_id: str
+    ) -> "SyncProgressTracker":
+        """
+        同期ジョブのトラッカーを取得する
+
+        取り込んだメールは同期ジョブに紐づけて保存するため（processed_emails.sync_job_id は必須）、
+        ジョブIDが無い場合（定期同期・一括同期など）はここで同期ジョブを作成する
+        """
+        if job_id is None:
+            from app.crud.crud_email import crud_email
+
+            async with AsyncSessionLocal() as db:
+                job = await crud_email.create_sync_job(db, account_id=account_id)
+            job_id = str(job.id)
+        return cls(job_id, user_id=user_id, account_id=account_id)
+
+    async def start(self) -> None:
+        """処理開始を記録"""
+        self.status = EmailSyncJobStatus.PROCESSING
+        self.started_at = datetime.utcnow()
+        self.completed_at = None
+        self.error_message = None
+        await self.flush()
+
+    async def add_total(self, count: int) -> None:
+        """処理対象件数を加算"""
+        self.total_emails += count
+        self._dirty = True
+        await self._maybe_flush()
+
+    async def advance(self, count: int = 1) -> None:
+        """処理済み件数を加算"""
+        self.processed_emails += count
+        self._dirty = True
+        await self._maybe_flush()
+
+    async def complete(self) -> None:
+        """完了を記録"""
+        self.status = EmailSyncJobStatus.COMPLETED
+        self.completed_at = datetime.utcnow()
+        await self.flush()
+
+    async def fail(self, error: str) -> None:
+        """失敗を記録"""
+        self.status = EmailSyncJobStatus.FAILED
+        self.error_message = error
+        self.completed_at = datetime.utcnow()
+        await self.flush()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """現在の進捗をステータスAPIの形式で返す"""
+        return {
+            "id": self.job_id,
+            "user_id": self.user_id,
+            "email_account_id": self.account_id or "",
+            "status": self.status.value,
+            "total_emails": self.total_emails,
+            "processed_emails": self.processed_emails,
+            "started_at": self.started_at.isoformat(),
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "error_message": self.error_message
+        }
+
+    async def _maybe_flush(self) -> None:
+        """前回の書き込みから間隔が空いていれば反映"""
+        if self._dirty and time.monotonic() - self._last_flush >= self.flush_interval:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """集約した進捗を Redis と email_sync_jobs に書き込む"""
+        async with self._lock:
+            snapshot = self.snapshot()
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+            # 進捗の書き込み失敗で同期自体は止めない
+            try:
+                await get_redis().setex(
+                    PROGRESS_KEY.format(job_id=self.job_id),
+                    settings.SYNC_PROGRESS_TTL,
+                    json.dumps(snapshot)
+                )
+            except redis.RedisError as e:
+                logger.warning(f"Failed to write sync progress to Redis: {e}")
+
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(EmailSyncJob)
+                        .where(EmailSyncJob.id == self.job_id)
+                        .values(
+                            status=self.status,
+                            total_emails=self.total_emails,
+                            processed_emails=self.processed_emails,
+                            completed_at=self.completed_at,
+                            error_details=(
+                                {"error": self.error_message} if self.error_message else None
+                            )
+                        )
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.warning(f"Failed to write sync progress to database: {e}")
+
+
+async def get_sync_progress(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    同期ジョブの進捗を取得
+
+    Redis に無い場合（期限切れ・書き込み失敗）は email_sync_jobs から復元する
+    """
+
+    try:
+        cached = await get_redis().get(PROGRESS_KEY.format(job_id=job_id))
+        if cached:
+            return json.loads(cached)
+    except redis.RedisError as e:
+        logger.warning(f"Failed to read sync progress from Redis: {e}")
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(EmailSyncJob, EmailAccount.user_id)
+            .join(EmailAccount, EmailSyncJob.email_account_id == EmailAccount.id)
+            .where(EmailSyncJob.id == job_id)
+        )
+        row = result.first()
+
+    if not row:
+        return None
+
+    job, user_id = row
+    return {
+        "id": str(job.id),
+        "user_id": str(user_id),
+        "email_account_id": str(job.email_account_id),
+        "status": job.status.value if hasattr(job.status, "value") else job.status,
+        "total_emails": job.total_emails,
+        "processed_emails": job.processed_emails,
+        "started_at": job.started_at.isoformat(),
+        "completed_at": job.completed_at.isoformat() if job.completed_at else None,
+        "error_message": (job.error_details or {}).get("error")
+    }
@@ -4,12 +4,15 @@
 import os
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
-from sqlalchemy.orm import Session
-from sqlalchemy import func, extract, and_
+from sqlalchemy import func, extract, and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
 from app.models.usage import OpenAIUsage
 from app.models.user import User
+from app.services.cache_service import invalidate_tags
+
+# 使用量を記録したら無効化する（使用量エンドポイントのレスポンスキャッシュ）
+USER_USAGE_TAG = "user:{user_id}:usage"
 
 
 class UserUsageTracker:
@@ -45,10 +48,10 @@ class UserUsageTracker:
         }
     }
     
-    def __init__(self, db: Session = None):
-        self.db = db or next(get_db())
+    def __init__(self, db: AsyncSession):
+        self.db = db
     
-    def log_usage(
+    async def log_usage(
         self,
         user_id: str,
         model: str,
@@ -87,8 +90,9 @@ class UserUsageTracker:
         )
         
         self.db.add(usage_record)
-        self.db.commit()
-        self.db.refresh(usage_record)
+        await self.db.commit()
+        await self.db.refresh(usage_record)
+        await invalidate_tags(USER_USAGE_TAG.format(user_id=user_id))
         
         return usage_record
     
@@ -118,7 +122,7 @@ class UserUsageTracker:
         
         return round(input_cost + output_cost, 6)
     
-    def get_user_monthly_usage(
+    async def get_user_monthly_usage(
         self,
         user_id: str,
         year: int = None,
@@ -131,57 +135,47 @@ class UserUsageTracker:
             year = year or now.year
             month = month or now.month
         
+        month_filter = (
+            OpenAIUsage.user_id == user_id,
+            extract('year', OpenAIUsage.created_at) == year,
+            extract('month', OpenAIUsage.created_at) == month
+        )
+        
         # 月次合計の取得
-        monthly_total = self.db.query(
+        monthly_total = (await self.db.execute(select(
             func.sum(OpenAIUsage.input_tokens).label('total_input_tokens'),
             func.sum(OpenAIUsage.output_tokens).label('total_output_tokens'),
             func.sum(OpenAIUsage.total_tokens).label('total_tokens'),
             func.sum(OpenAIUsage.cost_usd).label('total_cost_usd'),
             func.sum(OpenAIUsage.cost_jpy).label('total_cost_jpy'),
             func.count(OpenAIUsage.id).label('request_count')
-        ).filter(
-            OpenAIUsage.user_id == user_id,
-            extract('year', OpenAIUsage.created_at) == year,
-            extract('month', OpenAIUsage.created_at) == month
-        ).first()
+        ).where(*month_filter))).first()
         
         # モデル別の使用量
-        model_stats = self.db.query(
+        model_stats = (await self.db.execute(select(
             OpenAIUsage.model,
             func.sum(OpenAIUsage.input_tokens).label('input_tokens'),
             func.sum(OpenAIUsage.output_tokens).label('output_tokens'),
             func.sum(OpenAIUsage.cost_usd).label('cost_usd'),
             func.count(OpenAIUsage.id).label('requests')
-        ).filter(
-            OpenAIUsage.user_id == user_id,
-            extract('year', OpenAIUsage.created_at) == year,
-            extract('month', OpenAIUsage.created_at) == month
-        ).group_by(OpenAIUsage.model).all()
+        ).where(*month_filter).group_by(OpenAIUsage.model))).all()
         
         # 用途別の使用量
-        purpose_stats = self.db.query(
+        purpose_stats = (await self.db.execute(select(
             OpenAIUsage.purpose,
             func.sum(OpenAIUsage.input_tokens).label('input_tokens'),
             func.sum(OpenAIUsage.output_tokens).label('output_tokens'),
             func.sum(OpenAIUsage.cost_usd).label('cost_usd'),
             func.count(OpenAIUsage.id).label('requests')
-        ).filter(
-            OpenAIUsage.user_id == user_id,
-            extract('year', OpenAIUsage.created_at) == year,
-            extract('month', OpenAIUsage.created_at) == month
-        ).group_by(OpenAIUsage.purpose).all()
+        ).where(*month_filter).group_by(OpenAIUsage.purpose))).all()
         
         # 日別使用量（グラフ用）
-        daily_stats = self.db.query(
+        daily_stats = (await self.db.execute(select(
             func.date(OpenAIUsage.created_at).label('date'),
             func.sum(OpenAIUsage.cost_usd).label('daily_cost'),
             func.sum(OpenAIUsage.total_tokens).label('daily_tokens'),
             func.count(OpenAIUsage.id).label('daily_requests')
-        ).filter(
-            OpenAIUsage.user_id == user_id,
-            extract('year', OpenAIUsage.created_at) == year,
-            extract('month', OpenAIUsage.created_at) == month
-        ).group_by(func.date(OpenAIUsage.created_at)).order_by(func.date(OpenAIUsage.created_at)).all()
+        ).where(*month_filter).group_by(func.date(OpenAIUsage.created_at)).order_by(func.date(OpenAIUsage.created_at)))).all()
         
         return {
             "year": year,
@@ -232,7 +226,7 @@ class UserUsageTracker:
             ]
         }
     
-    def get_user_recent_usage(
+    async def get_user_recent_usage(
         self,
         user_id: str,
         days: int = 7,
@@ -242,16 +236,16 @@ class UserUsageTracker:
         
         since_date = datetime.utcnow() - timedelta(days=days)
         
-        recent_usage = self.db.query(OpenAIUsage).filter(
+        recent_usage = (await self.db.execute(select(OpenAIUsage).where(
             and_(
                 OpenAIUsage.user_id == user_id,
                 OpenAIUsage.created_at >= since_date
             )
-        ).order_by(OpenAIUsage.created_at.desc()).limit(limit).all()
+        ).order_by(OpenAIUsage.created_at.desc()).limit(limit))).scalars().all()
         
         return [usage.to_dict() for usage in recent_usage]
     
-    def get_user_usage_summary(
+    async def get_user_usage_summary(
         self,
         user_id: str,
         days: int = 30
@@ -260,7 +254,7 @@ class UserUsageTracker:
         
         since_date = datetime.utcnow() - timedelta(days=days)
         
-        summary = self.db.query(
+        summary = (await self.db.execute(select(
             func.sum(OpenAIUsage.input_tokens).label('total_input_tokens'),
             func.sum(OpenAIUsage.output_tokens).label('total_output_tokens'),
             func.sum(OpenAIUsage.total_tokens).label('total_tokens'),
@@ -268,12 +262,12 @@ class UserUsageTracker:
             func.sum(OpenAIUsage.cost_jpy).label('total_cost_jpy'),
             func.count(OpenAIUsage.id).label('request_count'),
             func.max(OpenAIUsage.created_at).label('last_used')
-        ).filter(
+        ).where(
             and_(
                 OpenAIUsage.user_id == user_id,
                 OpenAIUsage.created_at >= since_date
             )
-        ).first()
+        ))).first()
         
         return {
             "period_days": days,
@@ -288,7 +282,3 @@ class UserUsageTracker:
                 (summary.total_cost_usd or 0.0) / max(summary.request_count or 1, 1), 6
             )
         }
-
-
-# グローバルインスタンス
-user_usage_tracker = UserUsageTracker()
\ No newline at end of file
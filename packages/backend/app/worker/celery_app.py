@@ -1,5 +1,15 @@
+import asyncio
+from typing import Any, Coroutine, Optional, TypeVar
+
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown
+
 from app.core.config import settings
+from app.core.database import dispose_engines, set_database_role
+from app.core.http_client import close_http_client
+from app.core.redis_client import close_redis
+
+T = TypeVar("T")
 
 # Create Celery app
 celery_app = Celery(
@@ -29,4 +39,57 @@ celery_app.conf.task_routes = {
     "app.worker.tasks.email.*": {"queue": "email"},
     "app.worker.tasks.ai.*": {"queue": "ai"},
     "app.worker.tasks.general.*": {"queue": "default"},
-}
\ No newline at end of file
+    "app.worker.tasks.maintenance.*": {"queue": "default"},
+}
+
+# 定期実行タスク（celery beat）
+celery_app.conf.beat_schedule = {
+    "reconcile-dashboard-stats": {
+        "task": "app.worker.tasks.maintenance.reconcile_dashboard_stats",
+        "schedule": settings.DASHBOARD_STATS_RECONCILE_INTERVAL,
+    },
+    "maintain-partitions": {
+        "task": "app.worker.tasks.maintenance.maintain_partitions",
+        "schedule": settings.PARTITION_MAINTENANCE_INTERVAL,
+    },
+}
+
+
+# ワーカープロセス共有のイベントループ
+# タスク毎にループを作り直すと共有HTTPクライアントの接続が再利用できないため、
+# プロセス単位で1つのループを使い回す
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def run_async(coro: Coroutine[Any, Any, T]) -> T:
+    """ワーカープロセス共有のイベントループでコルーチンを実行する"""
+    global _worker_loop
+
+    if _worker_loop is None or _worker_loop.is_closed():
+        _worker_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker_loop)
+
+    return _worker_loop.run_until_complete(coro)
+
+
+@worker_init.connect
+def _init_worker_resources(**kwargs: Any) -> None:
+    """ワーカー起動時に DB 接続を worker 用のプールに切り替える（子プロセスにも引き継がれる）"""
+    set_database_role("worker")
+
+
+@worker_process_shutdown.connect
+def _shutdown_worker_resources(**kwargs: Any) -> None:
+    """ワーカープロセス終了時に共有リソースを解放する"""
+    global _worker_loop
+
+    if _worker_loop is None or _worker_loop.is_closed():
+        return
+
+    try:
+        _worker_loop.run_until_complete(close_http_client())
+        _worker_loop.run_until_complete(close_redis())
+        _worker_loop.run_until_complete(dispose_engines())
+    finally:
+        _worker_loop.close()
+        _worker_loop = None
@@ -1,2 +1,3 @@
 from .email import *
-from .ai import *
\ No newline at end of file
+from .ai import *
+from .maintenance import *
\ No newline at end of file
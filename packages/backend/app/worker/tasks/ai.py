@@ -1,22 +1,41 @@
-import asyncio
 from typing import Dict, List, Any, Optional
 from celery import Task
 from datetime import datetime
+import hashlib
 import json
 import boto3
 from botocore.exceptions import ClientError
 
-from app.worker.celery_app import celery_app
+from app.worker.celery_app import celery_app, run_async
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import AsyncSessionLocal
 from app.models.email import ProcessedEmail
 from app.models.task import Task as TaskModel
 from app.models.history import AISupport
-from app.crud.crud_email import crud_email
+from app.crud.crud_email import crud_email, EMAIL_TAG
 from app.crud.crud_task import crud_task
 from app.schemas.task import TaskCreate
 from app.services.openai_service import OpenAIService
+from app.services.ai_response_cache import AIResponseCache
 from app.services.bedrock_service import BedrockService
+from app.services.cache_service import TaggedCache
+
+
+# Bump when the thread analysis prompts change so stale responses are not reused
+THREAD_TASK_PROMPT_VERSION = "v1"
+
+# Content-addressed cache so retries and re-syncs of an unchanged thread skip the model
+thread_analysis_cache = AIResponseCache(
+    "ai:thread_analysis",
+    ttl=settings.AI_RESPONSE_CACHE_TTL,
+    stale_ttl=settings.AI_CACHE_STALE_TTL
+)
+
+# Thread contexts are reused until one of their emails is rewritten (EMAIL_TAG)
+thread_context_cache = TaggedCache(
+    "ai:thread_context",
+    ttl=settings.THREAD_CONTEXT_CACHE_TTL
+)
 
 
 class AIAnalysisTask(Task):
@@ -88,14 +107,7 @@ def analyze_email_with_ai(self, email_id: str, user_id: str) -> Dict[str, Any]:
     Returns:
         Dict with analysis results
     """
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
-    try:
-        result = loop.run_until_complete(_analyze_email_async(email_id, user_id))
-        return result
-    finally:
-        loop.close()
+    return run_async(_analyze_email_async(email_id, user_id))
 
 @celery_app.task(bind=True, base=AIAnalysisTask, name="app.worker.tasks.ai.analyze_email_thread")
 def analyze_email_thread_for_tasks(
@@ -119,19 +131,16 @@ def analyze_email_thread_for_tasks(
         Dict with analysis results
     """
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(
+        return run_async(
             _analyze_email_thread_async(thread_id, email_ids, user_id, primary_subject)
         )
-        return result
     except Exception as e:
         self.retry(countdown=60, max_retries=3, exc=e)
 
 
 async def _analyze_email_async(email_id: str, user_id: str) -> Dict[str, Any]:
     """Async implementation of email analysis"""
-    async with get_db() as db:
+    async with AsyncSessionLocal() as db:
         # Get email
         email = await crud_email.get_processed_email(db, email_id=email_id)
         if not email:
@@ -215,40 +224,64 @@ async def _analyze_email_async(email_id: str, user_id: str) -> Dict[str, Any]:
             "timestamp": datetime.utcnow().isoformat()
         }
 
-async def _analyze_email_thread_async(
+async def _load_thread_context(
+    db,
     thread_id: str,
-    email_ids: List[str],
-    user_id: str,
-    primary_subject: str
-) -> Dict[str, Any]:
-    """
-    Async implementation of thread analysis
-    スレッド内の全メールを分析して、タスクを作成または更新
-    """
-    async with get_db() as db:
-        # Get all emails in the thread
+    email_ids: List[str]
+) -> List[Dict[str, Any]]:
+    """Load the thread's emails as prompt context, oldest first"""
+    async def compute() -> str:
         emails = []
         for email_id in email_ids:
             email = await crud_email.get_processed_email(db, email_id=email_id)
             if email:
                 emails.append(email)
         
+        # Raising keeps an empty context out of the cache
         if not emails:
             raise ValueError(f"No emails found for thread {thread_id}")
         
-        # Check if task already exists for this thread
-        existing_task = await crud_task.get_task_by_thread_id(db, thread_id=thread_id, user_id=user_id)
-        
-        # Prepare email content for analysis
-        thread_content = []
-        for email in sorted(emails, key=lambda x: x.email_date):
-            thread_content.append({
+        return json.dumps([
+            {
+                "id": str(email.id),
                 "date": email.email_date.isoformat(),
                 "from": email.sender,
                 "subject": email.subject,
                 "body": email.body_preview or "",
                 "is_reply": bool(email.in_reply_to)
-            })
+            }
+            for email in sorted(emails, key=lambda x: x.email_date)
+        ])
+    
+    ids_digest = hashlib.sha256(",".join(sorted(email_ids)).encode()).hexdigest()
+    tags = [EMAIL_TAG.format(email_id=email_id) for email_id in email_ids]
+    return json.loads(await thread_context_cache.get_or_compute(
+        f"{thread_id}:{ids_digest}", tags, compute
+    ))
+
+
+async def _analyze_email_thread_async(
+    thread_id: str,
+    email_ids: List[str],
+    user_id: str,
+    primary_subject: str
+) -> Dict[str, Any]:
+    """
+    Async implementation of thread analysis
+    スレッド内の全メールを分析して、タスクを作成または更新
+    """
+    async with AsyncSessionLocal() as db:
+        # Load the thread context (cached, so retries skip the per-email reads)
+        thread_context = await _load_thread_context(db, thread_id, email_ids)
+        
+        # Check if task already exists for this thread
+        existing_task = await crud_task.get_task_by_thread_id(db, thread_id=thread_id, user_id=user_id)
+        
+        # Prepare email content for analysis
+        thread_content = [
+            {k: v for k, v in entry.items() if k != "id"}
+            for entry in thread_context
+        ]
         
         # Initialize AI service
         ai_service = BedrockService() if settings.USE_BEDROCK else OpenAIService()
@@ -302,12 +335,21 @@ async def _analyze_email_thread_async(
             }}
             """
         
-        # Call AI service
-        analysis_result = await ai_service.analyze_content(prompt)
+        async def call_model() -> str:
+            analysis_result = await ai_service.analyze_content(prompt)
+            # Unparseable responses raise here so they are never cached
+            json.loads(analysis_result)
+            return analysis_result
         
-        # Process AI response
+        # Call AI service (reusing the response for an identical prompt)
         try:
-            result = json.loads(analysis_result)
+            result = json.loads(await thread_analysis_cache.get_or_compute(
+                prompt,
+                call_model,
+                model=getattr(ai_service, "model", type(ai_service).__name__),
+                template_version=THREAD_TASK_PROMPT_VERSION,
+                scope=user_id
+            ))
         except json.JSONDecodeError:
             result = {"action": "skip", "reason": "AI response parsing failed"}
         
@@ -315,6 +357,11 @@ async def _analyze_email_thread_async(
         if result.get("action") == "create" and not existing_task:
             # Create new task
             task_data = result.get("task", {})
+            emails = []
+            for entry in thread_context:
+                email = await crud_email.get_processed_email(db, email_id=entry["id"])
+                if email:
+                    emails.append(email)
             new_task = await crud_task.create(
                 db,
                 obj_in={
@@ -325,9 +372,9 @@ async def _analyze_email_thread_async(
                     "due_date": task_data.get("due_date"),
                     "user_id": user_id,
                     "thread_id": thread_id,
-                    "source_email_id": emails[0].id,
+                    "source_email_id": thread_context[0]["id"],
                     "created_by": "ai",
-                    "email_summary": f"スレッド内のメール {len(emails)} 件"
+                    "email_summary": f"スレッド内のメール {len(thread_context)} 件"
                 }
             )
             
@@ -339,7 +386,7 @@ async def _analyze_email_thread_async(
                 "action": "created",
                 "task_id": str(new_task.id),
                 "thread_id": thread_id,
-                "email_count": len(emails)
+                "email_count": len(thread_context)
             }
             
         elif result.get("action") == "update" and existing_task:
@@ -382,19 +429,12 @@ def generate_task_suggestions(self, task_id: str, context: str) -> Dict[str, Any
     Returns:
         Dict with suggestions
     """
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
-    try:
-        result = loop.run_until_complete(_generate_suggestions_async(task_id, context))
-        return result
-    finally:
-        loop.close()
+    return run_async(_generate_suggestions_async(task_id, context))
 
 
 async def _generate_suggestions_async(task_id: str, context: str) -> Dict[str, Any]:
     """Async implementation of task suggestions"""
-    async with get_db() as db:
+    async with AsyncSessionLocal() as db:
         # Get task
         task = await crud_task.get_task(db, task_id=task_id)
         if not task:
@@ -463,19 +503,12 @@ def summarize_email_thread(self, email_ids: List[str]) -> Dict[str, Any]:
     Returns:
         Dict with thread summary
     """
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
-    try:
-        result = loop.run_until_complete(_summarize_thread_async(email_ids))
-        return result
-    finally:
-        loop.close()
+    return run_async(_summarize_thread_async(email_ids))
 
 
 async def _summarize_thread_async(email_ids: List[str]) -> Dict[str, Any]:
     """Async implementation of thread summarization"""
-    async with get_db() as db:
+    async with AsyncSessionLocal() as db:
         # Get all emails in thread
         emails = []
         for email_id in email_ids:
@@ -1,13 +1,15 @@
-import asyncio
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from celery import Task
 from datetime import datetime
-import json
+import httpx
 
-from app.worker.celery_app import celery_app
+from app.worker.celery_app import celery_app, run_async
+from app.core.config import settings
 from app.services.email_service import EmailService
 from app.services.oauth_service import OAuthService
-from app.core.database import get_db
+from app.services.sync_progress import SyncProgressTracker
+from app.services.seen_messages import SeenMessageFilter
+from app.core.database import AsyncSessionLocal
 from app.models.email import ProcessedEmail, EmailAccount
 from app.models.task import Task as TaskModel
 from app.crud.crud_email import crud_email
@@ -23,30 +25,59 @@ class EmailSyncTask(Task):
 
 
 @celery_app.task(bind=True, base=EmailSyncTask, name="app.worker.tasks.email.sync_emails")
-def sync_emails(self, user_id: str, account_id: str) -> Dict[str, Any]:
+def sync_emails(
+    self,
+    user_id: str,
+    account_id: str,
+    sync_job_id: Optional[str] = None
+) -> Dict[str, Any]:
     """
     Sync emails from Gmail/Outlook for a specific account
     
     Args:
         user_id: User ID
         account_id: Email account ID
+        sync_job_id: EmailSyncJob ID to report progress to (created when omitted)
         
     Returns:
         Dict with sync results
     """
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    return run_async(
+        _sync_emails_async(user_id, account_id, self.request.id, sync_job_id)
+    )
+
+
+async def _sync_emails_async(
+    user_id: str,
+    account_id: str,
+    task_id: str,
+    sync_job_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Run an email sync and record its progress on the sync job"""
+    # Processed emails must belong to a sync job, so scheduled syncs get a new one
+    progress = await SyncProgressTracker.for_job(
+        sync_job_id, user_id=user_id, account_id=account_id
+    )
+    await progress.start()
     
     try:
-        result = loop.run_until_complete(_sync_emails_async(user_id, account_id, self.request.id))
-        return result
-    finally:
-        loop.close()
+        result = await _sync_account_emails(user_id, account_id, task_id, progress)
+    except Exception as e:
+        await progress.fail(str(e))
+        raise
+    
+    await progress.complete()
+    return result
 
 
-async def _sync_emails_async(user_id: str, account_id: str, task_id: str) -> Dict[str, Any]:
-    """Async implementation of email sync - 個別メール処理方式"""
-    async with get_db() as db:
+async def _sync_account_emails(
+    user_id: str,
+    account_id: str,
+    task_id: str,
+    progress: SyncProgressTracker
+) -> Dict[str, Any]:
+    """Async implementation of email sync - 一括登録方式"""
+    async with AsyncSessionLocal() as db:
         # Get email account
         account = await crud_email.get_email_account(db, account_id=account_id, user_id=user_id)
         if not account:
@@ -57,68 +88,66 @@ async def _sync_emails_async(user_id: str, account_id: str, task_id: str) -> Dic
         email_service = EmailService()
         
         # Get access token
-        token_data = await oauth_service.refresh_token(account.refresh_token, account.provider)
+        token_data = await oauth_service.get_access_token(
+            account_id, account.refresh_token, account.provider
+        )
         
         # Sync emails
-        if account.provider == "google":
-            emails = await email_service.sync_gmail(
-                access_token=token_data["access_token"],
-                last_sync_token=account.last_sync_token
+        try:
+            emails = await _fetch_provider_emails(email_service, account, token_data["access_token"])
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 401:
+                raise
+            # The cached access token was revoked or expired early - drop it and retry once
+            await oauth_service.invalidate_access_token(account_id)
+            token_data = await oauth_service.get_access_token(
+                account_id, account.refresh_token, account.provider
+            )
+            emails = await _fetch_provider_emails(email_service, account, token_data["access_token"])
+        
+        # Drop excluded domains and already processed emails before hydration
+        seen_filter = await SeenMessageFilter.load(account_id)
+        emails["messages"] = await _filter_new_emails(
+            db, user_id, emails["messages"], seen_filter
+        )
+        await progress.add_total(len(emails["messages"]))
+        
+        # Bodies are only downloaded for emails that will be analyzed
+        if account.provider == "microsoft":
+            await email_service.hydrate_outlook_messages(
+                token_data["access_token"], emails["messages"]
             )
-        elif account.provider == "microsoft":
-            emails = await email_service.sync_outlook(
-                access_token=token_data["access_token"],
-                last_sync_token=account.last_sync_token
+        elif settings.GMAIL_FETCH_FORMAT == "metadata":
+            await email_service.hydrate_gmail_messages(
+                token_data["access_token"], emails["messages"]
             )
-        else:
-            raise ValueError(f"Unsupported provider: {account.provider}")
         
-        # Process emails individually and group by thread
-        processed_count = 0
+        # Insert all new emails in one transaction (existing ones are skipped)
+        inserted = await crud_email.bulk_upsert_processed_emails(
+            db, emails["messages"], sync_job_id=progress.job_id
+        )
+        processed_count = len(inserted)
+        await seen_filter.add([email_data["id"] for email_data in emails["messages"]])
+        await progress.advance(len(emails["messages"]))
         threads = {}  # thread_id -> list of emails
         
         for email_data in emails["messages"]:
-            # Check if email already processed
-            existing = await crud_email.get_email_by_message_id(
-                db, message_id=email_data["id"], account_id=account_id
-            )
+            processed_email_id = inserted.pop(email_data["id"], None)
+            if not processed_email_id:
+                continue  # 処理済み（または同一同期内の重複）
             
-            if not existing:
-                # Create processed email record with thread info
-                processed_email = await crud_email.create_processed_email(
-                    db,
-                    email_data={
-                        "account_id": account_id,
-                        "email_id": email_data["id"],  # プロバイダー側のID
-                        "message_id": email_data.get("message_id", ""),  # Message-IDヘッダー
-                        "thread_id": email_data.get("thread_id", ""),
-                        "in_reply_to": email_data.get("in_reply_to", ""),
-                        "references": email_data.get("references", ""),
-                        "subject": email_data.get("subject", ""),
-                        "sender": email_data.get("from", ""),
-                        "recipients": json.dumps(email_data.get("to", [])),
-                        "body": email_data.get("body", ""),
-                        "body_preview": email_data.get("snippet", "")[:500] if email_data.get("snippet") else None,
-                        "received_at": email_data.get("date"),
-                        "is_task": False,
-                        "raw_data": json.dumps(email_data)
-                    }
-                )
-                
-                # スレッドごとにメールをグループ化
-                thread_id = email_data.get("thread_id", "")
-                if thread_id not in threads:
-                    threads[thread_id] = []
-                threads[thread_id].append({
-                    "email_id": str(processed_email.id),
-                    "subject": email_data.get("subject", ""),
-                    "from": email_data.get("from", ""),
-                    "date": email_data.get("date", ""),
-                    "body": email_data.get("body", ""),
-                    "is_reply": bool(email_data.get("in_reply_to"))
-                })
-                
-                processed_count += 1
+            # スレッドごとにメールをグループ化
+            thread_id = email_data.get("thread_id", "")
+            if thread_id not in threads:
+                threads[thread_id] = []
+            threads[thread_id].append({
+                "email_id": processed_email_id,
+                "subject": email_data.get("subject", ""),
+                "from": email_data.get("from", ""),
+                "date": email_data.get("date", ""),
+                "body": email_data.get("body", ""),
+                "is_reply": bool(email_data.get("in_reply_to"))
+            })
         
         # スレッド単位でAI分析タスクをキューに追加
         # 同じスレッドのメールは一緒に処理される
@@ -154,6 +183,51 @@ async def _sync_emails_async(user_id: str, account_id: str, task_id: str) -> Dic
         }
 
 
+async def _fetch_provider_emails(
+    email_service: EmailService,
+    account: EmailAccount,
+    access_token: str
+) -> Dict[str, Any]:
+    """Fetch new messages from the account's provider since its last sync token"""
+    if account.provider == "google":
+        return await email_service.sync_gmail(
+            access_token=access_token,
+            last_sync_token=account.last_sync_token
+        )
+    if account.provider == "microsoft":
+        return await email_service.sync_outlook(
+            access_token=access_token,
+            last_sync_token=account.last_sync_token
+        )
+    raise ValueError(f"Unsupported provider: {account.provider}")
+
+
+async def _filter_new_emails(
+    db,
+    user_id: str,
+    messages: List[Dict[str, Any]],
+    seen_filter: SeenMessageFilter
+) -> List[Dict[str, Any]]:
+    """Remove emails from excluded domains and emails that were already processed"""
+    exclude_domains = await crud_email.get_exclude_domains(db, user_id=user_id)
+    
+    # Only IDs the Bloom filter cannot rule out need the exact database check
+    _, maybe_seen = seen_filter.partition(email_data["id"] for email_data in messages)
+    existing_ids = await crud_email.get_existing_email_ids(db, email_ids=maybe_seen)
+    
+    def is_excluded(sender: str) -> bool:
+        domain = sender.rsplit("@", 1)[-1].strip(" >").lower()
+        return any(
+            domain == excluded or domain.endswith(f".{excluded}")
+            for excluded in exclude_domains
+        )
+    
+    return [
+        email_data for email_data in messages
+        if email_data["id"] not in existing_ids and not is_excluded(email_data.get("from", ""))
+    ]
+
+
 @celery_app.task(bind=True, base=EmailSyncTask, name="app.worker.tasks.email.analyze_email_for_tasks")
 def analyze_email_for_tasks(self, email_id: str, user_id: str) -> Dict[str, Any]:
     """
@@ -195,20 +269,14 @@ def send_email(self, to: List[str], subject: str, body: str, user_id: str) -> Di
     Returns:
         Dict with send results
     """
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    email_service = EmailService()
+    result = run_async(
+        email_service.send_email(to=to, subject=subject, body=body)
+    )
     
-    try:
-        email_service = EmailService()
-        result = loop.run_until_complete(
-            email_service.send_email(to=to, subject=subject, body=body)
-        )
-        
-        return {
-            "task_id": self.request.id,
-            "status": "sent",
-            "recipients": to,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-    finally:
-        loop.close()
\ No newline at end of file
+    return {
+        "task_id": self.request.id,
+        "status": "sent",
+        "recipients": to,
+        "timestamp": datetime.utcnow().isoformat()
+    }
\ No newline at end of file
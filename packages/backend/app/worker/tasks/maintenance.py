@@ -0,0 +1,79 @@
+from typing import Dict, Any
+from datetime import datetime
+import logging
+
+from app.worker.celery_app import celery_app, run_async
+from app.core.database import AsyncSessionLocal
+from app.crud.crud_dashboard_stats import crud_dashboard_stats
+from app.crud.crud_partitions import crud_partitions
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="app.worker.tasks.maintenance.reconcile_dashboard_stats")
+def reconcile_dashboard_stats() -> Dict[str, Any]:
+    """
+    Recount every user's dashboard rollup from the source tables
+    トリガーで追えない変更（パーティションの切り離し・カスケード削除など）を補正する
+    
+    Returns:
+        Dict with the number of reconciled users
+    """
+    return run_async(_reconcile_dashboard_stats_async())
+
+
+async def _reconcile_dashboard_stats_async() -> Dict[str, Any]:
+    """Async implementation of dashboard rollup reconciliation"""
+    start_time = datetime.utcnow()
+    
+    async with AsyncSessionLocal() as db:
+        users = await crud_dashboard_stats.reconcile_all(db)
+    
+    duration = (datetime.utcnow() - start_time).total_seconds()
+    logger.info(f"Dashboard stats reconciled for {users} users, duration={duration:.2f}s")
+    
+    return {
+        "status": "completed",
+        "reconciled_users": users,
+        "duration": duration
+    }
+
+
+@celery_app.task(name="app.worker.tasks.maintenance.maintain_partitions")
+def maintain_partitions() -> Dict[str, Any]:
+    """
+    Create upcoming time partitions and drop expired ones
+    保持期間を過ぎたデータは行の DELETE ではなくパーティションの切り離しで削除する
+    
+    Returns:
+        Dict with created and removed partitions per table
+    """
+    return run_async(_maintain_partitions_async())
+
+
+async def _maintain_partitions_async() -> Dict[str, Any]:
+    """Async implementation of partition maintenance"""
+    start_time = datetime.utcnow()
+    
+    async with AsyncSessionLocal() as db:
+        tables = await crud_partitions.maintain(db)
+    
+    # 切り離したメールはトリガーを経由しないため、ダッシュボード集計を数え直す
+    if tables["processed_emails"]["removed"]:
+        reconcile_dashboard_stats.delay()
+    
+    duration = (datetime.utcnow() - start_time).total_seconds()
+    logger.info(
+        "Partitions maintained: "
+        + ", ".join(
+            f"{table} created={len(result['created'])} removed={len(result['removed'])}"
+            for table, result in tables.items()
+        )
+        + f", duration={duration:.2f}s"
+    )
+    
+    return {
+        "status": "completed",
+        "tables": tables,
+        "duration": duration
+    }
@@ -4,17 +4,17 @@
 高パフォーマンスでエラー耐性のあるメール同期とAI分析タスク
 """
 
-import asyncio
 import logging
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from celery import Task
 
-from app.worker.celery_app import celery_app
+from app.worker.celery_app import celery_app, run_async
 from app.services.optimized_email_service import (
     OptimizedEmailSyncService,
     PerformanceMonitor
 )
+from app.services.sync_progress import SyncProgressTracker
 from app.services.ai_service import AIService
 from app.services.task_service import TaskService
 
@@ -49,7 +49,8 @@ def optimized_email_sync(
     self, 
     account_id: str, 
     user_id: str, 
-    provider: str = "gmail"
+    provider: str = "gmail",
+    sync_job_id: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     最適化されたメール同期タスク
@@ -58,6 +59,7 @@ def optimized_email_sync(
         account_id: メールアカウントID
         user_id: ユーザーID
         provider: プロバイダー（gmail/outlook）
+        sync_job_id: 進捗を記録する同期ジョブID（省略時は新規作成）
     
     Returns:
         同期結果の辞書
@@ -65,94 +67,58 @@ def optimized_email_sync(
     
     start_time = datetime.utcnow()
     
+    progress: Optional[SyncProgressTracker] = None
+    
     try:
-        # 進捗状態の更新
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'current': 0,
-                'total': 100,
-                'status': f'Starting {provider} sync...',
-                'provider': provider
-            }
+        # 取り込んだメールと進捗は同期ジョブに記録する（未指定の場合は作成する）
+        progress = run_async(
+            SyncProgressTracker.for_job(sync_job_id, user_id=user_id, account_id=account_id)
         )
+        run_async(progress.start())
         
         # 非同期関数を同期実行
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            if provider.lower() == "gmail":
-                result = loop.run_until_complete(
-                    self.email_service.sync_gmail_optimized(account_id, user_id)
+        if provider.lower() == "gmail":
+            result = run_async(
+                self.email_service.sync_gmail_optimized(
+                    account_id, user_id, progress=progress
                 )
-            else:
-                # Outlook同期は将来実装
-                raise NotImplementedError(f"Provider {provider} not yet implemented")
-            
-            # 進捗状態の更新
-            self.update_state(
-                state='PROGRESS',
-                meta={
-                    'current': 80,
-                    'total': 100,
-                    'status': 'Processing messages...',
-                    'message_count': result.get('count', 0)
-                }
-            )
-            
-            # パフォーマンス監視
-            loop.run_until_complete(
-                self.performance_monitor.track_sync_performance(
-                    provider=provider,
-                    user_id=user_id,
-                    message_count=result.get('count', 0),
-                    duration=result.get('duration', 0),
-                    api_calls=result.get('api_calls', 0),
-                    cached_count=result.get('cached_count', 0)
-                )
-            )
-            
-            # 最終状態更新
-            self.update_state(
-                state='SUCCESS',
-                meta={
-                    'current': 100,
-                    'total': 100,
-                    'status': 'Sync completed successfully',
-                    'result': result
-                }
             )
-            
-            duration = (datetime.utcnow() - start_time).total_seconds()
-            
-            logger.info(
-                f"Optimized {provider} sync completed for user {user_id}: "
-                f"{result.get('count', 0)} messages in {duration:.2f}s"
+        else:
+            # Outlook同期は将来実装
+            raise NotImplementedError(f"Provider {provider} not yet implemented")
+        
+        # パフォーマンス監視
+        run_async(
+            self.performance_monitor.track_sync_performance(
+                provider=provider,
+                user_id=user_id,
+                message_count=result.get('count', 0),
+                duration=result.get('duration', 0),
+                api_calls=result.get('api_calls', 0),
+                cached_count=result.get('cached_count', 0)
             )
-            
-            return {
-                **result,
-                'task_duration': duration,
-                'provider': provider,
-                'optimization': 'enabled'
-            }
-            
-        finally:
-            loop.close()
+        )
+        
+        run_async(progress.complete())
+        
+        duration = (datetime.utcnow() - start_time).total_seconds()
+        
+        logger.info(
+            f"Optimized {provider} sync completed for user {user_id}: "
+            f"{result.get('count', 0)} messages in {duration:.2f}s"
+        )
+        
+        return {
+            **result,
+            'task_duration': duration,
+            'provider': provider,
+            'optimization': 'enabled'
+        }
     
     except Exception as e:
         # エラー状態の更新
-        self.update_state(
-            state='FAILURE',
-            meta={
-                'current': 0,
-                'total': 100,
-                'status': f'Sync failed: {str(e)}',
-                'error': str(e),
-                'provider': provider
-            }
-        )
+        if progress:
+            run_async(progress.fail(str(e)))
         
         logger.error(
             f"Optimized {provider} sync failed for user {user_id}: {e}",
@@ -189,139 +155,70 @@ def optimized_ai_thread_analysis(
     
     start_time = datetime.utcnow()
     
+    # 途中経過は結果バックエンドに書き込まない（完了時の戻り値のみ保存される）
     try:
-        # 進捗状態の更新
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'current': 0,
-                'total': 100,
-                'status': f'Analyzing {len(thread_messages)} messages...',
-                'message_count': len(thread_messages)
-            }
-        )
-        
         # AIサービス初期化
         ai_service = AIService()
         task_service = TaskService()
         
-        # 非同期関数を同期実行
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            # 進捗更新
-            self.update_state(
-                state='PROGRESS',
-                meta={
-                    'current': 20,
-                    'total': 100,
-                    'status': 'Sending to AI for analysis...'
-                }
-            )
-            
-            # スレッド全体をまとめてAI分析
-            thread_analysis = loop.run_until_complete(
-                ai_service.analyze_email_thread_optimized(
-                    emails=thread_messages,
-                    context={
-                        'user_id': user_id,
-                        'account_id': account_id,
-                        'optimization_enabled': True
-                    }
-                )
-            )
-            
-            # 進捗更新
-            self.update_state(
-                state='PROGRESS',
-                meta={
-                    'current': 60,
-                    'total': 100,
-                    'status': 'Processing AI analysis results...'
-                }
-            )
-            
-            # AI判定結果に基づいてタスク作成
-            task_created = False
-            task_id = None
-            
-            if thread_analysis.get('should_create_task', False):
-                task_result = loop.run_until_complete(
-                    task_service.create_from_email_thread_optimized(
-                        user_id=user_id,
-                        thread_emails=thread_messages,
-                        ai_analysis=thread_analysis,
-                        account_id=account_id
-                    )
-                )
-                task_created = True
-                task_id = task_result.get('task_id')
-            
-            # 進捗更新
-            self.update_state(
-                state='PROGRESS',
-                meta={
-                    'current': 90,
-                    'total': 100,
-                    'status': 'Finalizing analysis...'
+        # スレッド全体をまとめてAI分析
+        thread_analysis = run_async(
+            ai_service.analyze_email_thread_optimized(
+                emails=thread_messages,
+                context={
+                    'user_id': user_id,
+                    'account_id': account_id,
+                    'optimization_enabled': True
                 }
             )
-            
-            # 処理済みマークを各メールに設定
-            for email in thread_messages:
-                loop.run_until_complete(
-                    _mark_email_as_analyzed(email['id'], user_id)
+        )
+        
+        # AI判定結果に基づいてタスク作成
+        task_created = False
+        task_id = None
+        
+        if thread_analysis.get('should_create_task', False):
+            task_result = run_async(
+                task_service.create_from_email_thread_optimized(
+                    user_id=user_id,
+                    thread_emails=thread_messages,
+                    ai_analysis=thread_analysis,
+                    account_id=account_id
                 )
-            
-            # 最終状態更新
-            self.update_state(
-                state='SUCCESS',
-                meta={
-                    'current': 100,
-                    'total': 100,
-                    'status': 'Analysis completed successfully',
-                    'task_created': task_created,
-                    'task_id': task_id
-                }
             )
-            
-            duration = (datetime.utcnow() - start_time).total_seconds()
-            
-            result = {
-                'analyzed_messages': len(thread_messages),
-                'task_created': task_created,
-                'task_id': task_id,
-                'analysis_duration': duration,
-                'ai_confidence': thread_analysis.get('confidence', 0.0),
-                'ai_reasoning': thread_analysis.get('reasoning', ''),
-                'optimization': 'enabled'
-            }
-            
-            logger.info(
-                f"Optimized AI analysis completed for user {user_id}: "
-                f"{len(thread_messages)} messages, task_created={task_created}, "
-                f"duration={duration:.2f}s"
+            task_created = True
+            task_id = task_result.get('task_id')
+        
+        # スレッドのメールを1文でまとめて分析済みにする
+        run_async(
+            _mark_thread_as_analyzed(
+                [email['id'] for email in thread_messages],
+                account_id,
+                thread_analysis
             )
-            
-            return result
-            
-        finally:
-            loop.close()
-    
-    except Exception as e:
-        # エラー状態の更新
-        self.update_state(
-            state='FAILURE',
-            meta={
-                'current': 0,
-                'total': 100,
-                'status': f'Analysis failed: {str(e)}',
-                'error': str(e),
-                'message_count': len(thread_messages)
-            }
         )
         
+        duration = (datetime.utcnow() - start_time).total_seconds()
+        
+        result = {
+            'analyzed_messages': len(thread_messages),
+            'task_created': task_created,
+            'task_id': task_id,
+            'analysis_duration': duration,
+            'ai_confidence': thread_analysis.get('confidence', 0.0),
+            'ai_reasoning': thread_analysis.get('reasoning', ''),
+            'optimization': 'enabled'
+        }
+        
+        logger.info(
+            f"Optimized AI analysis completed for user {user_id}: "
+            f"{len(thread_messages)} messages, task_created={task_created}, "
+            f"duration={duration:.2f}s"
+        )
+        
+        return result
+    
+    except Exception as e:
         logger.error(
             f"Optimized AI analysis failed for user {user_id}: {e}",
             exc_info=True
@@ -417,44 +314,38 @@ def cleanup_old_cache() -> Dict[str, Any]:
     """
     古いキャッシュデータのクリーンアップタスク
     
+    1回の実行は時間・キー数の予算内で打ち切り、次回は続きから再開する
+    
     Returns:
-        クリーンアップ結果
+        クリーンアップ結果（ネームスペース毎の削除数・解放バイト数）
     """
     
     start_time = datetime.utcnow()
     
     try:
-        from app.services.optimized_email_service import IntelligentCacheService
-        
-        cache_service = IntelligentCacheService()
+        from app.services.cache_cleanup import CacheCleanupEngine
         
         # 非同期関数を同期実行
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        namespaces = run_async(CacheCleanupEngine().run())
         
-        try:
-            # 期限切れキャッシュの削除
-            deleted_keys = loop.run_until_complete(
-                _cleanup_expired_cache(cache_service)
-            )
-            
-            duration = (datetime.utcnow() - start_time).total_seconds()
-            
-            result = {
-                'deleted_keys': deleted_keys,
-                'cleanup_duration': duration,
-                'status': 'completed'
-            }
-            
-            logger.info(
-                f"Cache cleanup completed: {deleted_keys} keys deleted, "
-                f"duration={duration:.2f}s"
-            )
-            
-            return result
-            
-        finally:
-            loop.close()
+        duration = (datetime.utcnow() - start_time).total_seconds()
+        deleted_keys = sum(stats['deleted'] for stats in namespaces.values())
+        reclaimed_bytes = sum(stats['reclaimed_bytes'] for stats in namespaces.values())
+        
+        result = {
+            'deleted_keys': deleted_keys,
+            'reclaimed_bytes': reclaimed_bytes,
+            'namespaces': namespaces,
+            'cleanup_duration': duration,
+            'status': 'completed'
+        }
+        
+        logger.info(
+            f"Cache cleanup completed: {deleted_keys} keys deleted, "
+            f"{reclaimed_bytes} bytes reclaimed, duration={duration:.2f}s"
+        )
+        
+        return result
     
     except Exception as e:
         logger.error(f"Cache cleanup failed: {e}", exc_info=True)
@@ -463,42 +354,19 @@ def cleanup_old_cache() -> Dict[str, Any]:
 
 # ヘルパー関数
 
-async def _mark_email_as_analyzed(message_id: str, user_id: str) -> None:
-    """メールを分析済みとしてマーク"""
+async def _mark_thread_as_analyzed(
+    message_ids: List[str],
+    account_id: str,
+    thread_analysis: Dict[str, Any]
+) -> None:
+    """スレッドのメールをまとめて分析済みとしてマーク"""
     from app.core.database import AsyncSessionLocal
+    from app.crud.crud_email import crud_email
     
     async with AsyncSessionLocal() as db:
-        await db.execute(
-            "UPDATE processed_emails SET analyzed_at = :analyzed_at "
-            "WHERE message_id = :message_id AND user_id = :user_id",
-            {
-                "analyzed_at": datetime.utcnow(),
-                "message_id": message_id,
-                "user_id": user_id
-            }
+        await crud_email.mark_thread_analyzed(
+            db,
+            account_id=account_id,
+            email_ids=message_ids,
+            ai_analysis=thread_analysis
         )
-        await db.commit()
-
-
-async def _cleanup_expired_cache(cache_service) -> int:
-    """期限切れキャッシュの削除"""
-    
-    # パターンマッチングで対象キーを取得
-    patterns = [
-        "email:msg:*",
-        "email:sync_token:*"
-    ]
-    
-    deleted_count = 0
-    
-    for pattern in patterns:
-        keys = await cache_service.redis.keys(pattern)
-        
-        # 期限切れキーの削除
-        for key in keys:
-            ttl = await cache_service.redis.ttl(key)
-            if ttl == -1:  # TTLが設定されていない場合
-                await cache_service.redis.delete(key)
-                deleted_count += 1
-    
-    return deleted_count
\ No newline at end of file
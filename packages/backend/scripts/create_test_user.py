@@ -11,10 +11,9 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from sqlmodel import select
-from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime
 
-from app.core.database import async_engine
+from app.core.database import AsyncSessionLocal
 from app.core.security import get_password_hash
 from app.models.user import User
 from app.models.email import EmailAccount
@@ -50,7 +49,7 @@ async def create_test_users():
         }
     ]
     
-    async with AsyncSession(async_engine) as session:
+    async with AsyncSessionLocal() as session:
         for user_data in test_users:
             # Check if user already exists
             statement = select(User).where(User.email == user_data["email"])
@@ -0,0 +1,92 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+
+
+class FakeRedisPipeline:
+    """Minimal in-memory pipeline recording commands for FakeRedis"""
+    
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        return False
+    
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+    
+    async def execute(self):
+        results = [
+            await getattr(self.redis, name)(*args, **kwargs)
+            for name, args, kwargs in self.commands
+        ]
+        self.commands = []
+        return results
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for the Redis commands the cache helpers use"""
+    
+    def __init__(self):
+        self.data = {}
+    
+    def pipeline(self, transaction=False):
+        return FakeRedisPipeline(self)
+    
+    async def get(self, key):
+        return self.data.get(key)
+    
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+    
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+    
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+        return True
+    
+    async def eval(self, script, numkeys, *args):
+        return 0
+    
+    async def expire(self, key, ttl):
+        return key in self.data
+    
+    async def hincrby(self, key, field, amount=1):
+        bucket = self.data.setdefault(key, {})
+        bucket[field] = bucket.get(field, 0) + amount
+        return bucket[field]
+    
+    async def hgetall(self, key):
+        return {field: str(value) for field, value in self.data.get(key, {}).items()}
+    
+    async def sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(members)
+        return len(members)
+    
+    async def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+
+@pytest.fixture
+def fake_redis():
+    """In-memory Redis shared by the cache helpers under test"""
+    return FakeRedis()
+
+
+@pytest.fixture
+def redis_pipeline():
+    """Mock pipeline usable as `async with redis.pipeline() as pipe`"""
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    pipe.__aenter__.return_value = pipe
+    return pipe
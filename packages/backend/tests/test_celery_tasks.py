@@ -42,14 +42,15 @@ def mock_processed_email():
 
 
 class TestEmailTasks:
-    @patch("app.worker.tasks.email.get_db")
+    @patch("app.worker.tasks.email.SyncProgressTracker.for_job", new_callable=AsyncMock)
+    @patch("app.worker.tasks.email.AsyncSessionLocal")
     @patch("app.worker.tasks.email.crud_email")
     @patch("app.worker.tasks.email.OAuthService")
     @patch("app.worker.tasks.email.EmailService")
-    def test_sync_emails_success(self, mock_email_service, mock_oauth_service, mock_crud, mock_get_db, mock_db, mock_email_account):
+    def test_sync_emails_success(self, mock_email_service, mock_oauth_service, mock_crud, mock_session_local, mock_for_job, mock_db, mock_email_account):
         """Test successful email sync"""
         # Setup mocks
-        mock_get_db.return_value = mock_db
+        mock_session_local.return_value = mock_db
         mock_crud.get_email_account = AsyncMock(return_value=mock_email_account)
         mock_crud.get_email_by_message_id = AsyncMock(return_value=None)
         mock_crud.create_processed_email = AsyncMock(return_value=MagicMock(id="processed123"))
@@ -83,12 +84,97 @@ class TestEmailTasks:
         assert result["processed_emails"] == 1
         assert result["sync_token_updated"] == True
         mock_crud.update_sync_token.assert_called_once()
+        # A sync started without a job id gets a newly created sync job
+        mock_for_job.assert_awaited_once_with(None, user_id="user123", account_id="account123")
     
-    @patch("app.worker.tasks.email.get_db")
+    @patch("app.worker.tasks.email.settings.GMAIL_FETCH_FORMAT", "metadata")
+    @patch("app.worker.tasks.email.analyze_email_thread_for_tasks")
+    @patch("app.worker.tasks.email.SeenMessageFilter.load", new_callable=AsyncMock)
+    @patch("app.worker.tasks.email.SyncProgressTracker.for_job", new_callable=AsyncMock)
+    @patch("app.worker.tasks.email.AsyncSessionLocal")
     @patch("app.worker.tasks.email.crud_email")
-    def test_sync_emails_account_not_found(self, mock_crud, mock_get_db, mock_db):
+    @patch("app.worker.tasks.email.OAuthService")
+    @patch("app.worker.tasks.email.EmailService")
+    def test_sync_emails_metadata_format_hydrates_bodies(self, mock_email_service, mock_oauth_service, mock_crud, mock_session_local, mock_for_job, mock_seen_load, mock_analyze, mock_db, mock_email_account):
+        """Test Gmail bodies are loaded before analysis when syncing metadata only"""
+        mock_session_local.return_value = mock_db
+        mock_for_job.return_value = AsyncMock(job_id="job123")
+        mock_crud.get_email_account = AsyncMock(return_value=mock_email_account)
+        mock_crud.get_exclude_domains = AsyncMock(return_value=[])
+        mock_crud.get_existing_email_ids = AsyncMock(return_value=set())
+        mock_crud.bulk_upsert_processed_emails = AsyncMock(return_value={"msg123": "processed123"})
+        mock_crud.update_sync_token = AsyncMock()
+        mock_seen_load.return_value.partition = MagicMock(return_value=(["msg123"], []))
+        mock_seen_load.return_value.add = AsyncMock()
+        
+        mock_oauth_service.return_value.get_access_token = AsyncMock(
+            return_value={"access_token": "new_token"}
+        )
+        
+        messages = [{"id": "msg123", "subject": "Test Email", "from": "sender@example.com", "body": ""}]
+        mock_email_service.return_value.sync_gmail = AsyncMock(
+            return_value={"messages": messages, "nextSyncToken": "new_sync_token"}
+        )
+        
+        async def hydrate(access_token, messages):
+            for message in messages:
+                message["body"] = "Loaded body"
+            return messages
+        
+        mock_email_service.return_value.hydrate_gmail_messages = AsyncMock(side_effect=hydrate)
+        
+        result = sync_emails("user123", "account123")
+        
+        assert result["status"] == "completed"
+        mock_email_service.return_value.hydrate_gmail_messages.assert_awaited_once()
+        queued = mock_analyze.delay.call_args.kwargs
+        assert queued["email_ids"] == ["processed123"]
+    
+    @patch("app.worker.tasks.email.analyze_email_thread_for_tasks")
+    @patch("app.worker.tasks.email.SeenMessageFilter.load", new_callable=AsyncMock)
+    @patch("app.worker.tasks.email.SyncProgressTracker.for_job", new_callable=AsyncMock)
+    @patch("app.worker.tasks.email.AsyncSessionLocal")
+    @patch("app.worker.tasks.email.crud_email")
+    @patch("app.worker.tasks.email.OAuthService")
+    @patch("app.worker.tasks.email.EmailService")
+    def test_sync_emails_retries_with_fresh_token_after_401(self, mock_email_service, mock_oauth_service, mock_crud, mock_session_local, mock_for_job, mock_seen_load, mock_analyze, mock_db, mock_email_account):
+        """Test a revoked cached token is invalidated and the sync retried with a new one"""
+        import httpx
+        
+        mock_session_local.return_value = mock_db
+        mock_for_job.return_value = AsyncMock(job_id="job123")
+        mock_crud.get_email_account = AsyncMock(return_value=mock_email_account)
+        mock_crud.get_exclude_domains = AsyncMock(return_value=[])
+        mock_crud.get_existing_email_ids = AsyncMock(return_value=set())
+        mock_crud.bulk_upsert_processed_emails = AsyncMock(return_value={})
+        mock_crud.update_sync_token = AsyncMock()
+        mock_seen_load.return_value.partition = MagicMock(return_value=([], []))
+        mock_seen_load.return_value.add = AsyncMock()
+        
+        oauth = mock_oauth_service.return_value
+        oauth.get_access_token = AsyncMock(side_effect=[
+            {"access_token": "revoked_token"}, {"access_token": "new_token"}
+        ])
+        oauth.invalidate_access_token = AsyncMock()
+        unauthorized = httpx.HTTPStatusError(
+            "401", request=MagicMock(), response=MagicMock(status_code=401)
+        )
+        mock_email_service.return_value.sync_gmail = AsyncMock(side_effect=[
+            unauthorized, {"messages": [], "nextSyncToken": "new_sync_token"}
+        ])
+        
+        result = sync_emails("user123", "account123")
+        
+        assert result["status"] == "completed"
+        oauth.invalidate_access_token.assert_awaited_once_with("account123")
+        assert mock_email_service.return_value.sync_gmail.await_args.kwargs["access_token"] == "new_token"
+    
+    @patch("app.worker.tasks.email.SyncProgressTracker.for_job", new_callable=AsyncMock)
+    @patch("app.worker.tasks.email.AsyncSessionLocal")
+    @patch("app.worker.tasks.email.crud_email")
+    def test_sync_emails_account_not_found(self, mock_crud, mock_session_local, mock_for_job, mock_db):
         """Test email sync with non-existent account"""
-        mock_get_db.return_value = mock_db
+        mock_session_local.return_value = mock_db
         mock_crud.get_email_account = AsyncMock(return_value=None)
         
         with pytest.raises(ValueError, match="Email account .* not found"):
@@ -129,14 +215,14 @@ class TestEmailTasks:
 
 
 class TestAITasks:
-    @patch("app.worker.tasks.ai.get_db")
+    @patch("app.worker.tasks.ai.AsyncSessionLocal")
     @patch("app.worker.tasks.ai.crud_email")
     @patch("app.worker.tasks.ai.crud_task")
     @patch("app.worker.tasks.ai.BedrockClient")
-    def test_analyze_email_with_ai_creates_task(self, mock_bedrock, mock_crud_task, mock_crud_email, mock_get_db, mock_db, mock_processed_email):
+    def test_analyze_email_with_ai_creates_task(self, mock_bedrock, mock_crud_task, mock_crud_email, mock_session_local, mock_db, mock_processed_email):
         """Test AI email analysis that creates a task"""
         # Setup mocks
-        mock_get_db.return_value = mock_db
+        mock_session_local.return_value = mock_db
         mock_crud_email.get_processed_email = AsyncMock(return_value=mock_processed_email)
         mock_crud_email.update_email_analysis = AsyncMock()
         
@@ -171,12 +257,12 @@ class TestAITasks:
         mock_crud_email.update_email_analysis.assert_called_once()
         mock_crud_task.create_task.assert_called_once()
     
-    @patch("app.worker.tasks.ai.get_db")
+    @patch("app.worker.tasks.ai.AsyncSessionLocal")
     @patch("app.worker.tasks.ai.crud_email")
     @patch("app.worker.tasks.ai.BedrockClient")
-    def test_analyze_email_with_ai_no_task(self, mock_bedrock, mock_crud_email, mock_get_db, mock_db, mock_processed_email):
+    def test_analyze_email_with_ai_no_task(self, mock_bedrock, mock_crud_email, mock_session_local, mock_db, mock_processed_email):
         """Test AI email analysis that doesn't create a task"""
-        mock_get_db.return_value = mock_db
+        mock_session_local.return_value = mock_db
         mock_crud_email.get_processed_email = AsyncMock(return_value=mock_processed_email)
         mock_crud_email.update_email_analysis = AsyncMock()
         
@@ -196,12 +282,12 @@ class TestAITasks:
         assert result["tasks_created"] == 0
         assert result["task_ids"] == []
     
-    @patch("app.worker.tasks.ai.get_db")
+    @patch("app.worker.tasks.ai.AsyncSessionLocal")
     @patch("app.worker.tasks.ai.crud_task")
     @patch("app.worker.tasks.ai.BedrockClient")
-    def test_generate_task_suggestions(self, mock_bedrock, mock_crud_task, mock_get_db, mock_db):
+    def test_generate_task_suggestions(self, mock_bedrock, mock_crud_task, mock_session_local, mock_db):
         """Test task suggestion generation"""
-        mock_get_db.return_value = mock_db
+        mock_session_local.return_value = mock_db
         mock_task = MagicMock(
             id="task123",
             title="Test Task",
@@ -231,12 +317,12 @@ class TestAITasks:
         assert "action_plan" in result["suggestions"]
         mock_crud_task.create_ai_support.assert_called_once()
     
-    @patch("app.worker.tasks.ai.get_db")
+    @patch("app.worker.tasks.ai.AsyncSessionLocal")
     @patch("app.worker.tasks.ai.crud_email")
     @patch("app.worker.tasks.ai.BedrockClient")
-    def test_summarize_email_thread(self, mock_bedrock, mock_crud_email, mock_get_db, mock_db):
+    def test_summarize_email_thread(self, mock_bedrock, mock_crud_email, mock_session_local, mock_db):
         """Test email thread summarization"""
-        mock_get_db.return_value = mock_db
+        mock_session_local.return_value = mock_db
         
         # Mock emails
         mock_emails = [
@@ -270,4 +356,32 @@ class TestAITasks:
         
         assert result["thread_size"] == 2
         assert "executive_summary" in result["summary"]
-        assert result["summary"]["executive_summary"] == "Discussion about project timeline"
\ No newline at end of file
+        assert result["summary"]["executive_summary"] == "Discussion about project timeline"    
+    @patch("app.services.cache_service.get_redis")
+    @patch("app.worker.tasks.ai.crud_email")
+    async def test_thread_context_is_reused_until_an_email_changes(self, mock_crud_email, mock_get_redis, fake_redis):
+        """Test the thread context skips the email reads until one of its emails is rewritten"""
+        from app.services.cache_service import invalidate_tags
+        from app.worker.tasks.ai import _load_thread_context
+        
+        mock_get_redis.return_value = fake_redis
+        mock_crud_email.get_processed_email = AsyncMock(side_effect=lambda db, email_id: MagicMock(
+            id=email_id,
+            email_date=datetime(2024, 1, 2) if email_id == "email1" else datetime(2024, 1, 1),
+            sender="user@example.com",
+            subject="Project timeline",
+            body_preview="body",
+            in_reply_to=None
+        ))
+        
+        first = await _load_thread_context(MagicMock(), "thread1", ["email1", "email2"])
+        again = await _load_thread_context(MagicMock(), "thread1", ["email1", "email2"])
+        
+        assert [entry["id"] for entry in first] == ["email2", "email1"]
+        assert again == first
+        assert mock_crud_email.get_processed_email.await_count == 2
+        
+        await invalidate_tags("email:email1")
+        await _load_thread_context(MagicMock(), "thread1", ["email1", "email2"])
+        
+        assert mock_crud_email.get_processed_email.await_count == 4
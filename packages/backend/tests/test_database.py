@@ -0,0 +1,395 @@
+import pytest
+import asyncio
+from unittest.mock import patch, MagicMock, AsyncMock
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+
+
+class TestAsyncCRUDBase:
+    @patch("app.crud.base.invalidate_tags", new_callable=AsyncMock)
+    async def test_create_many_commits_once_and_invalidates_tags(self, mock_invalidate):
+        """Test bulk creation awaits a single commit and bumps each owner's tag once"""
+        from app.crud.base import AsyncCRUDBase
+        
+        class _ThingCRUD(AsyncCRUDBase):
+            def cache_tags(self, obj):
+                return [f"user:{obj['user_id']}:things"]
+        
+        db = AsyncMock()
+        db.add_all = MagicMock()
+        crud = _ThingCRUD(dict)
+        
+        objs = await crud.create_many(
+            db, objs_in=[{"user_id": "u1"}, {"user_id": "u1"}, {"user_id": "u2"}]
+        )
+        
+        assert len(objs) == 3
+        db.add_all.assert_called_once_with(objs)
+        db.commit.assert_awaited_once()
+        assert sorted(mock_invalidate.await_args.args) == ["user:u1:things", "user:u2:things"]
+
+
+class FakeProcessedEmailsSession:
+    """Session double that enforces processed_email_keys the way Postgres would"""
+    
+    def __init__(self):
+        self.keys = set()
+        self.rows = []
+        self.statements = []
+        self.commit = AsyncMock()
+    
+    async def execute(self, statement):
+        from sqlalchemy.dialects import postgresql
+        
+        compiled = statement.compile(dialect=postgresql.dialect())
+        self.statements.append(str(compiled))
+        params = compiled.params
+        email_ids = [v for k, v in params.items() if k.startswith("email_id")]
+        result = MagicMock()
+        
+        if statement.table.name == "processed_email_keys":
+            claimed = [email_id for email_id in email_ids if email_id not in self.keys]
+            self.keys.update(claimed)
+            result.scalars = MagicMock(return_value=claimed)
+        else:
+            dates = [v for k, v in params.items() if k.startswith("email_date")]
+            self.rows.extend(zip(email_ids, dates))
+        return result
+
+
+class TestBulkUpsertProcessedEmails:
+    async def test_returns_ids_of_inserted_rows_only(self):
+        """Test duplicates are collapsed and only rows whose key was claimed are inserted"""
+        from app.crud.crud_email import crud_email
+        
+        db = FakeProcessedEmailsSession()
+        db.keys.add("msg-2")  # processed by an earlier sync
+        emails = [
+            {"id": "msg-1", "subject": "a", "date": "Tue, 14 Nov 2023 22:13:20 +0000"},
+            {"id": "msg-1", "subject": "a", "date": "Tue, 14 Nov 2023 22:13:20 +0000"},
+            {"id": "msg-2", "subject": "b", "date": "Tue, 14 Nov 2023 22:13:20 +0000"},
+        ]
+        
+        inserted = await crud_email.bulk_upsert_processed_emails(db, emails, sync_job_id="job-1")
+        
+        assert list(inserted) == ["msg-1"]
+        assert [email_id for email_id, _ in db.rows] == ["msg-1"]
+        assert "ON CONFLICT (email_id) DO NOTHING RETURNING" in db.statements[0]
+        db.commit.assert_awaited_once()
+    
+    async def test_same_email_with_different_dates_is_inserted_once(self):
+        """Test an email is stored once even when two syncs derive different email_date values"""
+        from uuid import uuid4
+        from app.crud.crud_email import crud_email
+        
+        db = FakeProcessedEmailsSession()
+        
+        # Legacy sync: Date header
+        first = await crud_email.bulk_upsert_processed_emails(
+            db, [{"id": "msg-1", "date": "Tue, 14 Nov 2023 22:13:20 +0000"}], sync_job_id="job-1"
+        )
+        # Optimized sync: internalDate, a different partition key for the same email
+        second = await crud_email.insert_new_processed_emails(db, [{
+            "id": uuid4(),
+            "sync_job_id": "job-2",
+            "email_id": "msg-1",
+            "email_date": datetime(2023, 11, 15, 9, 0),
+        }])
+        
+        assert list(first) == ["msg-1"]
+        assert second == {}
+        assert db.rows == [("msg-1", datetime(2023, 11, 14, 22, 13, 20))]
+
+    
+    @patch("app.crud.crud_email.invalidate_tags", new_callable=AsyncMock)
+    async def test_mark_thread_analyzed_updates_account_emails_in_one_statement(self, mock_invalidate):
+        """Test a thread is marked analyzed with one UPDATE scoped to the account's sync jobs"""
+        from sqlalchemy.dialects import postgresql
+        from app.crud.crud_email import crud_email
+        
+        db = AsyncMock()
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = ["pe-1", "pe-2"]
+        db.execute = AsyncMock(return_value=result)
+        
+        updated = await crud_email.mark_thread_analyzed(
+            db,
+            account_id="account-1",
+            email_ids=["msg-1", "msg-2"],
+            ai_analysis={"should_create_task": False}
+        )
+        
+        sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+        assert updated == 2
+        assert sql.startswith("UPDATE processed_emails SET ai_analysis=")
+        assert "email_sync_jobs.email_account_id" in sql
+        db.execute.assert_awaited_once()
+        db.commit.assert_awaited_once()
+        mock_invalidate.assert_awaited_once_with("email:pe-1", "email:pe-2")
+
+class TestDatabasePools:
+    def test_checkout_wait_histogram_quantiles(self):
+        """Test checkout waits land in cumulative buckets with bucket-bound quantiles"""
+        from app.core.database import CheckoutWaitHistogram
+        
+        histogram = CheckoutWaitHistogram()
+        for seconds in [0.0005] * 90 + [0.2] * 9 + [30.0]:
+            histogram.observe(seconds)
+        
+        snapshot = histogram.snapshot()
+        assert snapshot["count"] == 100
+        assert snapshot["buckets"]["0.001"] == 90
+        assert snapshot["buckets"]["0.25"] == 99
+        assert snapshot["buckets"]["10.0"] == 99
+        assert snapshot["buckets"]["+Inf"] == 100
+        assert snapshot["p50"] == 0.001
+        assert snapshot["p95"] == 0.25
+        assert snapshot["p99"] == 0.25
+        assert snapshot["max"] == 30.0
+    
+    async def test_roles_use_separate_tuned_pools(self):
+        """Test each role gets its own asyncpg engine sized from settings"""
+        from app.core import database
+        
+        try:
+            api_engine = database.get_engine("api")
+            worker_engine = database.get_engine("worker")
+            
+            assert api_engine is not worker_engine
+            assert database.get_engine("api") is api_engine
+            assert api_engine.url.drivername == "postgresql+asyncpg"
+            assert api_engine.pool.size() == settings.DB_API_POOL_SIZE
+            assert worker_engine.pool.size() == settings.DB_WORKER_POOL_SIZE
+            
+            metrics = database.get_pool_metrics()
+            assert metrics["worker"]["active"] is True
+            assert metrics["reporting"]["active"] is False
+            
+            with pytest.raises(ValueError):
+                database.get_engine("batch")
+        finally:
+            await database.dispose_engines()
+    
+    @patch("app.core.database._create_async_engine")
+    def test_stale_engines_are_disposed_on_loop_change(self, mock_create_engine):
+        """Test engines bound to a previous event loop are disposed instead of leaking connections"""
+        from app.core import database
+        
+        mock_create_engine.side_effect = lambda role: AsyncMock()
+        
+        async def acquire():
+            return database.get_engine("api")
+        
+        first = asyncio.run(acquire())
+        second = asyncio.run(acquire())
+        
+        assert second is not first
+        first.dispose.assert_awaited_once()
+        second.dispose.assert_not_awaited()
+        asyncio.run(database.dispose_engines())
+
+
+class TestKeysetPagination:
+    def test_cursor_is_bound_to_its_listing(self):
+        """Test cursors round-trip sort keys and reject other listings or garbage"""
+        from uuid import uuid4
+        from app.crud.pagination import InvalidCursorError, decode_cursor, encode_cursor
+        
+        values = [datetime(2025, 8, 1, 9, 30), uuid4()]
+        cursor = encode_cursor("user_tasks", values)
+        
+        assert decode_cursor("user_tasks", cursor, 2) == values
+        with pytest.raises(InvalidCursorError):
+            decode_cursor("chat_messages", cursor, 2)
+        with pytest.raises(InvalidCursorError):
+            decode_cursor("user_tasks", "not-a-cursor", 2)
+    
+    async def test_paginate_reads_one_extra_row_for_next_cursor(self):
+        """Test a full page returns a cursor pointing at its last row and the next page seeks past it"""
+        from sqlalchemy import Column, DateTime, Integer, MetaData, Table, select
+        from sqlalchemy.dialects import postgresql
+        from app.crud.pagination import paginate
+        
+        table = Table("items", MetaData(), Column("id", Integer), Column("created_at", DateTime))
+        rows = [MagicMock(id=i, created_at=datetime(2025, 8, 1, 12 - i)) for i in range(4)]
+        result = MagicMock()
+        result.scalars.return_value.unique.return_value.all.return_value = rows
+        db = AsyncMock()
+        db.execute.return_value = result
+        columns = [table.c.created_at, table.c.id]
+        
+        page, next_cursor = await paginate(db, select(table), columns, kind="items", limit=3)
+        
+        assert page == rows[:3]
+        assert next_cursor is not None
+        first_sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+        assert "OFFSET" not in first_sql
+        
+        result.scalars.return_value.unique.return_value.all.return_value = rows[3:]
+        page, last_cursor = await paginate(
+            db, select(table), columns, kind="items", limit=3, cursor=next_cursor
+        )
+        
+        assert page == rows[3:]
+        assert last_cursor is None
+        compiled = db.execute.await_args.args[0].compile(dialect=postgresql.dialect())
+        assert "items.created_at <= %(created_at_1)s" in str(compiled)
+        assert compiled.params["created_at_1"] == datetime(2025, 8, 1, 10)
+        assert compiled.params["id_1"] == 2
+
+
+class TestDashboardStats:
+    async def test_recounts_overdue_only_after_next_due_date(self):
+        """Test the rollup row is served as-is until an open task's due date passes"""
+        from app.crud.crud_dashboard_stats import CRUDDashboardStats
+        
+        stats = MagicMock(
+            total_tasks=4, todo_count=1, progress_count=1, done_count=2, overdue_count=1,
+            next_due_at=datetime.utcnow() + timedelta(days=1)
+        )
+        crud = CRUDDashboardStats()
+        crud._get = AsyncMock(return_value=stats)
+        crud._refresh_overdue = AsyncMock(return_value=MagicMock(
+            total_tasks=4, todo_count=1, progress_count=1, done_count=2, overdue_count=2,
+            next_due_at=None
+        ))
+        
+        summary = await crud.get_task_summary(AsyncMock(), "user-1")
+        
+        assert summary["overdue_count"] == 1
+        assert summary["completion_rate"] == 50.0
+        crud._refresh_overdue.assert_not_awaited()
+        
+        stats.next_due_at = datetime.utcnow() - timedelta(minutes=1)
+        summary = await crud.get_task_summary(AsyncMock(), "user-1")
+        
+        assert summary["overdue_count"] == 2
+        crud._refresh_overdue.assert_awaited_once()
+    
+    async def test_overdue_version_changes_when_next_due_date_passes(self):
+        """Test the dashboard ETag component changes once the next due date is reached"""
+        from app.crud.crud_dashboard_stats import CRUDDashboardStats
+        
+        crud = CRUDDashboardStats()
+        db = AsyncMock()
+        next_due_at = datetime.utcnow() + timedelta(minutes=1)
+        db.execute.return_value.scalar_one_or_none = MagicMock(return_value=next_due_at)
+        
+        pending = await crud.get_overdue_version(db, "user-1")
+        
+        db.execute.return_value.scalar_one_or_none = MagicMock(
+            return_value=next_due_at - timedelta(minutes=2)
+        )
+        passed = await crud.get_overdue_version(db, "user-1")
+        
+        db.execute.return_value.scalar_one_or_none = MagicMock(return_value=None)
+        no_due = await crud.get_overdue_version(db, "user-1")
+        
+        assert pending.endswith(":pending")
+        assert passed.endswith(":passed")
+        assert len({pending, passed, no_due}) == 3
+    
+    async def test_reconcile_locks_row_before_counting(self):
+        """Test reconciliation locks the rollup row before scanning so trigger deltas are not lost"""
+        from app.crud.crud_dashboard_stats import CRUDDashboardStats
+        
+        crud = CRUDDashboardStats()
+        crud._count_tasks = AsyncMock(return_value={"total_tasks": 3})
+        crud._count_emails = AsyncMock(return_value={"total_emails": 10})
+        crud._count_email_days = AsyncMock(return_value=[])
+        crud._get = AsyncMock(return_value=MagicMock())
+        db = AsyncMock()
+        statements = []
+        
+        async def execute(statement, *args):
+            statements.append(str(statement))
+            if "FOR UPDATE" in statements[-1]:
+                crud._count_tasks.assert_not_awaited()
+        
+        db.execute.side_effect = execute
+        
+        await crud.reconcile(db, "user-1")
+        
+        assert statements[0].startswith("INSERT INTO user_dashboard_stats")
+        assert "FOR UPDATE" in statements[1]
+        crud._count_tasks.assert_awaited_once()
+        db.commit.assert_awaited_once()
+
+
+class TestPartitionMaintenance:
+    def test_partition_bounds_and_names(self):
+        """Test monthly and quarterly partition ranges and naming"""
+        from datetime import date
+        from app.crud.crud_partitions import partition_bounds, partition_name
+        
+        assert partition_bounds(date(2025, 12, 17), 1) == (date(2025, 12, 1), date(2026, 1, 1))
+        assert partition_bounds(date(2025, 8, 17), 3) == (date(2025, 7, 1), date(2025, 10, 1))
+        assert partition_name("processed_emails", date(2025, 1, 1), 1) == "processed_emails_y2025m01"
+        assert partition_name("task_histories", date(2025, 7, 1), 3) == "task_histories_2025q3"
+    
+    async def test_creates_missing_future_partitions(self):
+        """Test only the missing partitions up to the premake horizon are attached"""
+        from datetime import date
+        from app.crud.crud_partitions import CRUDPartitions
+        
+        crud = CRUDPartitions()
+        crud.list_partitions = AsyncMock(return_value=[
+            {"name": "processed_emails_y2025m08", "start": date(2025, 8, 1), "end": date(2025, 9, 1)},
+        ])
+        crud._attach_partition = AsyncMock()
+        
+        created = await crud.ensure_future_partitions(
+            AsyncMock(), "processed_emails", months_ahead=2, today=date(2025, 8, 20)
+        )
+        
+        assert created == ["processed_emails_y2025m09", "processed_emails_y2025m10"]
+    
+    async def test_expired_partitions_are_detached_not_deleted(self):
+        """Test retention detaches whole partitions and keeps task emails in an archive partition"""
+        from datetime import date
+        from app.crud.crud_partitions import CRUDPartitions
+        
+        crud = CRUDPartitions()
+        crud.list_partitions = AsyncMock(return_value=[
+            {"name": "processed_emails_y2025m03_archive", "start": date(2025, 3, 1), "end": date(2025, 4, 1)},
+            {"name": "processed_emails_y2025m04", "start": date(2025, 4, 1), "end": date(2025, 5, 1)},
+            {"name": "processed_emails_y2025m05", "start": date(2025, 5, 1), "end": date(2025, 6, 1)},
+        ])
+        db = AsyncMock()
+        statements = []
+        
+        async def execute(statement, *args):
+            statements.append(str(statement))
+            return MagicMock(rowcount=2 if len(statements) == 2 else 0)
+        
+        async def commit():
+            statements.append("COMMIT")
+        
+        db.execute.side_effect = execute
+        db.commit.side_effect = commit
+        
+        removed = await crud.drop_expired_partitions(
+            db, "processed_emails", datetime(2025, 5, 20), keep_detached=False
+        )
+        
+        assert removed == [{"partition": "processed_emails_y2025m04", "retained": 2}]
+        detach = statements.index(
+            "ALTER TABLE processed_emails DETACH PARTITION processed_emails_y2025m04"
+        )
+        # Retained rows are copied before the detach, which is committed on its own
+        assert statements[0].startswith("CREATE TABLE IF NOT EXISTS processed_emails_y2025m04_archive")
+        assert statements[1].startswith(
+            "INSERT INTO processed_emails_y2025m04_archive SELECT * FROM processed_emails_y2025m04"
+        )
+        assert statements[2] == "COMMIT"
+        assert statements[detach + 1] == "COMMIT"
+        assert any(
+            s.startswith("ALTER TABLE processed_emails ATTACH PARTITION processed_emails_y2025m04_archive "
+                         "FOR VALUES FROM ('2025-04-01') TO ('2025-05-01')")
+            for s in statements[detach:]
+        )
+        assert "DROP TABLE processed_emails_y2025m04" in statements
+        assert not any("processed_emails_default" in s for s in statements)
+        assert not any("y2025m03" in s for s in statements)
+        assert not any(s.startswith("DELETE") for s in statements)
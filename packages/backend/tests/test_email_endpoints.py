@@ -1,6 +1,6 @@
 import pytest
 from httpx import AsyncClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from datetime import datetime
 
 from app.main import app
@@ -26,11 +26,15 @@ def mock_current_user():
 
 class TestEmailEndpoints:
     @patch("app.api.v1.endpoints.email.get_current_user")
-    @patch("app.api.v1.endpoints.email.sync_emails")
-    async def test_start_email_sync(self, mock_sync_emails, mock_get_user, client, auth_headers, mock_current_user):
-        """Test starting email sync"""
+    @patch("app.api.v1.endpoints.email.SyncProgressTracker")
+    @patch("app.api.v1.endpoints.email.crud_email")
+    @patch("app.worker.tasks.email.sync_emails")
+    async def test_start_email_sync(self, mock_sync_emails, mock_crud_email, mock_tracker, mock_get_user, client, auth_headers, mock_current_user):
+        """Test starting email sync creates a sync job and queues the task"""
         mock_get_user.return_value = mock_current_user
-        mock_sync_emails.delay.return_value = MagicMock(id="job123")
+        mock_crud_email.get_email_account = AsyncMock(return_value=MagicMock(id="account123"))
+        mock_crud_email.create_sync_job = AsyncMock(return_value=MagicMock(id="job123"))
+        mock_tracker.return_value.flush = AsyncMock()
         
         response = await client.post(
             "/api/v1/email/sync",
@@ -43,17 +47,26 @@ class TestEmailEndpoints:
         assert data["job_id"] == "job123"
         mock_sync_emails.delay.assert_called_once_with(
             user_id="user123",
-            account_id="account123"
+            account_id="account123",
+            sync_job_id="job123"
         )
     
     @patch("app.api.v1.endpoints.email.get_current_user")
-    @patch("app.api.v1.endpoints.email.AsyncResult")
-    async def test_get_sync_job_status_pending(self, mock_async_result, mock_get_user, client, auth_headers, mock_current_user):
-        """Test getting sync job status - pending"""
+    @patch("app.api.v1.endpoints.email.get_sync_progress")
+    async def test_get_sync_job_status_processing(self, mock_get_progress, mock_get_user, client, auth_headers, mock_current_user):
+        """Test getting sync job status - in progress"""
         mock_get_user.return_value = mock_current_user
-        mock_result = MagicMock()
-        mock_result.state = "PENDING"
-        mock_async_result.return_value = mock_result
+        mock_get_progress.return_value = {
+            "id": "job123",
+            "user_id": "user123",
+            "email_account_id": "account123",
+            "status": "processing",
+            "total_emails": 40,
+            "processed_emails": 15,
+            "started_at": "2024-01-01T00:00:00",
+            "completed_at": None,
+            "error_message": None
+        }
         
         response = await client.get(
             "/api/v1/email/sync/job123",
@@ -63,22 +76,27 @@ class TestEmailEndpoints:
         assert response.status_code == 200
         data = response.json()
         assert data["id"] == "job123"
-        assert data["status"] == "pending"
-        assert data["processed_emails"] == 0
+        assert data["status"] == "processing"
+        assert data["processed_emails"] == 15
+        assert data["total_emails"] == 40
+        assert data["started_at"].startswith("2024-01-01")
     
     @patch("app.api.v1.endpoints.email.get_current_user")
-    @patch("app.api.v1.endpoints.email.AsyncResult")
-    async def test_get_sync_job_status_success(self, mock_async_result, mock_get_user, client, auth_headers, mock_current_user):
-        """Test getting sync job status - success"""
+    @patch("app.api.v1.endpoints.email.get_sync_progress")
+    async def test_get_sync_job_status_failure(self, mock_get_progress, mock_get_user, client, auth_headers, mock_current_user):
+        """Test getting sync job status - failure"""
         mock_get_user.return_value = mock_current_user
-        mock_result = MagicMock()
-        mock_result.state = "SUCCESS"
-        mock_result.result = {
-            "account_id": "account123",
-            "processed_emails": 10,
-            "total_emails": 10
+        mock_get_progress.return_value = {
+            "id": "job123",
+            "user_id": "user123",
+            "email_account_id": "account123",
+            "status": "failed",
+            "total_emails": 0,
+            "processed_emails": 0,
+            "started_at": "2024-01-01T00:00:00",
+            "completed_at": "2024-01-01T00:01:00",
+            "error_message": "Sync failed"
         }
-        mock_async_result.return_value = mock_result
         
         response = await client.get(
             "/api/v1/email/sync/job123",
@@ -87,29 +105,22 @@ class TestEmailEndpoints:
         
         assert response.status_code == 200
         data = response.json()
-        assert data["status"] == "completed"
-        assert data["processed_emails"] == 10
-        assert data["total_emails"] == 10
+        assert data["status"] == "failed"
+        assert "Sync failed" in data["error_message"]
     
     @patch("app.api.v1.endpoints.email.get_current_user")
-    @patch("app.api.v1.endpoints.email.AsyncResult")
-    async def test_get_sync_job_status_failure(self, mock_async_result, mock_get_user, client, auth_headers, mock_current_user):
-        """Test getting sync job status - failure"""
+    @patch("app.api.v1.endpoints.email.get_sync_progress")
+    async def test_get_sync_job_status_other_user(self, mock_get_progress, mock_get_user, client, auth_headers, mock_current_user):
+        """Test sync jobs of other users are not visible"""
         mock_get_user.return_value = mock_current_user
-        mock_result = MagicMock()
-        mock_result.state = "FAILURE"
-        mock_result.info = Exception("Sync failed")
-        mock_async_result.return_value = mock_result
+        mock_get_progress.return_value = {"id": "job123", "user_id": "someone-else"}
         
         response = await client.get(
             "/api/v1/email/sync/job123",
             headers=auth_headers
         )
         
-        assert response.status_code == 200
-        data = response.json()
-        assert data["status"] == "failed"
-        assert "Sync failed" in data["error_message"]
+        assert response.status_code == 404
 
 
 class TestAIEndpoints:
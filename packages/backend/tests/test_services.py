@@ -1,8 +1,10 @@
 import pytest
+import asyncio
 from unittest.mock import patch, MagicMock, AsyncMock
 from datetime import datetime
 import json
 import base64
+import os
 
 from app.services.email_service import EmailService
 from app.services.oauth_service import OAuthService
@@ -51,11 +53,11 @@ class TestEmailService:
         sent_message = mock_smtp_instance.send_message.call_args[0][0]
         assert sent_message.get_content_type() == "multipart/alternative"
     
-    @patch("app.services.email_service.httpx.AsyncClient")
-    async def test_sync_gmail_full_sync(self, mock_httpx, email_service):
+    @patch("app.services.email_service.get_http_client")
+    async def test_sync_gmail_full_sync(self, mock_get_client, email_service):
         """Test Gmail full sync (no previous sync token)"""
         mock_client = AsyncMock()
-        mock_httpx.return_value.__aenter__.return_value = mock_client
+        mock_get_client.return_value = mock_client
         
         # Mock message list response
         mock_client.get.side_effect = [
@@ -100,11 +102,11 @@ class TestEmailService:
         assert result["messages"][0]["from"] == "sender@example.com"
         assert result["nextSyncToken"] == "12345"
     
-    @patch("app.services.email_service.httpx.AsyncClient")
-    async def test_sync_gmail_incremental(self, mock_httpx, email_service):
+    @patch("app.services.email_service.get_http_client")
+    async def test_sync_gmail_incremental(self, mock_get_client, email_service):
         """Test Gmail incremental sync with sync token"""
         mock_client = AsyncMock()
-        mock_httpx.return_value.__aenter__.return_value = mock_client
+        mock_get_client.return_value = mock_client
         
         mock_client.get.return_value = MagicMock(
             status_code=200,
@@ -126,11 +128,76 @@ class TestEmailService:
         call_args = mock_client.get.call_args[0][0]
         assert "history" in call_args
     
-    @patch("app.services.email_service.httpx.AsyncClient")
-    async def test_sync_outlook(self, mock_httpx, email_service):
+    @patch("app.services.email_service.get_http_client")
+    async def test_sync_gmail_metadata_format(self, mock_get_client, email_service):
+        """Test Gmail sync fetches metadata only when requested"""
+        mock_client = AsyncMock()
+        mock_get_client.return_value = mock_client
+        
+        mock_client.get.side_effect = [
+            MagicMock(
+                status_code=200,
+                json=lambda: {"messages": [{"id": "msg1"}, {"id": "msg2"}]}
+            ),
+            MagicMock(
+                status_code=200,
+                json=lambda: {
+                    "id": "msg1",
+                    "payload": {"headers": [{"name": "Subject", "value": "First"}]}
+                }
+            ),
+            MagicMock(
+                status_code=200,
+                json=lambda: {
+                    "id": "msg2",
+                    "payload": {"headers": [{"name": "Subject", "value": "Second"}]}
+                }
+            ),
+            MagicMock(
+                status_code=200,
+                json=lambda: {"historyId": "12345"}
+            )
+        ]
+        
+        result = await email_service.sync_gmail(
+            access_token="test_token",
+            concurrency=2,
+            message_format="metadata"
+        )
+        
+        assert [m["subject"] for m in result["messages"]] == ["First", "Second"]
+        assert all(m["body"] == "" for m in result["messages"])
+        
+        detail_params = mock_client.get.call_args_list[1].kwargs["params"]
+        assert detail_params["format"] == "metadata"
+        assert "fields" in detail_params
+    
+    @patch("app.services.email_service.get_http_client")
+    async def test_hydrate_gmail_messages(self, mock_get_client, email_service):
+        """Test bodies of metadata-only Gmail messages are loaded afterwards"""
+        mock_client = AsyncMock()
+        mock_get_client.return_value = mock_client
+        
+        mock_client.get.return_value = MagicMock(
+            status_code=200,
+            json=lambda: {
+                "payload": {"body": {"data": "SGVsbG8gV29ybGQ="}}  # "Hello World"
+            }
+        )
+        
+        messages = [{"id": "msg1", "body": ""}, {"id": "msg2", "body": ""}]
+        result = await email_service.hydrate_gmail_messages("test_token", messages)
+        
+        assert result is messages
+        assert [m["body"] for m in messages] == ["Hello World", "Hello World"]
+        assert mock_client.get.call_count == 2
+        assert mock_client.get.call_args.kwargs["params"]["format"] == "full"
+    
+    @patch("app.services.email_service.get_http_client")
+    async def test_sync_outlook(self, mock_get_client, email_service):
         """Test Outlook/Office 365 sync"""
         mock_client = AsyncMock()
-        mock_httpx.return_value.__aenter__.return_value = mock_client
+        mock_get_client.return_value = mock_client
         
         mock_client.get.return_value = MagicMock(
             status_code=200,
@@ -161,6 +228,51 @@ class TestEmailService:
         assert result["messages"][0]["subject"] == "Outlook Test"
         assert result["messages"][0]["from"] == "sender@outlook.com"
         assert result["deltaLink"] == "https://graph.microsoft.com/delta?token=new"
+    
+    @patch("app.services.email_service.get_http_client")
+    async def test_sync_outlook_follows_next_link_and_hydrates(self, mock_get_client, email_service):
+        """Test Outlook delta paging and $batch body hydration"""
+        mock_client = AsyncMock()
+        mock_get_client.return_value = mock_client
+        
+        mock_client.get.side_effect = [
+            MagicMock(
+                status_code=200,
+                json=lambda: {
+                    "value": [{"id": "msg1", "subject": "First"}],
+                    "@odata.nextLink": "https://graph.microsoft.com/delta?page=2"
+                }
+            ),
+            MagicMock(
+                status_code=200,
+                json=lambda: {
+                    "value": [{"id": "msg2", "subject": "Second"}, {"id": "old", "@removed": {}}],
+                    "@odata.deltaLink": "https://graph.microsoft.com/delta?token=final"
+                }
+            )
+        ]
+        
+        result = await email_service.sync_outlook(access_token="test_token")
+        
+        assert [m["id"] for m in result["messages"]] == ["msg1", "msg2"]
+        assert result["deltaLink"] == "https://graph.microsoft.com/delta?token=final"
+        assert "odata.maxpagesize" in mock_client.get.call_args_list[0].kwargs["headers"]["Prefer"]
+        
+        mock_client.post.return_value = MagicMock(
+            status_code=200,
+            json=lambda: {
+                "responses": [
+                    {"id": "0", "status": 200, "body": {"body": {"content": "Body 1"}}},
+                    {"id": "1", "status": 404, "body": {}}
+                ]
+            }
+        )
+        
+        messages = await email_service.hydrate_outlook_messages("test_token", result["messages"])
+        
+        assert messages[0]["body"] == "Body 1"
+        assert messages[1]["body"] == ""
+        assert len(mock_client.post.call_args.kwargs["json"]["requests"]) == 2
 
 
 class TestOAuthService:
@@ -178,11 +290,11 @@ class TestOAuthService:
         assert encrypted != original_token
         assert decrypted == original_token
     
-    @patch("app.services.oauth_service.httpx.AsyncClient")
-    async def test_refresh_google_token(self, mock_httpx, oauth_service):
+    @patch("app.services.oauth_service.get_http_client")
+    async def test_refresh_google_token(self, mock_get_client, oauth_service):
         """Test refreshing Google OAuth token"""
         mock_client = AsyncMock()
-        mock_httpx.return_value.__aenter__.return_value = mock_client
+        mock_get_client.return_value = mock_client
         
         mock_client.post.return_value = MagicMock(
             status_code=200,
@@ -211,11 +323,11 @@ class TestOAuthService:
         assert "oauth2.googleapis.com/token" in call_args[0][0]
         assert call_args[1]["data"]["refresh_token"] == "test_refresh_token"
     
-    @patch("app.services.oauth_service.httpx.AsyncClient")
-    async def test_refresh_microsoft_token(self, mock_httpx, oauth_service):
+    @patch("app.services.oauth_service.get_http_client")
+    async def test_refresh_microsoft_token(self, mock_get_client, oauth_service):
         """Test refreshing Microsoft OAuth token"""
         mock_client = AsyncMock()
-        mock_httpx.return_value.__aenter__.return_value = mock_client
+        mock_get_client.return_value = mock_client
         
         mock_client.post.return_value = MagicMock(
             status_code=200,
@@ -236,11 +348,11 @@ class TestOAuthService:
         assert result["access_token"] == "new_ms_token"
         assert "login.microsoftonline.com" in mock_client.post.call_args[0][0]
     
-    @patch("app.services.oauth_service.httpx.AsyncClient")
-    async def test_exchange_google_code(self, mock_httpx, oauth_service):
+    @patch("app.services.oauth_service.get_http_client")
+    async def test_exchange_google_code(self, mock_get_client, oauth_service):
         """Test exchanging Google authorization code for tokens"""
         mock_client = AsyncMock()
-        mock_httpx.return_value.__aenter__.return_value = mock_client
+        mock_get_client.return_value = mock_client
         
         # Mock token exchange response
         mock_client.post.return_value = MagicMock(
@@ -277,6 +389,57 @@ class TestOAuthService:
         decrypted = oauth_service.decrypt_token(result["refresh_token"])
         assert decrypted == "google_refresh"
     
+    @patch("app.services.oauth_service.get_redis")
+    @patch("app.services.oauth_service.get_http_client")
+    async def test_get_access_token_shares_single_refresh(self, mock_get_client, mock_get_redis, oauth_service):
+        """Test concurrent callers share one refresh and later calls hit the cache"""
+        from app.services import oauth_service as oauth_module
+        
+        mock_client = AsyncMock()
+        mock_get_client.return_value = mock_client
+        mock_client.post.return_value = MagicMock(
+            status_code=200,
+            json=lambda: {"access_token": "cached_access_token", "expires_in": 3600}
+        )
+        
+        mock_redis = AsyncMock()
+        mock_redis.get.return_value = None
+        mock_redis.set.return_value = True
+        mock_get_redis.return_value = mock_redis
+        oauth_module._token_cache.pop("account-1", None)
+        
+        encrypted_token = oauth_service.encrypt_token("test_refresh_token")
+        
+        results = await asyncio.gather(*[
+            oauth_service.get_access_token("account-1", encrypted_token, "google")
+            for _ in range(5)
+        ])
+        again = await oauth_service.get_access_token("account-1", encrypted_token, "google")
+        
+        assert {r["access_token"] for r in results} == {"cached_access_token"}
+        assert again["access_token"] == "cached_access_token"
+        mock_client.post.assert_called_once()
+        
+        # Redis only ever sees the encrypted access token
+        stored = json.loads(mock_redis.setex.call_args[0][2])
+        assert stored["access_token"] != "cached_access_token"
+        assert oauth_service.decrypt_token(stored["access_token"]) == "cached_access_token"
+        oauth_module._token_cache.pop("account-1", None)
+    
+    @patch("app.services.oauth_service.get_redis")
+    async def test_invalidate_access_token_drops_both_caches(self, mock_get_redis, oauth_service):
+        """Test an invalidated token is removed from the process and Redis caches"""
+        from app.services import oauth_service as oauth_module
+        
+        mock_redis = AsyncMock()
+        mock_get_redis.return_value = mock_redis
+        oauth_module._token_cache["account-2"] = {"access_token": "revoked"}
+        
+        await oauth_service.invalidate_access_token("account-2")
+        
+        assert "account-2" not in oauth_module._token_cache
+        mock_redis.delete.assert_awaited_once_with("oauth:access_token:account-2")
+    
     async def test_unsupported_provider(self, oauth_service):
         """Test error handling for unsupported provider"""
         encrypted_token = oauth_service.encrypt_token("some_token")
@@ -292,4 +455,576 @@ class TestOAuthService:
                 code="code",
                 provider="unsupported",
                 redirect_uri="http://localhost"
-            )
\ No newline at end of file
+            )
+
+class TestSharedHTTPClient:
+    async def test_client_is_reused_within_event_loop(self):
+        """Test the shared HTTP client is pooled per process/event loop"""
+        from app.core.http_client import get_http_client, close_http_client
+        
+        client = get_http_client()
+        
+        assert get_http_client() is client
+        
+        await close_http_client()
+        
+        assert client.is_closed
+        assert get_http_client() is not client
+        await close_http_client()
+    
+    def test_stale_client_is_closed_on_loop_change(self):
+        """Test the client of a previous event loop is closed instead of leaking its pool"""
+        from app.core.http_client import get_http_client
+        
+        async def acquire():
+            return get_http_client()
+        
+        first = asyncio.run(acquire())
+        second = asyncio.run(acquire())
+        
+        assert second is not first
+        assert first.is_closed
+        asyncio.run(second.aclose())
+
+
+class TestMultipartMixedParser:
+    def _build_response(self, boundary: str, newline: str) -> bytes:
+        parts = []
+        for i, (status, body) in enumerate([(200, '{"id": "a"}'), (429, '{"error": {}}')]):
+            parts.append(
+                f"--{boundary}{newline}"
+                f"Content-Type: application/http{newline}"
+                f"Content-ID: <response-item{i}>{newline}{newline}"
+                f"HTTP/1.1 {status} OK{newline}"
+                f"Content-Type: application/json{newline}"
+                f"Retry-After: 5{newline}{newline}"
+                f"{body}{newline}"
+            )
+        parts.append(f"--{boundary}--{newline}")
+        return "".join(parts).encode()
+
+    @pytest.mark.parametrize("newline", ["\r\n", "\n"])
+    def test_parses_parts_across_chunk_boundaries(self, newline):
+        """Test batch response parts are parsed incrementally with status and Content-ID"""
+        from app.services.optimized_email_service import MultipartMixedParser
+        
+        data = self._build_response("batch_abc", newline)
+        parser = MultipartMixedParser("batch_abc")
+        parts = []
+        for i in range(0, len(data), 7):
+            parts.extend(parser.feed(data[i:i + 7]))
+        
+        assert parser.finished
+        assert [p["content_id"] for p in parts] == ["response-item0", "response-item1"]
+        assert [p["status"] for p in parts] == [200, 429]
+        assert json.loads(parts[0]["body"]) == {"id": "a"}
+        assert parts[1]["headers"]["retry-after"] == "5"
+    
+    def test_boundary_search_resumes_after_scanned_bytes(self):
+        """Test a large part is not rescanned from the start on every chunk"""
+        from app.services.optimized_email_service import MultipartMixedParser
+        
+        parser = MultipartMixedParser("batch_abc")
+        parser.feed(
+            b"--batch_abc\r\nContent-ID: <response-item0>\r\n\r\n"
+            b"HTTP/1.1 200 OK\r\n\r\n"
+        )
+        for _ in range(10):
+            parser.feed(b"x" * 1024)
+        
+        assert parser._search_from == len(parser._buffer) - len(b"\n--batch_abc") + 1
+        parts = parser.feed(b"\r\n--batch_abc--\r\n")
+        assert len(parts) == 1
+        assert parser.finished
+
+
+class TestOptimizedEmailSync:
+    @patch("app.services.optimized_email_service.AsyncSessionLocal")
+    async def test_bulk_insert_queues_only_returned_rows(self, mock_session_local):
+        """Test a page claims its email IDs once and only newly claimed rows are inserted and analyzed"""
+        from sqlalchemy.dialects import postgresql
+        from app.services.optimized_email_service import OptimizedEmailSyncService
+        
+        # Replace only the queueing side without importing the Celery task module
+        email_tasks = MagicMock()
+        mock_analyze = email_tasks.analyze_email_thread_for_tasks
+        db = AsyncMock()
+        db.execute.return_value.scalars = MagicMock(return_value=["msg-1", "msg-3"])  # msg-2 already processed
+        mock_session_local.return_value.__aenter__.return_value = db
+        reply_headers = [
+            {"name": "Subject", "value": "Re: Budget"},
+            {"name": "In-Reply-To", "value": "<msg-1@example.com>"},
+        ]
+        messages = [
+            {"id": "msg-3", "threadId": "t-1", "internalDate": "1700000100000",
+             "payload": {"headers": reply_headers}},
+            {"id": "msg-1", "threadId": "t-1", "internalDate": "1700000000000",
+             "payload": {"headers": [{"name": "Subject", "value": "Budget"}]}},
+            {"id": "msg-1", "threadId": "t-1", "internalDate": "1700000000000",
+             "payload": {"headers": [{"name": "Subject", "value": "Budget"}]}},
+            {"id": "msg-2", "threadId": "t-2", "internalDate": "1700000000000"},
+        ]
+        
+        with patch.dict("sys.modules", {"app.worker.tasks.email": email_tasks}):
+            result = await OptimizedEmailSyncService()._process_messages(
+                messages, "user-1", "acc-1", "job-1"
+            )
+        
+        assert result == {"processed": 2, "threads": 1}
+        assert db.execute.await_count == 2
+        claim, insert = (call.args[0].compile(dialect=postgresql.dialect()) for call in db.execute.await_args_list)
+        assert "processed_email_keys" in str(claim) and "ON CONFLICT (email_id) DO NOTHING" in str(claim)
+        assert [v for k, v in claim.params.items() if k.startswith("email_id")] == ["msg-3", "msg-1", "msg-2"]
+        assert [v for k, v in insert.params.items() if k.startswith("email_id")] == ["msg-3", "msg-1"]
+        assert [v for k, v in insert.params.items() if k.startswith("sync_job_id")] == ["job-1", "job-1"]
+        row_ids = [str(v) for k, v in insert.params.items() if k.startswith("id_m") or k == "id"]
+        mock_analyze.delay.assert_called_once_with(
+            thread_id="t-1",
+            email_ids=row_ids,
+            user_id="user-1",
+            primary_subject="Budget"
+        )
+        db.commit.assert_awaited_once()
+    
+    async def test_revoked_token_is_dropped_and_sync_retried_once(self):
+        """Test a 401 from Gmail invalidates the cached token and resumes with a fresh one"""
+        import httpx
+        from app.services.optimized_email_service import OptimizedEmailSyncService
+        
+        service = OptimizedEmailSyncService()
+        service.oauth_service = MagicMock()
+        service.oauth_service.invalidate_access_token = AsyncMock()
+        service._get_fresh_access_token = AsyncMock(side_effect=["revoked", "fresh"])
+        unauthorized = httpx.HTTPStatusError(
+            "401", request=MagicMock(), response=MagicMock(status_code=401)
+        )
+        service._run_gmail_sync = AsyncMock(side_effect=[unauthorized, {"status": "success"}])
+        
+        result = await service.sync_gmail_optimized("acc-1", "user-1", MagicMock())
+        
+        assert result == {"status": "success"}
+        service.oauth_service.invalidate_access_token.assert_awaited_once_with("acc-1")
+        assert [call.args[0] for call in service._run_gmail_sync.await_args_list] == ["revoked", "fresh"]
+    
+    @patch("app.services.optimized_email_service.crud_email.get_email_account", new_callable=AsyncMock)
+    @patch("app.services.optimized_email_service.AsyncSessionLocal")
+    async def test_access_token_is_loaded_for_the_account(self, mock_session_local, mock_get_account):
+        """Test the access token is obtained with the account's refresh token"""
+        from fastapi import HTTPException
+        from app.services.optimized_email_service import OptimizedEmailSyncService
+        
+        service = OptimizedEmailSyncService()
+        service.oauth_service = MagicMock()
+        service.oauth_service.get_access_token = AsyncMock(return_value={"access_token": "fresh"})
+        mock_get_account.return_value = MagicMock(refresh_token="encrypted", provider="google")
+        
+        assert await service._get_fresh_access_token("acc-1", "user-1") == "fresh"
+        assert mock_get_account.await_args.kwargs == {"account_id": "acc-1", "user_id": "user-1"}
+        service.oauth_service.get_access_token.assert_awaited_once_with("acc-1", "encrypted", "google")
+        
+        mock_get_account.return_value = None
+        with pytest.raises(HTTPException) as exc_info:
+            await service._get_fresh_access_token("acc-2", "user-1")
+        assert exc_info.value.status_code == 401
+    
+    @patch("app.crud.crud_email.crud_email.create_sync_job", new_callable=AsyncMock)
+    @patch("app.services.sync_progress.AsyncSessionLocal")
+    async def test_sync_without_job_creates_one(self, mock_session_local, mock_create_job):
+        """Test a sync started without a job id records its emails on a newly created job"""
+        from app.services.sync_progress import SyncProgressTracker
+        
+        mock_create_job.return_value = MagicMock(id="job-new")
+        
+        created = await SyncProgressTracker.for_job(None, user_id="user-1", account_id="acc-1")
+        existing = await SyncProgressTracker.for_job("job-1", user_id="user-1", account_id="acc-1")
+        
+        assert created.job_id == "job-new"
+        assert existing.job_id == "job-1"
+        mock_create_job.assert_awaited_once()
+
+
+class TestCacheService:
+    @patch("app.services.cache_service.get_redis")
+    async def test_mget_returns_mapping_in_one_round_trip(self, mock_get_redis):
+        """Test mget maps keys to values with a single Redis call"""
+        from app.services.cache_service import CacheService
+        
+        mock_redis = AsyncMock()
+        mock_redis.mget.return_value = ["1", None]
+        mock_get_redis.return_value = mock_redis
+        
+        result = await CacheService().mget(["a", "b"])
+        
+        assert result == {"a": "1", "b": None}
+        mock_redis.mget.assert_awaited_once_with(["a", "b"])
+    
+    async def test_shared_pool_is_reused(self):
+        """Test CacheService instances share the process-wide Redis client"""
+        from app.core.redis_client import get_redis, close_redis
+        from app.services.cache_service import CacheService
+        
+        assert CacheService().redis_client is CacheService().redis_client
+        assert CacheService().redis_client is get_redis()
+        await close_redis()
+    
+    @patch("app.core.redis_client._create_client")
+    def test_stale_pool_is_closed_on_loop_change(self, mock_create_client):
+        """Test the Redis pool of a previous event loop is closed when the loop changes"""
+        from app.core.redis_client import get_redis
+        
+        mock_create_client.side_effect = lambda decode_responses: AsyncMock()
+        
+        async def acquire():
+            return get_redis()
+        
+        first = asyncio.run(acquire())
+        second = asyncio.run(acquire())
+        
+        assert second is not first
+        first.aclose.assert_awaited_once_with(close_connection_pool=True)
+        second.aclose.assert_not_awaited()
+    
+    @patch("app.services.cache_service._ensure_invalidation_listener")
+    @patch("app.services.cache_service.get_redis")
+    async def test_layered_cache_serves_l1_and_honours_invalidation(
+        self, mock_get_redis, mock_listener
+    ):
+        """Test LayeredCache promotes L2 hits to L1 and drops them on invalidation"""
+        from app.services.cache_service import (
+            LayeredCache, _apply_invalidation, get_cache_stats
+        )
+        
+        mock_redis = AsyncMock()
+        mock_redis.get.return_value = "token-1"
+        mock_get_redis.return_value = mock_redis
+        cache = LayeredCache("test:layered")
+        
+        assert await cache.get("acc") == "token-1"
+        assert await cache.get("acc") == "token-1"
+        mock_redis.get.assert_awaited_once_with("test:layered:acc")
+        
+        _apply_invalidation({"key": "test:layered:acc", "origin": "other-process"})
+        await cache.get("acc")
+        
+        assert mock_redis.get.await_count == 2
+        assert get_cache_stats()["test:layered"] == {
+            "l1_hits": 1, "l2_hits": 2, "misses": 0
+        }
+    
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+    def test_forked_child_uses_its_own_invalidation_origin(self):
+        """Test prefork children do not share the parent's origin and drop the inherited L1"""
+        from app.services import cache_service
+        
+        cache_service._local_cache.set("test:fork:key", "value", 60)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # child
+            os.close(read_fd)
+            child_state = json.dumps({
+                "origin": cache_service._PROCESS_ID,
+                "l1": cache_service._local_cache.get("test:fork:key"),
+            })
+            os.write(write_fd, child_state.encode())
+            os._exit(0)
+        
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            child_state = json.loads(pipe.read())
+        os.waitpid(pid, 0)
+        
+        assert child_state["origin"] != cache_service._PROCESS_ID
+        assert child_state["l1"] is None
+        assert cache_service._local_cache.get("test:fork:key") == "value"
+    
+    @patch("app.services.cache_service.get_redis")
+    async def test_single_flight_computes_once_for_concurrent_misses(self, mock_get_redis):
+        """Test concurrent misses for one key share a single computation"""
+        from app.services.cache_service import SingleFlightCache
+        
+        mock_redis = AsyncMock()
+        mock_redis.get.return_value = None
+        mock_redis.set.return_value = True
+        mock_get_redis.return_value = mock_redis
+        calls = 0
+        
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "result"
+        
+        cache = SingleFlightCache("test:single_flight", ttl=60)
+        results = await asyncio.gather(
+            *[cache.get_or_compute("key", compute) for _ in range(5)]
+        )
+        
+        assert results == ["result"] * 5
+        assert calls == 1
+        mock_redis.setex.assert_awaited_once()
+        mock_redis.eval.assert_awaited_once()
+    
+    @patch("app.services.cache_service.get_redis")
+    async def test_single_flight_serves_stale_while_revalidating(self, mock_get_redis):
+        """Test an expired entry is returned immediately and refreshed in the background"""
+        import json
+        import time
+        from app.services.cache_service import SingleFlightCache
+        
+        mock_redis = AsyncMock()
+        mock_redis.get.return_value = json.dumps(
+            {"value": "old", "fresh_until": time.time() - 1}
+        )
+        mock_redis.set.return_value = True
+        mock_get_redis.return_value = mock_redis
+        compute = AsyncMock(return_value="new")
+        
+        cache = SingleFlightCache("test:stale", ttl=60, stale_ttl=60)
+        assert await cache.get_or_compute("key", compute) == "old"
+        
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        compute.assert_awaited_once()
+    
+    def test_cache_codec_round_trip_with_compression(self):
+        """Test CacheCodec compresses large values and decodes both forms"""
+        from app.services.cache_codec import CacheCodec, COMPRESSION_NONE
+        
+        codec = CacheCodec(serializer="json", compression="zlib", compress_min_bytes=64)
+        small = {"id": "m1"}
+        large = {"id": "m2", "snippet": "status update " * 50}
+        
+        encoded_small = codec.encode(small)
+        encoded_large = codec.encode(large)
+        
+        assert encoded_small[1:2] == COMPRESSION_NONE
+        assert len(encoded_large) < len(large["snippet"])
+        assert codec.decode(encoded_small) == small
+        assert codec.decode(encoded_large) == large
+        assert codec.decode(b'{"legacy": "json"}') is None
+
+
+class TestCacheCleanupEngine:
+    @patch("app.services.cache_cleanup.get_redis")
+    async def test_cleanup_stops_at_key_budget_and_persists_cursor(
+        self, mock_get_redis, redis_pipeline
+    ):
+        """Test cleanup unlinks keys without TTL and saves the SCAN cursor when over budget"""
+        from app.services.cache_cleanup import CacheCleanupEngine, CURSOR_KEY
+        
+        pipe = redis_pipeline
+        pipe.execute.side_effect = [[-1, 120], [2048, 1], [1, 2048]]
+        
+        mock_redis = AsyncMock()
+        mock_redis.hgetall.return_value = {}
+        mock_redis.scan.return_value = (42, ["email:msg:a", "email:msg:b"])
+        mock_redis.pipeline = MagicMock(return_value=pipe)
+        mock_get_redis.return_value = mock_redis
+        
+        report = await CacheCleanupEngine(
+            namespaces=("email:msg",), key_budget=2
+        ).run()
+        
+        assert report["email:msg"] == {
+            "scanned": 2, "deleted": 1, "reclaimed_bytes": 2048, "pass_completed": False
+        }
+        pipe.unlink.assert_called_once_with("email:msg:a")
+        mock_redis.scan.assert_awaited_once_with(0, match="email:msg:*", count=500)
+        mock_redis.hset.assert_awaited_once_with(CURSOR_KEY, "email:msg", 42)
+
+
+class TestSeenMessageFilter:
+    @patch("app.services.seen_messages.get_redis")
+    async def test_partition_only_sends_possible_duplicates_to_exact_check(
+        self, mock_get_redis, redis_pipeline
+    ):
+        """Test added IDs are reported as possibly seen and unknown IDs as new"""
+        from app.services.seen_messages import SeenMessageFilter, bloom_parameters
+        
+        pipe = redis_pipeline
+        mock_get_redis.return_value.pipeline = MagicMock(return_value=pipe)
+        
+        num_bits, num_hashes = bloom_parameters(1000, 0.01)
+        seen = SeenMessageFilter("acc-1", bytearray(num_bits // 8), num_bits, num_hashes, 1000)
+        await seen.add(["msg-1", "msg-2"])
+        
+        new_ids, maybe_seen = seen.partition(["msg-1", "msg-2", "msg-3"])
+        
+        assert maybe_seen == ["msg-1", "msg-2"]
+        assert new_ids == ["msg-3"]
+        assert pipe.setbit.call_count == 2 * num_hashes
+        pipe.hincrby.assert_called_once_with("seen:bloom_meta:acc-1", "count", 2)
+    
+    def test_unavailable_filter_defers_to_exact_check(self):
+        """Test a filter without a bitmap treats every ID as possibly seen"""
+        from app.services.seen_messages import SeenMessageFilter
+        
+        seen = SeenMessageFilter("acc-1", None, 0, 0, 0)
+        
+        assert seen.partition(["msg-1"]) == ([], ["msg-1"])
+
+
+class TestTaggedCache:
+    @patch("app.services.cache_service.get_redis")
+    async def test_invalidating_a_tag_forces_recompute(self, mock_get_redis, fake_redis):
+        """Test entries are reused until one of their tags is invalidated"""
+        from app.services.cache_service import TaggedCache, invalidate_tags
+        
+        mock_get_redis.return_value = fake_redis
+        compute = AsyncMock(side_effect=["v1", "v2"])
+        cache = TaggedCache("test:tagged", ttl=3600)
+        tags = ["user:1:tasks"]
+        
+        assert await cache.get_or_compute("summary", tags, compute) == "v1"
+        assert await cache.get_or_compute("summary", tags, compute) == "v1"
+        
+        await invalidate_tags("user:1:tasks")
+        
+        assert await cache.get_or_compute("summary", tags, compute) == "v2"
+        assert compute.await_count == 2
+
+
+class TestConditionalResponse:
+    @staticmethod
+    def _request(query="", if_none_match=None):
+        from starlette.requests import Request
+        headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+        return Request({
+            "type": "http",
+            "method": "GET",
+            "path": "/api/v1/tasks",
+            "query_string": query.encode(),
+            "headers": headers,
+        })
+    
+    @patch("app.services.response_cache.get_redis")
+    @patch("app.services.cache_service.get_redis")
+    async def test_not_modified_until_tag_invalidated(
+        self, mock_tag_redis, mock_response_redis, fake_redis
+    ):
+        """Test If-None-Match returns 304 until the user's task tag is bumped"""
+        from app.services.cache_service import invalidate_tags
+        from app.services.response_cache import conditional_response
+        
+        mock_tag_redis.return_value = fake_redis
+        mock_response_redis.return_value = fake_redis
+        render = AsyncMock(return_value={"tasks": [], "total": 0})
+        tags = ["user:1:tasks"]
+        
+        first = await conditional_response(self._request("page=1"), "tasks", tags, render)
+        etag = first.headers["etag"]
+        assert first.status_code == 200
+        
+        cached = await conditional_response(
+            self._request("page=1", if_none_match=etag), "tasks", tags, render
+        )
+        assert cached.status_code == 304
+        assert render.await_count == 1
+        
+        await invalidate_tags("user:1:tasks")
+        
+        changed = await conditional_response(
+            self._request("page=1", if_none_match=etag), "tasks", tags, render
+        )
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert render.await_count == 2
+
+    
+    @patch("app.services.response_cache.get_redis")
+    @patch("app.services.cache_service.get_redis")
+    async def test_default_params_share_etag(
+        self, mock_tag_redis, mock_response_redis, fake_redis
+    ):
+        """Test a request relying on defaults reuses the response warmed with explicit defaults"""
+        from app.services.response_cache import conditional_response
+        
+        mock_tag_redis.return_value = fake_redis
+        mock_response_redis.return_value = fake_redis
+        render = AsyncMock(return_value={"tasks": [], "total": 0})
+        tags = ["user:1:tasks"]
+        
+        warmed = await conditional_response(
+            self._request(), "tasks", tags, render, params={"page": 1, "limit": 20, "search": None}
+        )
+        explicit = await conditional_response(
+            self._request("limit=20&page=1", if_none_match=warmed.headers["etag"]),
+            "tasks", tags, render, params={"page": 1, "limit": 20, "search": None}
+        )
+        other = await conditional_response(
+            self._request("limit=50"), "tasks", tags, render, params={"page": 1, "limit": 50}
+        )
+        
+        assert explicit.status_code == 304
+        assert other.headers["etag"] != warmed.headers["etag"]
+        assert render.await_count == 2
+
+class TestAIResponseCache:
+    @patch("app.services.ai_response_cache.get_redis")
+    @patch("app.services.cache_service.get_redis")
+    async def test_reuses_response_for_normalized_input(
+        self, mock_cache_redis, mock_ai_redis, fake_redis
+    ):
+        """Test whitespace-only changes hit the cache and a model change misses"""
+        from app.services.ai_response_cache import AIResponseCache, get_ai_cache_metrics
+        
+        mock_cache_redis.return_value = fake_redis
+        mock_ai_redis.return_value = fake_redis
+        compute = AsyncMock(side_effect=["r1", "r2"])
+        cache = AIResponseCache("test:ai", ttl=3600, near_duplicate=False)
+        
+        assert await cache.get_or_compute("件名: 見積\n本文: 確認", compute, model="m1") == "r1"
+        assert await cache.get_or_compute("件名: 見積  本文:  確認 ", compute, model="m1") == "r1"
+        assert await cache.get_or_compute("件名: 見積\n本文: 確認", compute, model="m2") == "r2"
+        
+        metrics = (await get_ai_cache_metrics())["test:ai"]
+        assert metrics["exact_hits"] == 1
+        assert metrics["misses"] == 2
+    
+    @patch("app.services.ai_response_cache.get_redis")
+    @patch("app.services.cache_service.get_redis")
+    async def test_near_duplicate_within_scope(
+        self, mock_cache_redis, mock_ai_redis, fake_redis
+    ):
+        """Test a one-character edit reuses the response only within the same scope"""
+        from app.services.ai_response_cache import AIResponseCache
+        
+        mock_cache_redis.return_value = fake_redis
+        mock_ai_redis.return_value = fake_redis
+        compute = AsyncMock(side_effect=["r1", "r2"])
+        cache = AIResponseCache("test:ai_near", ttl=3600, near_duplicate=True, max_distance=3)
+        original = "プロジェクト定例の議事録です。次回までに見積書を作成し、顧客へ送付します。" * 20
+        edited = original[:-1] + "！"
+        
+        assert await cache.get_or_compute(original, compute, scope="user-1") == "r1"
+        assert await cache.get_or_compute(edited, compute, scope="user-1") == "r1"
+        assert await cache.get_or_compute(edited, compute, scope="user-2") == "r2"
+
+
+class TestCacheWarmup:
+    @patch("app.services.cache_warmup.get_redis")
+    async def test_warms_dashboard_paths_once_per_cooldown(self, mock_get_redis, fake_redis):
+        """Test login warm-up requests each dashboard path with the user's token"""
+        from fastapi import FastAPI, Request
+        from app.services import cache_warmup
+        
+        mock_get_redis.return_value = fake_redis
+        requested = []
+        app = FastAPI()
+        
+        @app.get(settings.API_V1_STR + "/{path:path}")
+        async def record(path: str, request: Request):
+            requested.append((request.url.path, request.headers["authorization"]))
+            return {}
+        
+        cache_warmup.schedule_cache_warmup(app, "user-1", "token-1")
+        await cache_warmup._warmups["user-1"]
+        
+        assert len(requested) == len(cache_warmup.WARMUP_PATHS)
+        assert all(auth == "Bearer token-1" for _, auth in requested)
+        
+        # A refresh right after login does not warm the same user again
+        cache_warmup.schedule_cache_warmup(app, "user-1", "token-2")
+        if "user-1" in cache_warmup._warmups:
+            await cache_warmup._warmups["user-1"]
+        assert len(requested) == len(cache_warmup.WARMUP_PATHS)